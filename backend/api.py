@@ -6,16 +6,19 @@ import uuid
 from pathlib import Path
 from fastapi import FastAPI, Request, HTTPException, File, UploadFile, Form
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from starlette.background import BackgroundTask
 from pydantic import BaseModel, Field, ConfigDict
 from typing import List, Dict, Optional, Any, Union
 from datetime import datetime
 import json
+import asyncio
 import traceback
 import torch
 import tempfile
 
-from inference import chat_completion
+from infrastructure.config.settings import get_settings
 from model_registry import get_available_modes, LOCAL_MODEL_PATH as LOCAL_MODEL_DIR, DEVICE
 from tools_config import AVAILABLE_TOOLS
 from mode_router import auto_route_mode
@@ -24,9 +27,24 @@ from mode_router import auto_route_mode
 from utils.rate_limiter import rate_limiter
 from utils.logger import app_logger
 from utils.metrics import metrics
+from utils.adaptive_limiter import limiter_stats
 from utils.circuit_breaker import CircuitBreakerOpenError
 from middleware.error_handler import ErrorHandler
 from middleware.health_check import health_checker
+from core.services.inference.stream_bridge import iterate_in_thread, cancel_on_disconnect
+from core.domain.cancellation import CancellationToken
+from core.services.inference.admission import get_admission_controller
+# Admissão e health compartilhados com a app de api/main.py
+from api.dependencies import admit_request
+from api.routes import health
+
+# Engine: no próprio processo (padrão) ou no model server via IPC (ENGINE_MODE=remote),
+# o que permite rodar vários workers HTTP sem uma cópia do modelo em cada um
+if get_settings().engine_mode == "remote":
+    from engine.model_client import get_engine_client
+    chat_completion = get_engine_client().chat_completion
+else:
+    from inference import chat_completion
 
 
 # Models Pydantic
@@ -44,6 +62,7 @@ class ChatRequest(BaseModel):
     tools: Optional[List[Dict[str, Any]]] = None
     stream: bool = False
     mode: Optional[str] = None
+    priority: Optional[str] = None  # "batch" rebaixa a prioridade na fila de admissão
 
 from contextlib import asynccontextmanager
 
@@ -53,7 +72,11 @@ async def lifespan(app: FastAPI):
     print("=" * 60)
     print("🚀 Inicializando SuperEzio Python Backend v4.0.0 (Motor Llama.cpp)")
     print("=" * 60)
-    # A inicialização do modelo agora é feita no 'inference.py'
+    # O modelo carrega em background: o processo já responde /health/live
+    # enquanto /health/ready segura o tráfego até o warm-up terminar
+    if get_settings().engine_mode != "remote":
+        from engine.warmup import get_engine_lifecycle
+        get_engine_lifecycle().start()
     yield
     app_logger.info("Shutting down SuperEzio Backend")
     print("\n🛑 Encerrando servidor...")
@@ -66,11 +89,28 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# /health, /health/live, /health/ready, /health/engine
+app.include_router(health.router)
+
 def resolve_tools(custom_tools: Optional[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
     return AVAILABLE_TOOLS
 
+def require_engine_ready():
+    """Recusa com 503 + Retry-After enquanto o engine carrega/aquece"""
+    if get_settings().engine_mode == "remote":
+        return
+    from engine.warmup import get_engine_lifecycle
+    lifecycle = get_engine_lifecycle()
+    if not lifecycle.ready:
+        metrics.increment("api.rejected_not_ready")
+        raise HTTPException(
+            status_code=503,
+            detail=f"Engine not ready ({lifecycle.state})",
+            headers={"Retry-After": "5"},
+        )
+
 @app.post("/chat/vision")
-async def chat_vision(request: str = Form(...), image: UploadFile = File(...)):
+async def chat_vision(http_request: Request, request: str = Form(...), image: UploadFile = File(...)):
     req_id = str(uuid.uuid4())[:8]
     print(f"\n{'='*60}\n🖼️  [REQ #{req_id}] VISION request")
     try:
@@ -78,43 +118,80 @@ async def chat_vision(request: str = Form(...), image: UploadFile = File(...)):
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Invalid request format: {e}")
 
+    if get_settings().engine_backend == "fake":
+        raise HTTPException(status_code=501, detail="Vision is not supported by the fake engine (ENGINE_BACKEND=fake)")
+
+    require_engine_ready()
+    ticket = await admit_request("interactive", chat_request.priority)
+
     try:
         with tempfile.NamedTemporaryFile(delete=False, suffix=".png") as tmp:
             tmp.write(await image.read())
             image_path = tmp.name
         print(f"   Image saved to: {image_path}")
     except Exception as e:
+        ticket.release()
         raise HTTPException(status_code=500, detail=f"Failed to save image: {e}")
 
+    cancel_token = CancellationToken(get_settings().request_deadline_s or None)
+
     async def event_generator():
+        watcher = asyncio.create_task(cancel_on_disconnect(cancel_token, http_request.is_disconnected))
         try:
             messages_dict = [msg.model_dump(by_alias=True) for msg in chat_request.messages]
-            result_stream = chat_completion(
+            result_stream = lambda: chat_completion(
                 messages=messages_dict,
                 max_tokens=chat_request.max_tokens,
                 temperature=chat_request.temperature,
                 stream=True,
-                image_path=image_path
+                image_path=image_path,
+                cancel_token=cancel_token
             )
-            for chunk in result_stream:
+            # Decode em thread dedicada: o event loop segue atendendo outros clientes
+            ticket.tokens = 0
+            async for chunk in iterate_in_thread(result_stream, metric_prefix="vision.stream"):
+                ticket.tokens += 1
                 yield f"data: {json.dumps(chunk)}\n\n"
         finally:
+            watcher.cancel()
+            ticket.release()
+            cancel_token.cancel("stream_closed")
             if os.path.exists(image_path):
                 os.remove(image_path)
 
-    return StreamingResponse(event_generator(), media_type="text/event-stream")
+    # background: libera o lugar mesmo se o gerador nunca chegar a rodar
+    return StreamingResponse(event_generator(), media_type="text/event-stream",
+                             background=BackgroundTask(ticket.release_async))
 
 # Add o resto dos seus endpoints aqui (chat, health, etc.)
 @app.get("/")
 async def root():
     return {"status": "online"}
 
+@app.get("/metrics")
+def get_metrics():
+    """Contadores/histogramas, fila de admissão e limites adaptativos atuais"""
+    return {
+        **metrics.get_stats(),
+        "admission": get_admission_controller().stats(),
+        "limits": limiter_stats(),
+    }
+
 @app.post("/chat")
-def chat(req: ChatRequest):
-     return chat_completion(
-        messages=[msg.model_dump() for msg in req.messages],
-        tools=resolve_tools(req.tools),
-        temperature=req.temperature,
-        max_tokens=req.max_tokens,
-        stream=False
-    )
\ No newline at end of file
+async def chat(req: ChatRequest):
+    require_engine_ready()
+    ticket = await admit_request("chat", req.priority)
+    try:
+        result = await run_in_threadpool(
+            chat_completion,
+            messages=[msg.model_dump() for msg in req.messages],
+            tools=resolve_tools(req.tools),
+            temperature=req.temperature,
+            max_tokens=req.max_tokens,
+            stream=False
+        )
+        if isinstance(result, dict):
+            ticket.tokens = (result.get("usage") or {}).get("completion_tokens")
+        return result
+    finally:
+        ticket.release()
\ No newline at end of file
@@ -15,9 +15,16 @@ from core.services.routing.expert_router_impl import create_router
 from core.services.rag.rag_retriever_impl import create_rag_retriever
 from core.services.inference.generator_impl import create_generator
 from core.services.tools.tool_executor_impl import create_tool_executor
+from optimization.semantic_cache import get_semantic_cache
 
-# Rate limiting
+# Rate limiting / admissão
 from infrastructure.observability.rate_limiter import rate_limiter
+from core.services.inference.admission import (
+    AdmissionRejected,
+    AdmissionTicket,
+    get_admission_controller,
+    resolve_priority
+)
 
 
 # Cache de instâncias (singletons)
@@ -69,7 +76,8 @@ def get_chat_use_case() -> ChatCompletionUseCase:
             router=get_router(),
             rag_retriever=get_rag_retriever(),
             generator=get_generator(),
-            tool_executor=get_tool_executor()
+            tool_executor=get_tool_executor(),
+            answer_cache=get_semantic_cache()
         )
     return _chat_use_case
 
@@ -81,7 +89,8 @@ def get_stream_use_case() -> StreamCompletionUseCase:
         _stream_use_case = StreamCompletionUseCase(
             router=get_router(),
             rag_retriever=get_rag_retriever(),
-            generator=get_generator()
+            generator=get_generator(),
+            answer_cache=get_semantic_cache()
         )
     return _stream_use_case
 
@@ -102,3 +111,15 @@ def check_rate_limit(request: Request, endpoint: str = "chat"):
     
     return True
 
+
+
+async def admit_request(default_priority: str, requested: str | None = None) -> AdmissionTicket:
+    """Ocupa um lugar de geração (fila por prioridade) ou recusa com 503 + Retry-After"""
+    try:
+        return await get_admission_controller().acquire(resolve_priority(default_priority, requested))
+    except AdmissionRejected as exc:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Server overloaded ({exc.reason}). Retry after {exc.retry_after} seconds",
+            headers={"Retry-After": str(exc.retry_after)}
+        )
@@ -15,14 +15,13 @@ import torch
 
 # Infrastructure imports
 from infrastructure.config.settings import get_settings
-from infrastructure.models.registry import (
+from model_registry import (
     get_model_and_tokenizer,
     get_available_modes,
-    LOCAL_MODEL_DIR,
+    LOCAL_MODEL_PATH as LOCAL_MODEL_DIR,
     DEVICE
 )
 from infrastructure.observability.logger import app_logger
-from infrastructure.observability.metrics import metrics
 from infrastructure.observability.health import health_checker
 
 # Middleware
@@ -31,8 +30,8 @@ from middleware.error_handler import ErrorHandler
 # Routes
 from api.routes import chat, stream, health, metrics as metrics_route
 
-# Import legacy para compatibilidade durante migração
-from inference import load_model
+# Engine: carregado e aquecido em background (ver engine/warmup.py)
+from engine.warmup import get_engine_lifecycle
 
 
 settings = get_settings()
@@ -51,22 +50,22 @@ async def lifespan(app: FastAPI):
     print(f"🤖 Modelo: {LOCAL_MODEL_DIR}")
     print(f"📁 Verificando se modelo existe...")
     
-    if not LOCAL_MODEL_DIR.exists():
+    if settings.engine_backend == "fake":
+        # Engine simulado (engine/fake_backend.py): sobe sem o GGUF em disco
+        print("🧪 ENGINE_BACKEND=fake: pulando verificação do modelo")
+    elif not LOCAL_MODEL_DIR.exists():
         app_logger.error("Model not found", path=str(LOCAL_MODEL_DIR))
         raise Exception(f"❌ ERRO: Modelo não encontrado em {LOCAL_MODEL_DIR}")
     else:
         print(f"✅ Modelo encontrado!")
         app_logger.info("Model found", path=str(LOCAL_MODEL_DIR))
     
-    print(f"⏳ Carregando modelo base... (isso pode levar 90-120 segundos na primeira vez)")
-    print(f"   Com quantização 4-bit: ~4-5 GB VRAM")
-    print(f"   LoRAs serão carregados sob demanda quando mode for especificado")
+    print(f"⏳ Carregando modelo base em background... (/health/ready responde 200 após o warm-up)")
     
     try:
-        with metrics.timer("startup.model_load"):
-            load_model(mode=None)  # Carregar apenas modelo base
-        print(f"✅ Modelo base carregado com sucesso!")
-        app_logger.info("Model loaded", mode="base")
+        if settings.engine_mode != "remote":
+            get_engine_lifecycle().start()
+        app_logger.info("Model load started", mode="base")
         
         available_modes = get_available_modes()
         if available_modes:
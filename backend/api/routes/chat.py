@@ -8,14 +8,13 @@ from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.responses import JSONResponse
 from api.schemas.requests import ChatRequest
 from api.schemas.responses import ChatResponse
-from api.dependencies import get_chat_use_case, check_rate_limit
+from api.dependencies import get_chat_use_case, check_rate_limit, admit_request
 from core.domain.message import Message
 from core.use_cases.chat_completion import ChatCompletionUseCase
 from infrastructure.observability.logger import app_logger
 from infrastructure.observability.metrics import metrics
 from infrastructure.observability.circuit_breaker import CircuitBreakerOpenError
 from middleware.error_handler import ErrorHandler
-import torch
 
 
 router = APIRouter(prefix="/chat", tags=["chat"])
@@ -62,9 +61,8 @@ async def chat(
         user_message_preview=user_text[:120]
     )
     
-    # Limpar cache GPU
-    if torch.cuda.is_available():
-        torch.cuda.empty_cache()
+    # Admissão: espera um lugar na fila "chat" (ou 503 + Retry-After)
+    ticket = await admit_request("chat", req.priority)
     
     try:
         # Limitar max_tokens
@@ -83,6 +81,7 @@ async def chat(
         )
         
         infer_time = time.time() - t0
+        ticket.tokens = (result.usage or {}).get("completion_tokens")
         
         # Métricas
         metrics.histogram("chat.inference_time", infer_time)
@@ -161,4 +160,6 @@ async def chat(
             status_code=500,
             media_type="application/json; charset=utf-8"
         )
+    finally:
+        ticket.release()
 
@@ -4,9 +4,12 @@ GET /health endpoints
 """
 import torch
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse
 from api.schemas.responses import HealthResponse
 from infrastructure.observability.health import health_checker
-from infrastructure.models.registry import LOCAL_MODEL_DIR, DEVICE
+from model_registry import LOCAL_MODEL_PATH as LOCAL_MODEL_DIR, DEVICE
+from infrastructure.config.settings import get_settings
+from core.services.inference.admission import get_admission_controller
 
 
 router = APIRouter(tags=["health"])
@@ -30,3 +33,45 @@ async def health_detailed():
     """Health check detalhado de todos os componentes"""
     return health_checker.check_all()
 
+
+@router.get("/health/live")
+async def health_live():
+    """Liveness: o processo está de pé (não depende do modelo)"""
+    return {"status": "alive"}
+
+
+def engine_readiness() -> dict:
+    """Prontidão do engine local (lifecycle) ou do pool do model server"""
+    if get_settings().engine_mode == "remote":
+        from engine.model_client import get_engine_client
+        return get_engine_client().health()
+    from engine.warmup import get_engine_lifecycle
+    return get_engine_lifecycle().status()
+
+
+@router.get("/health/ready")
+def health_ready():
+    """Readiness: modelo carregado e aquecido (503 enquanto carrega)"""
+    status = engine_readiness()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+
+@router.get("/health/engine")
+def engine_health():
+    """Prontidão + fila de admissão, workers, tokenizer e caches do engine"""
+    status = engine_readiness()
+    status["admission"] = get_admission_controller().stats()
+    if status["ready"] and get_settings().engine_mode != "remote":
+        from engine.scheduler import get_scheduler
+        from engine.tokenizer import get_tokenizer
+        status["workers"] = [get_scheduler().stats()]
+        status["tokenizer"] = get_tokenizer().stats()
+        from optimization.response_cache import response_cache
+        status["response_cache"] = response_cache.get_stats()
+        from optimization.semantic_cache import get_semantic_cache
+        if get_semantic_cache() is not None:
+            status["semantic_cache"] = get_semantic_cache().get_stats()
+        from engine.cascade import get_cascade
+        if get_cascade() is not None:
+            status["cascade"] = get_cascade().get_stats()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
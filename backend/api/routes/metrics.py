@@ -5,6 +5,8 @@ GET /metrics endpoint
 from fastapi import APIRouter
 from api.schemas.responses import MetricsResponse
 from infrastructure.observability.metrics import metrics
+from core.services.inference.admission import get_admission_controller
+from utils.adaptive_limiter import limiter_stats
 
 
 router = APIRouter(tags=["metrics"])
@@ -16,6 +18,8 @@ async def get_metrics():
     stats = metrics.get_stats()
     return MetricsResponse(
         counters=stats.get("counters", {}),
-        histograms=stats.get("histograms", {})
+        histograms=stats.get("histograms", {}),
+        admission=get_admission_controller().stats(),
+        limits=limiter_stats()
     )
 
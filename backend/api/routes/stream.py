@@ -4,13 +4,18 @@ POST /chat/stream endpoint
 """
 import json
 import uuid
+import asyncio
 import textwrap
 from fastapi import APIRouter, Depends, Request
 from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 from api.schemas.requests import ChatRequest
-from api.dependencies import get_stream_use_case, check_rate_limit
+from api.dependencies import get_stream_use_case, check_rate_limit, admit_request
 from core.domain.message import Message
+from core.domain.cancellation import CancellationToken
+from core.services.inference.stream_bridge import cancel_on_disconnect
 from core.use_cases.stream_completion import StreamCompletionUseCase
+from infrastructure.config.settings import get_settings
 
 
 router = APIRouter(prefix="/chat", tags=["chat"])
@@ -35,7 +40,14 @@ async def chat_stream(
     print(f"📊 max_tokens: {req.max_tokens} | temp: {req.temperature}")
     print(f"📝 {len(req.messages)} mensagens")
     
+    # Admissão: streams são interativos (maior prioridade na fila)
+    ticket = await admit_request("interactive", req.priority)
+    
+    # Cancelado se o cliente desconectar ou o deadline estourar
+    cancel_token = CancellationToken(get_settings().request_deadline_s or None)
+    
     async def event_generator():
+        watcher = asyncio.create_task(cancel_on_disconnect(cancel_token, request.is_disconnected))
         try:
             chunk_count = 0
             
@@ -47,10 +59,12 @@ async def chat_stream(
                 messages=messages,
                 temperature=req.temperature,
                 max_tokens=req.max_tokens,
-                mode=req.mode
+                mode=req.mode,
+                cancel_token=cancel_token
             ):
                 # Enviar token diretamente
                 chunk_count += 1
+                ticket.tokens = chunk_count
                 data = json.dumps({"content": token, "done": False})
                 yield f"data: {data}\n\n"
             
@@ -66,10 +80,19 @@ async def chat_stream(
             traceback.print_exc()
             error_data = json.dumps({"error": str(e), "done": True})
             yield f"data: {error_data}\n\n"
+        finally:
+            watcher.cancel()
+            ticket.release()
+            if cancel_token.reason:
+                print(f"🛑 [REQ #{req_id}] Stream cancelado: {cancel_token.reason}")
+            else:
+                cancel_token.cancel("stream_closed")
     
     return StreamingResponse(
         event_generator(),
         media_type="text/event-stream",
+        # Garante a liberação mesmo se o gerador nunca chegar a rodar
+        background=BackgroundTask(ticket.release_async),
         headers={
             "Cache-Control": "no-cache",
             "Connection": "keep-alive",
@@ -24,4 +24,5 @@ class ChatRequest(BaseModel):
     tools: Optional[List[Dict[str, Any]]] = None
     stream: bool = False
     mode: Optional[str] = None  # Modo/perfil LoRA
+    priority: Optional[str] = None  # "batch" rebaixa a prioridade na fila de admissão
 
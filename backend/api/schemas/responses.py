@@ -47,4 +47,6 @@ class MetricsResponse(BaseModel):
     """Response de métricas"""
     counters: Dict[str, int]
     histograms: Dict[str, Dict[str, Any]]
+    admission: Optional[Dict[str, Any]] = None
+    limits: Optional[Dict[str, Dict[str, Any]]] = None
 
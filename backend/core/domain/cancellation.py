@@ -0,0 +1,58 @@
+"""
+Cancellation Domain Entity
+Token de cancelamento por requisição (desconexão do cliente ou deadline)
+"""
+import threading
+import time
+from typing import Optional
+
+
+class GenerationCancelled(Exception):
+    """Geração interrompida por cancelamento ou deadline"""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class CancellationToken:
+    """
+    Token compartilhado entre a camada HTTP e o loop de decode.
+    Mutável e thread-safe: a rota cancela, o scheduler consulta a cada passo.
+    """
+
+    def __init__(self, deadline_s: Optional[float] = None):
+        self._event = threading.Event()
+        self._reason: Optional[str] = None
+        self.deadline: Optional[float] = time.monotonic() + deadline_s if deadline_s else None
+
+    def cancel(self, reason: str = "cancelled"):
+        """Solicita o cancelamento (idempotente: vale o primeiro motivo)"""
+        if not self._event.is_set():
+            self._reason = reason
+            self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        """True se cancelado ou se o deadline passou"""
+        if self._event.is_set():
+            return True
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            self.cancel("timeout")
+            return True
+        return False
+
+    @property
+    def reason(self) -> Optional[str]:
+        return self._reason
+
+    def remaining(self) -> Optional[float]:
+        """Segundos até o deadline (None = sem deadline)"""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def check(self):
+        """Levanta GenerationCancelled se o token já foi cancelado"""
+        if self.cancelled:
+            raise GenerationCancelled(self._reason or "cancelled")
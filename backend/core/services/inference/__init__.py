@@ -2,8 +2,16 @@
 Inference Services
 Text generation services
 """
+from core.services.inference.admission import AdmissionController, AdmissionRejected, get_admission_controller
 from core.services.inference.generator import Generator
 from core.services.inference.generator_impl import GeneratorImpl, create_generator
-from core.services.inference.prompt_builder import build_messages
+from core.services.inference.prompt_builder import build_messages, build_static_prefix
+from core.services.inference.stream_bridge import iterate_in_thread, cancel_on_disconnect
+from core.services.inference.token_budget import TokenBudget, TokenCounter, get_prompt_budget, get_token_counter
 
-__all__ = ["Generator", "GeneratorImpl", "create_generator", "build_messages"]
+__all__ = [
+    "AdmissionController", "AdmissionRejected", "get_admission_controller",
+    "Generator", "GeneratorImpl", "create_generator", "build_messages", "build_static_prefix",
+    "iterate_in_thread", "cancel_on_disconnect",
+    "TokenBudget", "TokenCounter", "get_prompt_budget", "get_token_counter",
+]
@@ -0,0 +1,260 @@
+"""
+Admission Control
+Limita as gerações em andamento e enfileira o excesso por prioridade.
+
+- Classes: interactive (stream) > chat > batch. Quem libera um lugar o entrega
+  direto ao primeiro da fila de maior prioridade (FIFO dentro da classe)
+- Cada classe tem um tempo máximo de fila: se a espera estimada pela
+  profundidade atual já passa do limite a requisição é recusada na hora
+  (503 + Retry-After), senão espera até o limite e só então desiste
+- A estimativa usa o tempo médio de serviço observado (EWMA), então o
+  Retry-After acompanha a carga real em vez de um valor fixo
+
+Com sobrecarga o sistema enfileira de forma previsível e recusa cedo o que
+não vai caber, em vez de todas as requisições estourarem timeout juntas.
+
+Com um AdaptiveLimiter o número de lugares deixa de ser fixo: cada geração
+que termina informa sua latência por token e o limiter ajusta o limite
+(AIMD) para manter o p95 no alvo; max_in_flight vira o teto.
+
+Roda no event loop do servidor (uma instância por processo): sem locks.
+"""
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from infrastructure.config.settings import get_settings
+from utils.adaptive_limiter import AdaptiveLimiter, get_limiter
+from utils.metrics import metrics
+
+PRIORITIES: Dict[str, int] = {"interactive": 0, "chat": 1, "batch": 2}
+
+# Peso da última observação no tempo médio de serviço
+_SERVICE_EWMA = 0.2
+
+
+class AdmissionRejected(Exception):
+    """Requisição recusada pela admissão (fila cheia ou espera longa demais)"""
+
+    def __init__(self, reason: str, priority: str, retry_after: int):
+        super().__init__(f"Admission rejected ({reason}, {priority}); retry after {retry_after}s")
+        self.reason = reason
+        self.priority = priority
+        self.retry_after = retry_after
+
+
+def resolve_priority(default: str, requested: Optional[str] = None) -> str:
+    """
+    Classe efetiva: o cliente pode rebaixar a requisição (ex.: "batch"),
+    nunca promovê-la acima do padrão do endpoint.
+    """
+    if requested not in PRIORITIES:
+        return default
+    return requested if PRIORITIES[requested] > PRIORITIES[default] else default
+
+
+class AdmissionTicket:
+    """
+    Lugar ocupado por uma requisição admitida; release() é idempotente e pode
+    ser chamado de qualquer thread: fora do event loop (ex.: BackgroundTask
+    síncrona no threadpool) a devolução é agendada de volta no loop.
+    """
+
+    def __init__(self, controller: "AdmissionController", priority: str, admitted_at: float):
+        self._controller = controller
+        self._loop = asyncio.get_running_loop()  # _admit só roda no loop (acquire / _release)
+        self.priority = priority
+        self.admitted_at = admitted_at
+        self.released = False
+        self.tokens: Optional[int] = None  # tokens gerados (amostra de latência para o limiter)
+
+    def release(self) -> None:
+        try:
+            on_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            self._release_on_loop()
+        elif not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._release_on_loop)
+
+    async def release_async(self) -> None:
+        """Para BackgroundTask: o Starlette aguarda no loop, sem passar pelo threadpool"""
+        self.release()
+
+    def _release_on_loop(self) -> None:
+        # Só o loop testa e marca released: sem corrida entre threads
+        if not self.released:
+            self.released = True
+            self._controller._release(self)
+
+
+class AdmissionController:
+    """Semáforo com filas de prioridade e prazo de fila por classe"""
+
+    def __init__(
+        self,
+        max_in_flight: int,
+        max_queue: int = 64,
+        queue_timeouts: Optional[Dict[str, float]] = None,
+        service_time_s: float = 8.0,
+        limiter: Optional[AdaptiveLimiter] = None,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self._max_in_flight = max(1, max_in_flight)
+        self.limiter = limiter
+        self.max_queue = max_queue
+        self.queue_timeouts = {"interactive": 10.0, "chat": 30.0, "batch": 300.0, **(queue_timeouts or {})}
+        self.service_time = service_time_s
+        self._clock = clock
+        self._in_flight = 0
+        # (prioridade, ordem de chegada, classe, entrada na fila, future)
+        self._waiters: List[Tuple[int, int, str, float, asyncio.Future]] = []
+        self._queued = {name: 0 for name in PRIORITIES}
+        self._order = itertools.count()
+        self._stats = {"admitted": 0, "queued": 0, "rejected": 0, "timed_out": 0}
+
+    @property
+    def max_in_flight(self) -> int:
+        """Lugares atuais: o limite aprendido pelo limiter ou o valor fixo"""
+        if self.limiter is not None:
+            return min(self.limiter.limit, self._max_in_flight)
+        return self._max_in_flight
+
+    # ------------------------------------------------------------------
+    # Estimativas
+    # ------------------------------------------------------------------
+    def _ahead_of(self, priority: str) -> int:
+        """Requisições na fila que seriam atendidas antes de uma nova desta classe"""
+        rank = PRIORITIES[priority]
+        return sum(count for name, count in self._queued.items() if PRIORITIES[name] <= rank)
+
+    def estimated_wait(self, priority: str) -> float:
+        """Espera estimada (s) de uma nova requisição da classe"""
+        if self._in_flight < self.max_in_flight and not self._ahead_of(priority):
+            return 0.0
+        return (self._ahead_of(priority) + 1) / self.max_in_flight * self.service_time
+
+    def retry_after(self, priority: str) -> int:
+        """Segundos até valer a pena tentar de novo (pela profundidade atual)"""
+        return max(1, math.ceil(self.estimated_wait(priority)))
+
+    # ------------------------------------------------------------------
+    # Admissão
+    # ------------------------------------------------------------------
+    async def acquire(self, priority: str = "chat") -> AdmissionTicket:
+        """
+        Ocupa um lugar, esperando na fila da classe se necessário.
+
+        Raises:
+            AdmissionRejected: fila cheia, espera estimada acima do prazo da
+                classe ou prazo esgotado na fila
+        """
+        if priority not in PRIORITIES:
+            raise ValueError(f"Prioridade '{priority}' inválida: use {', '.join(PRIORITIES)}")
+
+        if self._in_flight < self.max_in_flight and not self._ahead_of(priority):
+            return self._admit(priority, waited=0.0)
+
+        timeout = self.queue_timeouts.get(priority, 30.0)
+        if self._queued[priority] >= self.max_queue:
+            raise self._reject("queue_full", priority)
+        if self.estimated_wait(priority) > timeout:
+            raise self._reject("overloaded", priority)
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (PRIORITIES[priority], next(self._order), priority, self._clock(), future))
+        self._queued[priority] += 1
+        self._stats["queued"] += 1
+        try:
+            await asyncio.wait_for(future, timeout)
+        except BaseException as exc:
+            if future.done() and not future.cancelled():
+                future.result().release()  # admitida no mesmo instante em que desistiu
+            else:
+                # Prazo ou cliente saiu: sai da contagem; a entrada no heap é
+                # descartada quando chegar ao topo
+                future.cancel()
+                self._queued[priority] -= 1
+            if isinstance(exc, asyncio.TimeoutError):
+                self._stats["timed_out"] += 1
+                raise self._reject("queue_timeout", priority) from None
+            raise
+        return future.result()
+
+    def _admit(self, priority: str, waited: float) -> AdmissionTicket:
+        self._in_flight += 1
+        self._stats["admitted"] += 1
+        metrics.increment("admission.admitted", tags={"priority": priority})
+        metrics.histogram(f"admission.queue_wait.{priority}", waited)
+        return AdmissionTicket(self, priority, self._clock())
+
+    def _reject(self, reason: str, priority: str) -> AdmissionRejected:
+        self._stats["rejected"] += 1
+        metrics.increment("admission.rejected", tags={"priority": priority, "reason": reason})
+        retry_after = self.retry_after(priority)
+        print(f"🚦 [ADMISSION] Recusada ({priority}, {reason}): {self._in_flight} em andamento, "
+              f"{sum(self._queued.values())} na fila, retry em {retry_after}s")
+        return AdmissionRejected(reason, priority, retry_after)
+
+    def _release(self, ticket: AdmissionTicket) -> None:
+        held = self._clock() - ticket.admitted_at
+        self.service_time += _SERVICE_EWMA * (held - self.service_time)
+        if self.limiter is not None and ticket.tokens:
+            self.limiter.observe(held, cost=ticket.tokens, in_flight=self._in_flight)
+        self._in_flight -= 1
+        while self._waiters and self._in_flight < self.max_in_flight:
+            _, _, priority, enqueued_at, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue  # desistiu enquanto esperava
+            self._queued[priority] -= 1
+            future.set_result(self._admit(priority, waited=self._clock() - enqueued_at))
+
+    def stats(self) -> Dict:
+        return {
+            "in_flight": self._in_flight,
+            "max_in_flight": self.max_in_flight,
+            "max_in_flight_cap": self._max_in_flight,
+            "waiting": dict(self._queued),
+            "service_time_s": round(self.service_time, 3),
+            **self._stats,
+        }
+
+
+# ----------------------------------------------------------------------
+# Instância global (configurada por settings.admission_*)
+# ----------------------------------------------------------------------
+_controller: Optional[AdmissionController] = None
+
+
+def get_admission_controller() -> AdmissionController:
+    global _controller
+    if _controller is None:
+        settings = get_settings()
+        max_in_flight = settings.admission_max_in_flight
+        if max_in_flight <= 0:
+            workers = settings.engine_server_workers if settings.engine_mode == "remote" else 1
+            max_in_flight = settings.engine_parallel_slots * workers * 2
+        limiter = None
+        if settings.adaptive_limits_enabled:
+            # Começa nos slots do engine e aprende até o teto
+            limiter = get_limiter(
+                "engine",
+                initial_limit=min(settings.engine_parallel_slots, max_in_flight),
+                max_limit=max_in_flight,
+            )
+        _controller = AdmissionController(
+            max_in_flight=max_in_flight,
+            max_queue=settings.admission_max_queue,
+            queue_timeouts={
+                "interactive": settings.admission_timeout_interactive_s,
+                "chat": settings.admission_timeout_chat_s,
+                "batch": settings.admission_timeout_batch_s,
+            },
+            service_time_s=settings.admission_service_time_s,
+            limiter=limiter,
+        )
+    return _controller
@@ -2,14 +2,32 @@
 Generator Protocol (Interface)
 Define contrato para geradores de texto
 """
-from typing import Protocol, List, Dict, Optional, AsyncGenerator
+from typing import Protocol, List, Dict, Optional, AsyncGenerator, Any
 from core.domain.message import Message
 from core.domain.completion import CompletionResult
+from core.domain.cancellation import CancellationToken
 
 
 class Generator(Protocol):
     """Protocolo para geradores de texto"""
     
+    def build_prompt(
+        self,
+        messages: List[Message],
+        rag_context: Optional[str],
+        expert_id: str,
+        tools: Optional[List[Dict]] = None,
+        max_tokens: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Monta as mensagens finais (system + persona + RAG + histórico + usuário).
+        RAG, histórico e usuário são ajustados ao contexto do slot menos max_tokens.
+        
+        Returns:
+            Mensagens prontas para o modelo
+        """
+        ...
+    
     async def generate(
         self,
         messages: List[Message],
@@ -17,7 +35,9 @@ class Generator(Protocol):
         expert_id: Optional[str] = None,
         temperature: float = 0.7,
         max_tokens: int = 512,
-        tools: Optional[List[Dict]] = None
+        tools: Optional[List[Dict]] = None,
+        cancel_token: Optional[CancellationToken] = None,
+        prompt: Optional[List[Dict[str, Any]]] = None
     ) -> CompletionResult:
         """
         Gera completion de chat.
@@ -29,6 +49,8 @@ class Generator(Protocol):
             temperature: Temperatura de geração
             max_tokens: Máximo de tokens
             tools: Ferramentas disponíveis (opcional)
+            cancel_token: Cancelamento / deadline da requisição (opcional)
+            prompt: Mensagens já montadas por build_prompt (pula a montagem)
             
         Returns:
             CompletionResult
@@ -42,7 +64,10 @@ class Generator(Protocol):
         expert_id: Optional[str] = None,
         temperature: float = 0.7,
         max_tokens: int = 512,
-        tools: Optional[List[Dict]] = None
+        tools: Optional[List[Dict]] = None,
+        cancel_token: Optional[CancellationToken] = None,
+        prompt: Optional[List[Dict[str, Any]]] = None,
+        outcome: Optional[Dict[str, Any]] = None
     ) -> AsyncGenerator[str, None]:
         """
         Gera completion com streaming.
@@ -54,6 +79,9 @@ class Generator(Protocol):
             temperature: Temperatura de geração
             max_tokens: Máximo de tokens
             tools: Ferramentas disponíveis (opcional)
+            cancel_token: Cancelamento / deadline da requisição (opcional)
+            prompt: Mensagens já montadas por build_prompt (pula a montagem)
+            outcome: Dict preenchido com "finish_reason" ao fim do stream (opcional)
             
         Yields:
             Tokens de texto
@@ -6,11 +6,17 @@ Esta é uma camada de adaptação que mantém compatibilidade com código legado
 import os
 import json
 import time
+import asyncio
+from functools import partial
 from typing import List, Dict, Optional, Any, AsyncGenerator
 from core.services.inference.generator import Generator
 from core.domain.message import Message
 from core.domain.completion import CompletionResult
 from core.domain.tool import ToolCall
+from core.domain.cancellation import CancellationToken
+from core.services.inference.stream_bridge import iterate_in_thread
+from core.services.inference.prompt_builder import build_messages
+from core.services.inference.token_budget import get_prompt_budget
 from infrastructure.config.settings import get_settings
 
 # Importar código existente (legado)
@@ -19,13 +25,12 @@ from infrastructure.config.settings import get_settings
 try:
     from inference import (
         chat_completion as legacy_chat_completion,
-        format_messages,
-        _inject_rag_context,
-        SYSTEM_PROMPT
+        generate_from_messages,
+        SYSTEM_PROMPT,
+        CORE_IDENTITY
     )
     from model_registry import get_model_and_tokenizer, get_model_for_expert
     from prompt_builder import build_messages as build_messages_legacy
-    from expert_router import get_router
     from rag_client import query_rag, build_rag_system_message
 except ImportError as e:
     # Fallback se imports legados não disponíveis
@@ -42,6 +47,38 @@ class GeneratorImpl:
     def __init__(self):
         self.settings = get_settings()
     
+    def build_prompt(
+        self,
+        messages: List[Message],
+        rag_context: Optional[str],
+        expert_id: str,
+        tools: Optional[List[Dict]] = None,
+        max_tokens: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Monta as mensagens finais com o contexto RAG já recuperado, dentro do orçamento de tokens"""
+        messages_dict = [m.to_dict() for m in messages]
+        return build_messages(
+            base_system=SYSTEM_PROMPT,
+            core_identity=CORE_IDENTITY,
+            rag_message=rag_context,
+            expert_id=expert_id,
+            history=messages_dict[:-1],
+            user_message=messages_dict[-1]["content"] if messages_dict else "",
+            tools=tools,
+            budget=get_prompt_budget(max_tokens)
+        )
+    
+    def _request(self, messages, rag_context, expert_id, tools, prompt, **kwargs):
+        """
+        Chamada ao engine. Com expert_id conhecido gera direto do prompt montado
+        (sem novo routing/RAG); sem ele cai no caminho legado completo.
+        """
+        if expert_id:
+            if prompt is None:
+                prompt = self.build_prompt(messages, rag_context, expert_id, tools, kwargs.get("max_tokens"))
+            return partial(generate_from_messages, prompt, expert_id=expert_id, tools=tools, **kwargs)
+        return partial(legacy_chat_completion, messages=[m.to_dict() for m in messages], tools=tools, **kwargs)
+    
     async def generate(
         self,
         messages: List[Message],
@@ -49,7 +86,9 @@ class GeneratorImpl:
         expert_id: Optional[str] = None,
         temperature: float = 0.7,
         max_tokens: int = 512,
-        tools: Optional[List[Dict]] = None
+        tools: Optional[List[Dict]] = None,
+        cancel_token: Optional[CancellationToken] = None,
+        prompt: Optional[List[Dict[str, Any]]] = None
     ) -> CompletionResult:
         """
         Gera completion de chat.
@@ -61,6 +100,8 @@ class GeneratorImpl:
             temperature: Temperatura de geração
             max_tokens: Máximo de tokens
             tools: Ferramentas disponíveis (opcional)
+            cancel_token: Cancelamento / deadline da requisição (opcional)
+            prompt: Mensagens já montadas pelo pipeline (opcional)
             
         Returns:
             CompletionResult
@@ -68,26 +109,32 @@ class GeneratorImpl:
         if legacy_chat_completion is None:
             raise RuntimeError("Legacy chat_completion not available")
         
-        # Converter domain entities para formato legado
-        messages_dict = [m.to_dict() for m in messages]
-        
-        # Se expert_id fornecido, usar router para obter decisão completa
-        mode = None
-        if expert_id:
-            router = get_router()
-            decision = router.route(messages_dict, explicit_mode=expert_id)
-            mode = decision.lora_adapter if decision.lora_adapter else None
-        
-        # Chamar função legada
-        result = legacy_chat_completion(
-            messages=messages_dict,
-            tools=tools,
+        call = self._request(
+            messages, rag_context, expert_id, tools, prompt,
             temperature=temperature,
             max_tokens=max_tokens,
             stream=False,
-            mode=mode
+            cancel_token=cancel_token
         )
         
+        # Chamada bloqueante fora do event loop
+        result = await asyncio.get_running_loop().run_in_executor(None, call)
+        
+        # Resposta no formato OpenAI (chat.completion)
+        if isinstance(result, dict) and result.get("choices"):
+            choice = result["choices"][0]
+            calls = choice["message"].get("tool_calls") or []
+            return CompletionResult(
+                content=choice["message"].get("content") or "",
+                expert=expert_id,
+                tool_calls=[ToolCall(name=tc["name"], parameters=tc["parameters"]) for tc in calls] or None,
+                usage=result.get("usage"),
+                metadata={
+                    "finish_reason": choice.get("finish_reason") or "stop",
+                    "cached": bool(result.get("cached")),
+                }
+            )
+
         # Converter resultado legado para domain entity
         if isinstance(result, dict):
             # Extrair tool_calls se existirem
@@ -122,7 +169,10 @@ class GeneratorImpl:
         expert_id: Optional[str] = None,
         temperature: float = 0.7,
         max_tokens: int = 512,
-        tools: Optional[List[Dict]] = None
+        tools: Optional[List[Dict]] = None,
+        cancel_token: Optional[CancellationToken] = None,
+        prompt: Optional[List[Dict[str, Any]]] = None,
+        outcome: Optional[Dict[str, Any]] = None
     ) -> AsyncGenerator[str, None]:
         """
         Gera completion com streaming.
@@ -134,6 +184,9 @@ class GeneratorImpl:
             temperature: Temperatura de geração
             max_tokens: Máximo de tokens
             tools: Ferramentas disponíveis (opcional)
+            cancel_token: Cancelamento / deadline da requisição (opcional)
+            prompt: Mensagens já montadas pelo pipeline (opcional)
+            outcome: Dict preenchido com "finish_reason" ao fim do stream (opcional)
             
         Yields:
             Tokens de texto
@@ -141,33 +194,41 @@ class GeneratorImpl:
         if legacy_chat_completion is None:
             raise RuntimeError("Legacy chat_completion not available")
         
-        # Converter domain entities para formato legado
-        messages_dict = [m.to_dict() for m in messages]
+        if cancel_token is None:
+            cancel_token = CancellationToken(self.settings.request_deadline_s or None)
         
-        # Se expert_id fornecido, usar router
-        mode = None
-        if expert_id:
-            router = get_router()
-            decision = router.route(messages_dict, explicit_mode=expert_id)
-            mode = decision.lora_adapter if decision.lora_adapter else None
+        if outcome is None:
+            outcome = {}
         
-        # Chamar função legada com stream=True
-        result = legacy_chat_completion(
-            messages=messages_dict,
-            tools=tools,
-            temperature=temperature,
-            max_tokens=max_tokens,
-            stream=True,
-            mode=mode
-        )
+        def produce():
+            # Roda na thread do stream bridge: o decode nunca bloqueia o event loop
+            result = self._request(
+                messages, rag_context, expert_id, tools, prompt,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                stream=True,
+                cancel_token=cancel_token
+            )()
+            if isinstance(result, (dict, str)):
+                # Fallback: resultado completo como único token
+                yield str(result)
+                return
+            for chunk in result:
+                choice = chunk["choices"][0] if isinstance(chunk, dict) else {"delta": {"content": chunk}}
+                delta = choice.get("delta", {})
+                if delta.get("content"):
+                    yield delta["content"]
+                if choice.get("finish_reason"):
+                    outcome["finish_reason"] = choice["finish_reason"]
         
-        # Yield tokens do generator
-        if hasattr(result, '__iter__'):
-            for token in result:
+        completed = False
+        try:
+            async for token in iterate_in_thread(produce, metric_prefix="generator.stream"):
                 yield token
-        else:
-            # Fallback: retornar resultado completo como único token
-            yield str(result)
+            completed = True
+        finally:
+            if not completed:
+                cancel_token.cancel("consumer_gone")
 
 
 # Factory function
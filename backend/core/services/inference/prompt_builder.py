@@ -2,49 +2,42 @@
 Prompt Builder
 Centralized prompt construction with strict priority system
 Moved from backend/prompt_builder.py to core/services/inference/
+(backend/prompt_builder.py re-exports this module: one implementation, so the
+legacy path and the pipeline build the same static prefix)
 """
 import os
-from typing import List, Dict, Optional
+from typing import TYPE_CHECKING, List, Dict, Optional
 from expert_registry import get_expert_persona
 
+if TYPE_CHECKING:
+    from core.services.inference.token_budget import TokenBudget, TokenCounter
+
 
 # Debug flag
 DEBUG_PROMPT = os.getenv("DEBUG_PROMPT", "true").lower() == "true"
 
 
-def build_messages(
+def build_static_prefix(
     base_system: str,
     core_identity: str,
-    rag_message: Optional[str],
     expert_id: str,
-    history: List[Dict[str, str]],
-    user_message: str,
-    tools: Optional[List[Dict]] = None,
-    max_history_turns: int = 10
+    tools: Optional[List[Dict]] = None
 ) -> List[Dict[str, str]]:
     """
-    Build final messages list with strict priority ordering.
+    Build the static system blocks shared by every request of an expert.
     
-    PRIORITY ORDER (most important first):
-    1. SYSTEM: base_system (global safety/OS rules)
-    2. SYSTEM: core_identity (SuperEzio global identity)
-    3. SYSTEM: rag_message (RAG context with override wording)
-    4. SYSTEM: expert_persona (expert-specific instructions)
-    5. HISTORY: recent conversation turns
-    6. USER: latest user message
+    These blocks never depend on the user query, so they always come first:
+    the engine snapshots their KV state once per expert and restores it
+    instead of re-running the prefill (see optimization/kv_cache.py).
     
     Args:
         base_system: Base system prompt (safety, OS rules)
         core_identity: Core SuperEzio identity
-        rag_message: RAG context (or None)
         expert_id: Expert ID to get persona from
-        history: Previous conversation turns (will be truncated)
-        user_message: Latest user message
         tools: Optional tool definitions (will be injected in expert persona)
-        max_history_turns: Maximum number of history turns to keep
         
     Returns:
-        List of message dicts ready for model
+        List of system message dicts
     """
     messages: List[Dict[str, str]] = []
     
@@ -62,16 +55,7 @@ def build_messages(
             "content": core_identity
         })
     
-    # 3. RAG CONTEXT (if available)
-    if rag_message:
-        messages.append({
-            "role": "system",
-            "content": rag_message
-        })
-        if DEBUG_PROMPT:
-            print(f"[PROMPT] RAG context injected: {len(rag_message)} chars")
-    
-    # 4. EXPERT PERSONA
+    # 3. EXPERT PERSONA
     expert_persona = get_expert_persona(expert_id)
     
     # Add tool information if tools are provided
@@ -80,6 +64,7 @@ def build_messages(
         expert_persona += f"\n\nAVAILABLE TOOLS: {', '.join(tool_names)}"
         expert_persona += "\nUse these tools when needed to inspect files, read data, or execute actions."
         expert_persona += "\nNEVER hallucinate file contents or directory structures - always use tools first."
+        expert_persona += '\nTo call a tool, reply ONLY with {"name": "<tool>", "parameters": {...}}.'
     
     messages.append({
         "role": "system",
@@ -91,8 +76,71 @@ def build_messages(
         if tools:
             print(f"[PROMPT] Tools injected: {len(tools)} tools")
     
+    return messages
+
+
+def build_messages(
+    base_system: str,
+    core_identity: str,
+    rag_message: Optional[str],
+    expert_id: str,
+    history: List[Dict[str, str]],
+    user_message: str,
+    tools: Optional[List[Dict]] = None,
+    max_history_turns: int = 10,
+    budget: Optional["TokenBudget"] = None
+) -> List[Dict[str, str]]:
+    """
+    Build final messages list with strict priority ordering.
+    
+    ORDER (static blocks first, so their KV prefix can be reused):
+    1. SYSTEM: base_system (global safety/OS rules)
+    2. SYSTEM: core_identity (SuperEzio global identity)
+    3. SYSTEM: expert_persona (expert-specific instructions)
+    4. SYSTEM: rag_message (RAG context with override wording)
+    5. HISTORY: recent conversation turns
+    6. USER: latest user message
+    
+    The RAG block keeps its explicit "HIGHEST PRIORITY" override wording, so
+    it still wins over the persona even though it comes after it.
+    
+    Args:
+        base_system: Base system prompt (safety, OS rules)
+        core_identity: Core SuperEzio identity
+        rag_message: RAG context (or None)
+        expert_id: Expert ID to get persona from
+        history: Previous conversation turns (will be truncated)
+        user_message: Latest user message
+        tools: Optional tool definitions (will be injected in expert persona)
+        max_history_turns: Maximum number of history turns to keep (ignored with budget)
+        budget: Token budget; when given, RAG/history/user are fitted to the
+            slot context at token precision instead of by turn count
+        
+    Returns:
+        List of message dicts ready for model
+    """
+    # 1-3. STATIC PREFIX
+    messages = build_static_prefix(base_system, core_identity, expert_id, tools)
+    history = [m for m in history if m.get("role") != "system"] if history else []
+    
+    if budget is not None:
+        rag_message, history, user_message, report = budget.fit(messages, rag_message, history, user_message)
+        if DEBUG_PROMPT:
+            print(f"[PROMPT] Budget: {report.prompt_tokens}/{report.n_ctx - report.reserved_output} tokens "
+                  f"(static={report.static} rag={report.rag} history={report.history} user={report.user}, "
+                  f"dropped_turns={report.dropped_turns}, truncated={list(report.truncated)})")
+    
+    # 4. RAG CONTEXT (if available)
+    if rag_message:
+        messages.append({
+            "role": "system",
+            "content": rag_message
+        })
+        if DEBUG_PROMPT:
+            print(f"[PROMPT] RAG context injected: {len(rag_message)} chars")
+    
     # 5. HISTORY (truncated to last N turns)
-    recent_history = history[-max_history_turns*2:] if history else []
+    recent_history = history if budget is not None else history[-max_history_turns*2:]
     
     for msg in recent_history:
         # Skip system messages from history (already added above)
@@ -115,3 +163,46 @@ def build_messages(
     
     return messages
 
+def truncate_history(
+    history: List[Dict[str, str]],
+    max_tokens: int = 2000,
+    counter: Optional["TokenCounter"] = None
+) -> List[Dict[str, str]]:
+    """
+    Truncate history to fit within token budget.
+    Exact count with the model vocabulary when a counter is given,
+    otherwise the ~4 chars = 1 token heuristic
+    
+    Args:
+        history: Full history
+        max_tokens: Maximum tokens to keep
+        counter: Token counter (see core/services/inference/token_budget.py)
+        
+    Returns:
+        Truncated history
+    """
+    if not history:
+        return []
+    
+    if counter is not None:
+        cost = counter.count_message
+    else:
+        # Rough estimate: 4 chars per token
+        cost = lambda msg: len(msg.get("content", "")) / 4
+    
+    # Count from end
+    total_tokens = 0
+    truncated = []
+    
+    for msg in reversed(history):
+        total_tokens += cost(msg)
+        
+        if total_tokens > max_tokens:
+            break
+        
+        truncated.insert(0, msg)
+    
+    if DEBUG_PROMPT and len(truncated) < len(history):
+        print(f"[PROMPT] History truncated: {len(history)} → {len(truncated)} messages")
+    
+    return truncated
@@ -0,0 +1,144 @@
+"""
+Stream Bridge
+Ponte entre geradores síncronos (llama.cpp / scheduler) e corrotinas asyncio.
+
+O gerador roda em uma thread de um executor dedicado e entrega os itens à
+corrotina por uma asyncio.Queue limitada: se o cliente SSE for lento a fila
+enche e a thread produtora espera (backpressure), sem travar o event loop.
+Quando o consumidor sai (fim, erro ou desconexão) a produtora é avisada e
+fecha o gerador.
+
+cancel_on_disconnect liga a desconexão do cliente HTTP a um CancellationToken.
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import AsyncGenerator, Awaitable, Callable, Iterable, Optional, TypeVar
+
+from core.domain.cancellation import CancellationToken
+from infrastructure.config.settings import get_settings
+from utils.metrics import metrics
+
+T = TypeVar("T")
+
+_DONE = object()
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+class _Failure:
+    """Exceção levantada pelo produtor, repassada ao consumidor"""
+
+    def __init__(self, exc: BaseException):
+        self.exc = exc
+
+
+def get_stream_executor() -> ThreadPoolExecutor:
+    """Executor dedicado aos streams (não disputa o executor padrão do loop)"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=get_settings().stream_bridge_workers,
+                thread_name_prefix="stream-bridge",
+            )
+        return _executor
+
+
+async def iterate_in_thread(
+    make_iterable: Callable[[], Iterable[T]],
+    max_buffer: Optional[int] = None,
+    metric_prefix: str = "stream",
+) -> AsyncGenerator[T, None]:
+    """
+    Consome `make_iterable()` em thread dedicada e produz os itens de forma assíncrona.
+
+    Args:
+        make_iterable: Fábrica do gerador síncrono (chamada já na thread produtora)
+        max_buffer: Itens em trânsito antes de a produtora bloquear
+        metric_prefix: Prefixo das métricas de TTFT / latência entre tokens
+
+    Yields:
+        Itens produzidos pelo gerador
+    """
+    loop = asyncio.get_running_loop()
+    queue: "asyncio.Queue" = asyncio.Queue(maxsize=max_buffer or get_settings().stream_queue_size)
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        """Bloqueia enquanto a fila estiver cheia; False se o consumidor saiu"""
+        future = asyncio.run_coroutine_threadsafe(queue.put(item), loop)
+        while True:
+            try:
+                future.result(timeout=0.1)
+                return True
+            except FutureTimeout:
+                if stop.is_set():
+                    future.cancel()
+                    return False
+
+    def produce():
+        iterable = None
+        try:
+            iterable = make_iterable()
+            for item in iterable:
+                if stop.is_set() or not put(item):
+                    break
+        except BaseException as exc:
+            if not stop.is_set():
+                put(_Failure(exc))
+            return
+        finally:
+            close = getattr(iterable, "close", None)
+            if close is not None:
+                close()
+        if not stop.is_set():
+            put(_DONE)
+
+    started = time.time()
+    last: Optional[float] = None
+    finished = False
+    loop.run_in_executor(get_stream_executor(), produce)
+    try:
+        while True:
+            item = await queue.get()
+            if item is _DONE:
+                finished = True
+                break
+            if isinstance(item, _Failure):
+                finished = True
+                raise item.exc
+
+            now = time.time()
+            if last is None:
+                metrics.histogram(f"{metric_prefix}.ttft", now - started)
+            else:
+                metrics.histogram(f"{metric_prefix}.inter_token", now - last)
+            last = now
+            yield item
+    finally:
+        stop.set()
+        # Libera uma produtora eventualmente bloqueada em queue.put
+        while not queue.empty():
+            queue.get_nowait()
+        if not finished:
+            metrics.increment(f"{metric_prefix}.abandoned")
+
+
+async def cancel_on_disconnect(
+    token: CancellationToken,
+    is_disconnected: Callable[[], Awaitable[bool]],
+    interval: float = 0.25,
+):
+    """
+    Vigia a conexão (ex.: Request.is_disconnected do Starlette) e cancela o
+    token quando o cliente sai. Rodar como task e cancelar ao fim do stream.
+    """
+    while not token.cancelled:
+        if await is_disconnected():
+            token.cancel("client_disconnect")
+            metrics.increment("stream.client_disconnect")
+            return
+        await asyncio.sleep(interval)
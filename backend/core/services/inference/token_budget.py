@@ -0,0 +1,256 @@
+"""
+Token Budget
+Orçamento de tokens do prompt com contagem exata pelo vocabulário do GGUF.
+
+Cada segmento (system, RAG, turnos do histórico, mensagem do usuário) é
+tokenizado com o vocabulário do llama.cpp e o resultado fica em cache pelo
+hash do texto (system/persona/histórico se repetem a cada requisição).
+
+Alocação por prioridade dentro de n_ctx - tokens reservados para a resposta:
+1. Prefixo estático (system + identidade + persona): nunca cortado
+2. Mensagem do usuário: corta o meio se não couber (mantém início e fim)
+3. RAG: até rag_share do espaço restante (corta o final)
+4. Histórico: turnos inteiros, do mais recente para o mais antigo
+5. Sobra volta para o RAG
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from infrastructure.config.settings import get_settings
+
+# Tokens do chat template por mensagem (<|im_start|>role\n ... <|im_end|>\n)
+MESSAGE_OVERHEAD = 6
+ELLIPSIS = "\n[...]\n"
+
+
+class TokenCounter:
+    """Tokenizador com cache LRU por hash de segmento"""
+
+    def __init__(
+        self,
+        tokenize: Callable[[bytes], List[int]],
+        detokenize: Callable[[List[int]], bytes],
+        cache_size: int = 4096
+    ):
+        self._tokenize = tokenize
+        self._detokenize = detokenize
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[bytes, Tuple[int, ...]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def tokenize(self, text: str) -> Tuple[int, ...]:
+        key = hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+        with self._lock:
+            tokens = self._cache.get(key)
+            if tokens is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return tokens
+
+        tokens = tuple(self._tokenize(text.encode("utf-8")))
+        with self._lock:
+            self.misses += 1
+            self._cache[key] = tokens
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return tokens
+
+    def count(self, text: str) -> int:
+        return len(self.tokenize(text)) if text else 0
+
+    def count_message(self, message: Dict) -> int:
+        content = message.get("content") or ""
+        if not isinstance(content, str):
+            # Conteúdo multimodal: só as partes de texto contam aqui
+            content = " ".join(p.get("text", "") for p in content if isinstance(p, dict))
+        return self.count(content) + MESSAGE_OVERHEAD
+
+    def truncate(self, text: str, max_tokens: int, keep: str = "head") -> str:
+        """
+        Corta `text` para no máximo max_tokens tokens.
+        keep: "head" (início), "tail" (fim) ou "both" (início + fim, corta o meio)
+        """
+        tokens = self.tokenize(text)
+        if len(tokens) <= max_tokens:
+            return text
+        if max_tokens <= 0:
+            return ""
+
+        decode = lambda ids: self._detokenize(list(ids)).decode("utf-8", errors="ignore")
+        marker = self.count(ELLIPSIS)
+        if keep == "tail":
+            return ELLIPSIS.lstrip() + decode(tokens[-max(1, max_tokens - marker):])
+        if keep == "both" and max_tokens > 2 * marker:
+            half = (max_tokens - marker) // 2
+            return decode(tokens[:half]) + ELLIPSIS + decode(tokens[-half:])
+        return decode(tokens[:max(1, max_tokens - marker)]) + ELLIPSIS.rstrip()
+
+
+class _EstimateCounter(TokenCounter):
+    """Fallback sem vocabulário: ~4 caracteres por token (mesma heurística antiga)"""
+
+    def __init__(self):
+        super().__init__(
+            tokenize=lambda data: list(range((len(data.decode("utf-8", errors="ignore")) + 3) // 4)),
+            detokenize=lambda ids: b"",
+        )
+
+    def truncate(self, text: str, max_tokens: int, keep: str = "head") -> str:
+        max_chars = max(0, max_tokens) * 4
+        if len(text) <= max_chars:
+            return text
+        if keep == "tail":
+            return text[-max_chars:]
+        if keep == "both":
+            half = max_chars // 2
+            return text[:half] + ELLIPSIS + text[-half:]
+        return text[:max_chars]
+
+
+@dataclass
+class BudgetReport:
+    """Quanto cada slot recebeu (para logs/métricas)"""
+    n_ctx: int
+    reserved_output: int
+    static: int = 0
+    user: int = 0
+    rag: int = 0
+    history: int = 0
+    dropped_turns: int = 0
+    truncated: Tuple[str, ...] = ()
+
+    @property
+    def prompt_tokens(self) -> int:
+        return self.static + self.user + self.rag + self.history
+
+
+class TokenBudget:
+    """Distribui o contexto entre system / RAG / histórico / usuário com precisão de token"""
+
+    def __init__(
+        self,
+        counter: TokenCounter,
+        n_ctx: int = 4096,
+        reserve_output: int = 512,
+        rag_share: float = 0.4
+    ):
+        self.counter = counter
+        self.n_ctx = n_ctx
+        self.reserve_output = reserve_output
+        self.rag_share = rag_share
+        self.last_report: Optional[BudgetReport] = None
+
+    def fit(
+        self,
+        static: List[Dict],
+        rag_message: Optional[str],
+        history: List[Dict],
+        user_message: str
+    ) -> Tuple[Optional[str], List[Dict], str, BudgetReport]:
+        """
+        Ajusta RAG, histórico e mensagem do usuário ao orçamento.
+
+        Returns:
+            (rag_message, history, user_message, report)
+        """
+        counter = self.counter
+        report = BudgetReport(n_ctx=self.n_ctx, reserved_output=self.reserve_output)
+        truncated: List[str] = []
+
+        report.static = sum(counter.count_message(m) for m in static)
+        available = self.n_ctx - self.reserve_output - report.static
+
+        # 2. Usuário
+        user_tokens = counter.count(user_message) if isinstance(user_message, str) else 0
+        if isinstance(user_message, str) and user_tokens + MESSAGE_OVERHEAD > available:
+            user_message = counter.truncate(user_message, max(0, available - MESSAGE_OVERHEAD), keep="both")
+            user_tokens = counter.count(user_message)
+            truncated.append("user")
+        report.user = user_tokens + MESSAGE_OVERHEAD
+        available -= report.user
+
+        # 3. RAG (primeira passada: limitado a rag_share)
+        rag_full = counter.count(rag_message) + MESSAGE_OVERHEAD if rag_message else 0
+        rag_cap = min(rag_full, int(max(0, available) * self.rag_share))
+
+        # 4. Histórico: turnos inteiros, mais recentes primeiro
+        history_room = available - rag_cap
+        kept: List[Dict] = []
+        for message in reversed(history):
+            cost = counter.count_message(message)
+            if cost > history_room:
+                break
+            kept.append(message)
+            history_room -= cost
+        kept.reverse()
+        report.dropped_turns = len(history) - len(kept)
+        report.history = sum(counter.count_message(m) for m in kept)
+
+        # 5. Sobra volta para o RAG
+        if rag_message:
+            rag_room = available - report.history
+            if rag_full > rag_room:
+                rag_message = counter.truncate(rag_message, max(0, rag_room - MESSAGE_OVERHEAD), keep="head") or None
+                truncated.append("rag")
+            report.rag = counter.count(rag_message) + MESSAGE_OVERHEAD if rag_message else 0
+
+        report.truncated = tuple(truncated)
+        self.last_report = report
+        return rag_message, kept, user_message, report
+
+
+# ----------------------------------------------------------------------
+# Contador global (vocabulário do GGUF, carregado sob demanda)
+# ----------------------------------------------------------------------
+_counter: Optional[TokenCounter] = None
+_counter_lock = threading.Lock()
+_fallback_counter: Optional[TokenCounter] = None
+_fallback_until = 0.0
+_FALLBACK_RETRY_S = 30.0  # GGUF ainda baixando / falha transitória: tenta de novo depois disso
+
+
+def get_token_counter() -> TokenCounter:
+    """
+    Contador com o vocabulário do modelo (tokenizer do engine, ver engine/tokenizer.py).
+    Sem llama.cpp ou sem o GGUF, cai na estimativa de 4 caracteres por token; a
+    falha não é memorizada para sempre: o vocabulário é tentado de novo a cada
+    _FALLBACK_RETRY_S segundos.
+    """
+    global _counter, _fallback_counter, _fallback_until
+    with _counter_lock:
+        if _counter is not None:
+            return _counter
+        if _fallback_counter is not None and time.monotonic() < _fallback_until:
+            return _fallback_counter
+        try:
+            from engine.tokenizer import get_tokenizer
+
+            _counter = get_tokenizer().counter
+            _fallback_counter = None
+            return _counter
+        except Exception as exc:
+            print(f"⚠️  [BUDGET] Vocabulário do GGUF indisponível, estimando tokens: {exc}")
+            if _fallback_counter is None:
+                _fallback_counter = _EstimateCounter()
+            _fallback_until = time.monotonic() + _FALLBACK_RETRY_S
+            return _fallback_counter
+
+
+def get_prompt_budget(max_new_tokens: Optional[int] = None) -> TokenBudget:
+    """Orçamento para uma requisição: n_ctx do slot menos o que a resposta pode ocupar"""
+    settings = get_settings()
+    reserve = max_new_tokens if max_new_tokens and max_new_tokens > 0 else settings.prompt_reserve_output
+    # Nunca reservar mais da metade do contexto para a resposta
+    reserve = min(reserve, settings.engine_slot_ctx // 2)
+    return TokenBudget(
+        get_token_counter(),
+        n_ctx=settings.engine_slot_ctx,
+        reserve_output=reserve,
+        rag_share=settings.prompt_rag_share,
+    )
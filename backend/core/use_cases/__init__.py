@@ -4,5 +4,6 @@ Casos de uso que orquestram serviços
 """
 from core.use_cases.chat_completion import ChatCompletionUseCase
 from core.use_cases.stream_completion import StreamCompletionUseCase
+from core.use_cases.pipeline import RequestContext, RequestPipeline
 
-__all__ = ["ChatCompletionUseCase", "StreamCompletionUseCase"]
+__all__ = ["ChatCompletionUseCase", "StreamCompletionUseCase", "RequestContext", "RequestPipeline"]
@@ -2,13 +2,14 @@
 Chat Completion Use Case
 Orquestra routing, RAG, inference e tools para completar chat
 """
-from typing import List, Optional
+from typing import Any, List, Optional
 from core.domain.message import Message
 from core.domain.completion import CompletionResult
 from core.services.routing.router import Router
 from core.services.rag.retriever import Retriever
 from core.services.inference.generator import Generator
 from core.services.tools.executor import ToolExecutor
+from core.use_cases.pipeline import RequestContext, RequestPipeline
 
 
 class ChatCompletionUseCase:
@@ -19,12 +20,14 @@ class ChatCompletionUseCase:
         router: Router,
         rag_retriever: Retriever,
         generator: Generator,
-        tool_executor: ToolExecutor
+        tool_executor: ToolExecutor,
+        answer_cache: Optional[Any] = None
     ):
         self.router = router
         self.rag_retriever = rag_retriever
         self.generator = generator
         self.tool_executor = tool_executor
+        self.pipeline = RequestPipeline(router, rag_retriever, generator, tool_executor, answer_cache=answer_cache)
     
     async def execute(
         self,
@@ -36,44 +39,17 @@ class ChatCompletionUseCase:
         """
         Executa completion de chat.
         
-        Fluxo:
+        Fluxo (RequestPipeline, cada etapa uma única vez):
         1. Route para expert
         2. Query RAG
-        3. Generate
-        4. Execute tools (se necessário)
-        5. Return result
+        3. Monta prompt
+        4. Generate
+        5. Execute tools (se necessário)
         """
-        # 1. Route
-        messages_dict = [m.to_dict() for m in messages]
-        decision = self.router.route(messages_dict, explicit_mode=mode)
-        
-        # 2. RAG
-        user_query = messages[-1].content if messages else ""
-        rag_context = None
-        if decision.rag_domains:
-            rag_context = self.rag_retriever.retrieve(
-                domains=decision.rag_domains,
-                query=user_query,
-                top_k=6
-            )
-        
-        # 3. Generate
-        result = await self.generator.generate(
+        ctx = RequestContext(
             messages=messages,
-            rag_context=rag_context,
-            expert_id=decision.expert_id,
             temperature=temperature,
-            max_tokens=max_tokens
+            max_tokens=max_tokens,
+            mode=mode
         )
-        
-        # 4. Tools (se necessário)
-        if result.tool_calls:
-            # tool_calls já são ToolCall objects
-            tool_results = await self.tool_executor.execute_batch(result.tool_calls)
-            
-            # Atualizar result com tool_results
-            from dataclasses import replace
-            result = replace(result, tool_results=tool_results)
-        
-        return result
-
+        return await self.pipeline.run(ctx)
@@ -0,0 +1,225 @@
+"""
+Request Pipeline
+Pipeline de uma requisição em etapas que rodam UMA vez cada:
+
+    route → retrieve → assemble → generate → tools
+
+O RequestContext carrega o resultado de cada etapa para a seguinte (a decisão
+do router, o contexto RAG, o prompt montado), então o generator não precisa
+rotear nem consultar o RAG de novo. Cada etapa tem seu tempo registrado em
+context.timings e na métrica pipeline.<etapa>.
+
+Com um answer_cache (cache semântico de respostas), logo após o routing uma
+pergunta equivalente já respondida pelo mesmo expert encerra o pipeline:
+retrieve, assemble e generate não rodam.
+"""
+import asyncio
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field, replace
+from functools import partial
+from typing import Any, AsyncGenerator, Dict, List, Optional
+
+from core.domain.cancellation import CancellationToken
+from core.domain.completion import CompletionResult
+from core.domain.expert import ExpertDecision
+from core.domain.message import Message
+from core.services.inference.generator import Generator
+from core.services.rag.retriever import Retriever
+from core.services.routing.router import Router
+from core.services.tools.executor import ToolExecutor
+from utils.metrics import metrics
+
+
+@dataclass
+class RequestContext:
+    """Estado de uma requisição ao longo do pipeline (mutável, escopo da requisição)"""
+
+    messages: List[Message]
+    temperature: float = 0.7
+    max_tokens: int = 512
+    mode: Optional[str] = None
+    tools: Optional[List[Dict]] = None
+    cancel_token: Optional[CancellationToken] = None
+
+    # Preenchidos pelas etapas
+    decision: Optional[ExpertDecision] = None
+    rag_context: Optional[str] = None
+    prompt: Optional[List[Dict[str, Any]]] = None
+    result: Optional[CompletionResult] = None
+    cache_hit: Optional[Any] = None
+    timings: Dict[str, float] = field(default_factory=dict)
+
+    @property
+    def user_query(self) -> str:
+        return self.messages[-1].content if self.messages else ""
+
+    @property
+    def served_from_cache(self) -> bool:
+        """Hit do cache semântico servido (hits de auditoria geram normalmente)"""
+        return self.cache_hit is not None and not self.cache_hit.audit
+
+
+class RequestPipeline:
+    """Executa as etapas de uma requisição sem repetir routing nem RAG"""
+
+    def __init__(
+        self,
+        router: Router,
+        rag_retriever: Retriever,
+        generator: Generator,
+        tool_executor: Optional[ToolExecutor] = None,
+        rag_top_k: int = 6,
+        answer_cache: Optional[Any] = None
+    ):
+        self.router = router
+        self.rag_retriever = rag_retriever
+        self.generator = generator
+        self.tool_executor = tool_executor
+        self.rag_top_k = rag_top_k
+        self.answer_cache = answer_cache
+
+    @contextmanager
+    def _stage(self, ctx: RequestContext, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            ctx.timings[name] = elapsed
+            metrics.histogram(f"pipeline.{name}", elapsed)
+
+    async def _offload(self, func, *args, **kwargs):
+        """Etapas síncronas (grafo, keywords, tokenização) rodam fora do event loop"""
+        return await asyncio.get_running_loop().run_in_executor(None, partial(func, *args, **kwargs))
+
+    async def prepare(self, ctx: RequestContext) -> RequestContext:
+        """route → retrieve → assemble"""
+        with self._stage(ctx, "route"):
+            messages_dict = [m.to_dict() for m in ctx.messages]
+            ctx.decision = await self._offload(self.router.route, messages_dict, explicit_mode=ctx.mode)
+
+        if ctx.cancel_token is not None:
+            ctx.cancel_token.check()
+
+        # Com ferramentas a resposta certa pode ser uma chamada, não o texto de uma pergunta parecida
+        if (
+            self.answer_cache is not None
+            and not ctx.tools
+            and self.answer_cache.accepts(ctx.decision.expert_id, messages_dict)
+        ):
+            with self._stage(ctx, "cache"):
+                ctx.cache_hit = await self._offload(self.answer_cache.lookup, ctx.decision.expert_id, ctx.user_query)
+            if ctx.served_from_cache:
+                return ctx
+
+        with self._stage(ctx, "retrieve"):
+            if ctx.decision.rag_domains and ctx.user_query:
+                ctx.rag_context = await self._offload(
+                    self.rag_retriever.retrieve,
+                    domains=ctx.decision.rag_domains,
+                    query=ctx.user_query,
+                    top_k=self.rag_top_k
+                )
+
+        with self._stage(ctx, "assemble"):
+            ctx.prompt = await self._offload(
+                self.generator.build_prompt,
+                messages=ctx.messages,
+                rag_context=ctx.rag_context,
+                expert_id=ctx.decision.expert_id,
+                tools=ctx.tools,
+                max_tokens=ctx.max_tokens
+            )
+        return ctx
+
+    def _cached_result(self, ctx: RequestContext) -> CompletionResult:
+        entry = ctx.cache_hit.entry
+        return CompletionResult(
+            content=entry.answer,
+            expert=ctx.decision.expert_id,
+            metadata={
+                "finish_reason": entry.finish_reason,
+                "cached": "semantic",
+                "similarity": round(ctx.cache_hit.score, 4),
+            }
+        )
+
+    async def _remember(self, ctx: RequestContext, answer: str, finish_reason: str):
+        """Alimenta o cache semântico (e audita o hit amostrado, se houver)"""
+        if self.answer_cache is None or ctx.tools or not self.answer_cache.accepts(
+            ctx.decision.expert_id, [m.to_dict() for m in ctx.messages]
+        ):
+            return
+        if ctx.cache_hit is not None:
+            await self._offload(self.answer_cache.audit, ctx.cache_hit, answer)
+        namespaces = list(ctx.decision.rag_domains or [])
+        await self._offload(
+            self.answer_cache.store, ctx.decision.expert_id, ctx.user_query, answer, finish_reason, namespaces
+        )
+
+    async def run(self, ctx: RequestContext) -> CompletionResult:
+        """Pipeline completo (não-streaming)"""
+        await self.prepare(ctx)
+
+        if ctx.served_from_cache:
+            ctx.result = self._cached_result(ctx)
+            ctx.result.metadata["timings"] = {name: round(value, 4) for name, value in ctx.timings.items()}
+            return ctx.result
+
+        with self._stage(ctx, "generate"):
+            ctx.result = await self.generator.generate(
+                messages=ctx.messages,
+                rag_context=ctx.rag_context,
+                expert_id=ctx.decision.expert_id,
+                temperature=ctx.temperature,
+                max_tokens=ctx.max_tokens,
+                tools=ctx.tools,
+                cancel_token=ctx.cancel_token,
+                prompt=ctx.prompt
+            )
+
+        if not ctx.result.tool_calls:
+            await self._remember(ctx, ctx.result.content, (ctx.result.metadata or {}).get("finish_reason", "stop"))
+
+        if ctx.result.tool_calls and self.tool_executor is not None:
+            with self._stage(ctx, "tools"):
+                tool_results = await self.tool_executor.execute_batch(ctx.result.tool_calls)
+                ctx.result = replace(ctx.result, tool_results=tool_results)
+
+        metadata = dict(ctx.result.metadata or {})
+        metadata["timings"] = {name: round(value, 4) for name, value in ctx.timings.items()}
+        ctx.result = replace(ctx.result, expert=ctx.result.expert or ctx.decision.expert_id, metadata=metadata)
+        return ctx.result
+
+    async def stream(self, ctx: RequestContext) -> AsyncGenerator[str, None]:
+        """Pipeline completo com streaming de tokens"""
+        await self.prepare(ctx)
+
+        if ctx.served_from_cache:
+            answer = ctx.cache_hit.entry.answer
+            for start in range(0, len(answer), 16):
+                yield answer[start:start + 16]
+            return
+
+        pieces: List[str] = []
+        outcome: Dict[str, Any] = {}
+        with self._stage(ctx, "generate"):
+            async for token in self.generator.generate_stream(
+                messages=ctx.messages,
+                rag_context=ctx.rag_context,
+                expert_id=ctx.decision.expert_id,
+                temperature=ctx.temperature,
+                max_tokens=ctx.max_tokens,
+                tools=ctx.tools,
+                cancel_token=ctx.cancel_token,
+                prompt=ctx.prompt,
+                outcome=outcome
+            ):
+                pieces.append(token)
+                yield token
+
+        # Stream chegou ao fim sem cancelamento; o cache só guarda se o motor informou "stop"
+        finish_reason = outcome.get("finish_reason")
+        if finish_reason and (ctx.cancel_token is None or not ctx.cancel_token.cancelled):
+            await self._remember(ctx, "".join(pieces), finish_reason)
@@ -2,11 +2,13 @@
 Stream Completion Use Case
 Orquestra routing, RAG, inference para streaming de tokens
 """
-from typing import List, Optional, AsyncGenerator
+from typing import Any, List, Optional, AsyncGenerator
 from core.domain.message import Message
+from core.domain.cancellation import CancellationToken
 from core.services.routing.router import Router
 from core.services.rag.retriever import Retriever
 from core.services.inference.generator import Generator
+from core.use_cases.pipeline import RequestContext, RequestPipeline
 
 
 class StreamCompletionUseCase:
@@ -16,49 +18,41 @@ class StreamCompletionUseCase:
         self,
         router: Router,
         rag_retriever: Retriever,
-        generator: Generator
+        generator: Generator,
+        answer_cache: Optional[Any] = None
     ):
         self.router = router
         self.rag_retriever = rag_retriever
         self.generator = generator
+        self.pipeline = RequestPipeline(router, rag_retriever, generator, answer_cache=answer_cache)
     
     async def execute(
         self,
         messages: List[Message],
         temperature: float = 0.7,
         max_tokens: int = 512,
-        mode: Optional[str] = None
+        mode: Optional[str] = None,
+        cancel_token: Optional[CancellationToken] = None
     ) -> AsyncGenerator[str, None]:
         """
         Executa streaming completion de chat.
         
-        Fluxo:
+        Fluxo (RequestPipeline, cada etapa uma única vez):
         1. Route para expert
         2. Query RAG
-        3. Generate stream
-        4. Yield tokens
-        """
-        # 1. Route
-        messages_dict = [m.to_dict() for m in messages]
-        decision = self.router.route(messages_dict, explicit_mode=mode)
-        
-        # 2. RAG
-        user_query = messages[-1].content if messages else ""
-        rag_context = None
-        if decision.rag_domains:
-            rag_context = self.rag_retriever.retrieve(
-                domains=decision.rag_domains,
-                query=user_query,
-                top_k=6
-            )
+        3. Monta prompt
+        4. Generate stream
+        5. Yield tokens
         
-        # 3. Generate stream
-        async for token in self.generator.generate_stream(
+        cancel_token é propagado até o loop de decode: cancelar (desconexão,
+        deadline) libera o slot do engine imediatamente.
+        """
+        ctx = RequestContext(
             messages=messages,
-            rag_context=rag_context,
-            expert_id=decision.expert_id,
             temperature=temperature,
-            max_tokens=max_tokens
-        ):
+            max_tokens=max_tokens,
+            mode=mode,
+            cancel_token=cancel_token
+        )
+        async for token in self.pipeline.stream(ctx):
             yield token
-
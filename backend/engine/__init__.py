@@ -0,0 +1,25 @@
+"""
+Engine Module
+Dono do motor de inferência: scheduler de continuous batching, backends e
+cliente do model server (engine em processo separado)
+"""
+from .scheduler import (
+    BatchItem,
+    SamplingParams,
+    GenerationEvent,
+    GenerationHandle,
+    BatchScheduler,
+    get_scheduler,
+    shutdown_scheduler,
+)
+from .speculative import Drafter, DraftModelDrafter, PromptLookupDrafter
+from .model_client import RemoteEngineClient, get_engine_client
+from .warmup import EngineLifecycle, get_engine_lifecycle
+
+__all__ = [
+    'BatchItem', 'SamplingParams', 'GenerationEvent', 'GenerationHandle',
+    'BatchScheduler', 'get_scheduler', 'shutdown_scheduler',
+    'Drafter', 'DraftModelDrafter', 'PromptLookupDrafter',
+    'RemoteEngineClient', 'get_engine_client',
+    'EngineLifecycle', 'get_engine_lifecycle',
+]
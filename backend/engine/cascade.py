@@ -0,0 +1,218 @@
+"""
+Model Cascade
+Modelo pequeno residente para perguntas simples, 7B só para o que precisa.
+
+- Saudações, agradecimentos, contas ("quanto é 2+2") e perguntas que o
+  EnhancedRAG.detect_query_complexity classifica como "simple" vão para um GGUF
+  pequeno (ex.: Qwen2.5-1.5B-Instruct) com scheduler próprio
+- Perguntas medium/complex e experts de código vão direto para o engine principal
+- Escalonamento: a resposta do modelo pequeno só é entregue se a confiança
+  (média geométrica da probabilidade dos tokens) passar de
+  cascade_min_confidence e a geração terminou sozinha; chamada de ferramenta,
+  corte por tamanho ou erro também escalonam para o 7B
+
+A resposta do modelo pequeno é gerada inteira antes de ser entregue (em stream
+é reenviada em pedaços): sem isso não dá para desistir dela no escalonamento.
+Respostas simples são curtas, então o custo em TTFT é pequeno.
+"""
+import re
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from code_pipeline_simple import is_code_expert
+from core.domain.cancellation import CancellationToken
+from engine.scheduler import BatchScheduler, SamplingParams
+from infrastructure.config.settings import get_settings
+from utils.metrics import metrics
+
+_GREETING = re.compile(
+    r"^(oi+|ol[aá]|opa|e a[ií]|eae|hey|hi|hello|bom dia|boa tarde|boa noite|tudo bem|tudo bom|"
+    r"obrigad[oa]|valeu|vlw|tchau|at[eé] mais|beleza|blz|ok|certo)\b"
+)
+_ARITHMETIC = re.compile(r"^(quanto (é|e|da|dá|deu)|calcule|calcula)?[\s\d.,+\-*/x×÷()^%=]+$")
+
+
+def is_trivial(query: str) -> bool:
+    """Saudação/agradecimento curto ou conta simples"""
+    text = query.strip().lower().rstrip("?!. ")
+    if not text:
+        return False
+    if _GREETING.match(text) and len(text.split()) <= 6:
+        return True
+    return bool(_ARITHMETIC.match(text)) and any(c.isdigit() for c in text)
+
+
+def query_complexity(query: str) -> str:
+    """simple / medium / complex (mesma heurística do Adaptive Retrieval)"""
+    try:
+        from rag.enhanced_rag import enhanced_rag
+    except Exception:
+        return "medium"
+    return enhanced_rag.detect_query_complexity(query)
+
+
+def cascade_tier(query: str, expert_id: str, user_turns: int = 1) -> str:
+    """
+    "small" ou "large" para a pergunta.
+    Com histórico, só o trivial fica no pequeno (follow-ups dependem do contexto).
+    """
+    if not query or is_code_expert(expert_id):
+        return "large"
+    if is_trivial(query):
+        return "small"
+    if user_turns <= 1 and query_complexity(query) == "simple":
+        return "small"
+    return "large"
+
+
+@dataclass
+class SmallAnswer:
+    content: str
+    finish_reason: str
+    usage: Dict[str, int]
+    confidence: float
+
+
+class ModelCascade:
+    """Modelo pequeno com scheduler próprio + regra de escalonamento"""
+
+    def __init__(
+        self,
+        scheduler: BatchScheduler,
+        tokenizer,
+        model_name: str,
+        min_confidence: float = 0.55,
+        max_tokens: int = 256
+    ):
+        self.scheduler = scheduler
+        self.tokenizer = tokenizer
+        self.model_name = model_name
+        self.min_confidence = min_confidence
+        self.max_tokens = max_tokens
+        self._lock = threading.Lock()
+        self._stats = {"small": 0, "large": 0, "escalated": 0}
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def route(self, expert_id: str, messages: List[Dict[str, Any]]) -> bool:
+        """True se a requisição deve tentar o modelo pequeno primeiro"""
+        user_messages = [m for m in messages if m.get("role") == "user"]
+        query = user_messages[-1].get("content") if user_messages else ""
+        if not isinstance(query, str):
+            return False  # multimodal
+        tier = cascade_tier(query, expert_id, len(user_messages))
+        if tier == "large":
+            self._count("large")
+            metrics.increment("cascade.routed", tags={"tier": "large"})
+            return False
+        return True
+
+    def answer(
+        self,
+        messages: List[Dict[str, Any]],
+        temperature: float,
+        max_tokens: int,
+        grammar: Optional[str] = None,
+        cancel_token: Optional[CancellationToken] = None
+    ) -> Optional[SmallAnswer]:
+        """
+        Resposta do modelo pequeno, ou None para escalonar ao engine principal.
+        """
+        limit = min(max_tokens, self.max_tokens) if max_tokens and max_tokens > 0 else self.max_tokens
+        prompt = self.tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+        handle = self.scheduler.submit(
+            self.tokenizer.tokenize(prompt, cache=False),
+            SamplingParams(
+                temperature=temperature,
+                max_tokens=limit,
+                grammar=grammar,
+                stop_on_call=grammar is not None,
+                logprobs=True,
+            ),
+            cancel_token=cancel_token,
+        )
+        try:
+            content = handle.text()
+        except RuntimeError as exc:
+            return self._escalate("error", f"erro ({exc})")
+
+        confidence = handle.confidence or 0.0
+        metrics.histogram("cascade.small_confidence", confidence)
+        if handle.finish_reason != "stop" or not content.strip():
+            return self._escalate(handle.finish_reason or "empty", f"finish_reason={handle.finish_reason}")
+        if confidence < self.min_confidence:
+            return self._escalate("low_confidence", f"confiança {confidence:.2f} < {self.min_confidence:.2f}")
+
+        self._count("small")
+        metrics.increment("cascade.routed", tags={"tier": "small"})
+        return SmallAnswer(content, "stop", handle.usage, confidence)
+
+    def _escalate(self, reason: str, detail: str) -> None:
+        self._count("escalated")
+        metrics.increment("cascade.escalated", tags={"reason": reason})
+        print(f"⤴️  [CASCADE] Escalonando para o modelo principal: {detail}")
+        return None
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            tried = self._stats["small"] + self._stats["escalated"]
+            return {
+                "model": self.model_name,
+                **self._stats,
+                "escalation_rate": round(self._stats["escalated"] / tried * 100, 2) if tried else 0,
+                "scheduler": self.scheduler.stats(),
+            }
+
+
+# ----------------------------------------------------------------------
+# Instância global (só com cascade_small_model configurado)
+# ----------------------------------------------------------------------
+_cascade: Optional[ModelCascade] = None
+_cascade_lock = threading.Lock()
+_cascade_disabled = False
+
+
+def get_cascade() -> Optional[ModelCascade]:
+    """Cascata global, ou None se desabilitada / modelo pequeno indisponível"""
+    global _cascade, _cascade_disabled
+    if _cascade is not None or _cascade_disabled:
+        return _cascade
+
+    with _cascade_lock:
+        if _cascade is None and not _cascade_disabled:
+            settings = get_settings()
+            if not settings.cascade_small_model:
+                _cascade_disabled = True
+                return None
+            try:
+                from llama_cpp import Llama
+                from engine.llama_batch import LlamaBatchBackend
+                from engine.tokenizer import GGUFTokenizer
+                from infrastructure.config.paths import get_cascade_model_path
+
+                model_path = get_cascade_model_path()
+                print(f"📂 [CASCADE] Carregando modelo pequeno {model_path.name}...")
+                llm = Llama(model_path=str(model_path), n_ctx=512, n_gpu_layers=-1,
+                            n_threads=settings.engine_threads, verbose=False)
+                backend = LlamaBatchBackend(
+                    llm,
+                    n_slots=settings.cascade_small_slots,
+                    slot_ctx=settings.engine_slot_ctx,
+                    batch_size=settings.engine_batch_size,
+                )
+                _cascade = ModelCascade(
+                    BatchScheduler(backend, prefill_chunk=settings.engine_prefill_chunk,
+                                   max_backlog=settings.engine_stream_backlog),
+                    GGUFTokenizer(llm, cache_size=settings.prompt_token_cache_size),
+                    model_name=model_path.stem,
+                    min_confidence=settings.cascade_min_confidence,
+                    max_tokens=settings.cascade_max_tokens,
+                )
+                print(f"✅ [CASCADE] Ativa: {model_path.name} para perguntas simples")
+            except Exception as exc:
+                print(f"⚠️  [CASCADE] Desabilitada: {exc}")
+                _cascade_disabled = True
+    return _cascade
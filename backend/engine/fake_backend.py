@@ -0,0 +1,247 @@
+"""
+Fake Engine
+Backend determinístico para benchmark da API sem carregar o modelo
+(ENGINE_BACKEND=fake).
+
+Implementa o mesmo contrato BatchBackend do LlamaBatchBackend, então o
+scheduler, os caches, o orçamento de prompt e as rotas rodam de verdade; só o
+decode é simulado:
+- a resposta de cada prompt é uma sequência de palavras sorteada com semente
+  (fake_engine_seed + hash do prompt): mesmo prompt, mesmo texto
+- o tamanho da resposta segue uma distribuição em torno de fake_engine_output_tokens
+- cada llama_decode simulado dorme um passo de decode (fixed / normal /
+  lognormal / exponential em torno de fake_engine_decode_ms, +5% por sequência
+  extra no batch) mais o custo de prefill por token de prompt
+
+Com isso dá para medir o overhead de roteamento/RAG/API e regressões em
+qualquer máquina, com latências parecidas com as do 7B.
+"""
+import re
+import time
+import zlib
+from array import array
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from core.services.inference.token_budget import TokenCounter
+from engine.scheduler import BatchItem
+
+EOS_ID = 0
+# Logit do token roteirizado: alto o bastante para vencer temperatura/top-p usuais
+SCRIPT_LOGIT = 30.0
+
+WORDS = (
+    "o SuperEzio responde de forma direta e objetiva sem enrolar porque tempo é "
+    "dinheiro e o Marco quer saber logo qual é o próximo passo do projeto então "
+    "vamos por partes primeiro o contexto depois a solução e por fim os riscos "
+    "tudo certo com o Fluminense a família e o código em Python"
+).split()
+
+
+class FakeLatency:
+    """Distribuição de latência em torno de uma média (ms)"""
+
+    DISTRIBUTIONS = ("fixed", "normal", "lognormal", "exponential")
+
+    def __init__(self, mean_ms: float, jitter: float = 0.25, distribution: str = "lognormal", seed: int = 0):
+        if distribution not in self.DISTRIBUTIONS:
+            raise ValueError(f"Distribuição '{distribution}' inválida: use {', '.join(self.DISTRIBUTIONS)}")
+        self.mean_ms = mean_ms
+        self.jitter = jitter
+        self.distribution = distribution
+        self._rng = np.random.default_rng(seed)
+
+    def sample(self) -> float:
+        """Uma amostra em segundos"""
+        mean = self.mean_ms
+        if mean <= 0:
+            return 0.0
+        if self.distribution == "fixed" or self.jitter <= 0:
+            value = mean
+        elif self.distribution == "normal":
+            value = max(0.0, self._rng.normal(mean, mean * self.jitter))
+        elif self.distribution == "lognormal":
+            # mu ajustado para a média da lognormal ficar em mean
+            value = self._rng.lognormal(np.log(mean) - self.jitter ** 2 / 2, self.jitter)
+        else:
+            value = self._rng.exponential(mean)
+        return value / 1000.0
+
+
+class _FakeSequence:
+    def __init__(self, script: List[int]):
+        self.script = script
+        self.emitted = 0
+        self.digest = 0
+
+
+class FakeBatchBackend:
+    """Contrato BatchBackend com decode simulado"""
+
+    def __init__(
+        self,
+        n_slots: int = 4,
+        slot_ctx: int = 4096,
+        batch_size: int = 512,
+        n_vocab: int = 8192,
+        decode_latency: Optional[FakeLatency] = None,
+        prefill_ms_per_token: float = 0.3,
+        output_tokens: int = 120,
+        seed: int = 0,
+        sleep: Callable[[float], None] = time.sleep
+    ):
+        self.n_slots = max(1, n_slots)
+        self.slot_ctx = slot_ctx
+        self.batch_size = batch_size
+        self.n_vocab = n_vocab
+        self.decode_latency = decode_latency or FakeLatency(25.0, seed=seed)
+        self.prefill_ms_per_token = prefill_ms_per_token
+        self.output_tokens = output_tokens
+        self.seed = seed
+        self._sleep = sleep
+        self._sequences: Dict[int, _FakeSequence] = {}
+        self.steps = 0
+
+    def _script(self, digest: int) -> List[int]:
+        """Resposta determinística para o prompt (ids das palavras, 1..len(WORDS))"""
+        rng = np.random.default_rng([self.seed, digest])
+        length = max(1, int(rng.normal(self.output_tokens, self.output_tokens * 0.3)))
+        return [int(i) + 1 for i in rng.integers(0, len(WORDS), size=length)]
+
+    def decode(self, items: List[BatchItem]) -> List[Optional[np.ndarray]]:
+        prefill_tokens = 0
+        decoding = 0
+        results: List[Optional[np.ndarray]] = []
+
+        for item in items:
+            sequence = self._sequences.get(item.seq_id)
+            if sequence is None or item.pos == 0:
+                sequence = self._sequences[item.seq_id] = _FakeSequence([])
+
+            if not sequence.script:
+                # Ainda no prompt: acumula o hash; o roteiro sai no último pedaço
+                prefill_tokens += len(item.tokens)
+                sequence.digest = zlib.crc32(array("i", item.tokens).tobytes(), sequence.digest)
+                if item.want_logits:
+                    sequence.script = self._script(sequence.digest)
+            else:
+                decoding += 1
+
+            if not item.want_logits:
+                results.append(None)
+                continue
+            rows = len(item.tokens) if item.all_logits else 1
+            logits = np.zeros((rows, self.n_vocab), dtype=np.float32)
+            for row in range(rows):
+                index = sequence.emitted + row
+                logits[row, sequence.script[index] if index < len(sequence.script) else EOS_ID] = SCRIPT_LOGIT
+            sequence.emitted += rows
+            results.append(logits if item.all_logits else logits[0])
+
+        delay = prefill_tokens * self.prefill_ms_per_token / 1000.0
+        if decoding:
+            delay += self.decode_latency.sample() * (1 + 0.05 * (decoding - 1))
+        if delay > 0:
+            self._sleep(delay)
+        self.steps += 1
+        return results
+
+    def release(self, seq_id: int) -> None:
+        self._sequences.pop(seq_id, None)
+
+    def token_bytes(self, token_id: int) -> bytes:
+        if 1 <= token_id <= len(WORDS):
+            return (WORDS[token_id - 1] + " ").encode("utf-8")
+        return b""
+
+    def is_eog(self, token_id: int) -> bool:
+        return token_id == EOS_ID
+
+
+class FakeTokenizer:
+    """
+    Mesma interface do GGUFTokenizer sem vocabulário real: cada palavra ou
+    sinal de pontuação vira um id por hash (contagens próximas às de um BPE)
+    """
+
+    eos_token = "<|im_end|>"
+    bos_token = ""
+    _PIECE = re.compile(r"\s*\w+|\s*[^\w\s]")
+
+    def __init__(self, n_vocab: int = 8192, cache_size: int = 4096):
+        self.n_vocab = n_vocab
+        self._pieces: Dict[int, str] = {}
+        self.counter = TokenCounter(self._tokenize, self._detokenize, cache_size=cache_size)
+
+    def _tokenize(self, data: bytes) -> List[int]:
+        ids = []
+        for piece in self._PIECE.findall(data.decode("utf-8", errors="ignore")):
+            token_id = 1 + zlib.crc32(piece.encode("utf-8")) % (self.n_vocab - 1)
+            self._pieces.setdefault(token_id, piece)
+            ids.append(token_id)
+        return ids
+
+    def _detokenize(self, ids: List[int]) -> bytes:
+        return "".join(self._pieces.get(i, "") for i in ids).encode("utf-8")
+
+    def tokenize(self, text: str, cache: bool = True) -> List[int]:
+        if not cache:
+            return self._tokenize(text.encode("utf-8"))
+        return list(self.counter.tokenize(text))
+
+    def detokenize(self, ids: List[int]) -> str:
+        return self._detokenize(ids).decode("utf-8")
+
+    def count(self, text: str) -> int:
+        return self.counter.count(text)
+
+    def render_chat(self, messages: List[Dict], add_generation_prompt: bool = True) -> str:
+        prompt = "".join(f"<|im_start|>{m['role']}\n{m['content']}<|im_end|>\n" for m in messages)
+        return prompt + ("<|im_start|>assistant\n" if add_generation_prompt else "")
+
+    def apply_chat_template(self, messages: List[Dict], tokenize: bool = False, add_generation_prompt: bool = True):
+        prompt = self.render_chat(messages, add_generation_prompt)
+        return self.tokenize(prompt) if tokenize else prompt
+
+    def stats(self) -> Dict:
+        lookups = self.counter.hits + self.counter.misses
+        return {
+            "backend": type(self).__name__,
+            "cached_segments": len(self.counter._cache),
+            "cache_hit_rate": round(self.counter.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+class FakeLlama:
+    """Ocupa o lugar do objeto Llama no model_registry com ENGINE_BACKEND=fake"""
+
+    def __init__(self, n_vocab: int = 8192):
+        self._n_vocab = n_vocab
+
+    def n_vocab(self) -> int:
+        return self._n_vocab
+
+    def create_chat_completion(self, **kwargs):
+        raise RuntimeError("Engine fake (ENGINE_BACKEND=fake) não suporta visão: use o engine llama.cpp")
+
+
+def create_fake_backend(n_slots: int, slot_ctx: int, batch_size: int) -> FakeBatchBackend:
+    """Backend fake configurado por settings.fake_engine_*"""
+    from infrastructure.config.settings import get_settings
+
+    settings = get_settings()
+    return FakeBatchBackend(
+        n_slots=n_slots,
+        slot_ctx=slot_ctx,
+        batch_size=batch_size,
+        decode_latency=FakeLatency(
+            settings.fake_engine_decode_ms,
+            jitter=settings.fake_engine_jitter,
+            distribution=settings.fake_engine_latency,
+            seed=settings.fake_engine_seed,
+        ),
+        prefill_ms_per_token=settings.fake_engine_prefill_ms,
+        output_tokens=settings.fake_engine_output_tokens,
+        seed=settings.fake_engine_seed,
+    )
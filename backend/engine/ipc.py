@@ -0,0 +1,101 @@
+"""
+Engine IPC
+Protocolo local entre os workers HTTP e os processos do model server.
+
+Cada mensagem é um frame: 4 bytes (big-endian) de tamanho + JSON UTF-8.
+Endereços:
+    unix:/caminho/do/socket   (Linux/macOS)
+    tcp:127.0.0.1:8765        (fallback, ex.: Windows)
+"""
+import json
+import os
+import socket
+import struct
+from typing import Any, Dict, Optional, Tuple
+
+_HEADER = struct.Struct(">I")
+MAX_FRAME_BYTES = 64 * 1024 * 1024
+
+
+class IPCError(ConnectionError):
+    """Conexão com o model server perdida ou frame inválido"""
+
+
+def default_address() -> str:
+    """Socket Unix quando disponível, senão TCP em loopback"""
+    if hasattr(socket, "AF_UNIX") and os.name != "nt":
+        return "unix:/tmp/superezio-engine.sock"
+    return "tcp:127.0.0.1:8765"
+
+
+def worker_address(base: str, index: int) -> str:
+    """Endereço do worker `index` do pool (sufixo no socket ou porta + index)"""
+    family, target = _parse(base)
+    if family == "unix":
+        return f"unix:{target}.{index}"
+    host, port = target
+    return f"tcp:{host}:{port + index}"
+
+
+def _parse(address: str) -> Tuple[str, Any]:
+    family, _, rest = address.partition(":")
+    if family == "unix":
+        return "unix", rest
+    if family == "tcp":
+        host, _, port = rest.rpartition(":")
+        return "tcp", (host or "127.0.0.1", int(port))
+    raise ValueError(f"Endereço IPC inválido: {address!r} (use unix:/path ou tcp:host:port)")
+
+
+def listen(address: str, backlog: int = 64) -> socket.socket:
+    """Abre o socket de escuta do worker"""
+    family, target = _parse(address)
+    if family == "unix":
+        if os.path.exists(target):
+            os.unlink(target)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    else:
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind(target)
+    server.listen(backlog)
+    return server
+
+
+def connect(address: str, timeout: Optional[float] = None) -> socket.socket:
+    """Conecta em um worker"""
+    family, target = _parse(address)
+    sock = socket.socket(socket.AF_UNIX if family == "unix" else socket.AF_INET, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(target)
+    except OSError:
+        sock.close()
+        raise
+    if family == "tcp":
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    return sock
+
+
+def send_message(sock: socket.socket, message: Dict[str, Any]):
+    payload = json.dumps(message, ensure_ascii=False).encode("utf-8")
+    sock.sendall(_HEADER.pack(len(payload)) + payload)
+
+
+def recv_message(sock: socket.socket) -> Dict[str, Any]:
+    (size,) = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    if size > MAX_FRAME_BYTES:
+        raise IPCError(f"Frame grande demais: {size} bytes")
+    return json.loads(_recv_exact(sock, size).decode("utf-8"))
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    chunks = []
+    remaining = size
+    while remaining:
+        chunk = sock.recv(min(remaining, 1 << 20))
+        if not chunk:
+            raise IPCError("Conexão encerrada pelo model server")
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b"".join(chunks)
@@ -0,0 +1,190 @@
+"""
+Llama.cpp Batch Backend
+Contexto multi-sequência dedicado ao scheduler de continuous batching.
+
+Reaproveita os pesos já carregados pelo model_registry (mesmo llama_model) e
+cria um segundo llama_context com n_seq_max = número de slots, de modo que
+cada geração ativa tenha sua própria sequência no KV cache.
+"""
+import ctypes
+from typing import List, Optional, Union
+
+import numpy as np
+import llama_cpp
+from llama_cpp import Llama
+from llama_cpp import _internals as internals
+
+from infrastructure.config.settings import get_settings
+
+from engine.lora import LoraAdapterCache
+from engine.scheduler import BatchItem
+
+# Mesmo layout de llama_token_data (id, logit, p)
+_TOKEN_DATA = np.dtype([("id", np.int32), ("logit", np.float32), ("p", np.float32)])
+
+
+class LlamaGrammarConstraint:
+    """Sampler de gramática do llama.cpp aplicado aos logits amostrados em NumPy"""
+
+    def __init__(self, vocab, gbnf: str, n_vocab: int):
+        self._sampler = llama_cpp.llama_sampler_init_grammar(vocab, gbnf.encode("utf-8"), b"root")
+        if not self._sampler:
+            raise ValueError("llama.cpp rejeitou a gramática GBNF")
+        self._all = np.zeros(n_vocab, dtype=_TOKEN_DATA)
+        self._all["id"] = np.arange(n_vocab, dtype=np.int32)
+        self._one = np.zeros(1, dtype=_TOKEN_DATA)
+
+    def _apply(self, data: np.ndarray):
+        candidates = llama_cpp.llama_token_data_array(
+            data=data.ctypes.data_as(llama_cpp.llama_token_data_p),
+            size=len(data),
+            selected=-1,
+            sorted=False,
+        )
+        llama_cpp.llama_sampler_apply(self._sampler, ctypes.byref(candidates))
+
+    def allows(self, token_id: int) -> bool:
+        self._one["id"] = token_id
+        self._one["logit"] = 0.0
+        self._apply(self._one)
+        return bool(np.isfinite(self._one["logit"][0]))
+
+    def mask(self, logits: np.ndarray) -> np.ndarray:
+        self._all["logit"] = logits
+        self._apply(self._all)
+        return self._all["logit"].copy()
+
+    def accept(self, token_id: int) -> None:
+        llama_cpp.llama_sampler_accept(self._sampler, token_id)
+
+    def free(self) -> None:
+        if self._sampler:
+            llama_cpp.llama_sampler_free(self._sampler)
+            self._sampler = None
+
+
+class LlamaBatchBackend:
+    """Implementa o contrato BatchBackend sobre a API de baixo nível do llama.cpp"""
+
+    def __init__(self, llm: Llama, n_slots: int = 4, slot_ctx: int = 4096, batch_size: int = 512):
+        self.llm = llm
+        self.n_slots = max(1, n_slots)
+        self.slot_ctx = slot_ctx
+        self.batch_size = batch_size
+        self.n_vocab = llm.n_vocab()
+
+        params = llama_cpp.llama_context_default_params()
+        params.n_ctx = self.n_slots * slot_ctx
+        params.n_batch = batch_size
+        params.n_ubatch = batch_size
+        params.n_seq_max = self.n_slots
+        params.n_threads = llm.context_params.n_threads
+        params.n_threads_batch = llm.context_params.n_threads_batch
+        if hasattr(params, "kv_unified"):
+            # Buffer único: sequências que compartilham prefixo aproveitam o mesmo espaço
+            params.kv_unified = True
+
+        self._ctx = internals.LlamaContext(model=llm._model, params=params, verbose=False)
+        self._batch = internals.LlamaBatch(n_tokens=batch_size, embd=0, n_seq_max=1, verbose=False)
+
+        vocab_getter = getattr(llama_cpp, "llama_model_get_vocab", None)
+        self._vocab = vocab_getter(llm._model.model) if vocab_getter else None
+        self._eos = llm.token_eos()
+        self.adapters = LoraAdapterCache(self._load_adapter, llama_cpp.llama_adapter_lora_free,
+                                         capacity=get_settings().lora_max_resident)
+
+    def decode(self, items: List[BatchItem]) -> List[Optional[np.ndarray]]:
+        """Decodifica todas as fatias em um único llama_decode"""
+        batch = self._batch.batch
+        batch.n_tokens = 0
+        logit_rows: List[Union[int, List[int]]] = []
+
+        for item in items:
+            for offset, token in enumerate(item.tokens):
+                j = batch.n_tokens
+                batch.token[j] = token
+                batch.pos[j] = item.pos + offset
+                batch.n_seq_id[j] = 1
+                batch.seq_id[j][0] = item.seq_id
+                batch.logits[j] = False
+                batch.n_tokens += 1
+            if item.all_logits:
+                first = batch.n_tokens - len(item.tokens)
+                for j in range(first, batch.n_tokens):
+                    batch.logits[j] = True
+                logit_rows.append(list(range(first, batch.n_tokens)))
+            elif item.want_logits:
+                batch.logits[batch.n_tokens - 1] = True
+                logit_rows.append(batch.n_tokens - 1)
+            else:
+                logit_rows.append(-1)
+
+        self._ctx.decode(self._batch)
+
+        results: List[Optional[np.ndarray]] = []
+        for row in logit_rows:
+            if isinstance(row, list):
+                results.append(np.stack([self._logits(j) for j in row]))
+            elif row < 0:
+                results.append(None)
+            else:
+                results.append(self._logits(row))
+        return results
+
+    def _logits(self, row: int) -> np.ndarray:
+        ptr = self._ctx.get_logits_ith(row)
+        return np.ctypeslib.as_array(ptr, shape=(self.n_vocab,)).copy()
+
+    def release(self, seq_id: int) -> None:
+        self._ctx.kv_cache_seq_rm(seq_id, -1, -1)
+
+    def truncate(self, seq_id: int, n_past: int) -> None:
+        """Remove do KV as posições >= n_past (tokens especulativos rejeitados)"""
+        self._ctx.kv_cache_seq_rm(seq_id, n_past, -1)
+
+    def save_seq_state(self, seq_id: int) -> bytes:
+        """Copia o KV de uma sequência (equivalente por slot do Llama.save_state)"""
+        size = llama_cpp.llama_state_seq_get_size(self._ctx.ctx, seq_id)
+        buffer = (ctypes.c_uint8 * size)()
+        n_bytes = llama_cpp.llama_state_seq_get_data(self._ctx.ctx, buffer, size, seq_id)
+        return ctypes.string_at(buffer, n_bytes)
+
+    def load_seq_state(self, seq_id: int, state: bytes) -> bool:
+        """Restaura um KV copiado por save_seq_state no slot indicado"""
+        self.release(seq_id)
+        buffer = (ctypes.c_uint8 * len(state)).from_buffer_copy(state)
+        return llama_cpp.llama_state_seq_set_data(self._ctx.ctx, buffer, len(state), seq_id) > 0
+
+    def token_bytes(self, token_id: int) -> bytes:
+        return self.llm.detokenize([token_id])
+
+    def _load_adapter(self, name: str):
+        from infrastructure.config.paths import get_lora_dir
+
+        path = get_lora_dir() / f"{name}.gguf"
+        adapter = llama_cpp.llama_adapter_lora_init(self.llm._model.model, str(path).encode("utf-8"))
+        if not adapter:
+            raise FileNotFoundError(f"Falha ao carregar adapter LoRA {path}")
+        return adapter
+
+    def set_adapter(self, name: Optional[str], scale: float = 1.0) -> None:
+        """Aplica um adapter LoRA (ou nenhum) a todas as sequências do contexto"""
+        # Tira o adapter atual antes: carregar outro pode liberar o atual no LRU
+        llama_cpp.llama_set_adapters_lora(self._ctx.ctx, None, 0, None)
+        if name is None:
+            return
+        adapters = (llama_cpp.llama_adapter_lora_p_ctypes * 1)(self.adapters.get(name))
+        scales = (ctypes.c_float * 1)(scale)
+        llama_cpp.llama_set_adapters_lora(self._ctx.ctx, adapters, 1, scales)
+
+    def grammar(self, gbnf: str) -> LlamaGrammarConstraint:
+        if self._vocab is None:
+            raise RuntimeError("llama_cpp sem llama_model_get_vocab: gramáticas indisponíveis")
+        return LlamaGrammarConstraint(self._vocab, gbnf, self.n_vocab)
+
+    def is_eog(self, token_id: int) -> bool:
+        if token_id == self._eos:
+            return True
+        if self._vocab is not None and hasattr(llama_cpp, "llama_vocab_is_eog"):
+            return bool(llama_cpp.llama_vocab_is_eog(self._vocab, token_id))
+        return False
@@ -0,0 +1,117 @@
+"""
+LoRA Adapters
+Adapters GGUF carregados sob demanda sobre os pesos do modelo base já em memória.
+
+- Um adapter por expert (expert_registry.lora_adapter), arquivo
+  <lora_dir>/<nome>.gguf (convertido com convert_lora_to_gguf.py do llama.cpp)
+- LRU de adapters residentes: os mais usados ficam carregados, o menos usado
+  sai quando passa de lora_max_resident
+- No llama.cpp o adapter vale para o contexto inteiro, então todas as
+  sequências de um passo de decode usam o mesmo adapter: o scheduler agrupa a
+  fila por adapter e só troca quando o grupo atual esvazia (ver
+  BatchScheduler._next_waiting)
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from infrastructure.config.settings import get_settings
+from utils.metrics import metrics
+
+
+class LoraAdapterCache:
+    """LRU de adapters residentes (handles opacos do backend)"""
+
+    def __init__(
+        self,
+        load: Callable[[str], Any],
+        free: Callable[[Any], None],
+        capacity: int = 4
+    ):
+        self._load = load
+        self._free = free
+        self.capacity = max(1, capacity)
+        self._resident: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.evictions = 0
+
+    def get(self, name: str) -> Any:
+        """Handle do adapter, carregando (e liberando o menos usado) se preciso"""
+        with self._lock:
+            handle = self._resident.get(name)
+            if handle is not None:
+                self._resident.move_to_end(name)
+                return handle
+
+            start = time.time()
+            handle = self._load(name)
+            metrics.histogram("engine.lora.load_time", time.time() - start, tags={"adapter": name})
+            self.loads += 1
+            self._resident[name] = handle
+            while len(self._resident) > self.capacity:
+                evicted, old = self._resident.popitem(last=False)
+                self._free(old)
+                self.evictions += 1
+                metrics.increment("engine.lora.evicted", tags={"adapter": evicted})
+            return handle
+
+    def resident(self) -> List[str]:
+        with self._lock:
+            return list(self._resident)
+
+    def clear(self):
+        with self._lock:
+            while self._resident:
+                self._free(self._resident.popitem()[1])
+
+
+def available_adapters() -> List[str]:
+    """Nomes dos adapters GGUF presentes em lora_dir"""
+    from infrastructure.config.paths import get_lora_dir
+
+    lora_dir = get_lora_dir()
+    if not lora_dir.is_dir():
+        return []
+    return sorted(path.stem for path in lora_dir.glob("*.gguf"))
+
+
+def adapter_for_expert(expert_id: str) -> Tuple[Optional[str], float]:
+    """
+    (adapter, escala) do expert; (None, 1.0) = modelo base.
+    Adapter declarado mas sem GGUF em disco cai no modelo base.
+    """
+    from expert_registry import get_expert
+
+    try:
+        name = get_expert(expert_id)["lora_adapter"]
+    except ValueError:
+        return None, 1.0
+    if not name or name not in _available_cached():
+        return None, 1.0
+    settings = get_settings()
+    return name, settings.lora_scales.get(name, settings.lora_default_scale)
+
+
+_available: Optional[Tuple[float, List[str]]] = None
+
+
+def _available_cached(ttl: float = 30.0) -> List[str]:
+    """available_adapters() sem listar o diretório a cada requisição"""
+    global _available
+    now = time.time()
+    if _available is None or now - _available[0] > ttl:
+        _available = (now, available_adapters())
+    return _available[1]
+
+
+def lora_stats(cache: Optional[LoraAdapterCache], active: Optional[Tuple[str, float]], swaps: int) -> Dict[str, Any]:
+    return {
+        "active": active[0] if active else None,
+        "scale": active[1] if active else None,
+        "swaps": swaps,
+        "resident": cache.resident() if cache else [],
+        "loads": cache.loads if cache else 0,
+        "evictions": cache.evictions if cache else 0,
+    }
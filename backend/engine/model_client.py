@@ -0,0 +1,153 @@
+"""
+Model Client
+Lado do worker HTTP: encaminha chat_completion para o pool do model server.
+
+Despacho por carga: cada engine reporta (op=health) quantas sequências tem
+ativas + na fila; o cliente soma as requisições que ele próprio tem em voo
+e escolhe o engine de menor carga entre os prontos.
+"""
+import threading
+import time
+from typing import Any, Dict, Generator, List, Optional, Union
+
+from core.domain.cancellation import CancellationToken
+from engine import ipc
+from infrastructure.config.settings import get_settings
+from utils.metrics import metrics
+
+HEALTH_TTL = 1.0  # segundos entre consultas de carga a um mesmo engine
+
+
+def probe(address: str, timeout: float = 2.0) -> Dict[str, Any]:
+    """Health de um engine; ready=False se não responder"""
+    try:
+        with ipc.connect(address, timeout=timeout) as sock:
+            ipc.send_message(sock, {"op": "health"})
+            status = ipc.recv_message(sock)
+    except (OSError, ValueError) as exc:
+        return {"address": address, "ready": False, "error": str(exc)}
+    status["address"] = address
+    return status
+
+
+class RemoteEngineClient:
+    """Mesma assinatura de inference.chat_completion, executada no model server"""
+
+    def __init__(self, addresses: List[str], timeout: Optional[float] = None):
+        self.addresses = addresses
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._health: Dict[str, Dict[str, Any]] = {}
+        self._checked_at: Dict[str, float] = {}
+        self._inflight: Dict[str, int] = {address: 0 for address in addresses}
+
+    def _refresh(self, address: str, force: bool = False) -> Dict[str, Any]:
+        now = time.time()
+        if force or now - self._checked_at.get(address, 0.0) > HEALTH_TTL:
+            status = probe(address)
+            with self._lock:
+                self._health[address] = status
+                self._checked_at[address] = now
+        return self._health[address]
+
+    def _pick(self) -> str:
+        """Engine pronto de menor carga (reportada + requisições locais em voo)"""
+        best, best_score = None, None
+        for address in self.addresses:
+            status = self._refresh(address)
+            if not status.get("ready"):
+                continue
+            with self._lock:
+                score = status.get("load", 0) + self._inflight[address]
+            if best_score is None or score < best_score:
+                best, best_score = address, score
+        if best is None:
+            raise RuntimeError("Model server indisponível: nenhum engine pronto")
+        return best
+
+    def _open(self, kwargs: Dict[str, Any]):
+        address = self._pick()
+        try:
+            sock = ipc.connect(address, timeout=self.timeout)
+            ipc.send_message(sock, {"op": "chat", "kwargs": kwargs})
+        except OSError:
+            # Engine caiu entre o health e a conexão: força nova consulta
+            self._refresh(address, force=True)
+            raise
+        with self._lock:
+            self._inflight[address] += 1
+        metrics.increment("engine.remote.dispatched")
+        return address, sock
+
+    def _close(self, address: str, sock):
+        with self._lock:
+            self._inflight[address] -= 1
+        sock.close()
+
+    def chat_completion(
+        self,
+        messages: List[Dict[str, Any]],
+        tools: Optional[List[Dict[str, Any]]] = None,
+        temperature: float = 0.2,
+        max_tokens: int = 2048,
+        stream: bool = False,
+        mode: Optional[str] = None,
+        image_path: Optional[str] = None,
+        cancel_token: Optional[CancellationToken] = None,
+    ) -> Union[Dict[str, Any], Generator[Dict[str, Any], None, None]]:
+        kwargs = {
+            "messages": messages,
+            "tools": tools,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "stream": stream,
+            "mode": mode,
+            "image_path": image_path,
+            # O token não atravessa o processo: o engine recria o deadline e
+            # cancela sozinho quando esta conexão fecha
+            "deadline_s": cancel_token.remaining() if cancel_token else None,
+        }
+        if stream:
+            return self._stream(kwargs, cancel_token)
+
+        address, sock = self._open(kwargs)
+        try:
+            reply = ipc.recv_message(sock)
+        finally:
+            self._close(address, sock)
+        if "error" in reply:
+            raise RuntimeError(reply["error"])
+        return reply["result"]
+
+    def _stream(self, kwargs: Dict[str, Any], cancel_token: Optional[CancellationToken]) -> Generator[Dict[str, Any], None, None]:
+        address, sock = self._open(kwargs)
+        try:
+            while cancel_token is None or not cancel_token.cancelled:
+                reply = ipc.recv_message(sock)
+                if "error" in reply:
+                    raise RuntimeError(reply["error"])
+                if reply.get("done"):
+                    return
+                yield reply["chunk"]
+        finally:
+            self._close(address, sock)
+
+    def health(self) -> Dict[str, Any]:
+        workers = [self._refresh(address, force=True) for address in self.addresses]
+        return {"ready": any(w.get("ready") for w in workers), "workers": workers}
+
+
+_client: Optional[RemoteEngineClient] = None
+_client_lock = threading.Lock()
+
+
+def get_engine_client() -> RemoteEngineClient:
+    """Cliente global configurado a partir de settings (engine_server_*)"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            settings = get_settings()
+            base = settings.engine_server_address or ipc.default_address()
+            addresses = [ipc.worker_address(base, i) for i in range(settings.engine_server_workers)]
+            _client = RemoteEngineClient(addresses, timeout=settings.engine_server_timeout)
+        return _client
@@ -0,0 +1,218 @@
+"""
+Model Server
+Pool de processos engine (Llama.cpp + scheduler) atendendo os workers HTTP via IPC.
+
+Cada processo do pool carrega o modelo uma única vez, fixa sua fatia de CPUs
+(afinidade) e escuta em seu próprio socket. Os workers do uvicorn não carregam
+o modelo: usam engine.model_client para escolher o processo menos carregado.
+
+Operações do protocolo (engine.ipc):
+    {"op": "health"}                  → {"ok", "ready", "worker", "pid", "load", ...}
+    {"op": "chat", "kwargs": {...}}   → {"result": {...}}                      (stream=False)
+                                      → {"chunk": {...}} ... {"done": true}    (stream=True)
+    Qualquer falha                    → {"error": "..."}
+
+Uso:
+    python -m engine.model_server --workers 2
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+from core.domain.cancellation import CancellationToken
+from engine import ipc
+
+
+def split_cpus(n_workers: int) -> List[Optional[List[int]]]:
+    """Divide as CPUs disponíveis em fatias contíguas, uma por worker"""
+    if not hasattr(os, "sched_getaffinity"):
+        return [None] * n_workers
+    cpus = sorted(os.sched_getaffinity(0))
+    if len(cpus) < n_workers:
+        return [None] * n_workers
+    size = len(cpus) // n_workers
+    return [cpus[i * size:(i + 1) * size] for i in range(n_workers)]
+
+
+# ----------------------------------------------------------------------
+# Processo engine
+# ----------------------------------------------------------------------
+
+def serve_worker(worker_id: int, address: str, cpus: Optional[List[int]] = None):
+    """Ponto de entrada do processo engine (roda até ser encerrado)"""
+    if cpus:
+        os.sched_setaffinity(0, cpus)
+        os.environ["ENGINE_THREADS"] = str(len(cpus))
+    # Este processo É o engine: nunca delegar para outro model server
+    os.environ["ENGINE_MODE"] = "local"
+
+    print(f"⏳ [ENGINE-{worker_id}] Carregando modelo (pid={os.getpid()}, cpus={cpus or 'todas'})...")
+    import inference
+    from engine.scheduler import get_scheduler
+    from engine.warmup import get_engine_lifecycle
+
+    # Load + warm-up antes de escutar: o health só responde depois de aquecido
+    lifecycle = get_engine_lifecycle()
+    lifecycle.run()
+    if not lifecycle.ready:
+        raise RuntimeError(f"Engine {worker_id} não subiu: {lifecycle.error}")
+
+    scheduler = get_scheduler()
+    server = ipc.listen(address)
+    print(f"✅ [ENGINE-{worker_id}] Pronto em {address}")
+
+    while True:
+        conn, _ = server.accept()
+        threading.Thread(
+            target=_handle_connection,
+            args=(conn, worker_id, inference, scheduler),
+            daemon=True,
+        ).start()
+
+
+def _handle_connection(conn, worker_id: int, inference, scheduler):
+    """Atende requisições sequenciais de uma conexão até o cliente fechar"""
+    with conn:
+        while True:
+            try:
+                request = ipc.recv_message(conn)
+            except (ipc.IPCError, OSError):
+                return
+
+            try:
+                op = request.get("op")
+                if op == "health":
+                    stats = scheduler.stats()
+                    ipc.send_message(conn, {
+                        "ok": True,
+                        "ready": True,
+                        "worker": worker_id,
+                        "pid": os.getpid(),
+                        "load": stats["slots_active"] + stats["waiting"],
+                        "slots_total": stats["slots_total"],
+                    })
+                elif op == "chat":
+                    kwargs = dict(request.get("kwargs") or {})
+                    kwargs["cancel_token"] = CancellationToken(kwargs.pop("deadline_s", None))
+                    if kwargs.get("stream"):
+                        chunks = inference.chat_completion(**kwargs)
+                        try:
+                            for chunk in chunks:
+                                ipc.send_message(conn, {"chunk": chunk})
+                        finally:
+                            # Cliente caiu no meio: fechar o gerador cancela a geração
+                            chunks.close()
+                        ipc.send_message(conn, {"done": True})
+                    else:
+                        ipc.send_message(conn, {"result": inference.chat_completion(**kwargs)})
+                else:
+                    ipc.send_message(conn, {"error": f"Operação desconhecida: {op!r}"})
+            except (ipc.IPCError, OSError):
+                # Cliente desconectou no meio do stream
+                return
+            except Exception as exc:
+                print(f"❌ [ENGINE-{worker_id}] Erro: {exc}")
+                try:
+                    ipc.send_message(conn, {"error": str(exc)})
+                except OSError:
+                    return
+
+
+# ----------------------------------------------------------------------
+# Supervisor do pool
+# ----------------------------------------------------------------------
+
+class ModelServerPool:
+    """Sobe N processos engine, reinicia os que morrerem e reporta prontidão"""
+
+    def __init__(self, n_workers: int = 1, address: Optional[str] = None, pin_cpus: bool = True):
+        self.n_workers = max(1, n_workers)
+        self.address = address or ipc.default_address()
+        self.addresses = [ipc.worker_address(self.address, i) for i in range(self.n_workers)]
+        self._cpus = split_cpus(self.n_workers) if pin_cpus else [None] * self.n_workers
+        self._ctx = multiprocessing.get_context("spawn")
+        self._processes: Dict[int, multiprocessing.Process] = {}
+
+    def _spawn(self, worker_id: int):
+        process = self._ctx.Process(
+            target=serve_worker,
+            args=(worker_id, self.addresses[worker_id], self._cpus[worker_id]),
+            name=f"superezio-engine-{worker_id}",
+            daemon=True,
+        )
+        process.start()
+        self._processes[worker_id] = process
+
+    def start(self):
+        for worker_id in range(self.n_workers):
+            self._spawn(worker_id)
+
+    def health(self) -> List[Dict]:
+        """Consulta cada worker (ready=False se ainda carregando ou morto)"""
+        from engine.model_client import probe
+
+        return [probe(address) for address in self.addresses]
+
+    def wait_ready(self, timeout: float = 600.0) -> bool:
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if all(h.get("ready") for h in self.health()):
+                return True
+            if any(not p.is_alive() for p in self._processes.values()):
+                return False
+            time.sleep(1.0)
+        return False
+
+    def supervise(self, interval: float = 1.0, on_tick=None):
+        """Loop bloqueante: reinicia workers mortos"""
+        while True:
+            for worker_id, process in list(self._processes.items()):
+                if not process.is_alive():
+                    print(f"⚠️  [MODEL-SERVER] Engine {worker_id} saiu (exit={process.exitcode}), reiniciando...")
+                    self._spawn(worker_id)
+            if on_tick is not None:
+                on_tick(self)
+            time.sleep(interval)
+
+    def stop(self, timeout: float = 10.0):
+        for process in self._processes.values():
+            process.terminate()
+        for process in self._processes.values():
+            process.join(timeout=timeout)
+        self._processes.clear()
+
+
+def main():
+    from infrastructure.config.settings import get_settings
+
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description="SuperEzio model server (pool de engines Llama.cpp)")
+    parser.add_argument("--workers", type=int, default=settings.engine_server_workers)
+    parser.add_argument("--address", default=settings.engine_server_address or ipc.default_address())
+    parser.add_argument("--no-pin", action="store_true", help="Não fixar afinidade de CPU")
+    args = parser.parse_args()
+
+    pool = ModelServerPool(args.workers, args.address, pin_cpus=not args.no_pin)
+    print(f"🚀 [MODEL-SERVER] Subindo {pool.n_workers} engine(s): {', '.join(pool.addresses)}")
+    pool.start()
+    try:
+        if pool.wait_ready():
+            print("✅ [MODEL-SERVER] Todos os engines prontos")
+        pool.supervise()
+    except KeyboardInterrupt:
+        print("\n🛑 [MODEL-SERVER] Encerrando engines...")
+    finally:
+        pool.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,945 @@
+"""
+Continuous Batching Scheduler
+Dono exclusivo do motor Llama.cpp: enfileira gerações, intercala passos de
+decode entre as sequências ativas (um slot de KV por sequência) e devolve os
+tokens de cada requisição pelo seu próprio canal.
+
+Cada passo monta UM batch com:
+- 1 token por sequência em decode (prioridade: latência de quem já está gerando)
+- fatias de prompt (chunked prefill) das sequências recém-admitidas
+
+O backend (ver engine/llama_batch.py) só precisa saber decodificar um batch
+multi-sequência e liberar slots; a amostragem é feita aqui em NumPy.
+
+Com um KVCacheManager configurado, a admissão restaura o snapshot do maior
+prefixo estático em cache e o prefill para exatamente no fim do prefixo
+declarado (prefix_len) para gravar um novo snapshot quando ainda não existe.
+
+Decodificação especulativa (engine/speculative.py): se a requisição pede um
+drafter (SamplingParams.speculative), o item de decode leva o último token +
+k tokens propostos, com logits de todas as posições; o scheduler aceita o
+maior prefixo que coincide com a amostragem do modelo principal, trunca o KV
+do resto e ajusta k pela taxa de aceitação.
+
+Cancelamento: cada sequência pode carregar um CancellationToken (desconexão do
+cliente ou deadline); a cada passo sequências canceladas saem do batch e liberam
+o slot, e os tokens que deixaram de ser gerados são contabilizados.
+
+Gramática (engine/tool_grammar.py): com SamplingParams.grammar e um backend que
+compila GBNF, o token amostrado é checado contra a gramática e, só se for
+inválido, a amostragem é refeita sobre os logits mascarados (o caminho comum
+não paga a máscara do vocabulário inteiro). Com stop_on_call a geração termina
+assim que o objeto de chamada de ferramenta fecha (finish_reason "tool_calls").
+
+LoRA (engine/lora.py): o adapter vale para o contexto inteiro, então todas as
+sequências ativas compartilham o mesmo (adapter, escala). A admissão continua no
+grupo atual enquanto houver fila para ele e só troca quando o grupo esvazia, ou
+quando alguém de outro adapter esperou mais que lora_max_wait (o grupo atual
+para de admitir e drena). Sequências com adapter não usam o cache de prefixos,
+cujos snapshots são do modelo base.
+"""
+import codecs
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Protocol
+
+import numpy as np
+
+from core.domain.cancellation import CancellationToken
+from engine.lora import lora_stats
+from engine.tool_grammar import ToolCallDetector
+from infrastructure.config.settings import get_settings
+from optimization.kv_cache import KVCacheManager
+from utils.metrics import metrics
+
+
+# Janela de tokens considerada pelo repeat_penalty
+REPEAT_WINDOW = 64
+
+
+@dataclass
+class SamplingParams:
+    """Parâmetros de amostragem de uma geração"""
+    temperature: float = 0.7
+    top_p: float = 0.95
+    top_k: int = 40
+    repeat_penalty: float = 1.1
+    max_tokens: Optional[int] = 512  # None = até o limite do slot
+    stop: List[str] = field(default_factory=list)
+    seed: Optional[int] = None
+    speculative: Optional[str] = None  # nome do drafter (ex.: "draft"); None = decode normal
+    grammar: Optional[str] = None  # GBNF que restringe a saída (None = livre)
+    stop_on_call: bool = False  # encerra quando o objeto de chamada de ferramenta fecha
+    lora: Optional[str] = None  # adapter LoRA (None = modelo base)
+    lora_scale: float = 1.0
+    logprobs: bool = False  # acumula log-prob dos tokens escolhidos (GenerationHandle.confidence)
+
+
+@dataclass
+class BatchItem:
+    """Fatia de tokens de UMA sequência dentro de um batch de decode"""
+    seq_id: int
+    tokens: List[int]
+    pos: int  # posição do primeiro token no KV da sequência
+    want_logits: bool  # logits do último token da fatia
+    all_logits: bool = False  # logits de TODOS os tokens (verificação especulativa)
+
+
+@dataclass
+class GenerationEvent:
+    """Evento emitido para o chamador (texto incremental ou fim)"""
+    text: str = ""
+    finish_reason: Optional[str] = None  # "stop" | "length" | "tool_calls" | "error" | "cancelled" | "timeout"
+    error: Optional[str] = None
+
+
+class BatchBackend(Protocol):
+    """Contrato mínimo de um motor capaz de decodificar batches multi-sequência"""
+
+    n_slots: int
+    slot_ctx: int
+    batch_size: int
+
+    def decode(self, items: List[BatchItem]) -> List[Optional[np.ndarray]]:
+        """Decodifica o batch e retorna os logits (ou None) de cada item (2D se all_logits)"""
+        ...
+
+    def release(self, seq_id: int) -> None:
+        """Descarta o KV da sequência"""
+        ...
+
+    def token_bytes(self, token_id: int) -> bytes:
+        """Bytes UTF-8 (possivelmente parciais) de um token"""
+        ...
+
+    def is_eog(self, token_id: int) -> bool:
+        """True se o token encerra a geração"""
+        ...
+
+    def save_seq_state(self, seq_id: int) -> bytes:
+        """Serializa o KV da sequência (opcional: habilita o cache de prefixos)"""
+        ...
+
+    def load_seq_state(self, seq_id: int, state: bytes) -> bool:
+        """Restaura um KV serializado no slot (opcional: habilita o cache de prefixos)"""
+        ...
+
+    def truncate(self, seq_id: int, n_past: int) -> None:
+        """Descarta o KV a partir da posição n_past (opcional: habilita especulação)"""
+        ...
+
+    def grammar(self, gbnf: str) -> "GrammarConstraint":
+        """Compila uma gramática GBNF para uma sequência (opcional: habilita SamplingParams.grammar)"""
+        ...
+
+    def set_adapter(self, name: Optional[str], scale: float = 1.0) -> None:
+        """Aplica um adapter LoRA ao contexto inteiro (opcional: habilita SamplingParams.lora)"""
+        ...
+
+
+class GrammarConstraint(Protocol):
+    """Estado de uma gramática ao longo de uma geração"""
+
+    def allows(self, token_id: int) -> bool:
+        ...
+
+    def mask(self, logits: np.ndarray) -> np.ndarray:
+        """Logits com -inf nos tokens que a gramática não aceita agora"""
+        ...
+
+    def accept(self, token_id: int) -> None:
+        ...
+
+    def free(self) -> None:
+        ...
+
+
+class GenerationHandle:
+    """
+    Canal de saída de uma geração.
+    Iterar produz GenerationEvent até o evento final (finish_reason != None).
+    """
+
+    def __init__(self, request_id: str, prompt_tokens: int):
+        self.request_id = request_id
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = 0
+        self.finish_reason: Optional[str] = None
+        self.error: Optional[str] = None
+        self.submitted_at = time.time()
+        self.first_token_at: Optional[float] = None
+        self.logprob_sum = 0.0
+        self.scored_tokens = 0
+        self._events: "queue.Queue[GenerationEvent]" = queue.Queue()
+
+    def _put(self, event: GenerationEvent):
+        if event.finish_reason:
+            self.finish_reason = event.finish_reason
+            self.error = event.error
+        self._events.put(event)
+
+    def __iter__(self) -> Iterator[GenerationEvent]:
+        while True:
+            event = self._events.get()
+            yield event
+            if event.finish_reason:
+                return
+
+    @property
+    def pending(self) -> int:
+        """Eventos produzidos e ainda não consumidos (cliente lento)"""
+        return self._events.qsize()
+
+    def text(self) -> str:
+        """Bloqueia até o fim e retorna o texto completo"""
+        parts = [event.text for event in self]
+        if self.finish_reason == "error":
+            raise RuntimeError(self.error or "Falha na geração")
+        return "".join(parts)
+
+    @property
+    def confidence(self) -> Optional[float]:
+        """Média geométrica da probabilidade dos tokens escolhidos (SamplingParams.logprobs)"""
+        if not self.scored_tokens:
+            return None
+        return float(np.exp(self.logprob_sum / self.scored_tokens))
+
+    @property
+    def usage(self) -> Dict[str, int]:
+        return {
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.prompt_tokens + self.completion_tokens,
+        }
+
+
+class _Sequence:
+    """Estado interno de uma geração ocupando um slot"""
+
+    def __init__(
+        self,
+        handle: GenerationHandle,
+        prompt: List[int],
+        params: SamplingParams,
+        prefix_len: int = 0,
+        prefix_label: Optional[str] = None,
+        cancel_token: Optional[CancellationToken] = None,
+    ):
+        self.handle = handle
+        self.cancel_token = cancel_token
+        self.prompt = prompt
+        self.params = params
+        self.prefix_len = prefix_len  # tokens estáticos a guardar no cache de prefixos
+        self.prefix_label = prefix_label
+        self.seq_id = -1
+        self.prefill_pos = 0  # quantos tokens do prompt já estão no KV
+        self.n_past = 0
+        self.last_token: Optional[int] = None
+        self.generated: List[int] = []
+        self.text = ""
+        self.emitted = 0  # caracteres de self.text já entregues
+        self.decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self.rng = np.random.default_rng(params.seed)
+        self.spec_k = 0  # tamanho atual da proposta especulativa (adaptativo)
+        self.grammar: Optional[GrammarConstraint] = None
+        self.call_detector = ToolCallDetector() if params.stop_on_call else None
+
+    @property
+    def prefilled(self) -> bool:
+        return self.prefill_pos >= len(self.prompt)
+
+    @property
+    def adapter(self) -> Optional[tuple]:
+        return (self.params.lora, self.params.lora_scale) if self.params.lora else None
+
+
+def sample_token(
+    logits: np.ndarray,
+    params: SamplingParams,
+    rng: np.random.Generator,
+    recent: Optional[List[int]] = None,
+) -> int:
+    """Amostragem temperature/top-k/top-p com repeat_penalty sobre logits brutos"""
+    logits = np.array(logits, dtype=np.float32, copy=True)
+
+    if params.repeat_penalty != 1.0 and recent:
+        ids = np.unique(np.asarray(recent[-REPEAT_WINDOW:], dtype=np.int64))
+        values = logits[ids]
+        logits[ids] = np.where(values > 0, values / params.repeat_penalty, values * params.repeat_penalty)
+
+    if params.temperature <= 0:
+        return int(np.argmax(logits))
+
+    logits /= params.temperature
+
+    if 0 < params.top_k < logits.shape[0]:
+        candidates = np.argpartition(logits, -params.top_k)[-params.top_k:]
+    else:
+        candidates = np.arange(logits.shape[0])
+
+    order = np.argsort(logits[candidates])[::-1]
+    candidates = candidates[order]
+    probs = np.exp(logits[candidates] - logits[candidates[0]])
+    probs /= probs.sum()
+
+    if params.top_p < 1.0:
+        cutoff = int(np.searchsorted(np.cumsum(probs), params.top_p)) + 1
+        candidates = candidates[:cutoff]
+        probs = probs[:cutoff] / probs[:cutoff].sum()
+
+    return int(rng.choice(candidates, p=probs))
+
+
+class BatchScheduler:
+    """
+    Scheduler de continuous batching.
+    Uma thread dedicada é a única a tocar no backend; chamadores só enfileiram.
+    """
+
+    def __init__(
+        self,
+        backend: BatchBackend,
+        prefill_chunk: int = 256,
+        prefix_cache: Optional[KVCacheManager] = None,
+        drafters: Optional[Dict[str, Any]] = None,
+        spec_k: int = 4,
+        spec_k_max: int = 8,
+        max_backlog: Optional[int] = None,
+        lora_max_wait: float = 2.0,
+    ):
+        self.backend = backend
+        self.prefill_chunk = max(1, prefill_chunk)
+        self.prefix_cache = prefix_cache if hasattr(backend, "save_seq_state") else None
+        self.drafters: Dict[str, Any] = dict(drafters or {}) if hasattr(backend, "truncate") else {}
+        self.spec_k = max(1, spec_k)
+        self.spec_k_max = max(self.spec_k, spec_k_max)
+        self.max_backlog = max_backlog
+        self.lora_max_wait = lora_max_wait
+        self._lora_enabled = hasattr(backend, "set_adapter")
+        self._adapter: Optional[tuple] = None  # (adapter, escala) aplicado no backend
+        self._adapter_swaps = 0
+
+        self._waiting: Deque[_Sequence] = deque()
+        self._active: Dict[int, _Sequence] = {}
+        self._free_slots: List[int] = list(range(backend.n_slots))
+        self._exclusive: Deque[tuple] = deque()
+
+        self._cv = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+
+        self._steps = 0
+        self._tokens_generated = 0
+        self._spec_stats: Dict[str, Dict[str, int]] = {}  # por expert: proposed / accepted
+
+    # ------------------------------------------------------------------
+    # API pública (qualquer thread)
+    # ------------------------------------------------------------------
+    def submit(
+        self,
+        prompt_tokens: List[int],
+        params: Optional[SamplingParams] = None,
+        request_id: Optional[str] = None,
+        prefix_len: Optional[int] = None,
+        prefix_label: Optional[str] = None,
+        cancel_token: Optional[CancellationToken] = None,
+    ) -> GenerationHandle:
+        """
+        Enfileira uma geração e retorna o handle de saída.
+
+        Args:
+            prompt_tokens: Prompt completo já tokenizado
+            params: Parâmetros de amostragem
+            request_id: ID para logs (gerado se omitido)
+            prefix_len: Quantos tokens iniciais formam um prefixo estático reutilizável
+            prefix_label: Rótulo do prefixo (ex.: expert_id) para invalidação
+            cancel_token: Interrompe a geração quando cancelado / no deadline
+        """
+        handle = GenerationHandle(request_id or str(uuid.uuid4())[:8], len(prompt_tokens))
+        if not prefix_len or prefix_len >= len(prompt_tokens):
+            prefix_len = 0
+        sequence = _Sequence(handle, list(prompt_tokens), params or SamplingParams(), prefix_len, prefix_label, cancel_token)
+
+        with self._cv:
+            self._ensure_running()
+            self._waiting.append(sequence)
+            self._cv.notify()
+
+        metrics.increment("engine.requests_submitted")
+        return handle
+
+    def run_exclusive(self, func: Callable[..., Any], *args, **kwargs) -> Future:
+        """
+        Executa func na thread do scheduler, entre dois passos de decode.
+        Usado por caminhos legados que precisam do objeto Llama inteiro (ex.: visão).
+        """
+        future: Future = Future()
+        with self._cv:
+            self._ensure_running()
+            self._exclusive.append((future, func, args, kwargs))
+            self._cv.notify()
+        return future
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cv:
+            return {
+                "slots_total": self.backend.n_slots,
+                "slots_active": len(self._active),
+                "waiting": len(self._waiting),
+                "steps": self._steps,
+                "tokens_generated": self._tokens_generated,
+                "prefix_cache": self.prefix_cache.get_stats() if self.prefix_cache else None,
+                "lora": lora_stats(getattr(self.backend, "adapters", None), self._adapter, self._adapter_swaps),
+                "speculative": {
+                    label: {**counts, "acceptance": round(counts["accepted"] / counts["proposed"], 3) if counts["proposed"] else 0.0}
+                    for label, counts in self._spec_stats.items()
+                },
+            }
+
+    def shutdown(self, timeout: float = 5.0):
+        with self._cv:
+            self._running = False
+            self._cv.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    # ------------------------------------------------------------------
+    # Loop do scheduler (thread dedicada)
+    # ------------------------------------------------------------------
+    def _ensure_running(self):
+        if self._running and self._thread is not None and self._thread.is_alive():
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, name="engine-scheduler", daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        while True:
+            with self._cv:
+                while self._running and not (self._waiting or self._active or self._exclusive):
+                    self._cv.wait()
+                if not self._running:
+                    self._fail_all("Scheduler encerrado")
+                    return
+                exclusive = list(self._exclusive)
+                self._exclusive.clear()
+
+            try:
+                self._iterate(exclusive)
+            except Exception as exc:
+                # Falha fora do decode (adapter, gramática, prefixo, amostragem...): a
+                # thread segue viva e ninguém fica esperando um handle que nunca fecha
+                print(f"❌ [SCHED] Falha no passo do scheduler: {exc}")
+                metrics.increment("engine.scheduler_errors")
+                with self._cv:
+                    self._fail_all(str(exc), pending=exclusive)
+
+    def _iterate(self, exclusive: List[tuple]):
+        """Uma volta do loop: admissão, jobs exclusivos e um passo de decode"""
+        with self._cv:
+            admitted = self._admit()
+
+        if admitted:
+            self._switch_adapter(admitted[0].adapter)
+        for sequence in admitted:
+            self._attach_grammar(sequence)
+            self._restore_prefix(sequence)
+
+        for future, func, args, kwargs in exclusive:
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(func(*args, **kwargs))
+                except BaseException as exc:
+                    future.set_exception(exc)
+
+        if self._active and not self._step():
+            # Todas as sequências pausadas por backpressure: espera o consumo
+            with self._cv:
+                self._cv.wait(timeout=0.01)
+
+    def _admit(self) -> List[_Sequence]:
+        """Move sequências da fila para slots livres (chamado com lock)"""
+        admitted: List[_Sequence] = []
+        for sequence in [s for s in self._waiting if self._is_cancelled(s)]:
+            self._waiting.remove(sequence)
+            self._cancel(sequence)
+
+        while self._waiting and self._free_slots:
+            sequence = self._next_waiting()
+            if sequence is None:
+                break
+            self._waiting.remove(sequence)
+            prompt_len = len(sequence.prompt)
+
+            if prompt_len == 0 or prompt_len >= self.backend.slot_ctx:
+                self._finish(sequence, "error", f"Prompt com {prompt_len} tokens não cabe no slot ({self.backend.slot_ctx})")
+                continue
+
+            sequence.seq_id = self._free_slots.pop(0)
+            self._active[sequence.seq_id] = sequence
+            admitted.append(sequence)
+            metrics.histogram("engine.queue_wait", time.time() - sequence.handle.submitted_at)
+        return admitted
+
+    def _next_waiting(self) -> Optional[_Sequence]:
+        """
+        Próxima sequência a admitir (chamado com lock). Sem LoRA é FIFO; com LoRA
+        fica no grupo do adapter atual para evitar trocas.
+        """
+        oldest = self._waiting[0]
+        if not self._lora_enabled:
+            return oldest
+        starved = oldest.adapter != self._adapter and time.time() - oldest.handle.submitted_at > self.lora_max_wait
+
+        if self._active:
+            # Admitidos no meio do grupo precisam do mesmo adapter; se alguém de
+            # outro grupo passou do tempo, para de admitir e deixa o grupo drenar
+            group = next(iter(self._active.values())).adapter
+            if starved and oldest.adapter != group:
+                return None
+        elif starved or not any(s.adapter == self._adapter for s in self._waiting):
+            group = oldest.adapter
+        else:
+            group = self._adapter
+        return next((s for s in self._waiting if s.adapter == group), None)
+
+    def _switch_adapter(self, adapter: Optional[tuple]):
+        """Aplica o adapter do grupo admitido (fora do lock; só troca se mudou)"""
+        if not self._lora_enabled or adapter == self._adapter:
+            return
+        start = time.time()
+        try:
+            self.backend.set_adapter(*(adapter or (None, 1.0)))
+        except Exception as exc:
+            print(f"⚠️  [SCHED] Adapter LoRA '{adapter[0]}' indisponível, usando o modelo base: {exc}")
+            metrics.increment("engine.lora.failed", tags={"adapter": adapter[0]})
+            with self._cv:
+                for sequence in list(self._active.values()) + list(self._waiting):
+                    if sequence.params.lora == adapter[0]:
+                        sequence.params.lora = None
+            self.backend.set_adapter(None)
+            adapter = None
+        elapsed = time.time() - start
+        previous = self._adapter[0] if self._adapter else "base"
+        current = adapter[0] if adapter else "base"
+        self._adapter = adapter
+        self._adapter_swaps += 1
+        metrics.increment("engine.lora.swaps", tags={"from": previous, "to": current})
+        metrics.histogram("engine.lora.swap_time", elapsed, tags={"adapter": current})
+        print(f"🔀 [SCHED] LoRA {previous} → {current} ({elapsed * 1000:.1f}ms)")
+
+    def _attach_grammar(self, sequence: _Sequence):
+        """Compila a gramática da sequência (fora do lock); sem suporte no backend segue livre"""
+        gbnf = sequence.params.grammar
+        if not gbnf or not hasattr(self.backend, "grammar"):
+            return
+        try:
+            sequence.grammar = self.backend.grammar(gbnf)
+        except Exception as exc:
+            print(f"⚠️  [SCHED] Gramática inválida, gerando sem restrição: {exc}")
+            metrics.increment("engine.grammar.failed")
+
+    def _restore_prefix(self, sequence: _Sequence):
+        """Restaura no slot o snapshot do maior prefixo em cache (fora do lock)"""
+        if self.prefix_cache is None or sequence.adapter is not None:
+            return
+        snapshot = self.prefix_cache.lookup(sequence.prompt)
+        if snapshot is None:
+            metrics.increment("engine.prefix_cache.miss")
+            return
+        try:
+            restored = self.backend.load_seq_state(sequence.seq_id, snapshot.state)
+        except Exception as exc:
+            print(f"⚠️  [SCHED] Falha ao restaurar prefixo: {exc}")
+            restored = False
+        if not restored:
+            self.backend.release(sequence.seq_id)
+            return
+        sequence.prefill_pos = sequence.n_past = len(snapshot.tokens)
+        metrics.increment("engine.prefix_cache.hit")
+        metrics.increment("engine.prefix_cache.tokens_saved", len(snapshot.tokens))
+
+    def _maybe_snapshot(self, sequence: _Sequence):
+        """Grava o KV do prefixo estático assim que o prefill chega ao fim dele"""
+        if self.prefix_cache is None or sequence.adapter is not None \
+                or not sequence.prefix_len or sequence.prefill_pos != sequence.prefix_len:
+            return
+        prefix = sequence.prompt[:sequence.prefix_len]
+        if self.prefix_cache.contains(prefix):
+            return
+        try:
+            state = self.backend.save_seq_state(sequence.seq_id)
+        except Exception as exc:
+            print(f"⚠️  [SCHED] Falha ao salvar prefixo: {exc}")
+            return
+        if self.prefix_cache.store(prefix, state, label=sequence.prefix_label):
+            metrics.increment("engine.prefix_cache.stored")
+
+    def _step(self) -> bool:
+        """Monta e decodifica um batch intercalando decode e prefill (False se nada a fazer)"""
+        cancelled = [s for s in self._active.values() if self._is_cancelled(s)]
+        if cancelled:
+            with self._cv:
+                for sequence in cancelled:
+                    self._cancel(sequence)
+                    self._release(sequence)
+
+        items: List[BatchItem] = []
+        owners: List[_Sequence] = []
+        budget = self.backend.batch_size
+
+        for sequence in self._active.values():
+            if self.max_backlog and sequence.handle.pending > self.max_backlog:
+                continue  # backpressure: cliente não está consumindo
+            if sequence.prefilled and budget > 0:
+                draft = self._propose(sequence, budget - 1)
+                tokens = [sequence.last_token] + draft
+                items.append(BatchItem(sequence.seq_id, tokens, sequence.n_past, True, all_logits=bool(draft)))
+                owners.append(sequence)
+                budget -= len(tokens)
+
+        for sequence in self._active.values():
+            if sequence.prefilled or budget <= 0:
+                continue
+            take = min(budget, self.prefill_chunk, len(sequence.prompt) - sequence.prefill_pos)
+            if self.prefix_cache is not None and sequence.prefill_pos < sequence.prefix_len:
+                # Não atravessar o fim do prefixo estático: o snapshot precisa dele exato
+                take = min(take, sequence.prefix_len - sequence.prefill_pos)
+            chunk = sequence.prompt[sequence.prefill_pos:sequence.prefill_pos + take]
+            is_last = sequence.prefill_pos + take >= len(sequence.prompt)
+            items.append(BatchItem(sequence.seq_id, chunk, sequence.n_past, is_last))
+            owners.append(sequence)
+            budget -= take
+
+        if not items:
+            return False
+
+        try:
+            logits_list = self.backend.decode(items)
+        except Exception as exc:
+            print(f"❌ [SCHED] Falha no decode: {exc}")
+            with self._cv:
+                for sequence in list(self._active.values()):
+                    self._release(sequence)
+                    self._finish(sequence, "error", str(exc))
+            return True
+
+        self._steps += 1
+        metrics.histogram("engine.batch_tokens", float(sum(len(item.tokens) for item in items)))
+
+        for item, sequence, logits in zip(items, owners, logits_list):
+            if item.all_logits:
+                self._verify(sequence, item, logits)
+                continue
+            sequence.n_past += len(item.tokens)
+            if not sequence.prefilled:
+                sequence.prefill_pos += len(item.tokens)
+                self._maybe_snapshot(sequence)
+            if logits is not None:
+                self._on_logits(sequence, logits)
+
+        finished = [s for s in self._active.values() if s.handle.finish_reason]
+        if finished:
+            with self._cv:
+                for sequence in finished:
+                    self._release(sequence)
+        return True
+
+    def _propose(self, sequence: _Sequence, budget: int) -> List[int]:
+        """Tokens especulativos para o próximo decode ([] = decode normal)"""
+        drafter = self.drafters.get(sequence.params.speculative) if sequence.params.speculative else None
+        if drafter is None or budget <= 0:
+            return []
+        if not sequence.spec_k:
+            sequence.spec_k = self.spec_k
+
+        k = min(sequence.spec_k, budget, self.backend.slot_ctx - sequence.n_past - 2)
+        max_tokens = sequence.params.max_tokens
+        if max_tokens:
+            k = min(k, max_tokens - sequence.handle.completion_tokens - 1)
+        if k <= 0:
+            return []
+        try:
+            return list(drafter.propose(sequence.seq_id, sequence.prompt + sequence.generated, k))[:k]
+        except Exception as exc:
+            print(f"⚠️  [SCHED] Drafter '{sequence.params.speculative}' falhou, seguindo sem especulação: {exc}")
+            sequence.params.speculative = None
+            return []
+
+    def _verify(self, sequence: _Sequence, item: BatchItem, logits: np.ndarray):
+        """
+        Aceita o maior prefixo do draft que coincide com a amostragem do modelo
+        principal; o primeiro token divergente vira a correção (ou bônus).
+        """
+        draft = item.tokens[1:]
+        accepted = 0
+        for i, row in enumerate(logits):
+            sequence.n_past = item.pos + i + 1  # tokens[0..i] válidos no KV
+            token = self._on_logits(sequence, row)
+            if sequence.handle.finish_reason or i >= len(draft) or token != draft[i]:
+                break
+            accepted += 1
+
+        if not sequence.handle.finish_reason:
+            self.backend.truncate(sequence.seq_id, sequence.n_past)
+
+        # k adaptativo: cresce enquanto tudo é aceito, encolhe quando a maioria é rejeitada
+        if accepted == len(draft):
+            sequence.spec_k = min(sequence.spec_k + 1, self.spec_k_max)
+        elif accepted * 2 < len(draft):
+            sequence.spec_k = max(1, sequence.spec_k - 1)
+
+        label = sequence.prefix_label or "default"
+        counts = self._spec_stats.setdefault(label, {"proposed": 0, "accepted": 0})
+        counts["proposed"] += len(draft)
+        counts["accepted"] += accepted
+        tags = {"expert": label, "drafter": sequence.params.speculative or ""}
+        metrics.increment("engine.spec.proposed", len(draft), tags=tags)
+        metrics.increment("engine.spec.accepted", accepted, tags=tags)
+
+    def _on_logits(self, sequence: _Sequence, logits: np.ndarray) -> int:
+        """Amostra o próximo token, emite texto e decide se a sequência terminou"""
+        params = sequence.params
+        recent = sequence.prompt[-REPEAT_WINDOW:] + sequence.generated
+        token = sample_token(logits, params, sequence.rng, recent)
+        if sequence.grammar is not None:
+            if not sequence.grammar.allows(token):
+                # Caminho raro: reamostra só entre os tokens que a gramática aceita
+                token = sample_token(sequence.grammar.mask(logits), params, sequence.rng, recent)
+                metrics.increment("engine.grammar.resampled")
+            if not self.backend.is_eog(token):
+                sequence.grammar.accept(token)
+        handle = sequence.handle
+        if params.logprobs:
+            peak = float(np.max(logits))
+            handle.logprob_sum += float(logits[token]) - peak - float(np.log(np.sum(np.exp(logits - peak))))
+            handle.scored_tokens += 1
+
+        if handle.first_token_at is None:
+            handle.first_token_at = time.time()
+            metrics.histogram("engine.ttft", handle.first_token_at - handle.submitted_at)
+
+        if self.backend.is_eog(token):
+            self._emit(sequence, sequence.decoder.decode(b"", final=True), final=True)
+            self._finish(sequence, "stop")
+            return token
+
+        sequence.generated.append(token)
+        sequence.last_token = token
+        handle.completion_tokens += 1
+        self._tokens_generated += 1
+
+        piece = sequence.decoder.decode(self.backend.token_bytes(token))
+        if sequence.call_detector is not None:
+            end = sequence.call_detector.feed(piece)
+            if end is not None:
+                # Objeto da chamada fechou: nada útil vem depois dele
+                self._emit(sequence, piece[:end] + sequence.decoder.decode(b"", final=True), final=True)
+                self._finish(sequence, "tool_calls")
+                return token
+
+        if self._emit(sequence, piece):
+            self._finish(sequence, "stop")
+            return token
+
+        max_tokens = params.max_tokens
+        if (max_tokens is not None and max_tokens > 0 and handle.completion_tokens >= max_tokens) \
+                or sequence.n_past + 1 >= self.backend.slot_ctx:
+            self._emit(sequence, sequence.decoder.decode(b"", final=True), final=True)
+            self._finish(sequence, "length")
+        return token
+
+    def _emit(self, sequence: _Sequence, piece: str, final: bool = False) -> bool:
+        """
+        Acumula texto e entrega o que é seguro (sem prefixo de stop pendente).
+        Retorna True se uma stop string foi encontrada.
+        """
+        sequence.text += piece
+        stops = sequence.params.stop
+        longest_stop = max((len(s) for s in stops), default=0)
+
+        if stops:
+            search_from = max(0, sequence.emitted - longest_stop + 1)
+            hits = [i for i in (sequence.text.find(s, search_from) for s in stops) if i >= 0]
+            if hits:
+                cut = min(hits)
+                sequence.text = sequence.text[:cut]
+                self._deliver(sequence, len(sequence.text))
+                return True
+
+        safe_end = len(sequence.text)
+        if stops and not final:
+            for stop in stops:
+                for k in range(min(len(stop) - 1, len(sequence.text)), 0, -1):
+                    if sequence.text.endswith(stop[:k]):
+                        safe_end = min(safe_end, len(sequence.text) - k)
+                        break
+
+        self._deliver(sequence, safe_end)
+        return False
+
+    def _deliver(self, sequence: _Sequence, end: int):
+        if end > sequence.emitted:
+            sequence.handle._put(GenerationEvent(text=sequence.text[sequence.emitted:end]))
+            sequence.emitted = end
+
+    @staticmethod
+    def _is_cancelled(sequence: _Sequence) -> bool:
+        return sequence.cancel_token is not None and sequence.cancel_token.cancelled
+
+    def _cancel(self, sequence: _Sequence):
+        """Encerra uma sequência cancelada contabilizando o decode evitado"""
+        reason = sequence.cancel_token.reason or "cancelled"
+        max_tokens = sequence.params.max_tokens
+        if max_tokens is not None and max_tokens > 0:
+            saved = max(0, max_tokens - sequence.handle.completion_tokens)
+        else:
+            saved = max(0, self.backend.slot_ctx - max(sequence.n_past, len(sequence.prompt)))
+        metrics.increment("engine.cancelled", tags={"reason": reason})
+        metrics.increment("engine.cancelled_tokens_saved", saved)
+        self._finish(sequence, "timeout" if reason == "timeout" else "cancelled", reason)
+
+    def _finish(self, sequence: _Sequence, reason: str, error: Optional[str] = None):
+        if sequence.handle.finish_reason:
+            return
+        sequence.handle._put(GenerationEvent(finish_reason=reason, error=error))
+        metrics.increment("engine.requests_completed", tags={"finish_reason": reason})
+        metrics.histogram("engine.total_time", time.time() - sequence.handle.submitted_at)
+
+    def _release(self, sequence: _Sequence):
+        """Libera o slot da sequência (chamado com lock)"""
+        if sequence.grammar is not None:
+            sequence.grammar.free()
+            sequence.grammar = None
+        if sequence.seq_id in self._active:
+            del self._active[sequence.seq_id]
+            try:
+                self.backend.release(sequence.seq_id)
+                for drafter in self.drafters.values():
+                    drafter.release(sequence.seq_id)
+            except Exception as exc:
+                print(f"⚠️  [SCHED] Falha ao liberar slot {sequence.seq_id}: {exc}")
+            self._free_slots.append(sequence.seq_id)
+            sequence.seq_id = -1
+
+    def _fail_all(self, reason: str, pending: Optional[List[tuple]] = None):
+        """Encerra com erro tudo o que está ativo ou na fila e devolve os slots (chamado com lock)"""
+        for sequence in list(self._active.values()):
+            self._release(sequence)
+            self._finish(sequence, "error", reason)
+        while self._waiting:
+            self._finish(self._waiting.popleft(), "error", reason)
+        jobs = list(pending or []) + list(self._exclusive)
+        self._exclusive.clear()
+        for future, *_ in jobs:
+            if future.done():
+                continue
+            if future.running() or future.set_running_or_notify_cancel():
+                future.set_exception(RuntimeError(reason))
+
+
+# Singleton global
+_scheduler: Optional[BatchScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> BatchScheduler:
+    """Retorna o scheduler global, criando o backend Llama.cpp na primeira chamada"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            from model_registry import get_model_and_tokenizer
+            from optimization.kv_cache import kv_cache_manager
+
+            settings = get_settings()
+            llm, _ = get_model_and_tokenizer()
+            if settings.engine_backend == "fake":
+                from engine.fake_backend import create_fake_backend
+                backend = create_fake_backend(settings.engine_parallel_slots, settings.engine_slot_ctx,
+                                              settings.engine_batch_size)
+            else:
+                from engine.llama_batch import LlamaBatchBackend
+                backend = LlamaBatchBackend(
+                    llm,
+                    n_slots=settings.engine_parallel_slots,
+                    slot_ctx=settings.engine_slot_ctx,
+                    batch_size=settings.engine_batch_size,
+                )
+                if settings.kv_snapshot_persist:
+                    _attach_snapshot_store(backend, kv_cache_manager)
+            _scheduler = BatchScheduler(
+                backend,
+                prefill_chunk=settings.engine_prefill_chunk,
+                prefix_cache=kv_cache_manager,
+                drafters=_build_drafters(backend),
+                spec_k=settings.engine_spec_k,
+                spec_k_max=settings.engine_spec_k_max,
+                max_backlog=settings.engine_stream_backlog,
+                lora_max_wait=settings.lora_max_wait_s,
+            )
+            print(f"✅ [SCHED] Continuous batching: {backend.n_slots} slots x {backend.slot_ctx} tokens")
+        return _scheduler
+
+
+def _build_drafters(backend: BatchBackend) -> Dict[str, Any]:
+    """Drafters disponíveis para decodificação especulativa"""
+    settings = get_settings()
+    drafters: Dict[str, Any] = {}
+    if settings.engine_draft_model:
+        from llama_cpp import Llama
+        from engine.llama_batch import LlamaBatchBackend
+        from engine.speculative import DraftModelDrafter
+        from infrastructure.config.paths import get_draft_model_path
+
+        draft_path = get_draft_model_path()
+        try:
+            draft_llm = Llama(model_path=str(draft_path), n_ctx=512, n_gpu_layers=-1,
+                              n_threads=settings.engine_threads, verbose=False)
+            if draft_llm.n_vocab() != getattr(backend, "n_vocab", draft_llm.n_vocab()):
+                raise ValueError(f"vocabulário {draft_llm.n_vocab()} != {backend.n_vocab} do modelo principal")
+            draft_backend = LlamaBatchBackend(draft_llm, backend.n_slots, backend.slot_ctx, backend.batch_size)
+            drafters["draft"] = DraftModelDrafter(draft_backend)
+            print(f"✅ [SCHED] Speculative decoding com draft model: {draft_path.name}")
+        except Exception as exc:
+            print(f"⚠️  [SCHED] Draft model desativado ({draft_path}): {exc}")
+
+    from engine.speculative import PromptLookupDrafter
+    # Sem custo de memória; usa o draft model (se houver) quando não acha n-grama
+    drafters["lookup"] = PromptLookupDrafter(max_ngram=settings.engine_lookup_ngram, fallback=drafters.get("draft"))
+    return drafters
+
+
+def _attach_snapshot_store(backend: BatchBackend, cache: KVCacheManager):
+    """Liga a persistência em disco dos prefixos (falha aqui não impede o engine de subir)"""
+    from model_registry import LOCAL_MODEL_PATH
+    from infrastructure.config.paths import get_kv_snapshot_path
+    from optimization.kv_store import KVSnapshotStore
+
+    settings = get_settings()
+    try:
+        store = KVSnapshotStore(
+            get_kv_snapshot_path(),
+            LOCAL_MODEL_PATH,
+            n_ctx=backend.n_slots * backend.slot_ctx,
+            max_bytes=settings.kv_snapshot_max_bytes,
+        )
+        # Só apaga diretórios de outros modelos que nenhum processo da raiz está usando
+        store.prune_foreign_namespaces()
+        cache.attach_store(store)
+    except Exception as exc:
+        print(f"⚠️  [SCHED] Snapshots em disco desativados: {exc}")
+
+
+def shutdown_scheduler():
+    """Encerra o scheduler global (se existir)"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is not None:
+            _scheduler.shutdown()
+            _scheduler = None
@@ -0,0 +1,133 @@
+"""
+Speculative Decoding
+Drafters que propõem k tokens para o modelo principal verificar em um único
+decode (BatchItem.all_logits). A verificação fica no scheduler: cada token
+proposto é aceito enquanto coincidir com o que o modelo principal amostraria,
+então a saída tem exatamente a distribuição do modelo principal.
+
+Baseado em "Fast Inference from Transformers via Speculative Decoding" (Leviathan et al.)
+"""
+from typing import Dict, List, Optional, Protocol
+
+import numpy as np
+
+from engine.scheduler import BatchBackend, BatchItem
+
+
+class Drafter(Protocol):
+    """Fonte de tokens especulativos para uma sequência"""
+
+    def propose(self, seq_id: int, context: List[int], k: int) -> List[int]:
+        """Até k tokens prováveis após `context` (prompt + gerados)"""
+        ...
+
+    def release(self, seq_id: int) -> None:
+        """A sequência terminou: descarta estado associado ao slot"""
+        ...
+
+
+def _common_prefix(a: List[int], b: List[int]) -> int:
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i] == b[i]:
+        i += 1
+    return i
+
+
+class DraftModelDrafter:
+    """
+    Drafter com um modelo pequeno (ex.: Qwen2.5-0.5B GGUF, mesmo vocabulário).
+    Mantém um KV por slot no backend do draft e só decodifica o que mudou desde
+    a última proposta; tokens rejeitados são truncados do KV.
+    """
+
+    def __init__(self, backend: BatchBackend):
+        self.backend = backend
+        self._tokens: Dict[int, List[int]] = {}  # tokens presentes no KV do draft por slot
+
+    def propose(self, seq_id: int, context: List[int], k: int) -> List[int]:
+        if k <= 0 or len(context) + k >= self.backend.slot_ctx:
+            return []
+
+        cached = self._tokens.get(seq_id, [])
+        # Sempre re-decodificar ao menos o último token para obter logits
+        keep = min(_common_prefix(cached, context), len(context) - 1)
+        if keep < len(cached):
+            self.backend.truncate(seq_id, keep)
+
+        pos = keep
+        pending = context[keep:]
+        logits = None
+        while pending:
+            chunk, pending = pending[:self.backend.batch_size], pending[self.backend.batch_size:]
+            logits = self.backend.decode([BatchItem(seq_id, chunk, pos, not pending)])[0]
+            pos += len(chunk)
+        cached = list(context)
+
+        draft: List[int] = []
+        while len(draft) < k:
+            token = int(np.argmax(logits))
+            if self.backend.is_eog(token):
+                break
+            draft.append(token)
+            if len(draft) == k:
+                break
+            logits = self.backend.decode([BatchItem(seq_id, [token], pos, True)])[0]
+            cached.append(token)
+            pos += 1
+
+        self._tokens[seq_id] = cached
+        return draft
+
+    def release(self, seq_id: int) -> None:
+        if self._tokens.pop(seq_id, None) is not None:
+            self.backend.release(seq_id)
+
+
+class PromptLookupDrafter:
+    """
+    Drafter sem modelo: procura o n-grama final do contexto em posições
+    anteriores (prompt, contexto do RAG, texto já gerado) e propõe os tokens
+    que o seguiram. Ideal para pedidos de reescrita/refatoração, em que a
+    resposta copia trechos longos do arquivo colado.
+
+    Opcionalmente delega a outro drafter (ex.: draft model) quando não há match.
+    """
+
+    def __init__(self, max_ngram: int = 3, min_ngram: int = 1, fallback: Optional[Drafter] = None):
+        self.max_ngram = max(1, max_ngram)
+        self.min_ngram = max(1, min(min_ngram, self.max_ngram))
+        self.fallback = fallback
+        self._cursor: Dict[int, int] = {}  # onde a última cópia parou, por slot
+
+    def propose(self, seq_id: int, context: List[int], k: int) -> List[int]:
+        draft = self._lookup(seq_id, context, k) if k > 0 else []
+        if not draft and self.fallback is not None:
+            return self.fallback.propose(seq_id, context, k)
+        return draft
+
+    def _lookup(self, seq_id: int, context: List[int], k: int) -> List[int]:
+        tokens = np.asarray(context, dtype=np.int64)
+        for n in range(min(self.max_ngram, len(tokens) - 1), self.min_ngram - 1, -1):
+            # Janelas que terminam antes do último token (o próprio n-grama final fica de fora)
+            windows = np.lib.stride_tricks.sliding_window_view(tokens[:-1], n)
+            starts = np.flatnonzero((windows == tokens[-n:]).all(axis=1))
+            if starts.size == 0:
+                continue
+
+            # Prefere continuar de onde a cópia anterior parou (arquivos têm linhas repetidas)
+            cursor = self._cursor.get(seq_id, 0)
+            ahead = starts[starts + n >= cursor]
+            start = int(ahead[0]) if ahead.size else int(starts[-1])
+
+            follow = start + n
+            draft = tokens[follow:follow + k].tolist()
+            if draft:
+                self._cursor[seq_id] = follow
+                return draft
+        return []
+
+    def release(self, seq_id: int) -> None:
+        self._cursor.pop(seq_id, None)
+        if self.fallback is not None:
+            self.fallback.release(seq_id)
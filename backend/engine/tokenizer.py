@@ -0,0 +1,139 @@
+"""
+Engine Tokenizer
+Tokenizer do engine sobre o vocabulário do próprio GGUF.
+
+O llama.cpp já carrega o vocabulário e o chat template (metadata
+tokenizer.chat_template) junto com o modelo, então não há motivo para
+importar transformers nem manter o diretório HF do modelo em disco só para
+aplicar o template. A interface segue o que o código já usava do HF
+(apply_chat_template), mais tokenize/detokenize/count com cache LRU de ids
+por hash de segmento (o mesmo TokenCounter do orçamento de prompt).
+
+O tokenizer HF continua disponível com TOKENIZER_BACKEND=hf (só o chat
+template vem dele; os ids são sempre do vocabulário do GGUF).
+"""
+import threading
+from typing import Any, Dict, List, Optional, Union
+
+from core.services.inference.token_budget import TokenCounter
+from infrastructure.config.settings import get_settings
+
+# ChatML (Qwen) para GGUFs sem tokenizer.chat_template na metadata
+DEFAULT_CHAT_TEMPLATE = (
+    "{% for message in messages %}"
+    "{{ '<|im_start|>' + message['role'] + '\n' + message['content'] + '<|im_end|>' + '\n' }}"
+    "{% endfor %}"
+    "{% if add_generation_prompt %}{{ '<|im_start|>assistant\n' }}{% endif %}"
+)
+
+
+class GGUFTokenizer:
+    """Tokenize/detokenize/count/chat template com o vocabulário do GGUF"""
+
+    def __init__(self, llm, cache_size: int = 4096):
+        from llama_cpp.llama_chat_format import Jinja2ChatFormatter
+
+        self.llm = llm
+        self.counter = TokenCounter(self._tokenize, llm.detokenize, cache_size=cache_size)
+        self.eos_token_id = llm.token_eos()
+        self.bos_token_id = llm.token_bos()
+        self.eos_token = self._piece(self.eos_token_id)
+        self.bos_token = self._piece(self.bos_token_id)
+
+        template = llm.metadata.get("tokenizer.chat_template") or DEFAULT_CHAT_TEMPLATE
+        self._formatters = {
+            add: Jinja2ChatFormatter(template, self.eos_token, self.bos_token, add_generation_prompt=add)
+            for add in (True, False)
+        }
+
+    def _piece(self, token_id: int) -> str:
+        if token_id < 0:
+            return ""
+        return self.llm.detokenize([token_id], special=True).decode("utf-8", errors="ignore")
+
+    def _tokenize(self, data: bytes) -> List[int]:
+        return self.llm.tokenize(data, add_bos=False, special=True)
+
+    def tokenize(self, text: str, cache: bool = True) -> List[int]:
+        """
+        Ids do texto (sem BOS, tokens especiais reconhecidos).
+        cache=False para textos que não se repetem (prompt completo da requisição)
+        """
+        if not cache:
+            return self._tokenize(text.encode("utf-8"))
+        return list(self.counter.tokenize(text))
+
+    def detokenize(self, ids: List[int]) -> str:
+        return self.llm.detokenize(list(ids), special=True).decode("utf-8", errors="ignore")
+
+    def count(self, text: str) -> int:
+        return self.counter.count(text)
+
+    def render_chat(self, messages: List[Dict[str, Any]], add_generation_prompt: bool = True) -> str:
+        return self._formatters[add_generation_prompt](messages=messages).prompt
+
+    def apply_chat_template(
+        self,
+        messages: List[Dict[str, Any]],
+        tokenize: bool = False,
+        add_generation_prompt: bool = True
+    ) -> Union[str, List[int]]:
+        """Mesma assinatura do tokenizer HF"""
+        prompt = self.render_chat(messages, add_generation_prompt)
+        return self.tokenize(prompt) if tokenize else prompt
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.counter.hits + self.counter.misses
+        return {
+            "backend": type(self).__name__,
+            "cached_segments": len(self.counter._cache),
+            "cache_hit_rate": round(self.counter.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+class HFTemplateTokenizer(GGUFTokenizer):
+    """Chat template do tokenizer HF (TOKENIZER_BACKEND=hf); ids continuam do GGUF"""
+
+    def __init__(self, llm, hf_path: str, cache_size: int = 4096):
+        from transformers import AutoTokenizer
+
+        super().__init__(llm, cache_size=cache_size)
+        print(f"📂 Carregando tokenizer HF de {hf_path}...")
+        self.hf = AutoTokenizer.from_pretrained(hf_path)
+
+    def render_chat(self, messages: List[Dict[str, Any]], add_generation_prompt: bool = True) -> str:
+        return self.hf.apply_chat_template(messages, tokenize=False, add_generation_prompt=add_generation_prompt)
+
+
+def create_tokenizer(llm) -> GGUFTokenizer:
+    """Tokenizer para um motor já carregado, conforme settings.tokenizer_backend"""
+    settings = get_settings()
+    if settings.tokenizer_backend == "hf":
+        from infrastructure.config.paths import get_model_path
+
+        return HFTemplateTokenizer(llm, str(get_model_path()), cache_size=settings.prompt_token_cache_size)
+    return GGUFTokenizer(llm, cache_size=settings.prompt_token_cache_size)
+
+
+_vocab_tokenizer: Optional[GGUFTokenizer] = None
+_vocab_lock = threading.Lock()
+
+
+def get_tokenizer() -> GGUFTokenizer:
+    """
+    Tokenizer do engine. Com o modelo já em memória usa o próprio motor; senão
+    (worker HTTP com ENGINE_MODE=remote, CLI) carrega só o vocabulário do GGUF.
+    """
+    global _vocab_tokenizer
+    import model_registry
+
+    if model_registry.is_model_loaded():
+        return model_registry.get_model_and_tokenizer()[1]
+
+    with _vocab_lock:
+        if _vocab_tokenizer is None:
+            from llama_cpp import Llama
+
+            vocab = Llama(model_path=str(model_registry.LOCAL_MODEL_PATH), vocab_only=True, verbose=False)
+            _vocab_tokenizer = create_tokenizer(vocab)
+        return _vocab_tokenizer
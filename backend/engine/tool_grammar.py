@@ -0,0 +1,241 @@
+"""
+Tool-Call Grammar
+Gramática GBNF compilada dos JSON schemas das ferramentas (tools_config).
+
+Com a gramática ativa o modelo só consegue emitir:
+- uma chamada de ferramenta válida: {"name": "<ferramenta>", "parameters": {...}}
+  com os parâmetros obrigatórios do schema, tipos e enums respeitados; ou
+- texto livre (qualquer resposta que não comece com "{")
+
+Assim não existe mais "JSON quase certo" para procurar e reparsear. A
+gramática é cacheada por conjunto de ferramentas (hash dos schemas), e o
+ToolCallDetector encerra a geração assim que o objeto da chamada fecha, sem
+esperar o modelo emitir EOS.
+"""
+import hashlib
+import json
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+# Primitivas JSON (mesmas regras do json.gbnf do llama.cpp, espaço limitado)
+_PRIMITIVES = r'''ws ::= | " " | "\n" [ \t]{0,20}
+string ::= "\"" char* "\""
+char ::= [^"\\\x7F\x00-\x1F] | "\\" (["\\bfnrt/] | "u" [0-9a-fA-F]{4})
+integer ::= "-"? ([0-9] | [1-9] [0-9]{0,15})
+number ::= integer ("." [0-9]+)? ([eE] [-+]? [0-9]+)?
+boolean ::= "true" | "false"
+null ::= "null"
+value ::= object | array | string | number | boolean | null
+object ::= "{" ws ( string ws ":" ws value ws ( "," ws string ws ":" ws value ws )* )? "}"
+array ::= "[" ws ( value ws ( "," ws value ws )* )? "]"
+text ::= [^{ \t\n] [^\x00]*'''
+
+_SCALARS = {"string": "string", "integer": "integer", "number": "number", "boolean": "boolean", "null": "null"}
+
+
+def _literal(text: str) -> str:
+    """Literal GBNF que casa exatamente com text"""
+    escaped = text.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return f'"{escaped}"'
+
+
+def _json_literal(value: Any) -> str:
+    return _literal(json.dumps(value, ensure_ascii=False))
+
+
+class _GrammarBuilder:
+    """Traduz JSON schemas em regras GBNF (nomes únicos por caminho no schema)"""
+
+    def __init__(self):
+        self.rules: "OrderedDict[str, str]" = OrderedDict()
+
+    def _rule_name(self, hint: str) -> str:
+        base = re.sub(r"[^a-zA-Z0-9]+", "-", hint).strip("-").lower() or "rule"
+        name, n = base, 1
+        while name in self.rules:
+            n += 1
+            name = f"{base}-{n}"
+        return name
+
+    def add(self, hint: str, body: str) -> str:
+        name = self._rule_name(hint)
+        self.rules[name] = body
+        return name
+
+    def schema(self, schema: Dict[str, Any], hint: str) -> str:
+        """Expressão GBNF para um valor que obedece ao schema"""
+        if "enum" in schema:
+            return "(" + " | ".join(_json_literal(v) for v in schema["enum"]) + ")"
+        kind = schema.get("type")
+        if isinstance(kind, list):
+            return "(" + " | ".join(self.schema({**schema, "type": k}, hint) for k in kind) + ")"
+        if kind in _SCALARS:
+            return _SCALARS[kind]
+        if kind == "array":
+            items = schema.get("items")
+            item = self.schema(items, f"{hint}-item") if items else "value"
+            return self.add(hint, f'"[" ws ( {item} ws ( "," ws {item} ws )* )? "]"')
+        if kind == "object" and schema.get("properties"):
+            return self.add(hint, self.object_body(schema, hint))
+        return "object" if kind == "object" else "value"
+
+    def object_body(self, schema: Dict[str, Any], hint: str) -> str:
+        """
+        Propriedades obrigatórias na ordem do schema, depois opcionais em
+        qualquer ordem (o llama.cpp faz o mesmo com additionalProperties=false)
+        """
+        properties: Dict[str, Any] = schema.get("properties") or {}
+        required = [k for k in properties if k in set(schema.get("required") or ())]
+        optional = [k for k in properties if k not in required]
+
+        def pair(key: str) -> str:
+            return f'{_json_literal(key)} ws ":" ws {self.schema(properties[key], f"{hint}-{key}")} ws'
+
+        parts = [pair(k) for k in required]
+        body = ' "," ws '.join(parts)
+        if optional:
+            any_optional = self.add(f"{hint}-opt", " | ".join(pair(k) for k in optional))
+            if body:
+                body += f' ( "," ws {any_optional} )*'
+            else:
+                body = f'( {any_optional} ( "," ws {any_optional} )* )?'
+        return f'"{{" ws {body} "}}"'
+
+    def render(self, root: str) -> str:
+        lines = [f"root ::= {root}"]
+        lines += [f"{name} ::= {body}" for name, body in self.rules.items()]
+        return "\n".join(lines) + "\n" + _PRIMITIVES + "\n"
+
+
+def tools_to_gbnf(tools: List[Dict[str, Any]], allow_text: bool = True) -> str:
+    """
+    GBNF que aceita uma chamada {"name", "parameters"} de qualquer ferramenta da
+    lista (ou texto livre, se allow_text)
+    """
+    builder = _GrammarBuilder()
+    calls = []
+    for tool in tools:
+        name = tool["name"]
+        params = tool.get("parameters") or {"type": "object"}
+        params_expr = builder.schema(params, f"{name}-params") if params.get("properties") else "object"
+        calls.append(builder.add(
+            f"call-{name}",
+            f'"{{" ws {_json_literal("name")} ws ":" ws {_json_literal(name)} ws "," ws '
+            f'{_json_literal("parameters")} ws ":" ws {params_expr} ws "}}"'
+        ))
+    root = "( " + " | ".join(calls) + " )" if calls else "object"
+    if allow_text:
+        root = f"{root} | text"
+    return builder.render(root)
+
+
+@dataclass(frozen=True)
+class ToolGrammar:
+    """Gramática compilada de um conjunto de ferramentas"""
+    key: str
+    gbnf: str
+    tool_names: Tuple[str, ...]
+
+    def parse(self, text: str) -> Optional[Dict[str, Any]]:
+        """Chamada {"name", "parameters"} se text for uma chamada válida, senão None"""
+        return parse_tool_call(text, self.tool_names)
+
+
+def tools_key(tools: List[Dict[str, Any]]) -> str:
+    """Hash estável dos schemas (ordem das ferramentas importa para a gramática)"""
+    payload = json.dumps(
+        [{"name": t.get("name"), "parameters": t.get("parameters")} for t in tools],
+        sort_keys=True, ensure_ascii=False,
+    )
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+_grammars: "OrderedDict[str, ToolGrammar]" = OrderedDict()
+_grammars_lock = threading.Lock()
+_MAX_GRAMMARS = 32
+
+
+def get_tool_grammar(tools: List[Dict[str, Any]]) -> ToolGrammar:
+    """Gramática do conjunto de ferramentas, compilada uma vez e reaproveitada"""
+    key = tools_key(tools)
+    with _grammars_lock:
+        grammar = _grammars.get(key)
+        if grammar is not None:
+            _grammars.move_to_end(key)
+            return grammar
+
+    grammar = ToolGrammar(key, tools_to_gbnf(tools), tuple(t["name"] for t in tools))
+    with _grammars_lock:
+        _grammars[key] = grammar
+        while len(_grammars) > _MAX_GRAMMARS:
+            _grammars.popitem(last=False)
+    return grammar
+
+
+def parse_tool_call(text: str, tool_names: Optional[Tuple[str, ...]] = None) -> Optional[Dict[str, Any]]:
+    """Interpreta a saída como chamada de ferramenta (None = resposta em texto)"""
+    text = text.strip()
+    if not text.startswith("{"):
+        return None
+    try:
+        call = json.loads(text)
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(call, dict) or not isinstance(call.get("name"), str):
+        return None
+    if tool_names is not None and call["name"] not in tool_names:
+        return None
+    parameters = call.get("parameters")
+    return {"name": call["name"], "parameters": parameters if isinstance(parameters, dict) else {}}
+
+
+class ToolCallDetector:
+    """
+    Acompanha o texto gerado e detecta o fechamento do objeto da chamada
+    (profundidade de chaves fora de strings). Texto que não começa com "{"
+    nunca dispara.
+    """
+
+    def __init__(self):
+        self.mode: Optional[str] = None  # None (só espaços até agora) | "call" | "text"
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.closed = False
+
+    def feed(self, piece: str) -> Optional[int]:
+        """
+        Consome um pedaço de texto.
+        Returns: quantos caracteres do pedaço vão até a chave que fecha a chamada
+                 (inclusive), ou None se a chamada ainda não fechou
+        """
+        if self.closed or self.mode == "text":
+            return None
+        for i, char in enumerate(piece):
+            if self.mode is None:
+                if char.isspace():
+                    continue
+                if char != "{":
+                    self.mode = "text"
+                    return None
+                self.mode = "call"
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char == "{":
+                self.depth += 1
+            elif char == "}":
+                self.depth -= 1
+                if self.depth == 0:
+                    self.closed = True
+                    return i + 1
+        return None
@@ -0,0 +1,139 @@
+"""
+Engine Warm-up
+Carregamento do motor em background e aquecimento antes de aceitar tráfego.
+
+    idle → loading → warming → ready
+                 ↘ failed
+
+O processo sobe sem o modelo (import barato); o lifespan da API chama
+start() e o carregamento roda numa thread. O warm-up faz uma geração curta
+por persona de expert: compila os kernels, aloca os buffers do batch e deixa
+o snapshot de KV do prefixo estático de cada expert pronto no cache, então a
+primeira requisição real não paga nada disso. /health/ready só responde 200
+depois do warm-up.
+"""
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from infrastructure.config.settings import get_settings
+from utils.metrics import metrics
+
+WARMUP_MESSAGE = "ok"
+
+
+class EngineLifecycle:
+    """Estado do motor no processo (thread-safe)"""
+
+    IDLE = "idle"
+    LOADING = "loading"
+    WARMING = "warming"
+    READY = "ready"
+    FAILED = "failed"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+        self.state = self.IDLE
+        self.error: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self.ready_at: Optional[float] = None
+        self.warmed: Dict[str, float] = {}
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def start(self) -> threading.Thread:
+        """Dispara load + warm-up em background (idempotente)"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self.run, name="engine-warmup", daemon=True)
+                self._thread.start()
+            return self._thread
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        return self._ready.wait(timeout)
+
+    def run(self):
+        """Carrega o modelo, cria o scheduler e aquece cada expert (bloqueante)"""
+        settings = get_settings()
+        self.started_at = time.time()
+        try:
+            self.state = self.LOADING
+            from engine.scheduler import get_scheduler
+
+            from engine.cascade import get_cascade
+
+            get_scheduler()
+            get_cascade()  # modelo pequeno da cascata (se configurado)
+            metrics.histogram("engine.load_seconds", time.time() - self.started_at)
+
+            if settings.engine_warmup:
+                self.state = self.WARMING
+                self.warm_up(settings.engine_warmup_max_tokens)
+        except Exception as exc:
+            self.state = self.FAILED
+            self.error = str(exc)
+            print(f"❌ [ENGINE] Falha ao carregar o motor: {exc}")
+            return
+
+        self.ready_at = time.time()
+        self.state = self.READY
+        self._ready.set()
+        metrics.histogram("engine.startup_seconds", self.ready_at - self.started_at)
+        print(f"✅ [ENGINE] Pronto em {self.ready_at - self.started_at:.1f}s ({len(self.warmed)} experts aquecidos)")
+
+    def warm_up(self, max_tokens: int = 1, expert_ids: Optional[List[str]] = None):
+        """Uma geração curta por persona; falha de um expert não bloqueia a prontidão"""
+        import inference
+        from expert_registry import list_experts
+        from prompt_builder import build_messages
+        from tools_config import AVAILABLE_TOOLS
+
+        for expert_id in expert_ids or [e["expert_id"] for e in list_experts()]:
+            start = time.time()
+            try:
+                messages = build_messages(
+                    base_system=inference.SYSTEM_PROMPT,
+                    core_identity=inference.CORE_IDENTITY,
+                    rag_message=None,
+                    expert_id=expert_id,
+                    history=[],
+                    user_message=WARMUP_MESSAGE,
+                    tools=AVAILABLE_TOOLS,
+                )
+                # Mesmas tools do /chat: o snapshot do prefixo estático fica com a mesma chave
+                inference.generate_from_messages(
+                    messages, expert_id=expert_id, tools=AVAILABLE_TOOLS, temperature=0.0, max_tokens=max_tokens
+                )
+            except Exception as exc:
+                print(f"⚠️  [ENGINE] Warm-up de {expert_id} falhou: {exc}")
+                continue
+            self.warmed[expert_id] = time.time() - start
+        metrics.increment("engine.warmup.experts", len(self.warmed))
+
+    def status(self) -> Dict[str, Any]:
+        status: Dict[str, Any] = {"ready": self.ready, "state": self.state}
+        if self.error:
+            status["error"] = self.error
+        if self.started_at:
+            status["uptime_s"] = round(time.time() - self.started_at, 1)
+        if self.ready_at:
+            status["startup_s"] = round(self.ready_at - self.started_at, 1)
+        if self.warmed:
+            status["warmed_experts"] = {k: round(v, 3) for k, v in self.warmed.items()}
+        return status
+
+
+_lifecycle: Optional[EngineLifecycle] = None
+_lifecycle_lock = threading.Lock()
+
+
+def get_engine_lifecycle() -> EngineLifecycle:
+    global _lifecycle
+    with _lifecycle_lock:
+        if _lifecycle is None:
+            _lifecycle = EngineLifecycle()
+        return _lifecycle
@@ -3,7 +3,11 @@ Llama.cpp Inference Backend for SuperEzio
 """
 import os
 import json
+import time
+import queue
 import base64
+import uuid
+from contextlib import closing
 from pathlib import Path
 from typing import List, Dict, Optional, Any, Generator, Union
 from llama_cpp import Llama, LlamaGrammar
@@ -11,19 +15,37 @@ from llama_cpp import Llama, LlamaGrammar
 # Desabilita lazy loading do transformers (speedup em Windows)
 os.environ["TRANSFORMERS_NO_LAZY_IMPORT"] = "1"
 
-from model_registry import get_model_and_tokenizer
+from model_registry import get_model_and_tokenizer, LOCAL_MODEL_PATH
 from tool_executor import process_tool_calls
 from expert_router import get_router
 from rag_client import query_rag, build_rag_system_message
-from prompt_builder import build_messages
+from prompt_builder import build_messages, build_static_prefix
+from core.services.inference.token_budget import get_prompt_budget
 from code_pipeline_simple import run_code_pipeline_simple, is_code_expert
 from optimization.prompt_cache import prompt_cache
+from optimization.response_cache import response_cache, CachedResponse
+from optimization.semantic_cache import get_semantic_cache
+from expert_registry import get_expert
+from engine.scheduler import get_scheduler, SamplingParams, GenerationHandle
+from engine.tool_grammar import ToolGrammar, get_tool_grammar
+from engine.lora import adapter_for_expert
+from engine.cascade import get_cascade
+from core.domain.cancellation import CancellationToken
+from utils.metrics import metrics
+from infrastructure.config.settings import get_settings
 
-# Carregamento inicial do motor Llama.cpp e tokenizer
-llm_engine, tokenizer = get_model_and_tokenizer()
+# O motor Llama.cpp NÃO é carregado no import: get_model_and_tokenizer() carrega
+# na primeira chamada (ou no warm-up em background, ver engine/warmup.py)
 
 SYSTEM_PROMPT = """Você é SuperEzio. Responda em português brasileiro de forma direta e objetiva."""
 
+CORE_IDENTITY = "Você é SuperEzio..."
+
+MODEL_NAME = LOCAL_MODEL_PATH.stem
+
+# Tokens do prefixo estático (system + identidade + persona) por (expert, ferramentas)
+_static_prefix_tokens: Dict[tuple, List[int]] = {}
+
 def image_to_base64_data_uri(file_path):
     with open(file_path, "rb") as image_file:
         encoded_string = base64.b64encode(image_file.read()).decode("utf-8")
@@ -38,8 +60,12 @@ def chat_completion(
     mode: Optional[str] = None,
     image_path: Optional[str] = None,
     _skip_pipeline: bool = False,
+    cancel_token: Optional[CancellationToken] = None,
 ) -> Union[Dict[str, Any], Generator[Dict[str, Any], None, None]]:
     """Chat completion usando o motor Llama.cpp."""
+    if cancel_token is None:
+        # Sem token do chamador: ao menos o deadline padrão limita gerações "ilimitadas"
+        cancel_token = CancellationToken(get_settings().request_deadline_s or None)
     
     if image_path:
         last_user_message_index = -1
@@ -64,38 +90,356 @@ def chat_completion(
 
     router = get_router()
     decision = router.route(messages, explicit_mode=mode)
+
+    # Cache semântico: pergunta equivalente já respondida por este expert pula RAG e geração
+    # Com tools a resposta pode ser uma chamada de ferramenta: nunca servir texto de outra pergunta
+    semantic = get_semantic_cache() if not image_path and not tools else None
+    if semantic is not None and not semantic.accepts(decision.expert_id, messages):
+        semantic = None
+    semantic_hit = None
+    if semantic is not None:
+        semantic_hit = semantic.lookup(decision.expert_id, user_query)
+        if semantic_hit is not None and not semantic_hit.audit:
+            print(f"⚡ Resposta semântica do cache (score={semantic_hit.score:.3f}: \"{semantic_hit.entry.query[:60]}\")")
+            entry = semantic_hit.entry
+            return _replay_cached(CachedResponse(entry.answer, entry.finish_reason, usage={}), stream)
     
     rag_chunks = query_rag(decision.rag_domains, user_query, top_k=6, use_enhanced=True)
     rag_system_message = build_rag_system_message(rag_chunks)
     
     final_messages = build_messages(
         base_system=SYSTEM_PROMPT,
-        core_identity="Você é SuperEzio...",
+        core_identity=CORE_IDENTITY,
         rag_message=rag_system_message,
         expert_id=decision.expert_id,
         history=messages[:-1],
-        user_message=messages[-1],
-        tools=tools
+        user_message=messages[-1].get("content", ""),
+        tools=tools,
+        budget=get_prompt_budget(max_tokens)
     )
 
-    import time
-    gen_start = time.time()
-    
-    response = llm_engine.create_chat_completion(
-        messages=final_messages,
+    result = generate_from_messages(
+        final_messages,
+        expert_id=decision.expert_id,
+        tools=tools,
         temperature=temperature,
-        max_tokens=max_tokens if max_tokens > 0 else None, # None para ilimitado
-        stream=stream
+        max_tokens=max_tokens,
+        stream=stream,
+        vision=bool(image_path),
+        cancel_token=cancel_token,
     )
-    
-    gen_time = time.time() - gen_start
-    print(f"✅ Geração Llama.cpp concluída em {gen_time:.2f}s")
-    
+    if semantic is None:
+        return result
+
+    def remember(answer: str, finish_reason: str):
+        if semantic_hit is not None:
+            semantic.audit(semantic_hit, answer)
+        semantic.store(decision.expert_id, user_query, answer, finish_reason, _cache_namespaces(decision.expert_id))
+
+    return _on_answer(result, remember)
+
+
+def generate_from_messages(
+    final_messages: List[Dict[str, Any]],
+    expert_id: str,
+    tools: Optional[List[Dict[str, Any]]] = None,
+    temperature: float = 0.2,
+    max_tokens: int = 2048,
+    stream: bool = False,
+    vision: bool = False,
+    cancel_token: Optional[CancellationToken] = None,
+) -> Union[Dict[str, Any], Generator[Dict[str, Any], None, None]]:
+    """
+    Gera a partir de mensagens já montadas (system + persona + RAG + histórico).
+    Não roteia nem consulta RAG: usado pelo pipeline que já fez essas etapas.
+    """
+    if cancel_token is None:
+        cancel_token = CancellationToken(get_settings().request_deadline_s or None)
+
+    scheduler = get_scheduler()
+    # Com ferramentas a saída é restrita a uma chamada válida ou texto
+    grammar = get_tool_grammar(tools) if tools and get_settings().engine_tool_grammar else None
+
+    if vision:
+        # Visão depende do chat handler do objeto Llama completo: roda exclusivo
+        # na thread do scheduler, entre dois passos de decode
+        request_kwargs = dict(
+            messages=final_messages,
+            temperature=temperature,
+            max_tokens=max_tokens if max_tokens > 0 else None, # None para ilimitado
+        )
+        if grammar is not None:
+            request_kwargs["grammar"] = LlamaGrammar.from_string(grammar.gbnf, verbose=False)
+        if stream:
+            return _stream_exclusive(scheduler, request_kwargs, cancel_token)
+        cancel_token.check()
+        llm_engine, _ = get_model_and_tokenizer()
+        result = scheduler.run_exclusive(llm_engine.create_chat_completion, **request_kwargs).result()
+        if grammar is not None:
+            _attach_tool_call(result["choices"][0], grammar)
+        return result
+
+    prompt_tokens = _render_prompt_tokens(final_messages)
+    metrics.histogram("engine.prompt_tokens", len(prompt_tokens), tags={"expert": expert_id})
+
+    # Adapter LoRA do expert (None = modelo base; o scheduler agrupa a fila por adapter)
+    lora, lora_scale = adapter_for_expert(expert_id)
+
+    # Cache exato: mesmo prompt tokenizado + mesmos parâmetros (só temperatura baixa)
+    cache_key = None
+    if response_cache.eligible(temperature):
+        cache_key = response_cache.make_key(
+            prompt_tokens, model=MODEL_NAME, lora=lora, lora_scale=lora_scale,
+            temperature=temperature, max_tokens=max_tokens
+        )
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            print(f"⚡ Resposta servida do cache ({len(cached.content)} chars, hits={cached.hits})")
+            return _replay_cached(cached, stream)
+
+    # Cascata: pergunta simples tenta o modelo pequeno; baixa confiança escalona para cá
+    cascade = get_cascade()
+    if cascade is not None and cascade.route(expert_id, final_messages):
+        small = cascade.answer(
+            final_messages, temperature, max_tokens,
+            grammar=grammar.gbnf if grammar is not None else None,
+            cancel_token=cancel_token,
+        )
+        if small is not None:
+            print(f"🪶 Resposta do modelo pequeno ({cascade.model_name}, confiança {small.confidence:.2f})")
+            return _replay_cached(
+                CachedResponse(small.content, small.finish_reason, small.usage),
+                stream, model=cascade.model_name, cached=False,
+            )
+
+    handle = scheduler.submit(
+        prompt_tokens,
+        SamplingParams(
+            temperature=temperature,
+            max_tokens=max_tokens if max_tokens > 0 else None, # None para ilimitado
+            speculative=_speculative_mode(scheduler, expert_id),
+            grammar=grammar.gbnf if grammar is not None else None,
+            stop_on_call=grammar is not None,
+            lora=lora,
+            lora_scale=lora_scale,
+        ),
+        prefix_len=_static_prefix_len(expert_id, tools, prompt_tokens),
+        prefix_label=expert_id,
+        cancel_token=cancel_token,
+    )
+
     if stream:
-        def stream_generator():
-            for chunk in response:
+        return _stream_chunks(handle, cancel_token, cache_key, expert_id, grammar)
+
+    gen_start = time.time()
+    content = handle.text()
+    gen_time = time.time() - gen_start
+    print(f"✅ Geração Llama.cpp concluída em {gen_time:.2f}s ({handle.completion_tokens} tokens)")
+    if cache_key:
+        response_cache.put(cache_key, content, handle.finish_reason, handle.usage, _cache_namespaces(expert_id))
+
+    choice = {
+        "index": 0,
+        "message": {"role": "assistant", "content": content},
+        "finish_reason": handle.finish_reason,
+    }
+    if grammar is not None:
+        _attach_tool_call(choice, grammar)
+    return {
+        "id": f"chatcmpl-{handle.request_id}",
+        "object": "chat.completion",
+        "created": int(handle.submitted_at),
+        "model": MODEL_NAME,
+        "choices": [choice],
+        "usage": handle.usage,
+    }
+
+
+def _attach_tool_call(choice: Dict[str, Any], grammar: ToolGrammar):
+    """Se a resposta é uma chamada de ferramenta, expõe em message.tool_calls ({name, parameters})."""
+    call = grammar.parse(choice["message"].get("content") or "")
+    if call is None:
+        return
+    choice["message"]["tool_calls"] = [call]
+    choice["message"]["content"] = ""
+    choice["finish_reason"] = "tool_calls"
+    metrics.increment("engine.tool_calls", tags={"tool": call["name"]})
+
+
+def _render_prompt_tokens(messages: List[Dict[str, Any]]) -> List[int]:
+    """Aplica o chat template do modelo e tokeniza com o vocabulário do GGUF."""
+    _, tokenizer = get_model_and_tokenizer()
+    prompt = tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+    # Prompt completo é único por requisição: não vale ocupar o cache de segmentos
+    return tokenizer.tokenize(prompt, cache=False)
+
+
+def _static_prefix_len(expert_id: str, tools: Optional[List[Dict[str, Any]]], prompt_tokens: List[int]) -> int:
+    """Quantos tokens iniciais do prompt são o prefixo estático do expert (0 se não batem)."""
+    key = (expert_id, tuple(t.get("name") for t in tools or []))
+    prefix = _static_prefix_tokens.get(key)
+    if prefix is None:
+        _, tokenizer = get_model_and_tokenizer()
+        static_messages = build_static_prefix(SYSTEM_PROMPT, CORE_IDENTITY, expert_id, tools)
+        prefix = tokenizer.apply_chat_template(static_messages, tokenize=True, add_generation_prompt=False)
+        _static_prefix_tokens[key] = prefix
+    return len(prefix) if prompt_tokens[:len(prefix)] == prefix else 0
+
+
+def _speculative_mode(scheduler, expert_id: str) -> Optional[str]:
+    """Drafter usado na decodificação especulativa (None = decode normal)."""
+    # Experts de código costumam reescrever o arquivo colado: copiar do prompt rende muito
+    if is_code_expert(expert_id) and "lookup" in scheduler.drafters:
+        return "lookup"
+    if "draft" in scheduler.drafters:
+        return "draft"
+    return None
+
+
+def _cache_namespaces(expert_id: str) -> List[str]:
+    """Namespaces de RAG que alimentam o prompt do expert (para invalidar o cache de respostas)."""
+    try:
+        return list(get_expert(expert_id)["rag_domains"])
+    except ValueError:
+        return []
+
+
+def _on_answer(
+    result: Union[Dict[str, Any], Generator[Dict[str, Any], None, None]],
+    callback,
+) -> Union[Dict[str, Any], Generator[Dict[str, Any], None, None]]:
+    """Chama callback(texto, finish_reason) com a resposta completa (dict ou stream repassado)."""
+    if isinstance(result, dict):
+        choice = result["choices"][0]
+        callback(choice["message"].get("content") or "", choice.get("finish_reason") or "stop")
+        return result
+
+    def passthrough() -> Generator[Dict[str, Any], None, None]:
+        pieces: List[str] = []
+        with closing(result):
+            for chunk in result:
+                choice = chunk["choices"][0]
+                pieces.append(choice["delta"].get("content") or "")
+                if choice.get("finish_reason"):
+                    callback("".join(pieces), choice["finish_reason"])
                 yield chunk
-        return stream_generator()
-    else:
-        # Ferramentas não são suportadas em modo não-streaming com esta implementação
-        return response
\ No newline at end of file
+
+    return passthrough()
+
+
+def _replay_cached(
+    entry: CachedResponse,
+    stream: bool,
+    model: str = MODEL_NAME,
+    cached: bool = True,
+) -> Union[Dict[str, Any], Generator[Dict[str, Any], None, None]]:
+    """Resposta pronta (cache ou modelo da cascata) no mesmo formato OpenAI de uma geração (completa ou em stream)."""
+    request_id = f"chatcmpl-{'cache-' if cached else ''}{uuid.uuid4().hex[:12]}"
+    created = int(time.time())
+    if not stream:
+        return {
+            "id": request_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": entry.content},
+                "finish_reason": entry.finish_reason,
+            }],
+            "usage": entry.usage,
+            "cached": cached,
+        }
+
+    def replay() -> Generator[Dict[str, Any], None, None]:
+        base = {"id": request_id, "object": "chat.completion.chunk", "created": created, "model": model}
+        yield {**base, "choices": [{"index": 0, "delta": {"role": "assistant"}, "finish_reason": None}]}
+        for piece in response_cache.replay(entry):
+            yield {**base, "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]}
+        yield {**base, "choices": [{"index": 0, "delta": {}, "finish_reason": entry.finish_reason}]}
+
+    return replay()
+
+
+def _stream_chunks(
+    handle: GenerationHandle,
+    cancel_token: CancellationToken,
+    cache_key: Optional[str] = None,
+    expert_id: Optional[str] = None,
+    grammar: Optional[ToolGrammar] = None,
+) -> Generator[Dict[str, Any], None, None]:
+    """
+    Converte eventos do scheduler em chunks no formato OpenAI (fechar o gerador cancela a geração).
+    Uma chamada de ferramenta vai como texto e, no chunk final, em delta.tool_calls.
+    """
+    pieces: List[str] = []
+    base = {
+        "id": f"chatcmpl-{handle.request_id}",
+        "object": "chat.completion.chunk",
+        "created": int(handle.submitted_at),
+        "model": MODEL_NAME,
+    }
+    try:
+        yield {**base, "choices": [{"index": 0, "delta": {"role": "assistant"}, "finish_reason": None}]}
+
+        for event in handle:
+            if event.text:
+                if cache_key or grammar is not None:
+                    pieces.append(event.text)
+                yield {**base, "choices": [{"index": 0, "delta": {"content": event.text}, "finish_reason": None}]}
+            if event.finish_reason:
+                if event.finish_reason == "error":
+                    raise RuntimeError(event.error or "Falha na geração")
+                if cache_key:
+                    response_cache.put(cache_key, "".join(pieces), event.finish_reason, handle.usage, _cache_namespaces(expert_id))
+                delta: Dict[str, Any] = {}
+                if event.finish_reason == "tool_calls":
+                    call = grammar.parse("".join(pieces)) if grammar is not None else None
+                    if call is not None:
+                        delta["tool_calls"] = [call]
+                        metrics.increment("engine.tool_calls", tags={"tool": call["name"]})
+                yield {**base, "choices": [{"index": 0, "delta": delta, "finish_reason": event.finish_reason}]}
+    finally:
+        if not handle.finish_reason:
+            # Consumidor abandonou o stream: libera o slot em vez de gerar até max_tokens
+            cancel_token.cancel("consumer_gone")
+
+
+def _stream_exclusive(
+    scheduler,
+    request_kwargs: Dict[str, Any],
+    cancel_token: CancellationToken,
+) -> Generator[Dict[str, Any], None, None]:
+    """Streaming de uma chamada exclusiva ao Llama, repassando chunks por fila."""
+    chunks: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue()
+
+    def run():
+        try:
+            if cancel_token.cancelled:
+                return
+            llm_engine, _ = get_model_and_tokenizer()
+            for chunk in llm_engine.create_chat_completion(stream=True, **request_kwargs):
+                chunks.put(chunk)
+                if cancel_token.cancelled:
+                    print(f"🛑 Geração de visão interrompida ({cancel_token.reason})")
+                    break
+        finally:
+            chunks.put(None)
+
+    future = scheduler.run_exclusive(run)
+    try:
+        while True:
+            try:
+                chunk = chunks.get(timeout=0.5)
+            except queue.Empty:
+                if future.done():
+                    future.result()
+                    break
+                continue
+            if chunk is None:
+                break
+            yield chunk
+        future.result()
+    finally:
+        if not future.done():
+            cancel_token.cancel("consumer_gone")
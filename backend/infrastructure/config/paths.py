@@ -41,6 +41,46 @@ def get_lora_path(mode: str) -> Path:
     return path
 
 
+def get_lora_dir() -> Path:
+    """Retorna path do diretório de adapters LoRA em GGUF (engine Llama.cpp)"""
+    path = settings.lora_dir
+    if not path.is_absolute():
+        return PROJECT_ROOT / path
+    return path
+
+
+def get_draft_model_path() -> Path:
+    """Retorna path do GGUF do draft model (speculative decoding)"""
+    path = settings.engine_draft_model
+    if not path.is_absolute():
+        return PROJECT_ROOT / path
+    return path
+
+
+def get_rag_sqlite_path() -> Path:
+    """Retorna path do banco SQLite do RAG (rag_storage = "sqlite")"""
+    path = settings.rag_sqlite_path
+    if not path.is_absolute():
+        return PROJECT_ROOT / path
+    return path
+
+
+def get_cascade_model_path() -> Path:
+    """Retorna path do GGUF pequeno da cascata de modelos"""
+    path = settings.cascade_small_model
+    if not path.is_absolute():
+        return PROJECT_ROOT / path
+    return path
+
+
+def get_embedding_model_path() -> Path:
+    """Retorna path do GGUF de embedding (cache semântico e busca densa do RAG)"""
+    path = settings.semantic_cache_embedding_model
+    if not path.is_absolute():
+        return PROJECT_ROOT / path
+    return path
+
+
 def get_data_path() -> Path:
     """Retorna path do diretório de dados"""
     return PROJECT_ROOT / "data"
@@ -53,3 +93,11 @@ def get_logs_path() -> Path:
         return PROJECT_ROOT / path
     return path
 
+
+
+def get_kv_snapshot_path() -> Path:
+    """Retorna path do diretório de snapshots de KV persistidos"""
+    path = settings.kv_snapshot_dir
+    if not path.is_absolute():
+        return PROJECT_ROOT / path
+    return path
@@ -4,7 +4,7 @@ Valida variáveis de ambiente e fornece acesso tipado via Pydantic Settings.
 """
 from pydantic_settings import BaseSettings
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 
 class Settings(BaseSettings):
@@ -18,6 +18,11 @@ class Settings(BaseSettings):
     lora_familia_path: Path = Path("models/lora_familia_hardcore_v1")
     lora_accounting_path: Path = Path("models/lora_accounting")
     lora_legacy_path: Path = Path("models/lora_superezio")
+    lora_dir: Path = Path("models/lora")  # adapters GGUF do engine: <lora_dir>/<lora_adapter>.gguf
+    lora_max_resident: int = 4  # adapters carregados ao mesmo tempo (LRU)
+    lora_default_scale: float = 1.0
+    lora_scales: Dict[str, float] = {}  # escala por adapter (ex.: {"familia": 0.8})
+    lora_max_wait_s: float = 2.0  # espera máxima na fila antes de forçar a troca de adapter
     
     # API
     api_host: str = "0.0.0.0"
@@ -37,6 +42,19 @@ class Settings(BaseSettings):
     # RAG
     rag_top_k: int = 6
     rag_use_enhanced: bool = True
+    rag_storage: str = "json"  # json (snapshot + log por namespace) | sqlite (FTS5, índices no disco)
+    rag_sqlite_path: Path = Path("data/rag/rag.sqlite3")
+    # PersistentRAG: snapshot + log append-only por namespace
+    rag_wal_fsync_batch: int = 64  # operações por fsync (group commit)
+    rag_wal_fsync_ms: float = 50.0  # atraso máximo do fsync de operações pendentes (0 = fsync a cada operação)
+    rag_wal_compact_min: int = 1000  # operações no log antes de considerar compactar
+    rag_wal_compact_ratio: float = 0.5  # ... e log >= esta fração do snapshot
+    # Busca densa local (embeddings do semantic_cache_embedding_model, matriz memory-mapped em data/rag/vectors)
+    rag_vector_enabled: bool = False
+    rag_vector_dtype: str = "float16"  # float16 | int8 (escala por linha)
+    rag_vector_exact_max: int = 20000  # até aqui top-k exato; acima, índice IVF
+    rag_vector_nprobe: int = 8  # listas IVF visitadas por consulta
+    rag_vector_min_similarity: float = 0.35  # cosseno mínimo de um resultado que só a busca densa achou
     
     # Tools
     express_api_url: str = "http://localhost:8080"
@@ -53,7 +71,97 @@ class Settings(BaseSettings):
     max_tokens_default: int = 512
     temperature_default: float = 0.7
     max_tokens_max: int = 2048
-    
+    request_deadline_s: float = 600.0  # deadline por requisição (0 = sem limite)
+
+    # Admissão: gerações em andamento limitadas, excesso em filas por prioridade
+    admission_max_in_flight: int = 0  # 0 = 2x os slots do engine (x workers no modo remote)
+    admission_max_queue: int = 64  # requisições esperando por classe
+    admission_timeout_interactive_s: float = 10.0  # tempo máximo de fila (stream)
+    admission_timeout_chat_s: float = 30.0
+    admission_timeout_batch_s: float = 300.0
+    admission_service_time_s: float = 8.0  # estimativa inicial do tempo de uma geração (Retry-After)
+
+    # Limites adaptativos de concorrência (AIMD pelo p95 da latência)
+    adaptive_limits_enabled: bool = True
+    adaptive_window: int = 20  # amostras por ajuste
+    adaptive_engine_target_ms: float = 120.0  # p95 por token gerado (prefill + decode); teto = admission_max_in_flight
+    adaptive_rag_target_ms: float = 500.0  # p95 de uma recuperação RAG
+    adaptive_rag_max: int = 16
+    adaptive_tools_target_ms: float = 5000.0  # p95 de uma ferramenta remota (Express)
+    adaptive_tools_max: int = 16
+
+    # Engine (continuous batching sobre Llama.cpp)
+    engine_parallel_slots: int = 4  # sequências ativas simultâneas (slots de KV)
+    engine_slot_ctx: int = 4096  # contexto máximo por slot (tokens)
+    engine_batch_size: int = 512  # tokens por llama_decode
+    engine_prefill_chunk: int = 256  # tokens de prompt por slot a cada passo
+    engine_threads: Optional[int] = None  # threads do Llama.cpp (None = padrão da lib)
+    engine_warmup: bool = True  # uma geração curta por expert antes de marcar o engine como pronto
+    engine_warmup_max_tokens: int = 1
+    engine_tool_grammar: bool = True  # com ferramentas, restringe a saída a chamada válida (GBNF) ou texto
+    tokenizer_backend: str = "gguf"  # gguf = vocabulário/template do próprio GGUF, hf = chat template via transformers (model_path)
+
+    # Engine fake (benchmark da API sem modelo; ver engine/fake_backend.py e scripts/load_test.py)
+    engine_backend: str = "llama"  # llama | fake
+    fake_engine_decode_ms: float = 25.0  # média de um passo de decode
+    fake_engine_prefill_ms: float = 0.3  # por token de prompt
+    fake_engine_latency: str = "lognormal"  # fixed | normal | lognormal | exponential
+    fake_engine_jitter: float = 0.25  # desvio relativo
+    fake_engine_output_tokens: int = 120  # tamanho médio das respostas
+    fake_engine_seed: int = 0
+
+    # Speculative decoding
+    engine_draft_model: Optional[Path] = None  # ex.: models/qwen2.5-0.5b-instruct-q8_0.gguf
+    engine_spec_k: int = 4  # tokens propostos inicialmente por passo
+    engine_spec_k_max: int = 8  # teto do k adaptativo
+    engine_lookup_ngram: int = 3  # maior n-grama buscado no prompt (prompt lookup, experts code_*)
+
+    # Cascata: modelo pequeno residente para perguntas simples, 7B para o resto
+    cascade_small_model: Optional[Path] = None  # ex.: models/qwen2.5-1.5b-instruct-q4_k_m.gguf (None = desabilitada)
+    cascade_small_slots: int = 2
+    cascade_min_confidence: float = 0.55  # média geométrica da prob. dos tokens abaixo disso escalona
+    cascade_max_tokens: int = 256  # resposta simples que não termina até aqui escalona
+
+    engine_stream_backlog: int = 256  # eventos não consumidos antes de pausar o decode da sequência
+
+    # Streaming (ponte thread → asyncio)
+    stream_queue_size: int = 64  # itens em trânsito por stream antes de aplicar backpressure
+    stream_bridge_workers: int = 32  # threads produtoras (streams simultâneos por processo)
+
+    # Model server (engine fora do processo HTTP)
+    engine_mode: str = "local"  # local = modelo no próprio processo, remote = model server via IPC
+    engine_server_address: str = ""  # unix:/path ou tcp:host:port (vazio = padrão da plataforma)
+    engine_server_workers: int = 1  # processos engine no pool
+    engine_server_timeout: float = 300.0  # timeout de socket por requisição (s)
+
+    # Orçamento de tokens do prompt (contagem exata pelo vocabulário do GGUF)
+    prompt_reserve_output: int = 512  # tokens reservados para a resposta quando max_tokens não é informado
+    prompt_rag_share: float = 0.4  # fração máxima do espaço livre para o RAG antes do histórico
+    prompt_token_cache_size: int = 4096  # segmentos tokenizados em cache (LRU por hash)
+
+    # Cache exato de respostas (prompt tokenizado + sampling params)
+    response_cache_enabled: bool = True
+    response_cache_max_bytes: int = 64 * 1024 * 1024  # 64 MB
+    response_cache_ttl: float = 3600.0  # segundos
+    response_cache_max_temperature: float = 0.3  # acima disso a resposta não é reaproveitada
+
+    # Cache semântico de respostas (embedding local da pergunta, por expert)
+    semantic_cache_enabled: bool = True
+    semantic_cache_embedding_model: Optional[Path] = None  # ex.: models/multilingual-e5-small-q8_0.gguf (None = desabilitado; também usado pela busca densa do RAG)
+    semantic_cache_threshold: float = 0.92  # cosseno mínimo entre perguntas
+    semantic_cache_max_entries: int = 512  # respostas por expert (LRU)
+    semantic_cache_ttl: float = 24 * 3600.0  # frescor padrão (s)
+    semantic_cache_expert_ttls: Dict[str, float] = {}  # frescor por expert, ex.: {"code_hf_curator": 3600}
+    semantic_cache_experts: List[str] = []  # experts habilitados (vazio = todos)
+    semantic_cache_audit_rate: float = 0.05  # fração dos hits regenerados para medir falsos hits
+
+    # Cache de prefixos de KV (system + identidade + persona)
+    kv_prefix_cache_bytes: int = 1024 * 1024 * 1024  # 1 GB
+    kv_prefix_min_tokens: int = 64  # prefixos menores não compensam o snapshot
+    kv_snapshot_persist: bool = True  # grava snapshots em disco (warm start após restart)
+    kv_snapshot_dir: Path = Path("data/kv_snapshots")
+    kv_snapshot_max_bytes: int = 8 * 1024 * 1024 * 1024  # 8 GB
+
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
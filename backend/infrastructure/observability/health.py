@@ -8,7 +8,7 @@ import torch
 from typing import Dict, Any, Optional
 from infrastructure.observability.metrics import metrics
 from infrastructure.observability.logger import app_logger
-from infrastructure.models.registry import LOCAL_MODEL_DIR
+from model_registry import LOCAL_MODEL_PATH as LOCAL_MODEL_DIR
 from infrastructure.config.settings import get_settings
 
 
@@ -1,19 +1,25 @@
 """
 Model Loader - Carrega o modelo e mantém em memória
 Processo independente que carrega o modelo ANTES dos outros componentes
+
+Sobe o pool do model server (engine.model_server): N processos engine, cada um
+com sua cópia do modelo e afinidade de CPU, atendendo os workers HTTP via IPC
+(rode a API com ENGINE_MODE=remote). O model_status.json continua sendo
+atualizado para os componentes que ainda leem o status por arquivo.
 """
-import os
 import sys
 import time
 import json
 from pathlib import Path
-from inference import load_model, LOCAL_MODEL_DIR, DEVICE
-import torch
+
+from model_registry import LOCAL_MODEL_PATH as LOCAL_MODEL_DIR, DEVICE
+from infrastructure.config.settings import get_settings
+from engine.model_server import ModelServerPool
 
 # Arquivo de status para comunicação com outros processos
 STATUS_FILE = Path(__file__).parent / "model_status.json"
 
-def save_status(status: str, error: str = None):
+def save_status(status: str, error: str = None, workers: list = None):
     """Salva status do carregamento do modelo"""
     data = {
         "status": status,  # "loading", "ready", "error"
@@ -21,74 +27,76 @@ def save_status(status: str, error: str = None):
         "timestamp": time.time(),
         "model_path": str(LOCAL_MODEL_DIR),
         "device": DEVICE,
+        "workers": workers or [],
     }
     with open(STATUS_FILE, "w", encoding="utf-8") as f:
         json.dump(data, f, indent=2)
 
 def main():
+    settings = get_settings()
+
     print("=" * 60)
     print("🤖 SuperEzio - Model Loader")
     print("=" * 60)
     print(f"📊 Dispositivo: {DEVICE}")
     print(f"🤖 Modelo: {LOCAL_MODEL_DIR}")
+    print(f"🧩 Engines: {settings.engine_server_workers}")
     print()
-    
+
     # Verificar se modelo existe
     if not LOCAL_MODEL_DIR.exists():
         error_msg = f"❌ Modelo não encontrado em {LOCAL_MODEL_DIR}"
         print(error_msg)
         save_status("error", error_msg)
         sys.exit(1)
-    
+
     # Marcar como carregando
     save_status("loading")
     print("⏳ Carregando modelo... (isso pode levar 1-2 minutos)")
     print()
-    
+
+    pool = ModelServerPool(settings.engine_server_workers, settings.engine_server_address or None)
     try:
-        # Carregar modelo (isso vai preencher as variáveis globais)
-        load_model()
-        
-        # Verificar se carregou corretamente
-        from inference import model, tokenizer, generator
-        if model is None or tokenizer is None or generator is None:
-            raise Exception("Modelo não foi carregado corretamente")
-        
+        pool.start()
+        if not pool.wait_ready():
+            raise Exception("Engines não ficaram prontos (veja o log dos processos)")
+
         # Marcar como pronto
-        vram_used = torch.cuda.memory_allocated(0) / 1024**3 if DEVICE == "cuda" else 0
-        save_status("ready")
-        
+        save_status("ready", workers=pool.health())
+
         print("=" * 60)
         print("✅ MODELO CARREGADO COM SUCESSO!")
         print("=" * 60)
-        print(f"💾 VRAM usada: {vram_used:.2f} GB")
+        print(f"🔌 Model server: {', '.join(pool.addresses)}")
         print(f"🌐 Status: OFFLINE (sem dependência do Hugging Face)")
         print()
         print("🔄 Modelo está pronto e mantido em memória.")
-        print("📝 Outros componentes podem ser iniciados agora.")
+        print("📝 Inicie a API com ENGINE_MODE=remote para usar este processo.")
         print("⏸️  Pressione Ctrl+C para descarregar o modelo.")
         print("=" * 60)
         print()
-        
-        # Manter processo vivo (modelo em memória)
+
+        # Manter processo vivo (reinicia engines que caírem e atualiza o status)
+        def publish(current: ModelServerPool):
+            workers = current.health()
+            save_status("ready" if any(w.get("ready") for w in workers) else "loading", workers=workers)
+
         try:
-            while True:
-                time.sleep(1)
-                # Atualizar timestamp do status periodicamente
-                save_status("ready")
+            pool.supervise(interval=1.0, on_tick=publish)
         except KeyboardInterrupt:
             print("\n🛑 Descarregando modelo...")
             save_status("error", "Processo interrompido")
+            pool.stop()
             sys.exit(0)
-            
+
     except Exception as e:
         error_msg = f"❌ Erro ao carregar modelo: {e}"
         print(error_msg)
         save_status("error", str(e))
+        pool.stop()
         import traceback
         traceback.print_exc()
         sys.exit(1)
 
 if __name__ == "__main__":
     main()
-
@@ -2,11 +2,16 @@
 Registry de Modelos para SuperEzio com Llama.cpp Engine.
 """
 import os
+import threading
 from pathlib import Path
-from typing import Optional, Tuple
-from transformers import AutoTokenizer, PreTrainedTokenizer
+from typing import TYPE_CHECKING, Optional, Tuple
 from llama_cpp import Llama
 
+from infrastructure.config.settings import get_settings
+
+if TYPE_CHECKING:
+    from engine.tokenizer import GGUFTokenizer
+
 # Configuração
 BACKEND_DIR = Path(__file__).parent.resolve()
 PROJECT_ROOT = BACKEND_DIR.parent.resolve()
@@ -17,18 +22,34 @@ DEVICE = "cuda" if "CUDA_PATH" in os.environ else "cpu"
 
 # Cache Singleton para o motor Llama.cpp e tokenizer
 _llama_engine: Optional[Llama] = None
-_base_tokenizer: Optional[PreTrainedTokenizer] = None
+_base_tokenizer: Optional["GGUFTokenizer"] = None
+# Warm-up em background e primeira requisição podem chegar juntos: carrega uma vez só
+_load_lock = threading.Lock()
 
-def load_llama_cpp_model() -> Tuple[Llama, PreTrainedTokenizer]:
+def load_llama_cpp_model() -> Tuple[Llama, "GGUFTokenizer"]:
     """
     Carrega o motor Llama.cpp e o tokenizer.
     Usa cache global para garantir uma única instância (Singleton).
     """
-    global _llama_engine, _base_tokenizer
-
     if _llama_engine is not None and _base_tokenizer is not None:
         return _llama_engine, _base_tokenizer
 
+    with _load_lock:
+        if _llama_engine is not None and _base_tokenizer is not None:
+            return _llama_engine, _base_tokenizer
+        if get_settings().engine_backend == "fake":
+            return _load_fake_engine()
+        return _load_llama_cpp_model()
+
+
+def is_model_loaded() -> bool:
+    """True se o motor já está em memória (não dispara o carregamento)"""
+    return _llama_engine is not None
+
+
+def _load_llama_cpp_model() -> Tuple[Llama, "GGUFTokenizer"]:
+    global _llama_engine, _base_tokenizer
+
     print(f"📂 Carregando modelo GGUF de {LOCAL_MODEL_PATH} com Llama.cpp...")
 
     if not LOCAL_MODEL_PATH.exists():
@@ -46,11 +67,6 @@ def load_llama_cpp_model() -> Tuple[Llama, PreTrainedTokenizer]:
             f"📥 Execute primeiro: python scripts/download_gguf_model.py"
         )
     
-    # O tokenizer pode ser carregado do diretório original do modelo Hugging Face
-    tokenizer_path = PROJECT_ROOT / "models" / "qwen2.5-7b-instruct"
-    print(f"📂 Carregando tokenizer de {tokenizer_path}...")
-    tokenizer = AutoTokenizer.from_pretrained(str(tokenizer_path))
-
     # Carregar modelo com Llama.cpp
     # n_gpu_layers=-1 significa descarregar todas as camadas possíveis para a GPU
     print("🚀 Inicializando motor Llama.cpp...")
@@ -58,8 +74,12 @@ def load_llama_cpp_model() -> Tuple[Llama, PreTrainedTokenizer]:
         model_path=str(LOCAL_MODEL_PATH),
         n_ctx=4096,
         n_gpu_layers=-1,
+        n_threads=get_settings().engine_threads,
         verbose=True
     )
+    # Vocabulário e chat template vêm do próprio GGUF (sem transformers)
+    from engine.tokenizer import create_tokenizer
+    tokenizer = create_tokenizer(llm)
 
     _llama_engine = llm
     _base_tokenizer = tokenizer
@@ -68,17 +88,31 @@ def load_llama_cpp_model() -> Tuple[Llama, PreTrainedTokenizer]:
 
     return llm, tokenizer
 
-def get_model_and_tokenizer() -> Tuple[Llama, PreTrainedTokenizer]:
+def _load_fake_engine():
+    """Engine simulado para benchmark (ENGINE_BACKEND=fake): nenhum peso é carregado"""
+    global _llama_engine, _base_tokenizer
+    from engine.fake_backend import FakeLlama, FakeTokenizer
+
+    print("🧪 Engine FAKE ativo (ENGINE_BACKEND=fake): respostas simuladas, sem modelo")
+    _llama_engine = FakeLlama()
+    _base_tokenizer = FakeTokenizer(_llama_engine.n_vocab(), cache_size=get_settings().prompt_token_cache_size)
+    return _llama_engine, _base_tokenizer
+
+def get_model_and_tokenizer() -> Tuple[Llama, "GGUFTokenizer"]:
     """
     Retorna a instância do motor Llama.cpp e o tokenizer.
     """
     return load_llama_cpp_model()
 
-# Funções relacionadas a LoRA e experts são simplificadas ou removidas
-# por enquanto, para focar no funcionamento do modelo base com Llama.cpp.
-def get_model_for_expert(expert_id: str) -> Tuple[Llama, PreTrainedTokenizer]:
-    """Retorna o modelo base para qualquer expert."""
-    print(f"[Llama.cpp] Usando modelo base para expert={expert_id}")
+def get_model_for_expert(expert_id: str) -> Tuple[Llama, "GGUFTokenizer"]:
+    """
+    Retorna o motor compartilhado. O adapter LoRA do expert não é um modelo à
+    parte: o scheduler aplica o adapter no contexto de batch (engine/lora.py).
+    """
+    from engine.lora import adapter_for_expert
+
+    adapter, scale = adapter_for_expert(expert_id)
+    print(f"[Llama.cpp] expert={expert_id} → {f'LoRA {adapter} (x{scale})' if adapter else 'modelo base'}")
     return get_model_and_tokenizer()
 
 def clear_cache():
@@ -88,7 +122,7 @@ def clear_cache():
     _base_tokenizer = None
 
 def get_available_modes() -> list[str]:
-    """Retorna lista vazia, pois LoRAs não são carregados dinamicamente com Llama.cpp nesta configuração."""
-    return []
-
+    """Adapters LoRA em GGUF disponíveis para troca em tempo de execução (settings.lora_dir)."""
+    from engine.lora import available_adapters
 
+    return available_adapters()
@@ -2,11 +2,17 @@
 Optimization Module
 Otimizações avançadas baseadas em papers recentes
 """
-from .kv_cache import KVCacheManager, kv_cache_manager
+from .kv_cache import KVCacheManager, KVSnapshot, kv_cache_manager
+from .kv_store import KVSnapshotStore
 from .prompt_cache import PromptCache, prompt_cache
+from .response_cache import CachedResponse, ResponseCache, response_cache
+from .semantic_cache import SemanticCache, SemanticHit, get_semantic_cache, invalidate_semantic_cache, normalize_query
 
 __all__ = [
-    'KVCacheManager', 'kv_cache_manager',
+    'KVCacheManager', 'KVSnapshot', 'kv_cache_manager',
+    'KVSnapshotStore',
     'PromptCache', 'prompt_cache',
+    'CachedResponse', 'ResponseCache', 'response_cache',
+    'SemanticCache', 'SemanticHit', 'get_semantic_cache', 'invalidate_semantic_cache', 'normalize_query',
 ]
 
@@ -1,82 +1,155 @@
 """
 KV Cache Optimization
-Otimização de cache de chaves-valores para inferência mais rápida
+Cache de prefixos de KV: snapshots do estado do llama.cpp para prefixos estáticos
+do prompt (system + identidade + persona do expert).
 
-Baseado em papers sobre attention caching e KV cache optimization
+Em vez de re-processar ~1-2k tokens de system prompt a cada requisição, o
+scheduler restaura o snapshot do maior prefixo em cache e só faz prefill do
+restante (RAG, histórico, mensagem do usuário).
+
+Opcionalmente os snapshots também são persistidos em disco (optimization.kv_store),
+sobrevivendo a restarts.
+
+Baseado em papers sobre prefix caching / prompt cache (ex.: PagedAttention, Prompt Cache)
 """
-import torch
-from typing import Optional, Dict, Any
-from transformers import PreTrainedModel
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Dict, Any, Sequence, Tuple
+
+from infrastructure.config.settings import get_settings
+
+
+@dataclass
+class KVSnapshot:
+    """Estado serializado do KV de uma sequência que contém exatamente `tokens`"""
+    tokens: Tuple[int, ...]
+    state: bytes  # bytes ou mmap (snapshots carregados do disco)
+    label: Optional[str] = None  # ex.: expert_id, para invalidação seletiva
+    created_at: float = 0.0
+    hits: int = 0
+
+    @property
+    def n_bytes(self) -> int:
+        return len(self.state)
 
 
 class KVCacheManager:
     """
-    Gerenciador de KV cache para otimizar inferência
-    Reutiliza cache entre requisições similares
+    Gerenciador de snapshots de prefixo do KV cache
+    LRU limitado por orçamento de bytes; busca pelo maior prefixo de tokens
     """
-    
-    def __init__(self):
-        self._cache: Dict[str, Any] = {}
+
+    def __init__(self, max_bytes: int = 1 << 30, min_prefix_tokens: int = 64):
+        self.max_bytes = max_bytes
+        self.min_prefix_tokens = min_prefix_tokens
+        self._entries: "OrderedDict[Tuple[int, ...], KVSnapshot]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._store = None  # KVSnapshotStore opcional (persistência em disco)
+
         self._cache_hits = 0
         self._cache_misses = 0
-    
-    def get_cache_key(self, prompt_prefix: str, max_length: int = 50) -> str:
-        """Gera chave de cache baseada no prefixo do prompt"""
-        # Usar primeiros N tokens como chave
-        prefix = prompt_prefix[:max_length].strip()
-        return f"kv_{hash(prefix)}"
-    
-    def get_cache(
-        self, 
-        model: PreTrainedModel,
-        input_ids: torch.Tensor,
-        cache_key: Optional[str] = None
-    ) -> Optional[Dict[str, torch.Tensor]]:
+        self._evictions = 0
+        self._tokens_saved = 0
+
+    def attach_store(self, store) -> int:
+        """Conecta a camada de persistência e carrega os snapshots já gravados"""
+        self._store = store
+        return store.load_into(self)
+
+    def lookup(self, tokens: Sequence[int]) -> Optional[KVSnapshot]:
         """
-        Recupera KV cache se disponível
+        Retorna o snapshot do maior prefixo em cache de `tokens`.
+        Só considera prefixos estritamente menores que o prompt, para que reste
+        ao menos um token a decodificar (e gerar logits).
         """
-        if cache_key and cache_key in self._cache:
+        with self._lock:
+            best: Optional[KVSnapshot] = None
+            for key, snapshot in self._entries.items():
+                n = len(key)
+                if n >= len(tokens) or (best is not None and n <= len(best.tokens)):
+                    continue
+                if tuple(tokens[:n]) == key:
+                    best = snapshot
+
+            if best is None:
+                self._cache_misses += 1
+                return None
+
+            self._entries.move_to_end(best.tokens)
+            best.hits += 1
             self._cache_hits += 1
-            return self._cache[cache_key]
-        
-        self._cache_misses += 1
-        return None
-    
-    def save_cache(
-        self,
-        cache_key: str,
-        past_key_values: Any,
-        max_cache_size: int = 10
-    ):
-        """
-        Salva KV cache para reutilização
-        """
-        if len(self._cache) >= max_cache_size:
-            # Remover entrada mais antiga (FIFO)
-            oldest_key = next(iter(self._cache))
-            del self._cache[oldest_key]
-        
-        self._cache[cache_key] = past_key_values
-    
+            self._tokens_saved += len(best.tokens)
+            return best
+
+    def contains(self, tokens: Sequence[int]) -> bool:
+        with self._lock:
+            return tuple(tokens) in self._entries
+
+    def store(self, tokens: Sequence[int], state: bytes, label: Optional[str] = None, persist: bool = True) -> bool:
+        """Armazena snapshot, removendo os menos usados até caber no orçamento"""
+        key = tuple(tokens)
+        if len(key) < self.min_prefix_tokens or len(state) > self.max_bytes:
+            return False
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous.n_bytes
+
+            while self._entries and self._bytes + len(state) > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.n_bytes
+                self._evictions += 1
+
+            self._entries[key] = KVSnapshot(tokens=key, state=state, label=label, created_at=time.time())
+            self._bytes += len(state)
+
+        if persist and self._store is not None:
+            self._store.persist(key, state, label)
+        return True
+
+    def invalidate(self, label: Optional[str] = None) -> int:
+        """Remove snapshots de um label (ou todos se None); retorna quantos removeu"""
+        with self._lock:
+            keys = [k for k, s in self._entries.items() if label is None or s.label == label]
+            for key in keys:
+                self._bytes -= self._entries.pop(key).n_bytes
+        if self._store is not None:
+            self._store.invalidate(label)
+        return len(keys)
+
     def clear_cache(self):
         """Limpa todo o cache"""
-        self._cache.clear()
-        self._cache_hits = 0
-        self._cache_misses = 0
-    
+        self.invalidate()
+        with self._lock:
+            self._cache_hits = 0
+            self._cache_misses = 0
+            self._evictions = 0
+            self._tokens_saved = 0
+
     def get_stats(self) -> Dict[str, Any]:
         """Retorna estatísticas do cache"""
-        total = self._cache_hits + self._cache_misses
-        hit_rate = (self._cache_hits / total * 100) if total > 0 else 0
-        
-        return {
-            "cache_size": len(self._cache),
-            "cache_hits": self._cache_hits,
-            "cache_misses": self._cache_misses,
-            "hit_rate": round(hit_rate, 2)
-        }
+        with self._lock:
+            total = self._cache_hits + self._cache_misses
+            hit_rate = (self._cache_hits / total * 100) if total > 0 else 0
 
+            return {
+                "cache_size": len(self._entries),
+                "cache_bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "cache_hits": self._cache_hits,
+                "cache_misses": self._cache_misses,
+                "evictions": self._evictions,
+                "prefill_tokens_saved": self._tokens_saved,
+                "hit_rate": round(hit_rate, 2)
+            }
 
-# Instância global
-kv_cache_manager = KVCacheManager()
 
+# Instância global
+kv_cache_manager = KVCacheManager(
+    max_bytes=get_settings().kv_prefix_cache_bytes,
+    min_prefix_tokens=get_settings().kv_prefix_min_tokens,
+)
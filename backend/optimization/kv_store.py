@@ -0,0 +1,331 @@
+"""
+Persistent KV Snapshot Store
+Armazenamento em disco, endereçado por conteúdo, dos snapshots de prefixo do KV.
+
+Layout:
+    <root>/<hash do GGUF>-ctx<n_ctx>/<hash dos tokens>.kv   (estado bruto da sequência)
+    <root>/<hash do GGUF>-ctx<n_ctx>/index.json              (tokens, label, fingerprint da persona)
+
+Na inicialização os arquivos são mapeados em memória (mmap) e entregues ao
+KVCacheManager, então o primeiro request de cada expert já encontra o prefixo
+pronto (TTFT de warm start logo após o deploy).
+
+Invalidação automática:
+- Modelo trocado → hash do GGUF muda → diretório novo; diretórios antigos são
+  apagados por prune_foreign_namespaces() quando nenhum processo os usa
+- Persona alterada em expert_registry.EXPERTS → fingerprint do label muda → entrada descartada
+
+Vários processos (pool do model server) podem dividir a mesma raiz: cada store
+segura um lock compartilhado no seu diretório enquanto vive (o prune só apaga
+diretórios sem dono) e toda alteração do índice relê o index.json do disco e
+mescla sob um lock exclusivo, em vez de sobrescrever com a visão local.
+"""
+import hashlib
+import json
+import mmap
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Any, List, Optional, Sequence
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+INDEX_FILE = "index.json"
+FINGERPRINTS_FILE = "model_fingerprints.json"
+LOCK_FILE = ".lock"  # alterações do índice / criação e prune de diretórios
+IN_USE_FILE = ".inuse"  # lock compartilhado enquanto um store usa o diretório
+_HASH_CHUNK = 16 * 1024 * 1024
+
+
+def tokens_digest(tokens: Sequence[int]) -> str:
+    """Hash estável de uma sequência de tokens"""
+    return hashlib.sha256(np.asarray(tokens, dtype=np.int32).tobytes()).hexdigest()
+
+
+def file_digest(path: Path, cache_file: Optional[Path] = None) -> str:
+    """
+    SHA-256 do arquivo do modelo.
+    O resultado fica em cache por (caminho, tamanho, mtime) para não re-ler
+    vários GB a cada inicialização.
+    """
+    stat = path.stat()
+    cache_key = f"{path.resolve()}|{stat.st_size}|{stat.st_mtime_ns}"
+
+    known: Dict[str, str] = {}
+    if cache_file is not None and cache_file.exists():
+        try:
+            known = json.loads(cache_file.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            known = {}
+    if cache_key in known:
+        return known[cache_key]
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+            digest.update(chunk)
+    value = digest.hexdigest()
+
+    if cache_file is not None:
+        known = {k: v for k, v in known.items() if not k.startswith(f"{path.resolve()}|")}
+        known[cache_key] = value
+        _atomic_write(cache_file, json.dumps(known, indent=2).encode("utf-8"))
+    return value
+
+
+def persona_fingerprint(label: Optional[str]) -> str:
+    """Fingerprint da persona/config de um expert (vazio para labels fora do registry)"""
+    from expert_registry import EXPERTS, get_expert_persona
+
+    if not label or label not in EXPERTS:
+        return ""
+    payload = json.dumps(EXPERTS[label], sort_keys=True, default=str) + get_expert_persona(label)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _atomic_write(path: Path, data: bytes):
+    """Escreve em arquivo temporário e renomeia (nunca deixa arquivo pela metade)"""
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class _FileLock:
+    """
+    Lock entre processos sobre um arquivo (flock no POSIX, msvcrt no Windows).
+    No Windows não há lock compartilhado: shared vira exclusivo.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._fd: Optional[int] = None
+
+    def acquire(self, shared: bool = False, blocking: bool = True) -> bool:
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, (fcntl.LOCK_SH if shared else fcntl.LOCK_EX) | (0 if blocking else fcntl.LOCK_NB))
+            else:
+                msvcrt.locking(fd, msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+        except OSError:
+            os.close(fd)
+            return False
+        self._fd = fd
+        return True
+
+    def release(self):
+        if self._fd is None:
+            return
+        fd, self._fd = self._fd, None
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            else:
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(fd)
+
+    def __enter__(self) -> "_FileLock":
+        if not self.acquire():
+            raise OSError(f"Não foi possível travar {self.path}")
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class KVSnapshotStore:
+    """
+    Camada de persistência do KVCacheManager
+    Gravações acontecem em uma thread própria para não travar o loop do scheduler
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        model_path: Path,
+        n_ctx: int,
+        max_bytes: int = 8 * 1024 * 1024 * 1024,
+        fingerprint: Callable[[Optional[str]], str] = persona_fingerprint,
+    ):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._fingerprint = fingerprint
+
+        model_hash = file_digest(Path(model_path), self.root / FINGERPRINTS_FILE)
+        self.namespace = f"{model_hash[:32]}-ctx{n_ctx}"
+        self.directory = self.root / self.namespace
+        # Sob o lock da raiz: um prune concorrente não apaga o diretório entre o mkdir e o lock de uso
+        with _FileLock(self.root / LOCK_FILE):
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._in_use = _FileLock(self.directory / IN_USE_FILE)
+            self._in_use.acquire(shared=True, blocking=False)
+
+        self._lock = threading.Lock()
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="kv-store")
+        self._mmaps: List[mmap.mmap] = []
+        self._index: Dict[str, Dict[str, Any]] = self._read_index()
+
+    # ------------------------------------------------------------------ index
+
+    def _read_index(self) -> Dict[str, Dict[str, Any]]:
+        path = self.directory / INDEX_FILE
+        if not path.exists():
+            return {}
+        try:
+            return json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as exc:
+            print(f"⚠️  [KV-STORE] Índice corrompido, recomeçando: {exc}")
+            return {}
+
+    def _write_index(self):
+        _atomic_write(self.directory / INDEX_FILE, json.dumps(self._index).encode("utf-8"))
+
+    def _directory_lock(self) -> _FileLock:
+        """Lock exclusivo (entre processos) para ler-alterar-gravar o índice"""
+        return _FileLock(self.directory / LOCK_FILE)
+
+    def prune_foreign_namespaces(self) -> int:
+        """
+        Manutenção: remove snapshots de outros modelos / n_ctx que nenhum
+        processo vivo está usando. Retorna quantos diretórios foram apagados.
+        """
+        removed = 0
+        with _FileLock(self.root / LOCK_FILE):
+            for entry in self.root.iterdir():
+                if not entry.is_dir() or entry.name == self.namespace:
+                    continue
+                owner = _FileLock(entry / IN_USE_FILE)
+                if not owner.acquire(blocking=False):
+                    continue  # outro processo (outro modelo / n_ctx) ainda usa
+                owner.release()
+                shutil.rmtree(entry, ignore_errors=True)
+                removed += 1
+                print(f"🗑️  [KV-STORE] Snapshots de outro modelo removidos: {entry.name}")
+        return removed
+
+    def _drop(self, digest: str):
+        self._index.pop(digest, None)
+        try:
+            (self.directory / f"{digest}.kv").unlink()
+        except OSError:
+            pass  # ausente, ou ainda mapeado (Windows) - órfão sai no próximo load_into
+
+    # ------------------------------------------------------------------ API
+
+    def load_into(self, cache) -> int:
+        """
+        Mapeia em memória os snapshots válidos e registra no KVCacheManager.
+        Entradas de personas alteradas ou arquivos ausentes são descartadas.
+        Retorna quantos snapshots foram carregados.
+        """
+        loaded = 0
+        with self._lock, self._directory_lock():
+            self._index = self._read_index()
+            stale = [
+                digest for digest, meta in self._index.items()
+                if meta.get("persona") != self._fingerprint(meta.get("label"))
+                or not (self.directory / f"{digest}.kv").exists()
+            ]
+            for digest in stale:
+                self._drop(digest)
+            if stale:
+                self._write_index()
+                print(f"🗑️  [KV-STORE] {len(stale)} snapshot(s) invalidado(s) (persona/arquivo)")
+
+            # Gravações (.kv + índice) acontecem sob o mesmo lock: fora do índice
+            # em disco só sobra lixo de um processo que morreu no meio
+            for orphan in self.directory.glob("*.kv"):
+                if orphan.stem not in self._index:
+                    orphan.unlink(missing_ok=True)
+
+            # Mais recentes primeiro: se o orçamento em RAM acabar, ficam os últimos usados
+            entries = sorted(self._index.items(), key=lambda kv: kv[1].get("created_at", 0), reverse=True)
+            for digest, meta in entries:
+                with open(self.directory / f"{digest}.kv", "rb") as f:
+                    state = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                if cache.store(meta["tokens"], state, label=meta.get("label"), persist=False):
+                    self._mmaps.append(state)
+                    loaded += 1
+                else:
+                    state.close()
+
+        if loaded:
+            print(f"✅ [KV-STORE] {loaded} snapshot(s) de prefixo carregados de {self.directory}")
+        return loaded
+
+    def persist(self, tokens: Sequence[int], state, label: Optional[str] = None):
+        """Agenda a gravação de um snapshot (não bloqueia)"""
+        tokens = [int(t) for t in tokens]
+        self._writer.submit(self._persist_sync, tokens, bytes(state), label)
+
+    def _persist_sync(self, tokens: List[int], state: bytes, label: Optional[str]):
+        digest = tokens_digest(tokens)
+        try:
+            with self._lock, self._directory_lock():
+                self._index = self._read_index()  # mescla com o que outros processos gravaram
+                if digest in self._index:
+                    return
+                _atomic_write(self.directory / f"{digest}.kv", state)
+                self._index[digest] = {
+                    "tokens": tokens,
+                    "label": label,
+                    "persona": self._fingerprint(label),
+                    "n_bytes": len(state),
+                    "created_at": time.time(),
+                }
+                self._enforce_budget()
+                self._write_index()
+        except OSError as exc:
+            print(f"⚠️  [KV-STORE] Falha ao gravar snapshot: {exc}")
+
+    def _enforce_budget(self):
+        """Remove os snapshots mais antigos até caber em max_bytes"""
+        total = sum(meta["n_bytes"] for meta in self._index.values())
+        for digest, meta in sorted(self._index.items(), key=lambda kv: kv[1]["created_at"]):
+            if total <= self.max_bytes:
+                break
+            total -= meta["n_bytes"]
+            self._drop(digest)
+
+    def invalidate(self, label: Optional[str] = None) -> int:
+        """Remove do disco os snapshots de um label (ou todos se None)"""
+        with self._lock, self._directory_lock():
+            self._index = self._read_index()
+            digests = [d for d, meta in self._index.items() if label is None or meta.get("label") == label]
+            for digest in digests:
+                self._drop(digest)
+            if digests:
+                self._write_index()
+            return len(digests)
+
+    def flush(self, timeout: Optional[float] = None):
+        """Aguarda as gravações pendentes"""
+        self._writer.submit(lambda: None).result(timeout=timeout)
+
+    def close(self):
+        """Aguarda as gravações e libera o diretório para o prune de outros processos"""
+        self._writer.shutdown(wait=True)
+        self._in_use.release()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "directory": str(self.directory),
+                "snapshots": len(self._index),
+                "disk_bytes": sum(meta["n_bytes"] for meta in self._index.values()),
+                "max_bytes": self.max_bytes,
+            }
@@ -0,0 +1,178 @@
+"""
+Response Cache
+Cache exato de completions: mesma sequência de tokens do prompt final + mesmos
+parâmetros de amostragem → mesma resposta, sem passar pelo engine.
+
+- Só para requisições de temperatura baixa (quase determinísticas)
+- LRU limitado em bytes + TTL por entrada
+- Cada entrada guarda os namespaces de RAG que alimentaram o prompt; quando um
+  namespace muda (PersistentRAG) a entrada cai, e mudança no grafo (GraphRAG)
+  derruba tudo, já que toda consulta passa pelo grafo
+- A resposta em cache pode ser reenviada como stream (replay em pedaços)
+"""
+import hashlib
+import json
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+from utils.metrics import metrics
+
+# Overhead aproximado de uma entrada (chave, dataclass, dicts)
+ENTRY_OVERHEAD_BYTES = 256
+
+
+@dataclass
+class CachedResponse:
+    """Resposta completa de uma geração"""
+    content: str
+    finish_reason: str
+    usage: Dict[str, int]
+    namespaces: frozenset = field(default_factory=frozenset)
+    created_at: float = field(default_factory=time.time)
+    hits: int = 0
+
+    @property
+    def size_bytes(self) -> int:
+        return len(self.content.encode("utf-8")) + ENTRY_OVERHEAD_BYTES
+
+
+class ResponseCache:
+    """Cache exato de respostas por prompt tokenizado + sampling params"""
+
+    def __init__(
+        self,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl: float = 3600.0,
+        max_temperature: float = 0.3
+    ):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.max_temperature = max_temperature
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    def eligible(self, temperature: float) -> bool:
+        return self.max_bytes > 0 and temperature <= self.max_temperature
+
+    @staticmethod
+    def make_key(prompt_tokens: Sequence[int], **params: Any) -> str:
+        """Hash dos ids do prompt + parâmetros de amostragem (ordem das chaves irrelevante)"""
+        digest = hashlib.blake2b(array("i", prompt_tokens).tobytes(), digest_size=20)
+        digest.update(json.dumps(params, sort_keys=True, default=str).encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry.created_at > self.ttl:
+                self._drop(key)
+                entry = None
+            if entry is None:
+                self._misses += 1
+                metrics.increment("response_cache.miss")
+                return None
+            self._entries.move_to_end(key)
+            entry.hits += 1
+            self._hits += 1
+        metrics.increment("response_cache.hit")
+        return entry
+
+    def put(
+        self,
+        key: str,
+        content: str,
+        finish_reason: str,
+        usage: Optional[Dict[str, int]] = None,
+        namespaces: Optional[List[str]] = None
+    ):
+        """Guarda só gerações completas (stop/length); cancelamentos e erros não entram"""
+        if finish_reason not in ("stop", "length") or not content:
+            return
+        entry = CachedResponse(
+            content=content,
+            finish_reason=finish_reason,
+            usage=dict(usage or {}),
+            namespaces=frozenset(namespaces or ()),
+        )
+        if entry.size_bytes > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = entry
+            self._bytes += entry.size_bytes
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self._evictions += 1
+                metrics.increment("response_cache.evicted")
+
+    def _drop(self, key: str):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size_bytes
+
+    def invalidate_namespace(self, namespace: str) -> int:
+        """Remove respostas cujo prompt usou o namespace de RAG alterado"""
+        with self._lock:
+            stale = [k for k, e in self._entries.items() if namespace in e.namespaces]
+            for key in stale:
+                self._drop(key)
+            self._invalidations += len(stale)
+        if stale:
+            print(f"🧹 [RESPONSE-CACHE] Namespace '{namespace}' mudou: {len(stale)} respostas invalidadas")
+        return len(stale)
+
+    def invalidate_all(self, reason: str = "") -> int:
+        with self._lock:
+            count = len(self._entries)
+            self._entries.clear()
+            self._bytes = 0
+            self._invalidations += count
+        if count:
+            print(f"🧹 [RESPONSE-CACHE] {count} respostas invalidadas{f' ({reason})' if reason else ''}")
+        return count
+
+    @staticmethod
+    def replay(entry: CachedResponse, chunk_chars: int = 16) -> Iterator[str]:
+        """Resposta em cache como pedaços de texto para streaming"""
+        content = entry.content
+        for start in range(0, len(content), chunk_chars):
+            yield content[start:start + chunk_chars]
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / total * 100, 2) if total else 0,
+                "evictions": self._evictions,
+                "invalidations": self._invalidations,
+            }
+
+
+def _create_response_cache() -> ResponseCache:
+    from infrastructure.config.settings import get_settings
+
+    settings = get_settings()
+    return ResponseCache(
+        max_bytes=settings.response_cache_max_bytes if settings.response_cache_enabled else 0,
+        ttl=settings.response_cache_ttl,
+        max_temperature=settings.response_cache_max_temperature,
+    )
+
+
+# Instância global
+response_cache = _create_response_cache()
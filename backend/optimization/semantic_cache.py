@@ -0,0 +1,309 @@
+"""
+Semantic Answer Cache
+Cache de respostas por similaridade da pergunta ("Onde o Rapha estuda?" ≈
+"Qual a universidade do Rapha?"), por expert.
+
+- A pergunta é normalizada (minúsculas, sem acento/pontuação) e vira um
+  embedding local (rag/embeddings.py: llama.cpp em modo embedding com um GGUF
+  pequeno, compartilhado com a busca densa do RAG)
+- Busca pelo vizinho mais próximo (cosseno) entre as respostas do mesmo expert;
+  acima de threshold a resposta é servida sem RAG nem geração
+- Frescor: TTL global com override por expert + invalidação por namespace de
+  RAG (mesmos ganchos do response_cache)
+- Auditoria: uma amostra dos hits NÃO é servida; a geração roda normalmente e a
+  resposta nova é comparada com a do cache. Se divergir, conta como falso hit
+  (métrica + registro em jsonl para revisão)
+
+Só perguntas de turno único entram: com histórico, a mesma frase pode pedir
+outra coisa.
+"""
+import json
+import random
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from utils.metrics import metrics
+
+
+def normalize_query(text: str) -> str:
+    """Minúsculas, sem acentos, sem pontuação, espaços colapsados"""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+
+@dataclass
+class SemanticEntry:
+    query: str
+    answer: str
+    finish_reason: str
+    namespaces: frozenset = field(default_factory=frozenset)
+    created_at: float = field(default_factory=time.time)
+    hits: int = 0
+
+
+@dataclass
+class SemanticHit:
+    """Resultado de lookup; audit=True significa: gerar mesmo assim e chamar audit()"""
+    expert_id: str
+    query: str
+    entry: SemanticEntry
+    score: float
+    audit: bool = False
+
+
+class _ExpertIndex:
+    """Vetores normalizados (matriz densa) + entradas de um expert, LRU por uso"""
+
+    def __init__(self, dim: int, capacity: int):
+        self.capacity = capacity
+        self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self.entries: List[Optional[SemanticEntry]] = [None] * capacity
+        self.lru: "OrderedDict[int, None]" = OrderedDict()
+
+    def search(self, vector: np.ndarray):
+        if not self.lru:
+            return None, 0.0
+        rows = np.fromiter(self.lru.keys(), dtype=np.int64)
+        scores = self.vectors[rows] @ vector
+        best = int(np.argmax(scores))
+        return int(rows[best]), float(scores[best])
+
+    def add(self, vector: np.ndarray, entry: SemanticEntry):
+        if len(self.lru) < self.capacity:
+            row = next(i for i, e in enumerate(self.entries) if e is None)
+        else:
+            row, _ = self.lru.popitem(last=False)
+        self.vectors[row] = vector
+        self.entries[row] = entry
+        self.lru[row] = None
+
+    def touch(self, row: int):
+        self.lru.move_to_end(row)
+
+    def remove(self, row: int):
+        self.entries[row] = None
+        self.lru.pop(row, None)
+
+
+class SemanticCache:
+    """Cache semântico de respostas, particionado por expert"""
+
+    def __init__(
+        self,
+        embed: Callable[[str], Sequence[float]],
+        threshold: float = 0.92,
+        max_entries_per_expert: int = 512,
+        ttl: float = 24 * 3600.0,
+        expert_ttls: Optional[Dict[str, float]] = None,
+        audit_rate: float = 0.05,
+        answer_threshold: float = 0.85,
+        audit_log: Optional[Path] = None,
+        experts: Optional[List[str]] = None,
+        rng: Optional[random.Random] = None
+    ):
+        self._embed = embed
+        self.experts = set(experts or ())
+        self.threshold = threshold
+        self.max_entries_per_expert = max_entries_per_expert
+        self.ttl = ttl
+        self.expert_ttls = dict(expert_ttls or {})
+        self.audit_rate = audit_rate
+        self.answer_threshold = answer_threshold
+        self.audit_log = audit_log
+        self._rng = rng or random.Random()
+        self._indexes: Dict[str, _ExpertIndex] = {}
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def accepts(self, expert_id: str, messages: List[Dict[str, Any]]) -> bool:
+        """Pergunta de turno único (sem histórico) de um expert habilitado (vazio = todos)"""
+        if self.experts and expert_id not in self.experts:
+            return False
+        turns = [m for m in messages if m.get("role") in ("user", "assistant")]
+        return len(turns) == 1 and isinstance(turns[0].get("content"), str)
+
+    def _vector(self, text: str) -> np.ndarray:
+        vector = np.asarray(self._embed(text), dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm > 0 else vector
+
+    def _count(self, expert_id: str, name: str):
+        stats = self._stats.setdefault(expert_id, {"hits": 0, "misses": 0, "audits": 0, "false_hits": 0})
+        stats[name] += 1
+        metrics.increment(f"semantic_cache.{name}", tags={"expert": expert_id})
+
+    def _fresh(self, expert_id: str, entry: SemanticEntry) -> bool:
+        return time.time() - entry.created_at <= self.expert_ttls.get(expert_id, self.ttl)
+
+    def lookup(self, expert_id: str, query: str) -> Optional[SemanticHit]:
+        normalized = normalize_query(query)
+        if not normalized:
+            return None
+        vector = self._vector(normalized)
+        with self._lock:
+            index = self._indexes.get(expert_id)
+            row, score = index.search(vector) if index else (None, 0.0)
+            entry = index.entries[row] if row is not None else None
+            if entry is not None and not self._fresh(expert_id, entry):
+                index.remove(row)
+                entry = None
+            if entry is None or score < self.threshold:
+                self._count(expert_id, "misses")
+                return None
+            index.touch(row)
+            audit = self._rng.random() < self.audit_rate
+            if audit:
+                self._count(expert_id, "audits")
+            else:
+                entry.hits += 1
+                self._count(expert_id, "hits")
+        return SemanticHit(expert_id, query, entry, score, audit=audit)
+
+    def store(
+        self,
+        expert_id: str,
+        query: str,
+        answer: str,
+        finish_reason: str = "stop",
+        namespaces: Optional[List[str]] = None
+    ):
+        """Guarda só respostas completas (finish_reason "stop"; cortadas por max_tokens não)"""
+        normalized = normalize_query(query)
+        if finish_reason != "stop" or not answer or not normalized:
+            return
+        vector = self._vector(normalized)
+        entry = SemanticEntry(query, answer, finish_reason, frozenset(namespaces or ()))
+        with self._lock:
+            index = self._indexes.get(expert_id)
+            if index is None:
+                index = self._indexes[expert_id] = _ExpertIndex(vector.shape[0], self.max_entries_per_expert)
+            row, score = index.search(vector)
+            if row is not None and score >= 0.999:
+                # Mesma pergunta: substitui a resposta antiga
+                index.remove(row)
+            index.add(vector, entry)
+
+    def audit(self, hit: SemanticHit, generated: str) -> bool:
+        """
+        Compara a resposta gerada com a do cache para um hit amostrado.
+        Returns: True se as respostas concordam
+        """
+        agreement = float(self._vector(normalize_query(generated)) @ self._vector(normalize_query(hit.entry.answer)))
+        agreed = agreement >= self.answer_threshold
+        with self._lock:
+            if not agreed:
+                self._count(hit.expert_id, "false_hits")
+        if self.audit_log is not None:
+            record = {
+                "timestamp": time.time(),
+                "expert": hit.expert_id,
+                "query": hit.query,
+                "cached_query": hit.entry.query,
+                "query_score": round(hit.score, 4),
+                "answer_score": round(agreement, 4),
+                "false_hit": not agreed,
+            }
+            try:
+                self.audit_log.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.audit_log, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            except OSError as exc:
+                print(f"⚠️  [SEMANTIC-CACHE] Falha ao gravar auditoria: {exc}")
+        return agreed
+
+    def invalidate_namespace(self, namespace: str) -> int:
+        removed = 0
+        with self._lock:
+            for index in self._indexes.values():
+                for row in list(index.lru):
+                    if namespace in index.entries[row].namespaces:
+                        index.remove(row)
+                        removed += 1
+        return removed
+
+    def invalidate_all(self) -> int:
+        with self._lock:
+            removed = sum(len(index.lru) for index in self._indexes.values())
+            self._indexes.clear()
+        return removed
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            experts = {}
+            for expert_id, stats in self._stats.items():
+                served = stats["hits"] + stats["misses"] + stats["audits"]
+                experts[expert_id] = {
+                    **stats,
+                    "entries": len(self._indexes[expert_id].lru) if expert_id in self._indexes else 0,
+                    "hit_rate": round(stats["hits"] / served * 100, 2) if served else 0,
+                    "false_hit_rate": round(stats["false_hits"] / stats["audits"] * 100, 2) if stats["audits"] else 0,
+                }
+            return {"threshold": self.threshold, "experts": experts}
+
+
+# ----------------------------------------------------------------------
+# Instância global (só com modelo de embedding configurado)
+# ----------------------------------------------------------------------
+_semantic_cache: Optional[SemanticCache] = None
+_semantic_lock = threading.Lock()
+_semantic_disabled = False
+
+
+def get_semantic_cache() -> Optional[SemanticCache]:
+    """
+    Cache semântico global, ou None se desabilitado / sem modelo de embedding
+    (settings.semantic_cache_embedding_model, ex.: um GGUF multilingual-e5-small).
+    """
+    global _semantic_cache, _semantic_disabled
+    if _semantic_cache is not None or _semantic_disabled:
+        return _semantic_cache
+
+    with _semantic_lock:
+        if _semantic_cache is None and not _semantic_disabled:
+            from infrastructure.config.settings import get_settings
+
+            settings = get_settings()
+            if not settings.semantic_cache_enabled or not settings.semantic_cache_embedding_model:
+                _semantic_disabled = True
+                return None
+            try:
+                from infrastructure.config.paths import get_data_path
+                from rag.embeddings import get_embedder
+
+                embedder = get_embedder()
+                if embedder is None:
+                    raise RuntimeError("modelo de embedding indisponível")
+                _semantic_cache = SemanticCache(
+                    embed=embedder.embed,
+                    threshold=settings.semantic_cache_threshold,
+                    max_entries_per_expert=settings.semantic_cache_max_entries,
+                    ttl=settings.semantic_cache_ttl,
+                    expert_ttls=settings.semantic_cache_expert_ttls,
+                    audit_rate=settings.semantic_cache_audit_rate,
+                    audit_log=get_data_path() / "semantic_cache_audit.jsonl",
+                    experts=settings.semantic_cache_experts,
+                )
+                print("✅ [SEMANTIC-CACHE] Ativo")
+            except Exception as exc:
+                print(f"⚠️  [SEMANTIC-CACHE] Desabilitado: {exc}")
+                _semantic_disabled = True
+    return _semantic_cache
+
+
+def invalidate_semantic_cache(namespace: Optional[str] = None) -> int:
+    """Invalida o cache global se já estiver ativo (não carrega o modelo de embedding)"""
+    if _semantic_cache is None:
+        return 0
+    if namespace is None:
+        return _semantic_cache.invalidate_all()
+    return _semantic_cache.invalidate_namespace(namespace)
@@ -2,12 +2,12 @@
 RAG Module
 """
 from .advanced_rag import AdvancedRAG, RAGChunk, advanced_rag
-from .graph_rag import GraphRAG, KnowledgeGraph, Entity, Relationship, graph_rag
+from .graph_rag import GraphRAG, graph_rag
 from .enhanced_rag import EnhancedRAG, EnhancedRAGChunk, enhanced_rag
 
 __all__ = [
     'AdvancedRAG', 'RAGChunk', 'advanced_rag',
-    'GraphRAG', 'KnowledgeGraph', 'Entity', 'Relationship', 'graph_rag',
+    'GraphRAG', 'graph_rag',
     'EnhancedRAG', 'EnhancedRAGChunk', 'enhanced_rag'
 ]
 
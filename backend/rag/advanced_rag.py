@@ -7,6 +7,10 @@ Features:
 - Re-ranking
 - Hybrid search (semantic + keyword)
 - Context compression
+
+A parte semântica usa embeddings locais (rag/embeddings.py) quando
+settings.rag_vector_enabled e há modelo; sem modelo, cai no casamento de
+substring.
 """
 from typing import List, Dict, Optional, Tuple
 import re
@@ -25,8 +29,47 @@ class RAGChunk:
 class AdvancedRAG:
     """RAG avançado com otimizações baseadas em papers"""
     
-    def __init__(self):
+    def __init__(self, embedder=None):
         self.query_cache: Dict[str, List[RAGChunk]] = {}
+        self.embedder = embedder
+    
+    def _get_embedder(self):
+        if self.embedder is not None:
+            return self.embedder
+        from infrastructure.config.settings import get_settings
+        if not get_settings().rag_vector_enabled:
+            return None
+        from rag.embeddings import get_embedder
+        return get_embedder()
+    
+    def semantic_candidates(
+        self,
+        queries: List[str],
+        chunks: List[RAGChunk],
+        top_k: int,
+        min_similarity: float = 0.35
+    ) -> Optional[List[RAGChunk]]:
+        """
+        Chunks mais próximos (cosseno, melhor entre as queries expandidas),
+        com score = similaridade. None sem modelo de embedding.
+        O embedder guarda os vetores por texto (rag/embeddings.py): só chunks
+        novos passam pelo modelo.
+        """
+        embedder = self._get_embedder()
+        if embedder is None:
+            return None
+        if not chunks:
+            return []
+        from rag.vector_index import top_k_indices
+        
+        vectors = embedder.embed_many(queries + [chunk.content for chunk in chunks])
+        similarity = (vectors[len(queries):] @ vectors[:len(queries)].T).max(axis=1)
+        return [
+            RAGChunk(content=chunks[i].content, score=float(similarity[i]),
+                     source=chunks[i].source, metadata=chunks[i].metadata)
+            for i in top_k_indices(similarity, top_k).tolist()
+            if similarity[i] >= min_similarity
+        ]
     
     def expand_query(self, query: str) -> List[str]:
         """
@@ -138,13 +181,14 @@ class AdvancedRAG:
         # 1. Query expansion
         expanded_queries = self.expand_query(query)
         
-        # 2. Buscar chunks para cada query expandida
-        all_chunks = []
-        for exp_query in expanded_queries:
-            # Simular busca semântica (em produção, usar embeddings reais)
-            for chunk in chunks:
-                if exp_query.lower() in chunk.content.lower():
-                    all_chunks.append(chunk)
+        # 2. Buscar chunks para cada query expandida (embeddings; sem modelo, substring)
+        all_chunks = self.semantic_candidates(expanded_queries, chunks, top_k * 4)
+        if all_chunks is None:
+            all_chunks = []
+            for exp_query in expanded_queries:
+                for chunk in chunks:
+                    if exp_query.lower() in chunk.content.lower():
+                        all_chunks.append(chunk)
         
         # 3. Re-ranking
         reranked = self.rerank_chunks(all_chunks, query, top_k=top_k * 2)
@@ -0,0 +1,101 @@
+"""
+Local Embeddings
+Modelo de embedding na CPU (llama.cpp em modo embedding com um GGUF pequeno,
+ex.: multilingual-e5-small), compartilhado entre o cache semântico e a busca
+densa do RAG: o modelo é carregado uma vez só.
+
+Embeddings ficam num LRU por texto: chunks que voltam em várias consultas (ex.:
+candidatos do AdvancedRAG) não passam pelo modelo de novo.
+"""
+import threading
+from collections import OrderedDict
+from typing import Optional, Sequence
+
+import numpy as np
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """Vetores com norma 1 (cosseno vira produto interno)"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1.0)
+
+
+class LocalEmbedder:
+    """Embeddings normalizados a partir de um modelo llama.cpp"""
+
+    def __init__(self, model, batch_size: int = 32, cache_size: int = 8192):
+        self.model = model
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()  # o contexto do llama.cpp não é thread-safe
+        self._cache_lock = threading.Lock()
+
+    def embed(self, text: str) -> np.ndarray:
+        return self.embed_many([text])[0]
+
+    def embed_many(self, texts: Sequence[str]) -> np.ndarray:
+        """Matriz (len(texts), dim) float32 normalizada; só textos fora do cache vão ao modelo"""
+        if not len(texts):
+            return np.empty((0, 0), dtype=np.float32)
+        with self._cache_lock:
+            cached = {text: self._cache[text] for text in texts if text in self._cache}
+            for text in cached:
+                self._cache.move_to_end(text)
+        missing = list(dict.fromkeys(text for text in texts if text not in cached))
+
+        computed = {}
+        for start in range(0, len(missing), self.batch_size):
+            batch = missing[start:start + self.batch_size]
+            with self._lock:
+                vectors = self.model.embed(batch, normalize=True, truncate=True)
+            computed.update(zip(batch, normalize_rows(np.asarray(vectors, dtype=np.float32))))
+
+        if computed:
+            with self._cache_lock:
+                self._cache.update(computed)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return np.stack([cached.get(text, computed.get(text)) for text in texts])
+
+
+_embedder: Optional[LocalEmbedder] = None
+_embedder_lock = threading.Lock()
+_embedder_disabled = False
+
+
+def get_embedder() -> Optional[LocalEmbedder]:
+    """
+    Embedder global, ou None sem modelo configurado
+    (settings.semantic_cache_embedding_model) ou sem llama_cpp.
+    """
+    global _embedder, _embedder_disabled
+    if _embedder is not None or _embedder_disabled:
+        return _embedder
+
+    with _embedder_lock:
+        if _embedder is None and not _embedder_disabled:
+            from infrastructure.config.settings import get_settings
+
+            settings = get_settings()
+            if not settings.semantic_cache_embedding_model:
+                _embedder_disabled = True
+                return None
+            try:
+                from llama_cpp import Llama
+                from infrastructure.config.paths import get_embedding_model_path
+
+                model_path = get_embedding_model_path()
+                print(f"📂 [EMBEDDINGS] Carregando modelo de embedding {model_path.name}...")
+                _embedder = LocalEmbedder(Llama(
+                    model_path=str(model_path),
+                    embedding=True,
+                    n_ctx=512,
+                    n_threads=settings.engine_threads,
+                    verbose=False,
+                ))
+            except Exception as exc:
+                print(f"⚠️  [EMBEDDINGS] Indisponível: {exc}")
+                _embedder_disabled = True
+    return _embedder
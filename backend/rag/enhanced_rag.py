@@ -9,11 +9,23 @@ Features:
 - Contextual Compression
 - Hybrid Search Melhorado
 - Metadata Filtering
+
+O rerank trabalha sobre features pré-calculadas dos chunks (ChunkIndex: ids de
+tokens, hashes de bigramas, tamanho, posição, domínio) e pontua todos os
+candidatos de todas as queries reescritas numa passada NumPy: o custo acompanha
+o número de candidatos, não tamanho do texto × reescritas.
 """
-from typing import List, Dict, Optional, Tuple, Set
+from typing import List, Dict, Optional, Tuple, Set, Union
 import re
 from dataclasses import dataclass
 from collections import Counter
+from functools import lru_cache
+
+import numpy as np
+
+from rag.vector_index import top_k_indices
+
+_WORD = re.compile(r'\w+')
 
 
 @dataclass
@@ -27,6 +39,116 @@ class EnhancedRAGChunk:
     position: int = 0  # Posição no documento original
 
 
+def _token_ids(text: str) -> np.ndarray:
+    """Hash de cada palavra (minúsculas), na ordem do texto"""
+    return np.fromiter((hash(w) for w in _WORD.findall(text.lower())), dtype=np.int64)
+
+
+def _bigram_ids(text: str) -> np.ndarray:
+    """Hash de cada par de palavras consecutivas (frases de 2 palavras)"""
+    words = _WORD.findall(text.lower())
+    return np.fromiter((hash(pair) for pair in zip(words, words[1:])), dtype=np.int64)
+
+
+@lru_cache(maxsize=8192)
+def _content_features(content: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Tokens e bigramas distintos de um texto (o mesmo chunk volta em várias consultas)"""
+    return np.unique(_token_ids(content)), np.unique(_bigram_ids(content))
+
+
+def _lookup(keys: np.ndarray, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Posição de cada value em keys (ordenado) e máscara de quem foi encontrado"""
+    if not keys.size:
+        return np.zeros(len(values), dtype=np.int64), np.zeros(len(values), dtype=bool)
+    positions = np.minimum(np.searchsorted(keys, values), keys.size - 1)
+    return positions, keys[positions] == values
+
+
+class ChunkIndex:
+    """
+    Features dos chunks calculadas uma vez. Tokens e bigramas ficam em arrays
+    planos com o chunk dono de cada um (layout CSR), então casar uma consulta
+    é um searchsorted + bincount sobre todos os chunks de uma vez.
+    """
+    
+    def __init__(self, chunks: List[EnhancedRAGChunk]):
+        self.chunks = list(chunks)
+        features = [_content_features(chunk.content) for chunk in self.chunks]
+        owners = np.arange(len(self.chunks), dtype=np.int64)
+        self.term_ids = np.concatenate([t for t, _ in features]) if features else np.empty(0, dtype=np.int64)
+        self.term_owner = np.repeat(owners, [len(t) for t, _ in features])
+        self.bigram_ids = np.concatenate([b for _, b in features]) if features else np.empty(0, dtype=np.int64)
+        self.bigram_owner = np.repeat(owners, [len(b) for _, b in features])
+        self.lengths = np.array([len(c.content) for c in self.chunks], dtype=np.float64)
+        self.positions = np.array([c.position for c in self.chunks], dtype=np.float64)
+        self.base_scores = np.array([c.score for c in self.chunks], dtype=np.float64)
+        self.domains = np.array([c.domain for c in self.chunks], dtype=object)
+        # Achados pela busca densa (metadata["similarity"]): paráfrases sem palavra em comum
+        self.dense = np.array([(c.metadata or {}).get("similarity") is not None for c in self.chunks], dtype=bool)
+    
+    def __len__(self) -> int:
+        return len(self.chunks)
+    
+    def keyword_overlap(self, queries: List[str]) -> np.ndarray:
+        """
+        Fração das palavras de cada query presentes em cada chunk: matriz
+        (chunks × queries) = indicador chunk×termo @ indicador termo×query
+        """
+        term_sets = [np.unique(_token_ids(q)) for q in queries]
+        vocab = np.unique(np.concatenate(term_sets)) if term_sets else np.empty(0, dtype=np.int64)
+        overlap = np.zeros((len(self.chunks), len(queries)))
+        if not vocab.size or not len(self.chunks):
+            return overlap
+        
+        membership = np.zeros((vocab.size, len(queries)))
+        for column, ids in enumerate(term_sets):
+            membership[np.searchsorted(vocab, ids), column] = 1.0
+        positions, found = _lookup(vocab, self.term_ids)
+        indicator = np.zeros((len(self.chunks), vocab.size))
+        indicator[self.term_owner[found], positions[found]] = 1.0
+        return (indicator @ membership) / np.maximum(membership.sum(axis=0), 1.0)
+    
+    def phrase_matches(self, query: str) -> np.ndarray:
+        """Quantos bigramas da query (com repetição) aparecem em cada chunk"""
+        query_bigrams, weights = np.unique(_bigram_ids(query), return_counts=True)
+        positions, found = _lookup(query_bigrams, self.bigram_ids)
+        return np.bincount(
+            self.bigram_owner[found], weights=weights[positions[found]].astype(np.float64),
+            minlength=len(self.chunks)
+        )
+    
+    def signals(
+        self,
+        query: str,
+        rows: Optional[np.ndarray] = None,
+        keyword: Optional[np.ndarray] = None
+    ) -> Dict[str, np.ndarray]:
+        """Sinais de relevância das linhas pedidas (todas por padrão)"""
+        if rows is None:
+            rows = np.arange(len(self.chunks))
+        if keyword is None:
+            keyword = self.keyword_overlap([query])[rows, 0]
+        lengths = self.lengths[rows]
+        return {
+            "keyword": keyword,
+            "phrase": np.minimum(self.phrase_matches(query)[rows] * 0.3, 1.0),
+            "position": 1.0 / (1.0 + self.positions[rows] * 0.1),
+            "length": np.clip(1.0 - np.abs(lengths - 200) / 400, 0.0, 1.0),  # ideal ~200 chars
+            "domain": np.where(self.domains[rows] != None, 1.0, 0.8),  # noqa: E711
+        }
+    
+    def chunk(self, row: int, score: float) -> EnhancedRAGChunk:
+        chunk = self.chunks[row]
+        return EnhancedRAGChunk(
+            content=chunk.content,
+            score=float(score),
+            source=chunk.source,
+            domain=chunk.domain,
+            metadata=chunk.metadata,
+            position=chunk.position
+        )
+
+
 class EnhancedRAG:
     """
     RAG Avançado com técnicas de 2024-2025
@@ -138,99 +260,66 @@ class EnhancedRAG:
         # Limitar a 5 queries reescritas
         return rewritten[:5]
     
+    def index_chunks(self, chunks: List[EnhancedRAGChunk]) -> ChunkIndex:
+        """Pré-calcula as features dos chunks (reaproveitável entre consultas)"""
+        return ChunkIndex(chunks)
+    
+    @staticmethod
+    def fuse_signals(signals: Dict[str, np.ndarray], base_scores: np.ndarray) -> np.ndarray:
+        """Score combinado (pesos otimizados)"""
+        return (
+            signals["keyword"] * 0.25 +
+            signals["phrase"] * 0.35 +
+            base_scores * 0.20 +
+            signals["position"] * 0.10 +
+            signals["length"] * 0.05 +
+            signals["domain"] * 0.05
+        )
+    
     def advanced_rerank(
         self,
-        chunks: List[EnhancedRAGChunk],
+        chunks: Union[List[EnhancedRAGChunk], ChunkIndex],
         query: str,
         top_k: int = 5
     ) -> List[EnhancedRAGChunk]:
         """
         Advanced Reranking: Cross-encoder-like scoring
-        Combina múltiplos sinais de relevância
+        Combina múltiplos sinais de relevância: palavras da query (keyword),
+        frases de 2 palavras (phrase), posição, tamanho e domínio
         """
-        query_lower = query.lower()
-        query_words = set(re.findall(r'\w+', query_lower))
-        
-        scored_chunks = []
-        
-        for chunk in chunks:
-            content_lower = chunk.content.lower()
-            content_words = set(re.findall(r'\w+', content_lower))
-            
-            # 1. Keyword Matching Score (BM25-like)
-            common_words = query_words.intersection(content_words)
-            keyword_score = len(common_words) / max(len(query_words), 1)
-            
-            # 2. Phrase Matching Score (mais importante)
-            phrase_score = 0.0
-            query_phrases = []
-            words_list = query_lower.split()
-            for i in range(len(words_list) - 1):
-                phrase = f"{words_list[i]} {words_list[i+1]}"
-                query_phrases.append(phrase)
-            
-            for phrase in query_phrases:
-                if phrase in content_lower:
-                    phrase_score += 0.3
-            
-            phrase_score = min(phrase_score, 1.0)
-            
-            # 3. Position Score (chunks no início são mais relevantes)
-            position_score = 1.0 / (1.0 + chunk.position * 0.1)
-            
-            # 4. Length Score (chunks muito curtos ou muito longos são menos relevantes)
-            content_length = len(chunk.content)
-            ideal_length = 200  # Tamanho ideal de chunk
-            length_score = 1.0 - abs(content_length - ideal_length) / (ideal_length * 2)
-            length_score = max(0.0, min(1.0, length_score))
-            
-            # 5. Domain Score (se domain match)
-            domain_score = 1.0 if chunk.domain else 0.8
-            
-            # Score combinado (pesos otimizados)
-            combined_score = (
-                keyword_score * 0.25 +
-                phrase_score * 0.35 +
-                chunk.score * 0.20 +
-                position_score * 0.10 +
-                length_score * 0.05 +
-                domain_score * 0.05
-            )
-            
-            scored_chunks.append(EnhancedRAGChunk(
-                content=chunk.content,
-                score=combined_score,
-                source=chunk.source,
-                domain=chunk.domain,
-                metadata=chunk.metadata,
-                position=chunk.position
-            ))
-        
-        # Ordenar por score e retornar top_k
-        scored_chunks.sort(key=lambda x: x.score, reverse=True)
-        return scored_chunks[:top_k]
+        index = chunks if isinstance(chunks, ChunkIndex) else ChunkIndex(chunks)
+        if not len(index):
+            return []
+        combined = self.fuse_signals(index.signals(query), index.base_scores)
+        return [index.chunk(row, combined[row]) for row in top_k_indices(combined, top_k).tolist()]
     
     def compress_context(
         self,
         chunks: List[EnhancedRAGChunk],
         max_tokens: int = 1000,
-        preserve_important: bool = True
+        preserve_important: bool = True,
+        counter=None
     ) -> str:
         """
         Contextual Compression: Remove redundâncias mantendo informação relevante
+        
+        Tokens contados com o vocabulário do modelo (counter ou o contador global
+        de core/services/inference/token_budget.py); o corte do último chunk é
+        feito com precisão de token.
         """
         if not chunks:
             return ""
         
-        # Estimar tokens (aproximação: 4 chars = 1 token)
-        max_chars = max_tokens * 4
+        if counter is None:
+            from core.services.inference.token_budget import get_token_counter
+            counter = get_token_counter()
         
         # Se preserve_important, priorizar chunks com maior score
         if preserve_important:
             chunks = sorted(chunks, key=lambda x: x.score, reverse=True)
         
         compressed_parts = []
-        current_length = 0
+        current_tokens = 0
         seen_content = set()  # Evitar duplicatas
         
         for chunk in chunks:
@@ -240,7 +329,6 @@ class EnhancedRAG:
                 continue
             
             chunk_text = chunk.content.strip()
-            chunk_length = len(chunk_text)
             
             # Remover redundâncias dentro do chunk
             if preserve_important:
@@ -255,17 +343,17 @@ class EnhancedRAG:
                         important_sentences.append(sent)
                 
                 chunk_text = '. '.join(important_sentences[:3])  # Máximo 3 sentenças
-                chunk_length = len(chunk_text)
             
-            if current_length + chunk_length <= max_chars:
+            chunk_tokens = counter.count(chunk_text)
+            if current_tokens + chunk_tokens <= max_tokens:
                 compressed_parts.append(chunk_text)
                 seen_content.add(content_hash)
-                current_length += chunk_length
+                current_tokens += chunk_tokens
             else:
                 # Truncar último chunk se necessário
-                remaining = max_chars - current_length
-                if remaining > 100:  # Só adicionar se sobrar espaço significativo
-                    compressed_parts.append(chunk_text[:remaining] + "...")
+                remaining = max_tokens - current_tokens
+                if remaining > 25:  # Só adicionar se sobrar espaço significativo
+                    compressed_parts.append(counter.truncate(chunk_text, remaining, keep="head"))
                 break
         
         return "\n\n".join(compressed_parts)
@@ -293,42 +381,41 @@ class EnhancedRAG:
     def hybrid_search_enhanced(
         self,
         query: str,
-        chunks: List[EnhancedRAGChunk],
+        chunks: Union[List[EnhancedRAGChunk], ChunkIndex],
         top_k: int = 5,
         domain: Optional[str] = None
     ) -> List[EnhancedRAGChunk]:
         """
         Hybrid Search Melhorado: Combina múltiplas estratégias
+        Entram os chunks com alguma palavra de uma query reescrita e os vindos
+        da busca densa (metadata["similarity"]), mesmo sem palavra em comum.
         """
+        index = chunks if isinstance(chunks, ChunkIndex) else ChunkIndex(chunks)
+        if not len(index):
+            return []
+        
         # 1. Query Rewriting
         rewritten_queries = self.rewrite_query(query)
         
-        # 2. Buscar chunks para cada query reescrita
-        all_chunks = []
-        for rewritten_query in rewritten_queries:
-            # Buscar chunks que correspondem à query reescrita
-            query_words = set(re.findall(r'\w+', rewritten_query.lower()))
-            for chunk in chunks:
-                content_words = set(re.findall(r'\w+', chunk.content.lower()))
-                overlap = len(query_words.intersection(content_words))
-                if overlap > 0:
-                    # Ajustar score baseado no overlap
-                    adjusted_chunk = EnhancedRAGChunk(
-                        content=chunk.content,
-                        score=chunk.score + (overlap / max(len(query_words), 1)) * 0.1,
-                        source=chunk.source,
-                        domain=chunk.domain,
-                        metadata=chunk.metadata,
-                        position=chunk.position
-                    )
-                    all_chunks.append(adjusted_chunk)
+        # 2. Overlap de cada chunk com todas as queries reescritas numa passada;
+        #    vale a melhor reescrita de cada chunk
+        overlap = index.keyword_overlap(rewritten_queries)
+        best_overlap = overlap.max(axis=1)
+        base_scores = index.base_scores + best_overlap * 0.1
+        candidates = ((best_overlap > 0) | index.dense) & (base_scores >= 0.0)
         
         # 3. Metadata Filtering
         if domain:
-            all_chunks = self.filter_by_metadata(all_chunks, domain=domain)
-        
-        # 4. Advanced Reranking
-        reranked = self.advanced_rerank(all_chunks, query, top_k=top_k * 2)
+            candidates &= index.domains == domain
+        rows = np.flatnonzero(candidates)
+        
+        # 4. Advanced Reranking (keyword = overlap com a query original)
+        signals = index.signals(query, rows, keyword=overlap[rows, 0])
+        combined = self.fuse_signals(signals, base_scores[rows])
+        reranked = [
+            index.chunk(rows[i], combined[i])
+            for i in top_k_indices(combined, top_k * 2).tolist()
+        ]
         
         # 5. Deduplicação final
         seen_content = set()
@@ -78,6 +78,12 @@ class GraphRAG:
             json.dump(data, f, indent=2, ensure_ascii=False)
         print(f"Semantic graph updated and saved to {SEMANTIC_GRAPH_PATH}")
 
+        # Toda consulta RAG passa pelo grafo: respostas em cache ficaram velhas
+        from optimization.response_cache import response_cache
+        from optimization.semantic_cache import invalidate_semantic_cache
+        response_cache.invalidate_all("grafo semântico atualizado")
+        invalidate_semantic_cache()
+
 
     def query_graph(
         self,
@@ -0,0 +1,118 @@
+"""
+Inverted Index + BM25
+Índice invertido em memória para os namespaces do PersistentRAG
+
+- termo → posting list {id da entrada: frequência do termo}
+- normalização para português: minúsculas, sem acentos ("mãe" == "mae"),
+  sem pontuação e sem stopwords
+- BM25 (k1=1.5, b=0.75) só sobre as postings dos termos da consulta e top-k
+  por heap: o custo da busca acompanha as entradas que contêm os termos, não
+  o tamanho do namespace
+- add/remove incrementais (harvester e extração de memória escrevem o tempo todo)
+"""
+import heapq
+import math
+import re
+import unicodedata
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+_WORD = re.compile(r"\w+")
+
+STOPWORDS = frozenset(
+    "a o e as os um uma uns umas de da do das dos em na no nas nos por para pra "
+    "com sem que se ao aos ou mas como mais menos muito ja nao sim eu tu ele ela "
+    "nos vos eles elas me te lhe seu sua seus suas meu minha meus minhas isso "
+    "isto esse essa este esta aquele aquela ser estar ter foi sao era tem ha "
+    "the of and to in is are for on with".split()
+)
+
+
+def normalize(text: str) -> str:
+    """Minúsculas e sem acentos"""
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def tokenize(text: str) -> List[str]:
+    """Termos indexáveis (normalizados, sem stopwords nem letras soltas)"""
+    return [w for w in _WORD.findall(normalize(text)) if len(w) > 1 and w not in STOPWORDS]
+
+
+class InvertedIndex:
+    """Índice invertido com BM25 e atualização incremental"""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.doc_len: Dict[str, int] = {}
+        self._doc_terms: Dict[str, Tuple[str, ...]] = {}  # para remover sem reprocessar o texto
+        self._total_len = 0
+
+    def __len__(self) -> int:
+        return len(self.doc_len)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self.doc_len
+
+    @property
+    def avg_len(self) -> float:
+        return self._total_len / len(self.doc_len) if self.doc_len else 0.0
+
+    def add(self, doc_id: str, text: str) -> None:
+        if doc_id in self.doc_len:
+            self.remove(doc_id)
+        terms = Counter(tokenize(text))
+        for term, tf in terms.items():
+            self.postings.setdefault(term, {})[doc_id] = tf
+        length = sum(terms.values())
+        self.doc_len[doc_id] = length
+        self._doc_terms[doc_id] = tuple(terms)
+        self._total_len += length
+
+    def remove(self, doc_id: str) -> bool:
+        if doc_id not in self.doc_len:
+            return False
+        for term in self._doc_terms.pop(doc_id):
+            posting = self.postings.get(term)
+            if posting is not None:
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self.postings[term]
+        self._total_len -= self.doc_len.pop(doc_id)
+        return True
+
+    def idf(self, term: str) -> float:
+        df = len(self.postings.get(term, ()))
+        return math.log(1 + (len(self.doc_len) - df + 0.5) / (df + 0.5))
+
+    def search(self, query: str, k: int = 5, terms: Optional[List[str]] = None) -> List[Tuple[str, float, float]]:
+        """
+        Top-k por BM25.
+
+        Returns:
+            [(doc_id, score BM25, fração dos termos da consulta presentes)]
+        """
+        query_terms = list(dict.fromkeys(terms if terms is not None else tokenize(query)))
+        if not query_terms or not self.doc_len:
+            return []
+
+        avg_len = self.avg_len or 1.0
+        scores: Dict[str, float] = {}
+        matched: Dict[str, int] = {}
+        for term in query_terms:
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = self.idf(term)
+            for doc_id, tf in posting.items():
+                norm = self.k1 * (1 - self.b + self.b * self.doc_len[doc_id] / avg_len)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+                matched[doc_id] = matched.get(doc_id, 0) + 1
+
+        top = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [(doc_id, score, matched[doc_id] / len(query_terms)) for doc_id, score in top]
+
+    def stats(self) -> Dict:
+        return {"documents": len(self.doc_len), "terms": len(self.postings), "avg_len": round(self.avg_len, 1)}
@@ -1,22 +1,57 @@
 """
 Persistent RAG with Namespace Support
 Armazena informações permanentemente organizadas por namespaces
+
+A busca usa um índice invertido com BM25 por namespace (rag/inverted_index.py),
+montado ao carregar o namespace e mantido em add/delete.
+
+Escritas vão para um log append-only por namespace (rag/wal.py) com fsync
+agrupado e compactação periódica no snapshot {namespace}.json.
+
+Com settings.rag_vector_enabled (e um modelo de embedding), a busca também é
+densa (rag/vector_index.py, vetores em {storage_dir}/vectors) e os dois
+rankings são fundidos por reciprocal rank fusion: paráfrases que não dividem
+palavras com a consulta também são encontradas.
 """
 
-import json
 import os
+import uuid
 from pathlib import Path
 from typing import List, Dict, Optional, Any
 from datetime import datetime
 
+from infrastructure.config.settings import get_settings
+from rag.inverted_index import InvertedIndex
+from rag.vector_index import VectorIndex, reciprocal_rank_fusion
+from rag.wal import NamespaceLog
+
 
 class PersistentRAG:
-    def __init__(self, storage_dir: str = "data/rag"):
+    def __init__(self, storage_dir: str = "data/rag", embedder=None):
         self.storage_dir = Path(storage_dir)
         self.storage_dir.mkdir(parents=True, exist_ok=True)
         
         # Cache em memória por namespace
         self.memory: Dict[str, List[Dict[str, Any]]] = {}
+        # Índice invertido e entradas por ID, por namespace
+        self.indexes: Dict[str, InvertedIndex] = {}
+        self._by_id: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        # Snapshot + log append-only por namespace
+        self._logs: Dict[str, NamespaceLog] = {}
+        # Busca densa (None = só BM25)
+        self.vectors: Optional[VectorIndex] = None
+        settings = get_settings()
+        if embedder is None and settings.rag_vector_enabled:
+            from rag.embeddings import get_embedder
+            embedder = get_embedder()
+        if embedder is not None:
+            self.vectors = VectorIndex(
+                self.storage_dir / "vectors",
+                embedder,
+                dtype=settings.rag_vector_dtype,
+                exact_max=settings.rag_vector_exact_max,
+                nprobe=settings.rag_vector_nprobe,
+            )
         
         print(f"💾 [RAG] Inicializado em {self.storage_dir}")
     
@@ -24,38 +59,97 @@ class PersistentRAG:
         """Retorna caminho do arquivo para um namespace"""
         return self.storage_dir / f"{namespace}.json"
     
+    @staticmethod
+    def _index_text(entry: Dict[str, Any]) -> str:
+        """Texto indexado: conteúdo + tags"""
+        return " ".join([entry.get("text", ""), *entry.get("tags", [])])
+    
+    def _build_index(self, namespace: str):
+        """Monta o índice invertido do namespace a partir de self.memory"""
+        index = InvertedIndex()
+        by_id = {}
+        for entry in self.memory[namespace]:
+            index.add(entry["id"], self._index_text(entry))
+            by_id[entry["id"]] = entry
+        self.indexes[namespace] = index
+        self._by_id[namespace] = by_id
+    
+    def _get_log(self, namespace: str) -> NamespaceLog:
+        if namespace not in self._logs:
+            settings = get_settings()
+            self._logs[namespace] = NamespaceLog(
+                self.storage_dir,
+                namespace,
+                fsync_batch=settings.rag_wal_fsync_batch,
+                fsync_ms=settings.rag_wal_fsync_ms,
+                compact_min=settings.rag_wal_compact_min,
+                compact_ratio=settings.rag_wal_compact_ratio,
+            )
+        return self._logs[namespace]
+    
     def _load_namespace(self, namespace: str) -> List[Dict[str, Any]]:
-        """Carrega namespace do disco"""
+        """Carrega namespace do disco (snapshot + replay do log)"""
         if namespace in self.memory:
             return self.memory[namespace]
         
-        file_path = self._get_file_path(namespace)
-        if file_path.exists():
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    self.memory[namespace] = data
-                    print(f"✅ [RAG] Namespace '{namespace}': {len(data)} entradas carregadas")
-                    return data
-            except Exception as e:
-                print(f"❌ [RAG] Erro ao carregar '{namespace}': {e}")
-                self.memory[namespace] = []
-                return []
-        else:
-            self.memory[namespace] = []
-            return []
+        log = self._get_log(namespace)
+        data = []
+        try:
+            data = log.load()
+            if data or log.log_records:
+                print(f"✅ [RAG] Namespace '{namespace}': {len(data)} entradas carregadas "
+                      f"({log.snapshot_size} snapshot + {log.log_records} no log)")
+        except Exception as e:
+            print(f"❌ [RAG] Erro ao carregar '{namespace}': {e}")
+            data = []
+        self.memory[namespace] = data
+        self._build_index(namespace)
+        if self.vectors is not None:
+            self.vectors.sync(namespace, data)
+        if log.needs_compaction():
+            self.compact(namespace)
+        return data
     
-    def _save_namespace(self, namespace: str):
-        """Salva namespace no disco"""
+    def compact(self, namespace: str):
+        """Grava o namespace como snapshot e zera o log"""
         file_path = self._get_file_path(namespace)
         try:
             data = self.memory.get(namespace, [])
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-            print(f"💾 [RAG] Namespace '{namespace}': {len(data)} entradas salvas")
+            self._get_log(namespace).compact(data)
+            print(f"💾 [RAG] Namespace '{namespace}': {len(data)} entradas compactadas em {file_path.name}")
         except Exception as e:
-            print(f"❌ [RAG] Erro ao salvar '{namespace}': {e}")
+            print(f"❌ [RAG] Erro ao compactar '{namespace}': {e}")
+    
+    def _after_write(self, namespace: str):
+        """Compactação periódica + invalidação dos caches de resposta"""
+        if self._get_log(namespace).needs_compaction():
+            self.compact(namespace)
+        
+        # Respostas geradas com este namespace no prompt não valem mais
+        from optimization.response_cache import response_cache
+        from optimization.semantic_cache import invalidate_semantic_cache
+        response_cache.invalidate_namespace(namespace)
+        invalidate_semantic_cache(namespace)
+    
+    def flush(self):
+        """fsync das operações pendentes de todos os namespaces"""
+        for log in self._logs.values():
+            log.sync()
     
+    def close(self):
+        for log in self._logs.values():
+            log.close()
+        if self.vectors is not None:
+            self.vectors.close()
+    
+    @staticmethod
+    def _new_id(namespace: str, now: datetime) -> str:
+        """
+        ID único da entrada: o sufixo aleatório evita reaproveitar o ID de outra
+        entrada viva (índice, _by_id e o replay do log colapsam por ID)
+        """
+        return f"{namespace}_{now.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+
     def add(self, namespace: str, text: str, tags: List[str] = None, metadata: Dict = None) -> str:
         """
         Adiciona informação a um namespace
@@ -71,7 +165,7 @@ class PersistentRAG:
         """
         self._load_namespace(namespace)
         
-        entry_id = f"{namespace}_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{len(self.memory[namespace])}"
+        entry_id = self._new_id(namespace, datetime.now())
         
         entry = {
             "id": entry_id,
@@ -83,11 +177,56 @@ class PersistentRAG:
         }
         
         self.memory[namespace].append(entry)
-        self._save_namespace(namespace)
+        self.indexes[namespace].add(entry_id, self._index_text(entry))
+        self._by_id[namespace][entry_id] = entry
+        self._get_log(namespace).append_add(entry)
+        if self.vectors is not None:
+            self.vectors.add(namespace, [entry_id], [text])
+        self._after_write(namespace)
         
         print(f"✅ [RAG] Adicionado em '{namespace}': {text[:80]}...")
         return entry_id
     
+    def add_many(self, namespace: str, items: List[Any]) -> List[str]:
+        """
+        Adiciona várias entradas com um fsync e uma invalidação de cache só
+        
+        Args:
+            namespace: Nome do namespace
+            items: Textos ou dicts {"text", "tags"?, "metadata"?}
+        
+        Returns:
+            List[str]: IDs das entradas criadas
+        """
+        self._load_namespace(namespace)
+        log = self._get_log(namespace)
+        now = datetime.now()
+        ids = []
+        for item in items:
+            if isinstance(item, str):
+                item = {"text": item}
+            entry_id = self._new_id(namespace, now)
+            entry = {
+                "id": entry_id,
+                "text": item["text"],
+                "tags": item.get("tags") or [],
+                "metadata": item.get("metadata") or {},
+                "timestamp": now.isoformat(),
+                "namespace": namespace
+            }
+            self.memory[namespace].append(entry)
+            self.indexes[namespace].add(entry_id, self._index_text(entry))
+            self._by_id[namespace][entry_id] = entry
+            log.append_add(entry)
+            ids.append(entry_id)
+        log.sync()
+        if self.vectors is not None:
+            by_id = self._by_id[namespace]
+            self.vectors.add(namespace, ids, [by_id[entry_id]["text"] for entry_id in ids])
+        self._after_write(namespace)
+        print(f"✅ [RAG] {len(ids)} entradas adicionadas em '{namespace}'")
+        return ids
+    
     def search(self, namespace: str, query: str, limit: int = 5) -> List[Dict[str, Any]]:
         """
         Busca informações em um namespace
@@ -105,31 +244,58 @@ class PersistentRAG:
         if not entries:
             return []
         
-        query_lower = query.lower()
-        query_words = [w for w in query_lower.split() if len(w) > 2]
-        
-        # Calcular relevância
-        scored_entries = []
-        for entry in entries:
-            text_lower = entry["text"].lower()
-            
-            # Contar palavras que aparecem
-            matches = sum(1 for word in query_words if word in text_lower)
-            relevance = matches / len(query_words) if query_words else 0
-            
-            if relevance > 0:
-                entry_copy = entry.copy()
+        # BM25 no índice invertido; relevance = fração dos termos da consulta presentes
+        entries_by_id = self._by_id[namespace]
+        if self.vectors is not None:
+            results = self._hybrid_search(namespace, query, limit)
+        else:
+            results = []
+            for entry_id, score, relevance in self.indexes[namespace].search(query, limit):
+                entry_copy = entries_by_id[entry_id].copy()
                 entry_copy["relevance"] = relevance
-                scored_entries.append(entry_copy)
-        
-        # Ordenar por relevância
-        scored_entries.sort(key=lambda x: x["relevance"], reverse=True)
+                entry_copy["score"] = score
+                results.append(entry_copy)
         
-        results = scored_entries[:limit]
         print(f"🔍 [RAG] Busca em '{namespace}': {len(results)} resultados para '{query[:50]}'")
         
         return results
     
+    def _hybrid_search(self, namespace: str, query: str, limit: int) -> List[Dict[str, Any]]:
+        """
+        BM25 + busca densa fundidos por RRF. relevance = maior entre a fração
+        dos termos presentes e o cosseno; resultados só densos precisam de
+        settings.rag_vector_min_similarity.
+        """
+        depth = max(limit * 2, 10)
+        keyword = self.indexes[namespace].search(query, depth)
+        min_similarity = get_settings().rag_vector_min_similarity
+        keyword_ids = {entry_id for entry_id, _, _ in keyword}
+        dense = [
+            (entry_id, similarity)
+            for entry_id, similarity in self.vectors.search(namespace, query, depth)
+            if entry_id in keyword_ids or similarity >= min_similarity
+        ]
+        fused = reciprocal_rank_fusion([
+            [entry_id for entry_id, _, _ in keyword],
+            [entry_id for entry_id, _ in dense],
+        ])
+        relevance = {entry_id: fraction for entry_id, _, fraction in keyword}
+        similarity = dict(dense)
+        
+        results = []
+        for entry_id in sorted(fused, key=fused.get, reverse=True)[:limit]:
+            entry_copy = self._by_id[namespace][entry_id].copy()
+            entry_copy["relevance"] = max(relevance.get(entry_id, 0.0), similarity.get(entry_id, 0.0))
+            entry_copy["score"] = fused[entry_id]
+            if entry_id in similarity:
+                entry_copy["similarity"] = similarity[entry_id]
+            results.append(entry_copy)
+        return results
+    
+    def search_many(self, namespace: str, queries: List[str], limit: int = 5) -> List[List[Dict[str, Any]]]:
+        """Várias buscas no mesmo namespace"""
+        return [self.search(namespace, query, limit) for query in queries]
+    
     def delete(self, namespace: str, entry_id: str) -> bool:
         """Remove uma entrada por ID"""
         entries = self._load_namespace(namespace)
@@ -138,7 +304,12 @@ class PersistentRAG:
         self.memory[namespace] = [e for e in entries if e["id"] != entry_id]
         
         if len(self.memory[namespace]) < original_len:
-            self._save_namespace(namespace)
+            self.indexes[namespace].remove(entry_id)
+            self._by_id[namespace].pop(entry_id, None)
+            self._get_log(namespace).append_delete(entry_id)
+            if self.vectors is not None:
+                self.vectors.delete(namespace, entry_id)
+            self._after_write(namespace)
             print(f"🗑️  [RAG] Removido de '{namespace}': {entry_id}")
             return True
         
@@ -152,10 +323,9 @@ class PersistentRAG:
     
     def list_namespaces(self) -> List[str]:
         """Lista todos os namespaces disponíveis"""
-        namespaces = []
-        for file_path in self.storage_dir.glob("*.json"):
-            namespaces.append(file_path.stem)
-        return namespaces
+        namespaces = {file_path.stem for file_path in self.storage_dir.glob("*.json")}
+        namespaces.update(p.name[:-len(".wal.jsonl")] for p in self.storage_dir.glob("*.wal.jsonl"))
+        return sorted(namespaces)
     
     def get_stats(self, namespace: str) -> Dict[str, Any]:
         """Retorna estatísticas de um namespace"""
@@ -165,6 +335,9 @@ class PersistentRAG:
             "namespace": namespace,
             "total_entries": len(entries),
             "total_tags": len(set(tag for e in entries for tag in e.get("tags", []))),
+            "index": self.indexes[namespace].stats(),
+            "storage": self._get_log(namespace).stats(),
+            "vectors": self.vectors.stats(namespace) if self.vectors is not None else None,
             "file_path": str(self._get_file_path(namespace))
         }
     
@@ -202,10 +375,15 @@ class PersistentRAG:
 _rag_instance = None
 
 def get_rag_instance(storage_dir: str = "data/rag") -> PersistentRAG:
-    """Retorna instância singleton do RAG"""
+    """Retorna instância singleton do RAG (JSON + log ou SQLite, por settings.rag_storage)"""
     global _rag_instance
     if _rag_instance is None:
-        _rag_instance = PersistentRAG(storage_dir)
+        if get_settings().rag_storage == "sqlite":
+            from infrastructure.config.paths import get_rag_sqlite_path
+            from rag.sqlite_rag import SQLiteRAG
+            _rag_instance = SQLiteRAG(get_rag_sqlite_path())
+        else:
+            _rag_instance = PersistentRAG(storage_dir)
     return _rag_instance
 
 
@@ -0,0 +1,261 @@
+"""
+SQLite FTS5 RAG Storage
+Motor alternativo do PersistentRAG (settings.rag_storage = "sqlite")
+
+- Uma tabela `entries` (id, namespace, texto, tags, metadados, timestamp) e um
+  índice FTS5 externo sobre texto/tags, mantido por triggers
+- Ranking bm25() do próprio FTS5 (texto pesa mais que tags), consultas por
+  prefixo ("contab*") e normalização sem acentos (remove_diacritics)
+- Índices ficam no disco: nada é carregado inteiro em memória, e o modo WAL
+  permite leitores concorrentes entre os workers da API
+- add_many / search_many para ingestão e consultas em lote numa transação
+
+Mesma interface pública do PersistentRAG (add, search, delete, list,
+list_namespaces, get_stats, build_context). Migração dos JSON existentes:
+scripts/migrate_rag_to_sqlite.py.
+"""
+import json
+import sqlite3
+import threading
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+from rag.inverted_index import tokenize
+from rag.persistentRAG import PersistentRAG
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    rowid INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    namespace TEXT NOT NULL,
+    text TEXT NOT NULL,
+    tags TEXT NOT NULL DEFAULT '[]',
+    metadata TEXT NOT NULL DEFAULT '{}',
+    timestamp TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_namespace ON entries(namespace);
+CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5(
+    text, tags, namespace UNINDEXED,
+    content='entries', content_rowid='rowid',
+    tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS entries_ai AFTER INSERT ON entries BEGIN
+    INSERT INTO entries_fts(rowid, text, tags, namespace) VALUES (new.rowid, new.text, new.tags, new.namespace);
+END;
+CREATE TRIGGER IF NOT EXISTS entries_ad AFTER DELETE ON entries BEGIN
+    INSERT INTO entries_fts(entries_fts, rowid, text, tags, namespace)
+    VALUES ('delete', old.rowid, old.text, old.tags, old.namespace);
+END;
+CREATE TRIGGER IF NOT EXISTS entries_au AFTER UPDATE ON entries BEGIN
+    INSERT INTO entries_fts(entries_fts, rowid, text, tags, namespace)
+    VALUES ('delete', old.rowid, old.text, old.tags, old.namespace);
+    INSERT INTO entries_fts(rowid, text, tags, namespace) VALUES (new.rowid, new.text, new.tags, new.namespace);
+END;
+"""
+
+# Pesos do bm25() por coluna: texto, tags, namespace (não indexado)
+_BM25_WEIGHTS = "1.0, 0.5, 0.0"
+
+
+def fts_query(query: str, prefix: bool = False) -> Optional[str]:
+    """Consulta FTS5 (termos em OR) a partir do texto livre; None se não sobrar termo"""
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not terms:
+        return None
+    return " OR ".join(f'"{term}"' + ("*" if prefix else "") for term in terms)
+
+
+class SQLiteRAG:
+    """Armazenamento de namespaces em SQLite com busca FTS5"""
+
+    def __init__(self, db_path: Union[str, Path] = "data/rag/rag.sqlite3"):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.executescript(_SCHEMA)
+        print(f"💾 [RAG] SQLite FTS5 em {self.db_path}")
+
+    def _conn(self) -> sqlite3.Connection:
+        """Uma conexão por thread (WAL: leitores não bloqueiam o escritor)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30.0)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _row_to_entry(row: sqlite3.Row) -> Dict[str, Any]:
+        return {
+            "id": row["id"],
+            "text": row["text"],
+            "tags": json.loads(row["tags"]),
+            "metadata": json.loads(row["metadata"]),
+            "timestamp": row["timestamp"],
+            "namespace": row["namespace"],
+        }
+
+    @staticmethod
+    def _new_entry(namespace: str, item: Union[str, Dict[str, Any]]) -> Dict[str, Any]:
+        if isinstance(item, str):
+            item = {"text": item}
+        now = datetime.now()
+        return {
+            "id": item.get("id") or f"{namespace}_{now.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}",
+            "text": item["text"],
+            "tags": list(item.get("tags") or []),
+            "metadata": item.get("metadata") or {},
+            "timestamp": item.get("timestamp") or now.isoformat(),
+            "namespace": namespace,
+        }
+
+    def _after_write(self, namespace: str):
+        """Respostas geradas com este namespace no prompt não valem mais"""
+        from optimization.response_cache import response_cache
+        from optimization.semantic_cache import invalidate_semantic_cache
+        response_cache.invalidate_namespace(namespace)
+        invalidate_semantic_cache(namespace)
+
+    # ------------------------------------------------------------------
+    # Escrita
+    # ------------------------------------------------------------------
+    def add(self, namespace: str, text: str, tags: List[str] = None, metadata: Dict = None) -> str:
+        """Adiciona informação a um namespace; retorna o ID da entrada"""
+        entry_id = self.add_many(namespace, [{"text": text, "tags": tags, "metadata": metadata}])[0]
+        print(f"✅ [RAG] Adicionado em '{namespace}': {text[:80]}...")
+        return entry_id
+
+    def add_many(self, namespace: str, items: Iterable[Union[str, Dict[str, Any]]]) -> List[str]:
+        """
+        Adiciona várias entradas numa transação só.
+
+        Args:
+            namespace: Nome do namespace
+            items: Textos ou dicts {"text", "tags"?, "metadata"?, "id"?, "timestamp"?}
+                (IDs já existentes são sobrescritos)
+
+        Returns:
+            IDs das entradas, na ordem de `items`
+        """
+        entries = [self._new_entry(namespace, item) for item in items]
+        if not entries:
+            return []
+        with self._conn() as conn:
+            conn.executemany(
+                "INSERT INTO entries(id, namespace, text, tags, metadata, timestamp) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET namespace=excluded.namespace, text=excluded.text, "
+                "tags=excluded.tags, metadata=excluded.metadata, timestamp=excluded.timestamp",
+                [
+                    (e["id"], namespace, e["text"], json.dumps(e["tags"], ensure_ascii=False),
+                     json.dumps(e["metadata"], ensure_ascii=False), e["timestamp"])
+                    for e in entries
+                ],
+            )
+        self._after_write(namespace)
+        return [e["id"] for e in entries]
+
+    def delete(self, namespace: str, entry_id: str) -> bool:
+        """Remove uma entrada por ID"""
+        with self._conn() as conn:
+            deleted = conn.execute(
+                "DELETE FROM entries WHERE namespace = ? AND id = ?", (namespace, entry_id)
+            ).rowcount
+        if deleted:
+            self._after_write(namespace)
+            print(f"🗑️  [RAG] Removido de '{namespace}': {entry_id}")
+        return bool(deleted)
+
+    # ------------------------------------------------------------------
+    # Busca
+    # ------------------------------------------------------------------
+    def search(self, namespace: str, query: str, limit: int = 5, prefix: bool = False) -> List[Dict[str, Any]]:
+        """
+        Busca bm25 em um namespace.
+
+        Args:
+            namespace: Nome do namespace
+            query: Texto de busca
+            limit: Número máximo de resultados
+            prefix: Casa termos pelo prefixo ("contab" acha "contabilidade")
+
+        Returns:
+            Entradas com "relevance" (fração dos termos da consulta presentes)
+            e "score" (bm25, maior é melhor)
+        """
+        results = self._search(self._conn(), namespace, query, limit, prefix)
+        print(f"🔍 [RAG] Busca em '{namespace}': {len(results)} resultados para '{query[:50]}'")
+        return results
+
+    def search_many(
+        self, namespace: str, queries: List[str], limit: int = 5, prefix: bool = False
+    ) -> List[List[Dict[str, Any]]]:
+        """Várias buscas no mesmo namespace numa leitura só (um snapshot consistente)"""
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN")
+            return [self._search(conn, namespace, query, limit, prefix) for query in queries]
+
+    def _search(self, conn, namespace: str, query: str, limit: int, prefix: bool) -> List[Dict[str, Any]]:
+        match = fts_query(query, prefix)
+        if match is None:
+            return []
+        rows = conn.execute(
+            f"SELECT e.*, bm25(entries_fts, {_BM25_WEIGHTS}) AS rank "
+            "FROM entries_fts JOIN entries e ON e.rowid = entries_fts.rowid "
+            "WHERE entries_fts MATCH ? AND entries_fts.namespace = ? "
+            "ORDER BY rank LIMIT ?",
+            (match, namespace, limit),
+        ).fetchall()
+
+        terms = list(dict.fromkeys(tokenize(query)))
+        results = []
+        for row in rows:
+            entry = self._row_to_entry(row)
+            found = set(tokenize(f"{row['text']} {row['tags']}"))
+            if prefix:
+                matched = sum(1 for t in terms if any(w.startswith(t) for w in found))
+            else:
+                matched = sum(1 for t in terms if t in found)
+            entry["relevance"] = matched / len(terms)
+            entry["score"] = -row["rank"]
+            results.append(entry)
+        return results
+
+    # ------------------------------------------------------------------
+    # Listagem / estatísticas
+    # ------------------------------------------------------------------
+    def list(self, namespace: str) -> List[Dict[str, Any]]:
+        """Lista todas as entradas de um namespace"""
+        rows = self._conn().execute(
+            "SELECT * FROM entries WHERE namespace = ? ORDER BY rowid", (namespace,)
+        ).fetchall()
+        print(f"📋 [RAG] Listando '{namespace}': {len(rows)} entradas")
+        return [self._row_to_entry(row) for row in rows]
+
+    def list_namespaces(self) -> List[str]:
+        """Lista todos os namespaces disponíveis"""
+        rows = self._conn().execute("SELECT DISTINCT namespace FROM entries ORDER BY namespace").fetchall()
+        return [row["namespace"] for row in rows]
+
+    def get_stats(self, namespace: str) -> Dict[str, Any]:
+        """Retorna estatísticas de um namespace"""
+        rows = self._conn().execute("SELECT tags FROM entries WHERE namespace = ?", (namespace,)).fetchall()
+        return {
+            "namespace": namespace,
+            "total_entries": len(rows),
+            "total_tags": len({tag for row in rows for tag in json.loads(row["tags"])}),
+            "file_path": str(self.db_path),
+        }
+
+    build_context = PersistentRAG.build_context
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
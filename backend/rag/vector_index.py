@@ -0,0 +1,432 @@
+"""
+Dense Vector Index
+Busca densa local para os namespaces do PersistentRAG, sem banco vetorial externo
+
+- EmbeddingStore: matriz de embeddings memory-mapped ({namespace}.npy, float16
+  ou int8 com escala por linha) + log append-only de IDs ({namespace}.ids.jsonl);
+  a matriz cresce dobrando a capacidade e só as páginas lidas ficam residentes
+- Namespaces pequenos (até exact_max vetores): top-k exato, produto interno em
+  blocos + argpartition
+- Namespaces grandes: índice IVF (k-means esférico em NumPy, ~sqrt(n) listas);
+  a consulta visita as nprobe listas de centróide mais próximo
+- add incremental: vetores novos vão para o fim da matriz e para a lista IVF do
+  centróide mais próximo; o IVF é retreinado quando o namespace dobra
+- delete marca a linha como livre; compact() reescreve a matriz quando os
+  buracos passam das linhas vivas
+
+Vetores são normalizados: o score é o cosseno.
+"""
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from rag.embeddings import normalize_rows
+
+_BLOCK_ROWS = 32768  # linhas convertidas para float32 por vez na busca exata
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Índices dos k maiores scores, em ordem decrescente (argpartition + sort dos k)"""
+    if k <= 0 or scores.size == 0:
+        return np.empty(0, dtype=np.int64)
+    if k < scores.size:
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(scores.size)
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+def reciprocal_rank_fusion(rankings: Iterable[Sequence[str]], k: int = 60) -> Dict[str, float]:
+    """Funde rankings (listas de IDs, melhor primeiro): score = soma de 1 / (k + posição)"""
+    fused: Dict[str, float] = {}
+    for ranking in rankings:
+        for position, doc_id in enumerate(ranking, 1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + position)
+    return fused
+
+
+class EmbeddingStore:
+    """Matriz de embeddings de um namespace (memory-mapped) + mapa linha → ID"""
+
+    def __init__(self, directory: Path, namespace: str, dtype: str = "float16"):
+        if dtype not in ("float16", "int8"):
+            raise ValueError(f"dtype de embedding não suportado: {dtype}")
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.namespace = namespace
+        self.dtype = dtype
+        self.matrix_path = self.directory / f"{namespace}.npy"
+        self.ids_path = self.directory / f"{namespace}.ids.jsonl"
+        self.matrix: Optional[np.memmap] = None
+        self.ids: List[Optional[str]] = []  # linha → ID (None = linha livre)
+        self.rows: Dict[str, int] = {}  # ID → linha
+        self._scales: List[float] = []
+        self._scales_array: Optional[np.ndarray] = None
+        self._live_rows: Optional[np.ndarray] = None
+        self._file = None
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    @property
+    def dim(self) -> Optional[int]:
+        return None if self.matrix is None else self.matrix.shape[1]
+
+    @property
+    def capacity(self) -> int:
+        return 0 if self.matrix is None else self.matrix.shape[0]
+
+    # ------------------------------------------------------------------
+    # Leitura
+    # ------------------------------------------------------------------
+    def load(self) -> "EmbeddingStore":
+        if self.matrix_path.exists():
+            self.matrix = np.load(self.matrix_path, mmap_mode="r+")
+            self.dtype = self.matrix.dtype.name  # o arquivo manda (dtype pode ter mudado nas settings)
+        self.ids, self.rows, self._scales = [], {}, []
+        if self.ids_path.exists():
+            valid_bytes = 0
+            with open(self.ids_path, "rb") as f:
+                for line in f:
+                    try:
+                        if not line.endswith(b"\n"):
+                            raise ValueError("linha sem terminador")
+                        record = json.loads(line)
+                    except ValueError:
+                        print(f"⚠️  [VECTORS] IDs de '{self.namespace}' com registro incompleto; descartando o final")
+                        break
+                    if record["row"] is None:
+                        self._free(record["id"])
+                    elif record["row"] < self.capacity:
+                        self._assign(record["id"], record["row"], record.get("scale", 1.0))
+                    valid_bytes += len(line)
+            if valid_bytes < self.ids_path.stat().st_size:
+                with open(self.ids_path, "r+b") as f:
+                    f.truncate(valid_bytes)
+        self._changed()
+        return self
+
+    def _assign(self, doc_id: str, row: int, scale: float) -> None:
+        self._free(doc_id)
+        while len(self.ids) <= row:
+            self.ids.append(None)
+            self._scales.append(1.0)
+        self.ids[row] = doc_id
+        self._scales[row] = scale
+        self.rows[doc_id] = row
+
+    def _free(self, doc_id: str) -> Optional[int]:
+        row = self.rows.pop(doc_id, None)
+        if row is not None:
+            self.ids[row] = None
+        return row
+
+    def _changed(self) -> None:
+        self._scales_array = None
+        self._live_rows = None
+
+    def live_rows(self) -> np.ndarray:
+        if self._live_rows is None:
+            self._live_rows = np.fromiter(sorted(self.rows.values()), dtype=np.int64, count=len(self.rows))
+        return self._live_rows
+
+    def vectors(self, rows: np.ndarray) -> np.ndarray:
+        """Vetores float32 das linhas pedidas"""
+        block = np.asarray(self.matrix[rows], dtype=np.float32)
+        if self.dtype == "int8":
+            if self._scales_array is None:
+                self._scales_array = np.asarray(self._scales, dtype=np.float32)
+            block *= self._scales_array[rows, None]
+        return block
+
+    def score_rows(self, query: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        """Cosseno da consulta com as linhas pedidas (em blocos)"""
+        scores = np.empty(len(rows), dtype=np.float32)
+        for start in range(0, len(rows), _BLOCK_ROWS):
+            chunk = rows[start:start + _BLOCK_ROWS]
+            scores[start:start + len(chunk)] = self.vectors(chunk) @ query
+        return scores
+
+    # ------------------------------------------------------------------
+    # Escrita
+    # ------------------------------------------------------------------
+    def _encode(self, vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        if self.dtype == "int8":
+            scales = np.abs(vectors).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            return np.round(vectors / scales[:, None]).astype(np.int8), scales
+        return vectors.astype(np.float16), np.ones(len(vectors), dtype=np.float32)
+
+    def _reserve(self, rows: int, dim: int) -> None:
+        """Garante capacidade para `rows` linhas (dobra a matriz e troca o arquivo de forma atômica)"""
+        if self.matrix is not None and self.capacity >= rows:
+            return
+        capacity = max(rows, 2 * self.capacity, 256)
+        tmp_path = self.matrix_path.with_suffix(".npy.tmp")
+        grown = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=self.dtype, shape=(capacity, dim))
+        if self.matrix is not None:
+            grown[:len(self.ids)] = self.matrix[:len(self.ids)]
+        grown.flush()
+        del grown
+        self.matrix = None
+        os.replace(tmp_path, self.matrix_path)
+        self.matrix = np.load(self.matrix_path, mmap_mode="r+")
+
+    def add(self, ids: Sequence[str], vectors: np.ndarray) -> np.ndarray:
+        """
+        Grava vetores (normalizados) no fim da matriz; IDs já presentes são
+        substituídos. Retorna as linhas ocupadas.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if len(ids) != len(vectors):
+            raise ValueError("ids e vectors com tamanhos diferentes")
+        if not len(ids):
+            return np.empty(0, dtype=np.int64)
+        if self.dim is not None and vectors.shape[1] != self.dim:
+            raise ValueError(f"dimensão {vectors.shape[1]} != {self.dim} do namespace '{self.namespace}'")
+
+        start = len(self.ids)
+        self._reserve(start + len(ids), vectors.shape[1])
+        encoded, scales = self._encode(vectors)
+        # Vetores no disco antes dos IDs: um ID no log sempre aponta para uma linha escrita
+        self.matrix[start:start + len(ids)] = encoded
+        self.matrix.flush()
+
+        lines = []
+        for offset, (doc_id, scale) in enumerate(zip(ids, scales.tolist())):
+            self._assign(doc_id, start + offset, scale)
+            record = {"id": doc_id, "row": start + offset}
+            if self.dtype == "int8":
+                record["scale"] = scale
+            lines.append(json.dumps(record, ensure_ascii=False) + "\n")
+        self._write(lines)
+        self._changed()
+        return np.arange(start, start + len(ids), dtype=np.int64)
+
+    def delete(self, doc_id: str) -> bool:
+        if self._free(doc_id) is None:
+            return False
+        self._write([json.dumps({"id": doc_id, "row": None}, ensure_ascii=False) + "\n"])
+        self._changed()
+        return True
+
+    def _write(self, lines: List[str]) -> None:
+        if self._file is None:
+            self._file = open(self.ids_path, "a", encoding="utf-8")
+        self._file.writelines(lines)
+        self._file.flush()
+
+    def needs_compaction(self) -> bool:
+        return len(self.ids) >= 1024 and len(self.ids) - len(self.rows) > len(self.rows)
+
+    def compact(self) -> None:
+        """Reescreve só as linhas vivas (matriz e log de IDs novos, troca atômica)"""
+        rows = self.live_rows()
+        ids = [self.ids[row] for row in rows]
+        vectors = self.vectors(rows) if len(rows) else np.empty((0, self.dim or 0), dtype=np.float32)
+
+        self.close()
+        self.matrix = None
+        self.matrix_path.unlink(missing_ok=True)
+        self.ids_path.unlink(missing_ok=True)
+        self.ids, self.rows, self._scales = [], {}, []
+        self._changed()
+        if ids:
+            self.add(ids, vectors)
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self.matrix is not None:
+            self.matrix.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "vectors": len(self.rows),
+            "rows": len(self.ids),
+            "capacity": self.capacity,
+            "dim": self.dim,
+            "dtype": self.dtype,
+        }
+
+
+class IVFIndex:
+    """Inverted file: k-means esférico + uma lista de linhas por centróide"""
+
+    def __init__(self, nlist: int, seed: int = 0):
+        self.nlist = nlist
+        self.centroids: Optional[np.ndarray] = None
+        self.lists: List[List[int]] = []
+        self._arrays: Dict[int, np.ndarray] = {}
+        self._rng = np.random.default_rng(seed)
+
+    def train(self, sample: np.ndarray, iterations: int = 10) -> None:
+        """k-means esférico (vetores normalizados, similaridade por produto interno)"""
+        nlist = self.nlist = min(self.nlist, len(sample))
+        centroids = sample[self._rng.choice(len(sample), nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            counts = np.bincount(assign, minlength=nlist)
+            empty = counts == 0
+            if empty.any():
+                # centróide sem membros volta para um ponto aleatório
+                sums[empty] = sample[self._rng.choice(len(sample), int(empty.sum()))]
+            centroids = normalize_rows(sums)
+        self.centroids = centroids
+        self.lists = [[] for _ in range(nlist)]
+        self._arrays.clear()
+
+    def assign(self, vectors: np.ndarray) -> np.ndarray:
+        return np.argmax(vectors @ self.centroids.T, axis=1)
+
+    def add(self, rows: np.ndarray, vectors: np.ndarray) -> None:
+        for row, list_id in zip(rows.tolist(), self.assign(vectors).tolist()):
+            self.lists[list_id].append(row)
+            self._arrays.pop(list_id, None)
+
+    def candidates(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        """Linhas das nprobe listas mais próximas da consulta"""
+        probes = top_k_indices(self.centroids @ query, nprobe)
+        arrays = []
+        for list_id in probes.tolist():
+            if list_id not in self._arrays:
+                self._arrays[list_id] = np.asarray(self.lists[list_id], dtype=np.int64)
+            arrays.append(self._arrays[list_id])
+        return np.concatenate(arrays) if arrays else np.empty(0, dtype=np.int64)
+
+
+class _NamespaceVectors:
+    def __init__(self, store: EmbeddingStore):
+        self.store = store
+        self.ivf: Optional[IVFIndex] = None
+        self.trained_size = 0
+
+
+class VectorIndex:
+    """Busca densa por namespace: embeddings locais + store memory-mapped + exato/IVF"""
+
+    def __init__(
+        self,
+        directory: Path,
+        embedder,
+        dtype: str = "float16",
+        exact_max: int = 20000,
+        nprobe: int = 8
+    ):
+        self.directory = Path(directory)
+        self.embedder = embedder
+        self.dtype = dtype
+        self.exact_max = exact_max
+        self.nprobe = nprobe
+        self._namespaces: Dict[str, _NamespaceVectors] = {}
+        self._lock = threading.RLock()
+
+    def _get(self, namespace: str) -> _NamespaceVectors:
+        if namespace not in self._namespaces:
+            store = EmbeddingStore(self.directory, namespace, self.dtype).load()
+            self._namespaces[namespace] = _NamespaceVectors(store)
+        return self._namespaces[namespace]
+
+    # ------------------------------------------------------------------
+    # Escrita
+    # ------------------------------------------------------------------
+    def add(self, namespace: str, ids: Sequence[str], texts: Sequence[str]) -> None:
+        if not ids:
+            return
+        self.add_vectors(namespace, ids, self.embedder.embed_many(list(texts)))
+
+    def add_vectors(self, namespace: str, ids: Sequence[str], vectors: np.ndarray) -> None:
+        vectors = normalize_rows(vectors)
+        with self._lock:
+            ns = self._get(namespace)
+            rows = ns.store.add(ids, vectors)
+            if ns.ivf is not None:
+                ns.ivf.add(rows, vectors)
+
+    def delete(self, namespace: str, doc_id: str) -> bool:
+        with self._lock:
+            ns = self._get(namespace)
+            deleted = ns.store.delete(doc_id)
+            if deleted and ns.store.needs_compaction():
+                ns.store.compact()
+                ns.ivf = None  # linhas mudaram: retreina na próxima busca grande
+            return deleted
+
+    def sync(self, namespace: str, entries: List[Dict[str, Any]]) -> int:
+        """
+        Alinha o store com as entradas do namespace: calcula embeddings que
+        faltam (primeira ativação, crash entre o log e a matriz) e remove IDs
+        que não existem mais. Retorna quantos vetores foram calculados.
+        """
+        with self._lock:
+            store = self._get(namespace).store
+            wanted = {entry["id"] for entry in entries}
+            for doc_id in [doc_id for doc_id in store.rows if doc_id not in wanted]:
+                self.delete(namespace, doc_id)
+            missing = [entry for entry in entries if entry["id"] not in store.rows]
+            if missing:
+                print(f"🧮 [VECTORS] '{namespace}': calculando {len(missing)} embeddings...")
+                self.add(namespace, [e["id"] for e in missing], [e.get("text", "") for e in missing])
+            return len(missing)
+
+    # ------------------------------------------------------------------
+    # Busca
+    # ------------------------------------------------------------------
+    def search(self, namespace: str, query: str, k: int = 5) -> List[Tuple[str, float]]:
+        """Top-k por cosseno: [(id, similaridade)]"""
+        return self.search_vector(namespace, self.embedder.embed(query), k)
+
+    def search_vector(self, namespace: str, query: np.ndarray, k: int = 5) -> List[Tuple[str, float]]:
+        query = normalize_rows(query)
+        with self._lock:
+            ns = self._get(namespace)
+            store = ns.store
+            if not len(store):
+                return []
+            if len(store) <= self.exact_max:
+                rows = store.live_rows()
+            else:
+                self._ensure_ivf(ns)
+                rows = ns.ivf.candidates(query, self.nprobe)
+                rows = rows[[store.ids[row] is not None for row in rows.tolist()]]
+            scores = store.score_rows(query, rows)
+            best = top_k_indices(scores, k)
+            return [(store.ids[rows[i]], float(scores[i])) for i in best.tolist()]
+
+    def _ensure_ivf(self, ns: _NamespaceVectors) -> None:
+        """Treina o IVF na primeira busca grande e de novo quando o namespace dobra"""
+        size = len(ns.store)
+        if ns.ivf is not None and size < 2 * ns.trained_size:
+            return
+        rows = ns.store.live_rows()
+        ivf = IVFIndex(nlist=max(1, int(np.sqrt(size))))
+        sample = rows if len(rows) <= 64 * ivf.nlist else np.sort(ivf._rng.choice(rows, 64 * ivf.nlist, replace=False))
+        ivf.train(ns.store.vectors(sample))
+        for start in range(0, len(rows), _BLOCK_ROWS):
+            chunk = rows[start:start + _BLOCK_ROWS]
+            ivf.add(chunk, ns.store.vectors(chunk))
+        ns.ivf = ivf
+        ns.trained_size = size
+        print(f"🧮 [VECTORS] '{ns.store.namespace}': IVF com {ivf.nlist} listas para {size} vetores")
+
+    def close(self) -> None:
+        with self._lock:
+            for ns in self._namespaces.values():
+                ns.store.close()
+
+    def stats(self, namespace: str) -> Dict[str, Any]:
+        with self._lock:
+            ns = self._get(namespace)
+            mode = "exact" if len(ns.store) <= self.exact_max else "ivf"
+            return {
+                **ns.store.stats(),
+                "mode": mode,
+                "ivf_lists": ns.ivf.nlist if ns.ivf is not None else None,
+            }
@@ -0,0 +1,177 @@
+"""
+Namespace Write-Ahead Log
+Armazenamento append-only dos namespaces do PersistentRAG
+
+- {namespace}.json continua sendo o snapshot (lista de entradas, mesmo
+  formato de antes), agora gravado de forma atômica (tmp + fsync + rename):
+  crash no meio da escrita não deixa arquivo truncado
+- {namespace}.wal.jsonl recebe uma linha por operação ({"op": "add", "entry"}
+  ou {"op": "delete", "id"}): add/delete custam O(1) em disco
+- Group commit: a linha vai para o SO na hora (sobrevive a crash do processo);
+  o fsync é agrupado (a cada fsync_batch operações ou fsync_ms) e só uma
+  queda de energia perde a janela final
+- Compactação: quando o log passa de compact_min operações e de compact_ratio
+  do snapshot, o estado atual vira snapshot novo e o log é zerado
+- Abertura: snapshot + replay do log; uma última linha incompleta (crash no
+  meio do append) é descartada
+"""
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+
+def _fsync_dir(path: Path) -> None:
+    """fsync do diretório (o rename do snapshot precisa chegar ao disco)"""
+    if os.name == "nt":
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class NamespaceLog:
+    """Snapshot + log append-only de um namespace"""
+
+    def __init__(
+        self,
+        storage_dir: Path,
+        namespace: str,
+        fsync_batch: int = 64,
+        fsync_ms: float = 50.0,
+        compact_min: int = 1000,
+        compact_ratio: float = 0.5
+    ):
+        self.storage_dir = Path(storage_dir)
+        self.namespace = namespace
+        self.snapshot_path = self.storage_dir / f"{namespace}.json"
+        self.log_path = self.storage_dir / f"{namespace}.wal.jsonl"
+        self.fsync_batch = max(1, fsync_batch)
+        self.fsync_ms = fsync_ms
+        self.compact_min = compact_min
+        self.compact_ratio = compact_ratio
+        self.log_records = 0
+        self.snapshot_size = 0
+        self._file = None
+        self._unsynced = 0
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Leitura
+    # ------------------------------------------------------------------
+    def load(self) -> List[Dict[str, Any]]:
+        """Estado atual: snapshot + replay do log"""
+        entries: Dict[str, Dict[str, Any]] = {}
+        if self.snapshot_path.exists():
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                for entry in json.load(f):
+                    entries[entry["id"]] = entry
+        self.snapshot_size = len(entries)
+
+        self.log_records = 0
+        if self.log_path.exists():
+            valid_bytes = 0
+            with open(self.log_path, "rb") as f:
+                for line in f:
+                    try:
+                        if not line.endswith(b"\n"):
+                            raise ValueError("linha sem terminador")
+                        record = json.loads(line)
+                    except ValueError:
+                        # append interrompido por crash: o resto do log é descartado
+                        print(f"⚠️  [RAG] Log de '{self.namespace}' com registro incompleto; descartando o final")
+                        break
+                    self._apply(entries, record)
+                    valid_bytes += len(line)
+                    self.log_records += 1
+            if valid_bytes < self.log_path.stat().st_size:
+                with open(self.log_path, "r+b") as f:
+                    f.truncate(valid_bytes)
+        return list(entries.values())
+
+    @staticmethod
+    def _apply(entries: Dict[str, Dict[str, Any]], record: Dict[str, Any]) -> None:
+        if record.get("op") == "add":
+            entries[record["entry"]["id"]] = record["entry"]
+        elif record.get("op") == "delete":
+            entries.pop(record.get("id"), None)
+
+    # ------------------------------------------------------------------
+    # Escrita
+    # ------------------------------------------------------------------
+    def append_add(self, entry: Dict[str, Any]) -> None:
+        self._append({"op": "add", "entry": entry})
+
+    def append_delete(self, entry_id: str) -> None:
+        self._append({"op": "delete", "id": entry_id})
+
+    def _append(self, record: Dict[str, Any]) -> None:
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.log_path, "a", encoding="utf-8")
+            self._file.write(line)
+            self._file.flush()
+            self.log_records += 1
+            self._unsynced += 1
+            if self._unsynced >= self.fsync_batch or self.fsync_ms <= 0:
+                self._sync_locked()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.fsync_ms / 1000.0, self.sync)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _sync_locked(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._file is not None and self._unsynced:
+            os.fsync(self._file.fileno())
+        self._unsynced = 0
+
+    def sync(self) -> None:
+        """fsync das operações pendentes (group commit)"""
+        with self._lock:
+            self._sync_locked()
+
+    def needs_compaction(self) -> bool:
+        return self.log_records >= self.compact_min and self.log_records >= self.compact_ratio * self.snapshot_size
+
+    def compact(self, entries: List[Dict[str, Any]]) -> None:
+        """Grava o estado atual como snapshot (atômico) e zera o log"""
+        with self._lock:
+            tmp_path = self.snapshot_path.with_suffix(".json.tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entries, f, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.snapshot_path)
+            _fsync_dir(self.storage_dir)
+
+            # Só depois do snapshot no disco o log pode ser descartado
+            self._sync_locked()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            with open(self.log_path, "w", encoding="utf-8") as f:
+                os.fsync(f.fileno())
+            self.snapshot_size = len(entries)
+            self.log_records = 0
+
+    def close(self) -> None:
+        with self._lock:
+            self._sync_locked()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "snapshot_entries": self.snapshot_size,
+            "log_records": self.log_records,
+            "unsynced": self._unsynced,
+        }
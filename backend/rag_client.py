@@ -7,6 +7,8 @@ import json
 from typing import List, Dict, Optional
 from dataclasses import dataclass
 
+from utils.adaptive_limiter import ConcurrencyLimitExceeded, limited
+
 
 # Debug flag
 DEBUG_RAG = os.getenv("DEBUG_RAG", "true").lower() == "true"
@@ -22,6 +24,24 @@ class RAGChunk:
 
 
 def query_rag(
+    domains: List[str],
+    query: str,
+    top_k: int = 6,
+    use_enhanced: bool = True
+) -> List[RAGChunk]:
+    """
+    _query_rag com limite adaptativo de concorrência (utils/adaptive_limiter.py):
+    acima do limite a recuperação é pulada e a resposta segue sem contexto.
+    """
+    try:
+        with limited("rag"):
+            return _query_rag(domains, query, top_k, use_enhanced)
+    except ConcurrencyLimitExceeded as e:
+        print(f"⚠️  [RAG] Recuperação pulada (sobrecarga): {e}")
+        return []
+
+
+def _query_rag(
     domains: List[str],
     query: str,
     top_k: int = 6,
@@ -57,44 +77,47 @@ def query_rag(
     from rag.graph_rag import graph_rag
     
     try:
+        from rag.enhanced_rag import EnhancedRAGChunk, enhanced_rag
+        
         # Consultar grafo de conhecimento
         graph_results = graph_rag.query_graph(query, max_results=top_k * 2)  # Buscar mais para reranking
         
-        if graph_results:
-            # Converter resultados do grafo para EnhancedRAGChunk
-            from rag.enhanced_rag import EnhancedRAGChunk, enhanced_rag
+        # Converter resultados do grafo para EnhancedRAGChunk
+        enhanced_chunks = []
+        for idx, result in enumerate(graph_results or []):
+            entity = result["entity"]
+            related = result.get("related_entities", [])
             
-            enhanced_chunks = []
-            for idx, result in enumerate(graph_results):
-                entity = result["entity"]
-                related = result.get("related_entities", [])
-                
-                # Construir conteúdo rico com entidade e relações
-                content_parts = [f"{entity['name']} ({entity['type']})"]
-                
-                if entity.get("properties"):
-                    for key, value in entity["properties"].items():
-                        if key != "extracted_from":
-                            content_parts.append(f"{key}: {value}")
-                
-                if related:
-                    content_parts.append("Relacionado com:")
-                    for rel_entity in related[:3]:
-                        content_parts.append(f"- {rel_entity['name']} ({rel_entity['relation']})")
-                
-                content = "\n".join(content_parts)
-                
-                enhanced_chunks.append(EnhancedRAGChunk(
-                    content=content,
-                    score=1.0 - (idx * 0.05),  # Score inicial
-                    source=entity.get("properties", {}).get("source"),
-                    domain=entity.get("properties", {}).get("domain", domains[0] if domains else None),
-                    metadata={"entity_id": entity["id"], "entity_type": entity["type"]},
-                    position=idx
-                ))
+            # Construir conteúdo rico com entidade e relações
+            content_parts = [f"{entity['name']} ({entity['type']})"]
             
+            if entity.get("properties"):
+                for key, value in entity["properties"].items():
+                    if key != "extracted_from":
+                        content_parts.append(f"{key}: {value}")
+            
+            if related:
+                content_parts.append("Relacionado com:")
+                for rel_entity in related[:3]:
+                    content_parts.append(f"- {rel_entity['name']} ({rel_entity['relation']})")
+            
+            content = "\n".join(content_parts)
+            
+            enhanced_chunks.append(EnhancedRAGChunk(
+                content=content,
+                score=1.0 - (idx * 0.05),  # Score inicial
+                source=entity.get("properties", {}).get("source"),
+                domain=entity.get("properties", {}).get("domain", domains[0] if domains else None),
+                metadata={"entity_id": entity["id"], "entity_type": entity["type"]},
+                position=idx
+            ))
+        
+        # Busca densa (paráfrases) nos namespaces do PersistentRAG
+        enhanced_chunks.extend(_dense_chunks(domains, query, top_k))
+        
+        if enhanced_chunks:
             # Se Enhanced RAG está habilitado, usar técnicas avançadas
-            if use_enhanced and enhanced_chunks:
+            if use_enhanced:
                 domain_filter = domains[0] if domains else None
                 
                 # Usar Enhanced RAG para processar
@@ -112,7 +135,7 @@ def query_rag(
                         content=chunk.content,
                         domain=chunk.domain,
                         relevance=chunk.score,
-                        id=chunk.metadata.get("entity_id", f"chunk_{len(chunks)}")
+                        id=_chunk_id(chunk, len(chunks))
                     ))
                 
                 if DEBUG_RAG:
@@ -120,12 +143,12 @@ def query_rag(
             else:
                 # Fallback: usar chunks originais sem enhanced
                 chunks = []
-                for chunk in enhanced_chunks[:top_k]:
+                for chunk in sorted(enhanced_chunks, key=lambda c: c.score, reverse=True)[:top_k]:
                     chunks.append(RAGChunk(
                         content=chunk.content,
                         domain=chunk.domain,
                         relevance=chunk.score,
-                        id=chunk.metadata.get("entity_id", f"chunk_{len(chunks)}")
+                        id=_chunk_id(chunk, len(chunks))
                     ))
             
             if DEBUG_RAG:
@@ -145,6 +168,49 @@ def query_rag(
     return []
 
 
+def _dense_chunks(domains: List[str], query: str, top_k: int) -> list:
+    """
+    Entradas do PersistentRAG achadas pela busca densa (settings.rag_vector_enabled),
+    uma busca por domínio (domínio = namespace). metadata["similarity"] faz o
+    Enhanced RAG manter o chunk mesmo sem palavra em comum com a consulta.
+    """
+    from infrastructure.config.settings import get_settings
+    
+    if not domains or not get_settings().rag_vector_enabled:
+        return []
+    try:
+        from rag.enhanced_rag import EnhancedRAGChunk
+        from rag.persistentRAG import get_rag_instance
+        
+        rag = get_rag_instance()
+        if getattr(rag, "vectors", None) is None:  # sem modelo de embedding ou storage SQLite
+            return []
+        chunks = []
+        for domain in domains:
+            for position, entry in enumerate(rag.search(domain, query, limit=top_k)):
+                metadata = {"entry_id": entry["id"]}
+                if "similarity" in entry:
+                    metadata["similarity"] = entry["similarity"]
+                chunks.append(EnhancedRAGChunk(
+                    content=entry["text"],
+                    score=entry.get("relevance", 0.0),
+                    domain=domain,
+                    metadata=metadata,
+                    position=position
+                ))
+        if DEBUG_RAG:
+            print(f"[RAG] Busca densa: {len(chunks)} entradas em {domains}")
+        return chunks
+    except Exception as e:
+        print(f"⚠️  [RAG] Busca densa indisponível: {e}")
+        return []
+
+
+def _chunk_id(chunk, index: int) -> str:
+    metadata = chunk.metadata or {}
+    return metadata.get("entity_id") or metadata.get("entry_id") or f"chunk_{index}"
+
+
 def build_rag_system_message(chunks: List[RAGChunk]) -> Optional[str]:
     """
     Build system message from RAG chunks with explicit override wording.
@@ -1,8 +1,21 @@
-import pyautogui
 import tempfile
 import os
 from datetime import datetime
 
+try:
+    import pyautogui
+    _PYAUTOGUI_ERROR = None
+except Exception as exc:  # sem display (servidor headless, CI, ENGINE_BACKEND=fake): as tools respondem com erro
+    pyautogui = None
+    _PYAUTOGUI_ERROR = exc
+
+
+def _gui():
+    """pyautogui, ou erro explicando por que não está disponível"""
+    if pyautogui is None:
+        raise RuntimeError(f"pyautogui indisponível ({type(_PYAUTOGUI_ERROR).__name__}: {_PYAUTOGUI_ERROR})")
+    return pyautogui
+
 # ======================================================
 # Ferramentas de Controle do Sistema - "Mãos e Olhos"
 # ======================================================
@@ -19,7 +32,7 @@ def move_mouse_to(x: int, y: int) -> str:
         str: A confirmation message.
     """
     try:
-        pyautogui.moveTo(x, y, duration=0.25)
+        _gui().moveTo(x, y, duration=0.25)
         return f"Mouse moved to ({x}, {y})."
     except Exception as e:
         return f"Error moving mouse: {e}"
@@ -37,7 +50,7 @@ def click_at(x: int, y: int, button: str = 'left') -> str:
         str: A confirmation message.
     """
     try:
-        pyautogui.click(x, y, button=button)
+        _gui().click(x, y, button=button)
         return f"{button.capitalize()} click performed at ({x}, {y})."
     except Exception as e:
         return f"Error performing click: {e}"
@@ -53,7 +66,7 @@ def type_text(text: str) -> str:
         str: A confirmation message.
     """
     try:
-        pyautogui.write(text, interval=0.05)
+        _gui().write(text, interval=0.05)
         return f"Typed text: '{text[:30]}...'"
     except Exception as e:
         return f"Error typing text: {e}"
@@ -71,7 +84,7 @@ def take_screenshot() -> str:
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         file_path = os.path.join(temp_dir, f"superezio_screenshot_{timestamp}.png")
         
-        screenshot = pyautogui.screenshot()
+        screenshot = _gui().screenshot()
         screenshot.save(file_path)
         
         return f"Screenshot saved to {file_path}"
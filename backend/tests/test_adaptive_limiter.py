@@ -0,0 +1,56 @@
+"""
+Tests for the adaptive concurrency limiter
+AIMD on the latency p95: grows while saturated and fast, backs off when slow
+or when calls are dropped, and sheds calls above the learned limit
+"""
+
+import sys
+import os
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from core.services.inference.admission import AdmissionController
+from utils.adaptive_limiter import AdaptiveLimiter, ConcurrencyLimitExceeded
+
+
+def test_grows_only_when_saturated_and_fast():
+    limiter = AdaptiveLimiter("test", target_p95_s=0.1, initial_limit=2, max_limit=4, window=4)
+    for _ in range(4):
+        limiter.observe(0.01, in_flight=1)
+    assert limiter.limit == 2  # rápido, mas sem demanda: não cresce
+
+    for _ in range(12):
+        limiter.observe(0.01, in_flight=limiter.limit)
+    assert limiter.limit == 4  # teto
+
+
+def test_backs_off_on_slow_p95_and_drops():
+    limiter = AdaptiveLimiter("test", target_p95_s=0.1, initial_limit=10, window=4)
+    for _ in range(4):
+        limiter.observe(2.0, cost=10)  # 200ms por token
+    assert limiter.limit == 9
+    for _ in range(4):
+        limiter.observe(None, dropped=True)
+    assert limiter.limit == 8
+    assert limiter.stats()["decreases"] == 2 and limiter.stats()["last_p95_ms"] is None
+
+
+def test_sheds_above_limit():
+    limiter = AdaptiveLimiter("test", target_p95_s=1.0, initial_limit=1)
+    with limiter.slot():
+        with pytest.raises(ConcurrencyLimitExceeded):
+            with limiter.slot():
+                pass
+    assert limiter.in_flight == 0 and limiter.stats()["shed"] == 1
+
+
+def test_admission_follows_the_learned_limit():
+    limiter = AdaptiveLimiter("engine", target_p95_s=0.1, initial_limit=2, max_limit=8, window=2)
+    controller = AdmissionController(max_in_flight=3, limiter=limiter)
+    assert controller.max_in_flight == 2
+    for _ in range(4):
+        limiter.observe(0.01, in_flight=limiter.limit)
+    assert limiter.limit == 4 and controller.max_in_flight == 3  # teto da admissão
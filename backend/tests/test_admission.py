@@ -0,0 +1,105 @@
+"""
+Tests for admission control
+Bounded in-flight generations, priority hand-off between classes and
+fast 503s with a Retry-After that follows the queue depth
+"""
+
+import sys
+import os
+import asyncio
+import threading
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from core.services.inference.admission import AdmissionController, AdmissionRejected, resolve_priority
+
+
+def test_priority_hand_off():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, service_time_s=1.0)
+        first = await controller.acquire("chat")
+        order = []
+
+        async def wait(priority):
+            ticket = await controller.acquire(priority)
+            order.append(priority)
+            ticket.release()
+
+        tasks = [asyncio.create_task(wait(p)) for p in ("batch", "chat", "interactive")]
+        await asyncio.sleep(0)
+        assert controller.stats()["waiting"] == {"interactive": 1, "chat": 1, "batch": 1}
+        first.release()
+        await asyncio.gather(*tasks)
+        return order, controller.stats()
+
+    order, stats = asyncio.run(scenario())
+    assert order == ["interactive", "chat", "batch"]
+    assert stats["in_flight"] == 0 and stats["admitted"] == 4
+
+
+def test_overload_is_rejected_with_retry_after():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=2, service_time_s=10.0, queue_timeouts={"chat": 15.0})
+        held = [await controller.acquire("chat") for _ in range(2)]
+        waiting = asyncio.create_task(controller.acquire("chat"))
+        await asyncio.sleep(0)
+        # 2 lugares e 1 na fila: a próxima espera ~(1+1)/2*10s
+        assert controller.retry_after("chat") == 10
+        controller.queue_timeouts["chat"] = 5.0
+        with pytest.raises(AdmissionRejected) as rejected:
+            await controller.acquire("chat")
+        assert rejected.value.reason == "overloaded" and rejected.value.retry_after == 10
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        for ticket in held:
+            ticket.release()
+        return controller.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["in_flight"] == 0 and stats["waiting"]["chat"] == 0
+
+
+def test_queue_deadline():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, service_time_s=0.01, queue_timeouts={"interactive": 0.05})
+        held = await controller.acquire("chat")
+        with pytest.raises(AdmissionRejected) as rejected:
+            await controller.acquire("interactive")
+        held.release()
+        return rejected.value, controller.stats()
+
+    rejected, stats = asyncio.run(scenario())
+    assert rejected.reason == "queue_timeout"
+    assert stats["timed_out"] == 1 and stats["in_flight"] == 0
+
+
+def test_clients_can_only_demote():
+    assert resolve_priority("chat", "batch") == "batch"
+    assert resolve_priority("chat", "interactive") == "chat"
+    assert resolve_priority("interactive", None) == "interactive"
+
+
+def test_release_from_worker_thread_runs_on_the_loop():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, service_time_s=1.0)
+        held = await controller.acquire("chat")
+        waiter = asyncio.create_task(controller.acquire("interactive"))
+        await asyncio.sleep(0)
+
+        loop_thread = threading.get_ident()
+        released_on = []
+        original = controller._release
+        controller._release = lambda ticket: (released_on.append(threading.get_ident()), original(ticket))
+
+        # Como o BackgroundTask síncrono do Starlette: release no threadpool, duas vezes
+        await asyncio.gather(asyncio.to_thread(held.release), asyncio.to_thread(held.release))
+        ticket = await asyncio.wait_for(waiter, 1.0)
+        await ticket.release_async()
+        return released_on, loop_thread, controller.stats()
+
+    released_on, loop_thread, stats = asyncio.run(scenario())
+    assert released_on == [loop_thread, loop_thread]
+    assert stats["in_flight"] == 0 and stats["admitted"] == 2
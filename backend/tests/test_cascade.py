@@ -0,0 +1,94 @@
+"""
+Tests for the small/large model cascade
+Tier selection by query complexity and escalation on low-confidence answers
+"""
+
+import sys
+import os
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from engine.cascade import ModelCascade, cascade_tier, is_trivial
+from engine.scheduler import BatchScheduler
+
+
+def test_trivial_queries():
+    assert is_trivial("Oi!")
+    assert is_trivial("bom dia, tudo bem?")
+    assert is_trivial("quanto é 2+2?")
+    assert not is_trivial("oi, me explica como funciona o scheduler de batching do engine")
+    assert not is_trivial("2024 foi bom?")
+
+
+def test_tiers():
+    assert cascade_tier("quanto é 2+2", "general_conversation") == "small"
+    assert cascade_tier("quanto é 2+2", "code_python") == "large"
+    assert cascade_tier("Explique como funciona o prefix cache e compare com o vLLM", "general_conversation") == "large"
+
+
+class TextBackend:
+    """Gera um texto fixo; `peak` controla o quão concentrada é a distribuição"""
+
+    n_slots = 1
+    slot_ctx = 256
+    batch_size = 32
+
+    def __init__(self, text, peak):
+        self.text = text
+        self.peak = peak
+        self.pos = 0
+
+    def decode(self, items):
+        results = []
+        for item in items:
+            if not item.want_logits:
+                results.append(None)
+                continue
+            logits = np.zeros(256, dtype=np.float32)
+            logits[ord(self.text[self.pos]) if self.pos < len(self.text) else 0] = self.peak
+            self.pos += 1
+            results.append(logits)
+        return results
+
+    def release(self, seq_id):
+        self.pos = 0
+
+    def token_bytes(self, token_id):
+        return bytes([token_id])
+
+    def is_eog(self, token_id):
+        return token_id == 0
+
+
+class ByteTokenizer:
+    def apply_chat_template(self, messages, tokenize=False, add_generation_prompt=True):
+        return "".join(m["content"] for m in messages)
+
+    def tokenize(self, text, cache=True):
+        return list(text.encode("utf-8"))
+
+
+def ask(backend, max_tokens=64):
+    cascade = ModelCascade(BatchScheduler(backend), ByteTokenizer(), "small", min_confidence=0.5)
+    try:
+        return cascade, cascade.answer([{"role": "user", "content": "quanto é 2+2"}], 0.0, max_tokens)
+    finally:
+        cascade.scheduler.shutdown()
+
+
+def test_confident_answer_is_served():
+    cascade, answer = ask(TextBackend("4", peak=20.0))
+    assert answer.content == "4" and answer.confidence > 0.99
+    assert cascade.get_stats()["small"] == 1
+
+
+def test_low_confidence_and_truncation_escalate():
+    cascade, answer = ask(TextBackend("4", peak=2.0))
+    assert answer is None
+    assert cascade.get_stats()["escalated"] == 1
+
+    _, answer = ask(TextBackend("uma resposta longa demais", peak=20.0), max_tokens=4)
+    assert answer is None
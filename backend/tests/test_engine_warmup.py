@@ -0,0 +1,53 @@
+"""
+Tests for the engine lifecycle
+Background load and warm-up go idle → loading → warming → ready, a load
+failure ends in failed without ever reporting ready, and start() is idempotent
+"""
+
+import sys
+import os
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import engine.cascade
+import engine.scheduler
+from engine.warmup import EngineLifecycle
+from infrastructure.config.settings import get_settings
+
+
+def test_states_go_from_idle_to_ready(monkeypatch):
+    lifecycle = EngineLifecycle()
+    seen = []
+    monkeypatch.setattr(engine.scheduler, "get_scheduler", lambda: seen.append(lifecycle.state))
+    monkeypatch.setattr(engine.cascade, "get_cascade", lambda: None)
+    monkeypatch.setattr(get_settings(), "engine_warmup", True)
+
+    def warm_up(max_tokens):
+        seen.append(lifecycle.state)
+        lifecycle.warmed["code_general"] = 0.01
+
+    monkeypatch.setattr(lifecycle, "warm_up", warm_up)
+
+    assert lifecycle.status() == {"ready": False, "state": "idle"}
+    thread = lifecycle.start()
+    assert lifecycle.start() is thread
+    assert lifecycle.wait_ready(2.0)
+
+    assert seen == ["loading", "warming"]
+    status = lifecycle.status()
+    assert status["ready"] and status["state"] == "ready"
+    assert status["warmed_experts"] == {"code_general": 0.01}
+
+
+def test_load_failure_never_reports_ready(monkeypatch):
+    def broken():
+        raise FileNotFoundError("modelo.gguf")
+
+    monkeypatch.setattr(engine.scheduler, "get_scheduler", broken)
+    lifecycle = EngineLifecycle()
+    lifecycle.start().join(2.0)
+
+    assert not lifecycle.ready and not lifecycle.wait_ready(0.01)
+    status = lifecycle.status()
+    assert status["state"] == "failed" and status["error"] == "modelo.gguf"
@@ -0,0 +1,58 @@
+"""
+Tests for the vectorized Enhanced RAG rerank
+Precomputed chunk features (ChunkIndex), fused signals and hybrid search over
+all query rewrites in one pass
+"""
+
+import sys
+import os
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from rag.enhanced_rag import ChunkIndex, EnhancedRAG, EnhancedRAGChunk
+
+
+def make_chunks():
+    return [
+        EnhancedRAGChunk(content="Para criar API FastAPI defina as rotas", score=0.5, domain="code", position=0),
+        EnhancedRAGChunk(content="Erro de conexão com o banco de dados", score=0.5, domain="db", position=1),
+        EnhancedRAGChunk(content="fastapi fastapi fastapi", score=0.9, domain=None, position=2),
+        EnhancedRAGChunk(content="Receita de bolo de cenoura", score=0.9, domain="code", position=3),
+    ]
+
+
+def test_signals_match_the_rerank_formula():
+    index = ChunkIndex(make_chunks())
+    signals = index.signals("criar API FastAPI")
+
+    assert np.allclose(signals["keyword"], [1.0, 0.0, 1 / 3, 0.0])
+    # "api fastapi" só é frase no primeiro; "fastapi fastapi" não contém "api fastapi" como palavras
+    assert np.allclose(signals["phrase"], [0.6, 0.0, 0.0, 0.0])
+    assert np.allclose(signals["position"], [1.0, 1 / 1.1, 1 / 1.2, 1 / 1.3])
+    assert np.allclose(signals["domain"], [1.0, 1.0, 0.8, 1.0])
+    assert signals["length"][0] == 1.0 - abs(len(make_chunks()[0].content) - 200) / 400
+
+
+def test_keyword_overlap_scores_all_rewrites_at_once():
+    index = ChunkIndex(make_chunks())
+    overlap = index.keyword_overlap(["criar API", "erro banco", "bolo"])
+    assert overlap.shape == (4, 3)
+    assert np.allclose(overlap[:, 0], [1.0, 0.0, 0.0, 0.0])
+    assert np.allclose(overlap[:, 1], [0.0, 1.0, 0.0, 0.0])
+    assert np.allclose(overlap[:, 2], [0.0, 0.0, 0.0, 1.0])
+
+
+def test_hybrid_search_returns_each_chunk_once_with_domain_filter():
+    rag = EnhancedRAG()
+    index = rag.index_chunks(make_chunks())
+
+    results = rag.hybrid_search_enhanced("criar API FastAPI", index, top_k=5)
+    assert [r.content for r in results][:2] == [make_chunks()[0].content, make_chunks()[2].content]
+    assert len({r.content for r in results}) == len(results) == 2
+
+    filtered = rag.hybrid_search_enhanced("criar API FastAPI", index, top_k=5, domain="db")
+    assert filtered == []
+    assert rag.advanced_rerank(make_chunks(), "erro no banco", top_k=1)[0].domain == "db"
@@ -0,0 +1,58 @@
+"""
+Tests for the fake engine backend (ENGINE_BACKEND=fake)
+Deterministic scripted answers through the real BatchScheduler and
+configurable latency distributions
+"""
+
+import sys
+import os
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from engine.fake_backend import FakeBatchBackend, FakeLatency, FakeTokenizer
+from engine.scheduler import BatchScheduler, SamplingParams
+
+
+def generate(prompts, **backend_kwargs):
+    slept = []
+    backend = FakeBatchBackend(n_slots=2, slot_ctx=512, batch_size=64, sleep=slept.append, **backend_kwargs)
+    tokenizer = FakeTokenizer()
+    scheduler = BatchScheduler(backend)
+    try:
+        handles = [
+            scheduler.submit(tokenizer.tokenize(tokenizer.render_chat([{"role": "user", "content": p}])),
+                             SamplingParams(temperature=0.7, max_tokens=512))
+            for p in prompts
+        ]
+        return [(h.text(), h.finish_reason) for h in handles], slept
+    finally:
+        scheduler.shutdown()
+
+
+def test_same_prompt_same_answer():
+    (first, second, other), slept = generate(
+        ["Oi, tudo bem?", "Oi, tudo bem?", "Explique o scheduler"], output_tokens=40
+    )
+    assert first == second
+    assert first[0] != other[0]
+    assert first[1] == "stop" and 5 <= len(first[0].split()) <= 100
+    assert slept and all(s > 0 for s in slept)
+
+
+def test_latency_distributions():
+    for distribution in FakeLatency.DISTRIBUTIONS:
+        latency = FakeLatency(20.0, jitter=0.25, distribution=distribution, seed=1)
+        samples = [latency.sample() for _ in range(2000)]
+        assert abs(sum(samples) / len(samples) - 0.020) < 0.003
+    assert FakeLatency(20.0, distribution="fixed").sample() == 0.020
+    with pytest.raises(ValueError):
+        FakeLatency(20.0, distribution="uniform")
+
+
+def test_fake_tokenizer_counts_words_and_punctuation():
+    tokenizer = FakeTokenizer()
+    assert tokenizer.count("Oi, tudo bem?") == 5
+    assert tokenizer.detokenize(tokenizer.tokenize("Oi, tudo bem?")) == "Oi, tudo bem?"
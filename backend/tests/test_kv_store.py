@@ -0,0 +1,67 @@
+"""
+Tests for the persistent KV snapshot store
+Several processes on one root (model server pool): the index is merged instead
+of overwritten, snapshots written by others survive a load, and pruning only
+removes namespaces no live store is using
+"""
+
+import sys
+import os
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from optimization.kv_cache import KVCacheManager
+from optimization.kv_store import KVSnapshotStore
+
+
+def no_persona(label):
+    return ""
+
+
+def make_store(root, model, n_ctx=4096):
+    # Cada store abre seus próprios descritores de lock: no flock equivale a outro processo
+    return KVSnapshotStore(root, model, n_ctx=n_ctx, fingerprint=no_persona)
+
+
+def test_stores_sharing_a_root_merge_the_index(tmp_path):
+    model = tmp_path / "model.gguf"
+    model.write_bytes(b"gguf")
+    root = tmp_path / "kv"
+    first, second = make_store(root, model), make_store(root, model)
+    assert first.directory == second.directory
+
+    second.load_into(KVCacheManager(min_prefix_tokens=1))
+    first.persist([1, 2, 3], b"estado-a", label="code")
+    first.flush()
+    # O segundo carregou antes da gravação do primeiro: nem apaga o .kv nem sobrescreve o índice
+    second.load_into(KVCacheManager(min_prefix_tokens=1))
+    second.persist([4, 5, 6], b"estado-b", label="familia")
+    second.flush()
+
+    cache = KVCacheManager(min_prefix_tokens=1)
+    assert make_store(root, model).load_into(cache) == 2
+    assert cache.lookup([1, 2, 3, 9]).state[:] == b"estado-a"
+    assert cache.lookup([4, 5, 6, 9]).state[:] == b"estado-b"
+
+    assert first.invalidate("code") == 1
+    assert make_store(root, model).load_into(KVCacheManager(min_prefix_tokens=1)) == 1
+    for store in (first, second):
+        store.close()
+
+
+def test_prune_skips_namespaces_in_use(tmp_path):
+    old_model, new_model = tmp_path / "old.gguf", tmp_path / "new.gguf"
+    old_model.write_bytes(b"old")
+    new_model.write_bytes(b"new")
+    root = tmp_path / "kv"
+
+    old = make_store(root, old_model)
+    new = make_store(root, new_model, n_ctx=8192)
+    assert new.prune_foreign_namespaces() == 0
+    assert old.directory.exists()
+
+    old.close()
+    assert new.prune_foreign_namespaces() == 1
+    assert not old.directory.exists() and new.directory.exists()
+    new.close()
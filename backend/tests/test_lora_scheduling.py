@@ -0,0 +1,112 @@
+"""
+Tests for LoRA-aware scheduling
+Queued requests are grouped by adapter to minimise swaps, starved adapters
+still get their turn, and the resident-adapter LRU frees the least used one
+"""
+
+import sys
+import os
+import threading
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from engine.lora import LoraAdapterCache
+from engine.scheduler import BatchScheduler, SamplingParams
+
+
+class AdapterBackend:
+    """Gera 2 tokens por sequência e registra o adapter ativo em cada decode"""
+
+    n_slots = 1
+    slot_ctx = 256
+    batch_size = 32
+
+    def __init__(self, fail=()):
+        self.adapter = None
+        self.swaps = []
+        self.served = []
+        self.fail = set(fail)
+        self.count = {}
+
+    def set_adapter(self, name, scale=1.0):
+        if name in self.fail:
+            raise FileNotFoundError(name)
+        self.adapter = name
+        self.swaps.append(name)
+
+    def decode(self, items):
+        results = []
+        for item in items:
+            if not item.want_logits:
+                results.append(None)
+                continue
+            n = self.count.get(item.seq_id, 0)
+            self.count[item.seq_id] = n + 1
+            if n == 0:
+                self.served.append(self.adapter)
+            logits = np.zeros(8, dtype=np.float32)
+            logits[0 if n >= 2 else 5] = 10.0
+            results.append(logits)
+        return results
+
+    def release(self, seq_id):
+        self.count.pop(seq_id, None)
+
+    def token_bytes(self, token_id):
+        return b"x"
+
+    def is_eog(self, token_id):
+        return token_id == 0
+
+
+def run_queue(backend, adapters, lora_max_wait=60.0):
+    """Enfileira tudo com o loop parado e só então libera o scheduler"""
+    scheduler = BatchScheduler(backend, lora_max_wait=lora_max_wait)
+    gate = threading.Event()
+    scheduler.run_exclusive(gate.wait)
+    handles = [
+        scheduler.submit([1, 2], SamplingParams(temperature=0.0, repeat_penalty=1.0, lora=name))
+        for name in adapters
+    ]
+    gate.set()
+    try:
+        for handle in handles:
+            handle.text()
+    finally:
+        scheduler.shutdown()
+    return scheduler
+
+
+def test_queue_is_grouped_by_adapter():
+    backend = AdapterBackend()
+    scheduler = run_queue(backend, ["code", "familia", "code", "familia", "code"])
+    assert backend.served == ["code", "code", "code", "familia", "familia"]
+    assert backend.swaps == ["code", "familia"]
+    assert scheduler.stats()["lora"]["swaps"] == 2
+
+
+def test_starved_adapter_interrupts_the_group():
+    backend = AdapterBackend()
+    run_queue(backend, ["code", "familia", "code"], lora_max_wait=0.0)
+    assert backend.served == ["code", "familia", "code"]
+
+
+def test_missing_adapter_falls_back_to_base_model():
+    backend = AdapterBackend(fail={"familia"})
+    run_queue(backend, ["familia", "familia"])
+    assert backend.served == [None, None]
+
+
+def test_adapter_lru_frees_least_used():
+    freed = []
+    cache = LoraAdapterCache(load=lambda name: f"handle-{name}", free=freed.append, capacity=2)
+    cache.get("code")
+    cache.get("familia")
+    cache.get("code")
+    cache.get("accounting")
+    assert freed == ["handle-familia"]
+    assert cache.resident() == ["code", "accounting"]
+    assert cache.loads == 3 and cache.evictions == 1
@@ -0,0 +1,45 @@
+"""
+Tests for PersistentRAG search over the inverted index
+BM25 ranking, accent-insensitive matching and incremental add/delete
+"""
+
+import sys
+import os
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rag.inverted_index import InvertedIndex, tokenize
+from rag.persistentRAG import PersistentRAG
+
+
+def test_tokenize_strips_accents_and_stopwords():
+    assert tokenize("Ana Paula é a mãe do Rapha!") == ["ana", "paula", "mae", "rapha"]
+
+
+def test_bm25_prefers_rare_and_dense_terms():
+    index = InvertedIndex()
+    index.add("1", "imposto estadual ICMS sobre mercadorias")
+    index.add("2", "imposto federal de renda")
+    index.add("3", "ICMS ICMS substituição tributária")
+    ranked = index.search("ICMS imposto", k=3)
+    assert [doc_id for doc_id, _, _ in ranked] == ["1", "3", "2"]
+    assert ranked[0][2] == 1.0 and ranked[2][2] == 0.5
+
+    index.remove("1")
+    assert [doc_id for doc_id, _, _ in index.search("ICMS", k=3)] == ["3"]
+    assert "estadual" not in index.postings
+
+
+def test_persistent_rag_search_add_delete(tmp_path):
+    rag = PersistentRAG(str(tmp_path))
+    rag.add("familia", "Ana Paula é a mãe do Rapha", ["ana", "familia"])
+    rapha = rag.add("familia", "Rapha estuda na UdeM em Montreal", ["rapha", "educacao"])
+
+    results = rag.search("familia", "O Rapha estuda?", limit=2)
+    assert results[0]["id"] == rapha and results[0]["relevance"] == 1.0
+    assert rag.search("familia", "quem é a mae", limit=1)[0]["text"].startswith("Ana Paula")
+
+    assert rag.delete("familia", rapha)
+    reloaded = PersistentRAG(str(tmp_path))
+    assert [r["text"] for r in reloaded.search("familia", "rapha", limit=5)] == ["Ana Paula é a mãe do Rapha"]
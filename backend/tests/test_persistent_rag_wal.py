@@ -0,0 +1,76 @@
+"""
+Tests for the PersistentRAG write-ahead log
+Appends instead of rewrites, snapshot + replay on load, torn tails and
+compaction into an atomic snapshot
+"""
+
+import sys
+import os
+import json
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rag.persistentRAG import PersistentRAG
+from rag.wal import NamespaceLog
+
+
+def test_writes_append_and_replay(tmp_path):
+    rag = PersistentRAG(str(tmp_path))
+    first = rag.add("familia", "Ana Paula é a mãe do Rapha")
+    rag.add("familia", "Rapha estuda na UdeM em Montreal")
+    rag.delete("familia", first)
+    rag.close()
+
+    assert not (tmp_path / "familia.json").exists()
+    assert len((tmp_path / "familia.wal.jsonl").read_text(encoding="utf-8").splitlines()) == 3
+    assert rag.list_namespaces() == ["familia"]
+
+    reloaded = PersistentRAG(str(tmp_path))
+    assert [e["text"] for e in reloaded.list("familia")] == ["Rapha estuda na UdeM em Montreal"]
+
+
+def test_torn_tail_is_discarded(tmp_path):
+    log = NamespaceLog(tmp_path, "notas", fsync_ms=0)
+    log.load()
+    log.append_add({"id": "1", "text": "ok"})
+    log.close()
+    with open(log.log_path, "a", encoding="utf-8") as f:
+        f.write('{"op": "add", "entry": {"id": "2", "te')
+
+    reopened = NamespaceLog(tmp_path, "notas")
+    assert [e["id"] for e in reopened.load()] == ["1"]
+    reopened.append_add({"id": "3", "text": "depois do crash"})
+    reopened.close()
+    assert [e["id"] for e in NamespaceLog(tmp_path, "notas").load()] == ["1", "3"]
+
+
+def test_compaction_writes_snapshot_and_resets_log(tmp_path):
+    log = NamespaceLog(tmp_path, "notas", compact_min=3, compact_ratio=0.5)
+    entries = log.load()
+    for i in range(3):
+        entry = {"id": str(i), "text": f"nota {i}"}
+        entries.append(entry)
+        log.append_add(entry)
+    assert log.needs_compaction()
+
+    log.compact(entries)
+    log.close()
+    assert json.loads(log.snapshot_path.read_text(encoding="utf-8")) == entries
+    assert log.log_path.read_text(encoding="utf-8") == ""
+    assert NamespaceLog(tmp_path, "notas").load() == entries
+
+
+def test_delete_then_add_does_not_reuse_ids(tmp_path):
+    rag = PersistentRAG(str(tmp_path))
+    first = rag.add("familia", "Ana Paula é a mãe do Rapha")
+    second = rag.add("familia", "Rapha estuda na UdeM")
+    rag.delete("familia", first)
+    third = rag.add("familia", "Rapha mora em Montreal")
+    fourth, = rag.add_many("familia", ["Marco torce pro Fluminense"])
+    assert len({second, third, fourth}) == 3
+    rag.close()
+
+    reloaded = PersistentRAG(str(tmp_path))
+    assert sorted(e["id"] for e in reloaded.list("familia")) == sorted([second, third, fourth])
+    assert reloaded.search("familia", "UdeM")[0]["id"] == second
@@ -0,0 +1,70 @@
+"""
+Tests for the exact-match response cache
+Key stability, byte-bounded LRU, TTL, namespace invalidation and stream replay
+"""
+
+import sys
+import os
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from optimization.response_cache import ENTRY_OVERHEAD_BYTES, ResponseCache
+
+
+def test_key_depends_on_tokens_and_params():
+    key = ResponseCache.make_key([1, 2, 3], temperature=0.0, max_tokens=64)
+    assert key == ResponseCache.make_key([1, 2, 3], max_tokens=64, temperature=0.0)
+    assert key != ResponseCache.make_key([1, 2, 4], temperature=0.0, max_tokens=64)
+    assert key != ResponseCache.make_key([1, 2, 3], temperature=0.0, max_tokens=128)
+
+
+def test_only_low_temperature_is_eligible():
+    cache = ResponseCache(max_temperature=0.3)
+    assert cache.eligible(0.0)
+    assert not cache.eligible(0.7)
+    assert not ResponseCache(max_bytes=0).eligible(0.0)
+
+
+def test_lru_is_bounded_in_bytes():
+    """Entradas mais antigas saem quando o total passa de max_bytes"""
+    cache = ResponseCache(max_bytes=3 * (100 + ENTRY_OVERHEAD_BYTES))
+    for i in range(3):
+        cache.put(f"k{i}", "x" * 100, "stop")
+    assert cache.get("k0") is not None  # k0 vira o mais recente
+
+    cache.put("k3", "x" * 100, "stop")
+    assert cache.get("k1") is None
+    assert cache.get("k0") is not None and cache.get("k3") is not None
+    assert cache.get_stats()["bytes"] <= cache.max_bytes
+
+
+def test_ttl_and_incomplete_generations():
+    cache = ResponseCache(ttl=0.0)
+    cache.put("k", "resposta", "stop")
+    assert cache.get("k") is None
+
+    cache = ResponseCache()
+    cache.put("cancelled", "meia resposta", "cancelled")
+    cache.put("error", "", "stop")
+    assert cache.get("cancelled") is None and cache.get("error") is None
+
+
+def test_namespace_invalidation():
+    cache = ResponseCache()
+    cache.put("familia", "Rapha estuda na PUC", "stop", namespaces=["familia"])
+    cache.put("code", "use pathlib", "stop", namespaces=["code_python", "code_general"])
+
+    assert cache.invalidate_namespace("familia") == 1
+    assert cache.get("familia") is None
+    assert cache.get("code") is not None
+
+    assert cache.invalidate_all() == 1
+    assert cache.get_stats()["entries"] == 0
+
+
+def test_replay_reassembles_content():
+    cache = ResponseCache()
+    cache.put("k", "Olá! " * 20, "stop")
+    entry = cache.get("k")
+    assert "".join(ResponseCache.replay(entry, chunk_chars=7)) == entry.content
@@ -0,0 +1,192 @@
+"""
+Tests for the continuous batching scheduler
+A scripted backend drives the real BatchScheduler loop: admission into free
+slots, finish reasons, cancellation and deadlines, and a failure outside the
+decode call ending every pending generation while the thread stays alive
+"""
+
+import sys
+import os
+import threading
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pytest
+
+from engine.scheduler import BatchScheduler, SamplingParams
+
+EOS = 0
+WORD = 5
+
+
+class ScriptedBackend:
+    """Cada sequência gera `length` tokens WORD e depois EOS"""
+
+    batch_size = 64
+
+    def __init__(self, n_slots=2, slot_ctx=128, length=3, fail_token_bytes=0):
+        self.n_slots = n_slots
+        self.slot_ctx = slot_ctx
+        self.length = length
+        self.fail_token_bytes = fail_token_bytes
+        self.count = {}
+        self.released = []
+
+    def decode(self, items):
+        results = []
+        for item in items:
+            if not item.want_logits:
+                results.append(None)
+                continue
+            n = self.count.get(item.seq_id, 0)
+            self.count[item.seq_id] = n + 1
+            logits = np.zeros(8, dtype=np.float32)
+            logits[WORD if n < self.length else EOS] = 10.0
+            results.append(logits)
+        return results
+
+    def release(self, seq_id):
+        self.count.pop(seq_id, None)
+        self.released.append(seq_id)
+
+    def token_bytes(self, token_id):
+        if self.fail_token_bytes:
+            self.fail_token_bytes -= 1
+            raise ValueError("token_bytes quebrou")
+        return b"w "
+
+    def is_eog(self, token_id):
+        return token_id == EOS
+
+
+GREEDY = dict(temperature=0.0, repeat_penalty=1.0)
+
+
+def test_failure_outside_decode_fails_pending_and_keeps_running():
+    backend = ScriptedBackend(n_slots=1, fail_token_bytes=1)
+    scheduler = BatchScheduler(backend)
+    try:
+        first = scheduler.submit([1, 2, 3], SamplingParams(**GREEDY))
+        with pytest.raises(RuntimeError, match="token_bytes"):
+            first.text()
+        assert first.finish_reason == "error"
+
+        # A thread continua servindo e o slot voltou para a fila de livres
+        second = scheduler.submit([1, 2, 3], SamplingParams(**GREEDY))
+        assert second.text() == "w w w "
+        assert second.finish_reason == "stop"
+        assert scheduler.stats()["slots_active"] == 0
+        assert scheduler._free_slots == [0]
+    finally:
+        scheduler.shutdown()
+
+
+def test_admission_waits_for_a_free_slot_and_rejects_oversized_prompts():
+    backend = ScriptedBackend(n_slots=1, slot_ctx=16, length=2)
+    scheduler = BatchScheduler(backend)
+    gate = threading.Event()
+    scheduler.run_exclusive(gate.wait)
+    try:
+        first = scheduler.submit([1, 2], SamplingParams(**GREEDY))
+        second = scheduler.submit([3, 4], SamplingParams(**GREEDY))
+        too_long = scheduler.submit(list(range(1, 20)), SamplingParams(**GREEDY))
+        assert scheduler.stats()["waiting"] == 3
+        gate.set()
+
+        assert first.text() == second.text() == "w w "
+        assert first.usage == {"prompt_tokens": 2, "completion_tokens": 2, "total_tokens": 4}
+        with pytest.raises(RuntimeError, match="não cabe no slot"):
+            too_long.text()
+        # Um slot só: todo mundo passou pelo mesmo seq_id e ele voltou livre
+        assert backend.released == [0, 0] and scheduler._free_slots == [0]
+    finally:
+        scheduler.shutdown()
+
+
+def test_finish_reasons_length_and_stop_string():
+    scheduler = BatchScheduler(ScriptedBackend(length=10))
+    try:
+        capped = scheduler.submit([1], SamplingParams(max_tokens=3, **GREEDY))
+        stopped = scheduler.submit([2], SamplingParams(stop=["w w"], **GREEDY))
+        assert capped.text() == "w w w " and capped.finish_reason == "length"
+        assert stopped.text() == "" and stopped.finish_reason == "stop"
+    finally:
+        scheduler.shutdown()
+
+
+def test_cancel_frees_the_slot_and_counts_saved_tokens():
+    from core.domain.cancellation import CancellationToken
+    from utils.metrics import metrics
+
+    scheduler = BatchScheduler(ScriptedBackend(n_slots=1, length=1000))
+    try:
+        saved_before = metrics.get_stats()["counters"].get("engine.cancelled_tokens_saved", 0)
+        token = CancellationToken()
+        running = scheduler.submit([1, 2], SamplingParams(max_tokens=500, **GREEDY), cancel_token=token)
+        events = iter(running)
+        assert next(events).text == "w "
+        token.cancel("client_disconnect")
+        assert [e.finish_reason for e in events][-1] == "cancelled"
+        assert running.error == "client_disconnect"
+
+        expired = scheduler.submit([3], SamplingParams(**GREEDY), cancel_token=CancellationToken(deadline_s=1e-9))
+        expired.text()
+        assert expired.finish_reason == "timeout"
+
+        # O slot voltou: a próxima geração roda até o fim
+        assert scheduler.submit([4], SamplingParams(max_tokens=2, **GREEDY)).text() == "w w "
+        saved = metrics.get_stats()["counters"]["engine.cancelled_tokens_saved"] - saved_before
+        # max_tokens que faltavam: 500 - gerados (cancelada) + 512 (expirou antes do decode)
+        assert saved == 500 - running.completion_tokens + 512
+    finally:
+        scheduler.shutdown()
+
+
+class PrefixBackend(ScriptedBackend):
+    """Registra os tokens decodificados e serializa o KV como a lista de tokens"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.prefilled = []
+        self.kv = {}
+
+    def decode(self, items):
+        for item in items:
+            self.kv.setdefault(item.seq_id, []).extend(item.tokens)
+            if not self.count.get(item.seq_id):
+                self.prefilled.extend(item.tokens)
+        return super().decode(items)
+
+    def release(self, seq_id):
+        self.kv.pop(seq_id, None)
+        super().release(seq_id)
+
+    def save_seq_state(self, seq_id):
+        return bytes(self.kv[seq_id])
+
+    def load_seq_state(self, seq_id, state):
+        self.kv[seq_id] = list(state)
+        return True
+
+
+def test_static_prefix_is_snapshotted_once_and_reused():
+    from optimization.kv_cache import KVCacheManager
+
+    backend = PrefixBackend(length=1)
+    cache = KVCacheManager(min_prefix_tokens=2)
+    scheduler = BatchScheduler(backend, prefill_chunk=64, prefix_cache=cache)
+    prefix = [10, 11, 12, 13]
+    try:
+        scheduler.submit(prefix + [1, 2], SamplingParams(**GREEDY), prefix_len=4, prefix_label="code").text()
+        assert cache.contains(prefix) and backend.prefilled == prefix + [1, 2]
+
+        backend.prefilled.clear()
+        second = scheduler.submit(prefix + [3], SamplingParams(**GREEDY), prefix_len=4, prefix_label="code")
+        assert second.text() == "w "
+        # Só o sufixo passou pelo prefill; o KV restaurado já tinha o prefixo
+        assert backend.prefilled == [3]
+        assert cache.get_stats()["cache_size"] == 1
+    finally:
+        scheduler.shutdown()
@@ -0,0 +1,99 @@
+"""
+Tests for the semantic answer cache
+Uses a bag-of-words fake embedder: similar wording → high cosine
+"""
+
+import sys
+import os
+import random
+import zlib
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from optimization.semantic_cache import SemanticCache, normalize_query
+
+
+def embed(text):
+    vector = [0.0] * 64
+    for word in text.split():
+        vector[zlib.crc32(word.encode()) % 64] += 1.0
+    return vector
+
+
+def make_cache(**kwargs):
+    kwargs.setdefault("audit_rate", 0.0)
+    return SemanticCache(embed, threshold=0.8, **kwargs)
+
+
+def test_normalize_query():
+    assert normalize_query("  Onde o RAPHA estuda?? ") == "onde o rapha estuda"
+    assert normalize_query("Qual é a formação?") == "qual e a formacao"
+
+
+def test_hit_on_rephrased_question_per_expert():
+    cache = make_cache()
+    cache.store("familia", "Onde o Rapha estuda hoje?", "Rapha estuda na PUC-Rio.")
+
+    hit = cache.lookup("familia", "onde o rapha estuda hoje")
+    assert hit is not None and hit.entry.answer == "Rapha estuda na PUC-Rio."
+    assert hit.score >= 0.8
+
+    # Outro expert e pergunta diferente não batem
+    assert cache.lookup("code_python", "Onde o Rapha estuda hoje?") is None
+    assert cache.lookup("familia", "Como configurar o pytest?") is None
+
+    stats = cache.get_stats()["experts"]["familia"]
+    assert stats["hits"] == 1 and stats["misses"] == 1
+
+
+def test_freshness_per_expert():
+    cache = make_cache(ttl=3600.0, expert_ttls={"news": 0.0})
+    cache.store("news", "Qual o melhor modelo hoje?", "Qwen2.5")
+    cache.store("familia", "Qual o melhor modelo hoje?", "Qwen2.5")
+    assert cache.lookup("news", "Qual o melhor modelo hoje?") is None
+    assert cache.lookup("familia", "Qual o melhor modelo hoje?") is not None
+
+
+def test_incomplete_answers_and_invalidation():
+    cache = make_cache()
+    cache.store("familia", "Quem é o pai do Rapha?", "Marco", finish_reason="cancelled")
+    cache.store("familia", "Quem é o pai do Rapha?", "Mar", finish_reason="length")
+    assert cache.lookup("familia", "Quem é o pai do Rapha?") is None
+
+    cache.store("familia", "Quem é o pai do Rapha?", "Marco", namespaces=["familia"])
+    assert cache.invalidate_namespace("familia") == 1
+    assert cache.lookup("familia", "Quem é o pai do Rapha?") is None
+
+
+def test_audit_counts_false_hits():
+    """Hits amostrados não são servidos; divergência da resposta nova conta como falso hit"""
+    cache = make_cache(audit_rate=1.0, rng=random.Random(0))
+    cache.store("familia", "Onde o Rapha estuda?", "Rapha estuda na PUC-Rio")
+
+    hit = cache.lookup("familia", "Onde o Rapha estuda?")
+    assert hit is not None and hit.audit
+    assert cache.audit(hit, "Rapha estuda na PUC-Rio")
+    assert not cache.audit(hit, "Ele mora em Niterói com a família")
+
+    stats = cache.get_stats()["experts"]["familia"]
+    assert stats["audits"] == 1 and stats["false_hits"] == 1 and stats["hits"] == 0
+
+
+def test_accepts_single_turn_only():
+    cache = make_cache(experts=["familia"])
+    single = [{"role": "system", "content": "x"}, {"role": "user", "content": "Oi"}]
+    multi = single + [{"role": "assistant", "content": "Olá"}, {"role": "user", "content": "E aí?"}]
+    assert cache.accepts("familia", single)
+    assert not cache.accepts("familia", multi)
+    assert not cache.accepts("code_python", single)
+
+
+def test_lru_capacity():
+    cache = make_cache(max_entries_per_expert=2)
+    cache.store("e", "alpha beta gamma", "a")
+    cache.store("e", "delta epsilon zeta", "b")
+    cache.lookup("e", "alpha beta gamma")
+    cache.store("e", "eta theta iota", "c")
+    assert cache.lookup("e", "delta epsilon zeta") is None
+    assert cache.lookup("e", "alpha beta gamma") is not None
@@ -0,0 +1,93 @@
+"""
+Tests for speculative decoding in the batch scheduler
+Prompt-lookup drafts are verified against the main model in one decode: the
+output is exactly what plain greedy decoding produces, accepted drafts save
+decode steps and rejected ones are truncated from the KV
+"""
+
+import sys
+import os
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from engine.scheduler import BatchScheduler, SamplingParams
+from engine.speculative import PromptLookupDrafter
+
+EOS = 0
+
+
+class ScriptBackend:
+    """Modelo determinístico: após o prompt, o próximo token é script[n gerados]"""
+
+    n_slots = 1
+    slot_ctx = 256
+    batch_size = 64
+    n_vocab = 16
+
+    def __init__(self, prompt_len, script):
+        self.prompt_len = prompt_len
+        self.script = script
+        self.kv = {}
+        self.steps = 0
+
+    def _next(self, length):
+        index = length - self.prompt_len
+        return self.script[index] if 0 <= index < len(self.script) else EOS
+
+    def decode(self, items):
+        self.steps += 1
+        results = []
+        for item in items:
+            self.kv[item.seq_id] = self.kv.get(item.seq_id, [])[:item.pos] + list(item.tokens)
+            rows = len(item.tokens) if item.all_logits else 1
+            logits = np.zeros((rows, self.n_vocab), dtype=np.float32)
+            for row in range(rows):
+                length = item.pos + (row + 1 if item.all_logits else len(item.tokens))
+                logits[row, self._next(length)] = 10.0
+            results.append(logits if item.all_logits else (logits[0] if item.want_logits else None))
+        return results
+
+    def truncate(self, seq_id, n_past):
+        self.kv[seq_id] = self.kv.get(seq_id, [])[:n_past]
+
+    def release(self, seq_id):
+        self.kv.pop(seq_id, None)
+
+    def token_bytes(self, token_id):
+        return f"{token_id} ".encode("utf-8")
+
+    def is_eog(self, token_id):
+        return token_id == EOS
+
+
+def generate(script, speculative):
+    prompt = [1, 2, 3, 4, 5, 1, 2]
+    backend = ScriptBackend(len(prompt), script)
+    scheduler = BatchScheduler(backend, drafters={"lookup": PromptLookupDrafter()}, spec_k=4)
+    try:
+        params = SamplingParams(temperature=0.0, repeat_penalty=1.0, max_tokens=64, speculative=speculative)
+        text = scheduler.submit(prompt, params).text()
+        return text, backend.steps, scheduler.stats()["speculative"]
+    finally:
+        scheduler.shutdown()
+
+
+def test_accepted_drafts_match_greedy_output_in_fewer_steps():
+    script = [3, 4, 5, 1, 2, 3, 4, 5]  # repete o prompt: o lookup acerta
+    plain, plain_steps, _ = generate(script, None)
+    fast, fast_steps, stats = generate(script, "lookup")
+    assert fast == plain == "3 4 5 1 2 3 4 5 "
+    assert fast_steps < plain_steps
+    assert stats["default"]["accepted"] > 0
+
+
+def test_rejected_drafts_do_not_change_the_output():
+    script = [9, 9, 8, 7, 6]  # nada a copiar do prompt após o primeiro token
+    plain, _, _ = generate(script, None)
+    checked, _, stats = generate(script, "lookup")
+    assert checked == plain == "9 9 8 7 6 "
+    # "9" já apareceu: o lookup propõe outro 9, o modelo diverge e o KV é truncado
+    assert stats["default"]["proposed"] > 0 and stats["default"]["accepted"] == 0
@@ -0,0 +1,43 @@
+"""
+Tests for the SQLite FTS5 RAG backend
+bm25 ranking inside a namespace, prefix and accent-insensitive queries,
+bulk add/search and upserts by id
+"""
+
+import sys
+import os
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rag.sqlite_rag import SQLiteRAG, fts_query
+
+
+def test_fts_query():
+    assert fts_query("O que é o ICMS estadual?") == '"icms" OR "estadual"'
+    assert fts_query("contab", prefix=True) == '"contab"*'
+    assert fts_query("e a o") is None
+
+
+def test_search_add_many_and_delete(tmp_path):
+    rag = SQLiteRAG(tmp_path / "rag.sqlite3")
+    ids = rag.add_many("familia", [
+        {"text": "Ana Paula é a mãe do Rapha", "tags": ["ana"]},
+        {"text": "Rapha estuda na UdeM em Montreal", "tags": ["rapha", "educacao"]},
+    ])
+    rag.add("contabilidade", "ICMS é um imposto estadual sobre mercadorias", ["icms"])
+
+    results = rag.search("familia", "onde o Rapha estuda", limit=5)
+    assert results[0]["id"] == ids[1] and results[0]["tags"] == ["rapha", "educacao"]
+    assert rag.search("familia", "mae", limit=1)[0]["id"] == ids[0]
+    assert rag.search("familia", "ICMS") == []
+    assert [r["id"] for r in rag.search("contabilidade", "impos", prefix=True)]
+
+    batch = rag.search_many("familia", ["Ana", "Montreal"], limit=1)
+    assert [r[0]["id"] for r in batch] == ids
+
+    rag.add_many("familia", [{"id": ids[0], "text": "Ana Paula mora em Montreal"}])
+    assert len(rag.list("familia")) == 2
+    assert rag.delete("familia", ids[1]) and not rag.delete("familia", ids[1])
+    assert [r["text"] for r in rag.search("familia", "Montreal")] == ["Ana Paula mora em Montreal"]
+    assert rag.list_namespaces() == ["contabilidade", "familia"]
@@ -0,0 +1,83 @@
+"""
+Tests for the thread-to-asyncio stream bridge
+Bounded buffer (the producer thread waits for a slow consumer), the producer
+is closed when the consumer leaves, errors reach the consumer and a client
+disconnect cancels the generation token
+"""
+
+import sys
+import os
+import asyncio
+import threading
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from core.domain.cancellation import CancellationToken
+from core.services.inference.stream_bridge import cancel_on_disconnect, iterate_in_thread
+
+
+class Producer:
+    """Gerador síncrono que conta o que produziu e se foi fechado"""
+
+    def __init__(self, total=1000, fail_at=None):
+        self.total = total
+        self.fail_at = fail_at
+        self.produced = 0
+        self.closed = threading.Event()
+
+    def __call__(self):
+        try:
+            for i in range(self.total):
+                if i == self.fail_at:
+                    raise ValueError("decode falhou")
+                self.produced += 1
+                yield i
+        finally:
+            self.closed.set()
+
+
+def test_slow_consumer_applies_backpressure_and_closes_the_producer():
+    producer = Producer()
+
+    async def scenario():
+        stream = iterate_in_thread(producer, max_buffer=2)
+        first = await stream.__anext__()
+        await asyncio.sleep(0.3)  # cliente lento: a produtora fica parada na fila cheia
+        produced_while_slow = producer.produced
+        await stream.aclose()  # cliente saiu
+        return first, produced_while_slow
+
+    first, produced_while_slow = asyncio.run(scenario())
+    assert first == 0
+    # 1 entregue + 2 no buffer + 1 esperando lugar na fila
+    assert produced_while_slow <= 4
+    assert producer.closed.wait(2.0)
+    assert producer.produced < producer.total
+
+
+def test_items_arrive_in_order_and_errors_reach_the_consumer():
+    async def collect(producer):
+        return [item async for item in iterate_in_thread(producer, max_buffer=4)]
+
+    assert asyncio.run(collect(Producer(total=50))) == list(range(50))
+    with pytest.raises(ValueError, match="decode falhou"):
+        asyncio.run(collect(Producer(fail_at=3)))
+
+
+def test_disconnect_cancels_the_token():
+    async def scenario():
+        token = CancellationToken()
+        polls = []
+
+        async def is_disconnected():
+            polls.append(1)
+            return len(polls) >= 3
+
+        await asyncio.wait_for(cancel_on_disconnect(token, is_disconnected, interval=0.01), 1.0)
+        return token
+
+    token = asyncio.run(scenario())
+    assert token.cancelled and token.reason == "client_disconnect"
@@ -0,0 +1,119 @@
+"""
+Tests for token-budgeted prompt assembly
+Uses a word-level fake tokenizer so budgets can be checked exactly
+"""
+
+import sys
+import os
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.services.inference.token_budget import MESSAGE_OVERHEAD, TokenBudget, TokenCounter
+
+
+def make_counter():
+    vocab = {}
+
+    def tokenize(data: bytes):
+        return [vocab.setdefault(word, len(vocab)) for word in data.decode("utf-8").split()]
+
+    def detokenize(ids):
+        reverse = {v: k for k, v in vocab.items()}
+        return " ".join(reverse[i] for i in ids).encode("utf-8")
+
+    return TokenCounter(tokenize, detokenize, cache_size=8)
+
+
+def words(n, prefix="w"):
+    return " ".join(f"{prefix}{i}" for i in range(n))
+
+
+def test_counter_caches_segments():
+    """Same segment is tokenized once; LRU stays bounded"""
+    counter = make_counter()
+    assert counter.count(words(10)) == 10
+    assert counter.count(words(10)) == 10
+    assert counter.hits == 1 and counter.misses == 1
+
+    for i in range(20):
+        counter.count(words(i + 1, prefix="x"))
+    assert len(counter._cache) == 8
+
+
+def test_truncate_is_token_exact():
+    counter = make_counter()
+    text = words(100)
+    for keep in ("head", "tail", "both"):
+        cut = counter.truncate(text, 40, keep=keep)
+        assert counter.count(cut) <= 40, keep
+    assert counter.truncate(text, 40, keep="head").startswith("w0 ")
+    assert counter.truncate(text, 40, keep="tail").endswith("w99")
+
+
+def test_fit_keeps_prompt_within_context():
+    """static + rag + history + user never exceed n_ctx - reserve_output"""
+    counter = make_counter()
+    budget = TokenBudget(counter, n_ctx=400, reserve_output=100, rag_share=0.4)
+
+    static = [{"role": "system", "content": words(50, "s")}]
+    history = [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": words(30, f"h{i}_")}
+        for i in range(12)
+    ]
+    rag, kept, user, report = budget.fit(static, words(300, "r"), history, words(20, "u"))
+
+    assert report.prompt_tokens <= 400 - 100
+    # Histórico: só os turnos mais recentes, inteiros e em ordem
+    assert kept == history[-len(kept):]
+    assert 0 < len(kept) < len(history)
+    assert report.dropped_turns == len(history) - len(kept)
+    # RAG truncado, usuário intacto
+    assert "rag" in report.truncated
+    assert counter.count(rag) + MESSAGE_OVERHEAD <= report.rag
+    assert user == words(20, "u")
+
+
+def test_fit_leftover_goes_to_rag():
+    """Without history, RAG may use all remaining space, not only rag_share"""
+    counter = make_counter()
+    budget = TokenBudget(counter, n_ctx=400, reserve_output=100, rag_share=0.4)
+
+    rag, kept, user, report = budget.fit([], words(200, "r"), [], words(10, "u"))
+    assert rag == words(200, "r")
+    assert report.truncated == ()
+
+
+def test_fit_truncates_oversized_user_message():
+    counter = make_counter()
+    budget = TokenBudget(counter, n_ctx=200, reserve_output=50)
+
+    rag, kept, user, report = budget.fit([], None, [], words(500, "u"))
+    assert "user" in report.truncated
+    assert report.prompt_tokens <= 150
+    # Mantém início e fim da mensagem
+    assert user.startswith("u0 ") and user.endswith("u499")
+
+
+def test_get_token_counter_retries_after_fallback(monkeypatch):
+    import types
+    from core.services.inference import token_budget
+
+    real = make_counter()
+    state = {"fail": True}
+
+    def get_tokenizer():
+        if state["fail"]:
+            raise FileNotFoundError("GGUF ainda não está no disco")
+        return types.SimpleNamespace(counter=real)
+
+    monkeypatch.setitem(sys.modules, "engine.tokenizer", types.SimpleNamespace(get_tokenizer=get_tokenizer))
+    monkeypatch.setattr(token_budget, "_counter", None)
+    monkeypatch.setattr(token_budget, "_fallback_counter", None)
+    monkeypatch.setattr(token_budget, "_FALLBACK_RETRY_S", 0.0)
+
+    fallback = token_budget.get_token_counter()
+    assert fallback is not real and fallback.count("abcdefgh") == 2  # ~4 chars por token
+    state["fail"] = False
+    assert token_budget.get_token_counter() is real
+    assert token_budget.get_token_counter() is real
@@ -0,0 +1,174 @@
+"""
+Tests for grammar-constrained tool calls
+GBNF generation from tool schemas, call parsing, early stop when the call object
+closes and the grammar re-sampling path of the scheduler (char-level fake backend)
+"""
+
+import sys
+import os
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from engine.scheduler import BatchScheduler, SamplingParams
+from engine.tool_grammar import ToolCallDetector, get_tool_grammar, parse_tool_call, tools_to_gbnf
+
+TOOLS = [
+    {
+        "name": "read_file",
+        "parameters": {
+            "type": "object",
+            "properties": {"path": {"type": "string"}},
+            "required": ["path"],
+        },
+    },
+    {
+        "name": "click_at",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "x": {"type": "integer"},
+                "y": {"type": "integer"},
+                "button": {"type": "string", "enum": ["left", "right"]},
+            },
+            "required": ["x", "y"],
+        },
+    },
+]
+
+
+def test_gbnf_covers_every_tool_and_text():
+    gbnf = tools_to_gbnf(TOOLS)
+    root = gbnf.splitlines()[0]
+    assert root.startswith("root ::=")
+    assert "call-read-file" in root and "call-click-at" in root and root.endswith("| text")
+    assert '"\\"read_file\\""' in gbnf
+    assert '("\\"left\\"" | "\\"right\\"")' in gbnf
+    assert "| text" not in tools_to_gbnf(TOOLS, allow_text=False).splitlines()[0]
+
+
+def test_both_prompt_builders_describe_the_call_format():
+    import prompt_builder as legacy
+    from core.services.inference import prompt_builder as pipeline
+
+    assert legacy.build_static_prefix is pipeline.build_static_prefix
+    persona = pipeline.build_static_prefix("base", "identity", "code_general", TOOLS)[-1]["content"]
+    assert "AVAILABLE TOOLS: read_file, click_at" in persona
+    assert '{"name": "<tool>", "parameters": {...}}' in persona
+
+
+def test_grammar_is_cached_per_tool_set():
+    assert get_tool_grammar(TOOLS) is get_tool_grammar([dict(t) for t in TOOLS])
+    assert get_tool_grammar(TOOLS[:1]).key != get_tool_grammar(TOOLS).key
+
+
+def test_parse_tool_call():
+    names = ("read_file",)
+    call = parse_tool_call(' {"name": "read_file", "parameters": {"path": "/tmp/a"}}', names)
+    assert call == {"name": "read_file", "parameters": {"path": "/tmp/a"}}
+    assert parse_tool_call("Olá, tudo bem?", names) is None
+    assert parse_tool_call('{"name": "rm_rf", "parameters": {}}', names) is None
+    assert parse_tool_call('{"name": "read_file", "parameters": {', names) is None
+
+
+def test_detector_stops_at_closing_brace():
+    detector = ToolCallDetector()
+    assert detector.feed(' {"name": "read_file", ') is None
+    assert detector.feed('"parameters": {"path": "a}{b"}') is None
+    assert detector.feed('}\n\nObservação') == 1
+
+    text = ToolCallDetector()
+    assert text.feed("Claro! {não é chamada}") is None
+
+
+class CharBackend:
+    """Um token por caractere; os logits favorecem o próximo caractere do roteiro"""
+
+    n_slots = 1
+    slot_ctx = 512
+    batch_size = 64
+    EOS = 0
+
+    def __init__(self, script: str, forbidden: str = ""):
+        self.script = script
+        self.forbidden = forbidden
+        self.pos = {}
+
+    def decode(self, items):
+        results = []
+        for item in items:
+            if not item.want_logits:
+                results.append(None)
+                continue
+            i = self.pos.get(item.seq_id, 0)
+            self.pos[item.seq_id] = i + 1
+            logits = np.zeros(256, dtype=np.float32)
+            if i < len(self.script):
+                logits[ord(self.script[i])] = 10.0
+                logits[ord(self.script[i].upper())] += 5.0
+            else:
+                logits[self.EOS] = 10.0
+            results.append(logits)
+        return results
+
+    def release(self, seq_id):
+        self.pos.pop(seq_id, None)
+
+    def token_bytes(self, token_id):
+        return bytes([token_id])
+
+    def is_eog(self, token_id):
+        return token_id == self.EOS
+
+    def grammar(self, gbnf):
+        return ForbidGrammar(self.forbidden)
+
+
+class ForbidGrammar:
+    """Gramática de brinquedo: proíbe um conjunto de caracteres"""
+
+    def __init__(self, forbidden):
+        self.forbidden = {ord(c) for c in forbidden}
+        self.freed = False
+
+    def allows(self, token_id):
+        return token_id not in self.forbidden
+
+    def mask(self, logits):
+        logits = np.array(logits, copy=True)
+        logits[list(self.forbidden)] = -np.inf
+        return logits
+
+    def accept(self, token_id):
+        assert token_id not in self.forbidden
+
+    def free(self):
+        self.freed = True
+
+
+def run(backend, **params):
+    scheduler = BatchScheduler(backend)
+    try:
+        handle = scheduler.submit([1, 2, 3], SamplingParams(temperature=0.0, repeat_penalty=1.0, max_tokens=200, **params))
+        return handle.text(), handle.finish_reason
+    finally:
+        scheduler.shutdown()
+
+
+def test_scheduler_finishes_when_call_closes():
+    call = '{"name": "read_file", "parameters": {"path": "a"}}'
+    text, reason = run(CharBackend(call + " e mais texto"), stop_on_call=True)
+    assert (text, reason) == (call, "tool_calls")
+
+    text, reason = run(CharBackend("resposta normal"), stop_on_call=True)
+    assert (text, reason) == ("resposta normal", "stop")
+
+
+def test_scheduler_resamples_only_when_grammar_rejects():
+    # "a" é proibido: o segundo melhor token ("A") entra no lugar
+    text, _ = run(CharBackend("banana"), grammar="root ::= ...")
+    assert text == "banana"
+    text, _ = run(CharBackend("banana", forbidden="a"), grammar="root ::= ...")
+    assert text == "bAnAnA"
@@ -0,0 +1,152 @@
+"""
+Tests for the dense vector index
+Memory-mapped embedding store (float16/int8), exact and IVF top-k, and
+hybrid BM25 + dense search in PersistentRAG with a deterministic embedder
+"""
+
+import sys
+import os
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from rag.embeddings import normalize_rows
+from rag.inverted_index import tokenize
+from rag.persistentRAG import PersistentRAG
+from rag.vector_index import EmbeddingStore, VectorIndex, top_k_indices
+
+
+class ConceptEmbedder:
+    """Palavras do mesmo conceito caem na mesma dimensão (paráfrases ficam próximas)"""
+
+    CONCEPTS = [
+        {"universidade", "udem", "faculdade", "estuda", "estudar", "curso"},
+        {"mae", "pai", "familia", "filho"},
+        {"imposto", "icms", "tributo", "estadual"},
+        {"montreal", "canada", "cidade", "mora"},
+    ]
+
+    def __init__(self):
+        self.calls = 0
+
+    def embed(self, text):
+        return self.embed_many([text])[0]
+
+    def embed_many(self, texts):
+        self.calls += len(texts)
+        vectors = np.full((len(texts), len(self.CONCEPTS) + 1), 0.05, dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in tokenize(text):
+                for dim, concept in enumerate(self.CONCEPTS):
+                    if word in concept:
+                        vectors[row, dim] += 1.0
+        return normalize_rows(vectors)
+
+
+def test_top_k_indices_orders_best_first():
+    scores = np.array([0.1, 0.9, 0.5, 0.7], dtype=np.float32)
+    assert top_k_indices(scores, 2).tolist() == [1, 3]
+    assert top_k_indices(scores, 10).tolist() == [1, 3, 2, 0]
+
+
+def test_store_roundtrip_float16_and_int8(tmp_path):
+    rng = np.random.default_rng(1)
+    vectors = normalize_rows(rng.normal(size=(300, 16)))
+    ids = [f"doc{i}" for i in range(300)]
+    for dtype in ("float16", "int8"):
+        store = EmbeddingStore(tmp_path / dtype, "ns", dtype)
+        store.add(ids, vectors)  # 300 linhas: a matriz cresceu além da capacidade inicial
+        store.delete("doc7")
+        store.close()
+
+        reloaded = EmbeddingStore(tmp_path / dtype, "ns", dtype).load()
+        assert len(reloaded) == 299 and "doc7" not in reloaded.rows
+        row = reloaded.rows["doc42"]
+        assert np.abs(reloaded.vectors(np.array([row]))[0] - vectors[42]).max() < 0.02
+
+
+def test_store_discards_torn_id_record(tmp_path):
+    store = EmbeddingStore(tmp_path, "ns")
+    store.add(["a", "b"], normalize_rows(np.eye(2, 4)))
+    store.close()
+    with open(store.ids_path, "a", encoding="utf-8") as f:
+        f.write('{"id": "c", "ro')
+
+    reloaded = EmbeddingStore(tmp_path, "ns").load()
+    assert sorted(reloaded.rows) == ["a", "b"]
+    assert store.ids_path.read_text(encoding="utf-8").endswith("\n")
+
+
+def test_ivf_search_finds_neighbours_and_incremental_adds(tmp_path):
+    rng = np.random.default_rng(0)
+    vectors = normalize_rows(rng.normal(size=(2000, 32)))
+    index = VectorIndex(tmp_path, embedder=None, exact_max=100, nprobe=8)
+    index.add_vectors("ns", [str(i) for i in range(2000)], vectors)
+
+    for i in (3, 512, 1999):
+        assert index.search_vector("ns", vectors[i], k=1)[0][0] == str(i)
+    assert index.stats("ns")["mode"] == "ivf" and index.stats("ns")["ivf_lists"] == 44
+
+    extra = normalize_rows(rng.normal(size=(1, 32)))
+    index.add_vectors("ns", ["novo"], extra)
+    assert index.search_vector("ns", extra[0], k=1)[0][0] == "novo"
+    index.delete("ns", "novo")
+    assert index.search_vector("ns", extra[0], k=1)[0][0] != "novo"
+
+
+def test_persistent_rag_finds_paraphrases(tmp_path):
+    embedder = ConceptEmbedder()
+    rag = PersistentRAG(str(tmp_path), embedder=embedder)
+    udem = rag.add("familia", "Rapha estuda na UdeM em Montreal", ["rapha"])
+    rag.add("familia", "Ana Paula é a mãe do Rapha", ["ana"])
+    rag.add("familia", "ICMS é um imposto estadual", ["icms"])
+
+    # nenhuma palavra em comum com a entrada: só a busca densa acha
+    results = rag.search("familia", "qual a faculdade dele?", limit=1)
+    assert results[0]["id"] == udem and results[0]["similarity"] > 0.9
+    assert rag.get_stats("familia")["vectors"]["vectors"] == 3
+    rag.close()
+
+    # reabrir não recalcula embeddings
+    reopened_embedder = ConceptEmbedder()
+    reopened = PersistentRAG(str(tmp_path), embedder=reopened_embedder)
+    assert reopened.search("familia", "curso na universidade", limit=1)[0]["id"] == udem
+    assert reopened_embedder.calls == 1  # só a consulta
+    assert reopened.list_namespaces() == ["familia"]
+
+
+def test_local_embedder_caches_by_text():
+    from rag.embeddings import LocalEmbedder
+
+    class Model:
+        calls = 0
+
+        def embed(self, batch, normalize, truncate):
+            Model.calls += len(batch)
+            return [[len(text), 1.0] for text in batch]
+
+    embedder = LocalEmbedder(Model(), cache_size=2)
+    assert embedder.embed_many(["a", "bb", "a"]).shape == (3, 2) and Model.calls == 2
+    embedder.embed_many(["bb", "a"])
+    assert Model.calls == 2
+    embedder.embed_many(["ccc", "bb"])  # "a" sai do LRU
+    embedder.embed("a")
+    assert Model.calls == 4
+
+
+def test_query_rag_includes_dense_candidates(tmp_path, monkeypatch):
+    import rag.persistentRAG as persistent
+    import rag_client
+    from infrastructure.config.settings import get_settings
+
+    rag = PersistentRAG(str(tmp_path), embedder=ConceptEmbedder())
+    udem = rag.add("familia", "Rapha estuda na UdeM em Montreal", ["rapha"])
+    rag.add("familia", "ICMS é um imposto estadual", ["icms"])
+    monkeypatch.setattr(persistent, "_rag_instance", rag)
+    monkeypatch.setattr(get_settings(), "rag_vector_enabled", True)
+
+    chunks = rag_client.query_rag(["familia"], "qual a faculdade dele?", top_k=3)
+    assert [c.id for c in chunks] == [udem]
+    assert chunks[0].domain == "familia"
@@ -8,6 +8,8 @@ import requests
 from pathlib import Path
 from typing import Dict, Any, Optional, List, Callable
 
+from utils.adaptive_limiter import ConcurrencyLimitExceeded, limited
+
 # Ferramentas de controle de sistema (locais)
 from system_control_tools import SYSTEM_CONTROL_TOOLS
 
@@ -42,19 +44,21 @@ def execute_tool(tool_name: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
 def execute_remote_tool(tool_name: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
     """
     Executa uma ferramenta via servidor Express (Node.js).
+    Limite adaptativo de concorrência: com o Express lento, o excesso falha na hora.
     """
     try:
         mapped_params = _map_parameters(tool_name, parameters)
         
-        response = requests.post(
-            f"{EXPRESS_API_URL}/api/agent/tools/execute",
-            json={
-                "toolName": tool_name,
-                "parameters": mapped_params,
-                "confirmed": True
-            },
-            timeout=30
-        )
+        with limited("tools"):
+            response = requests.post(
+                f"{EXPRESS_API_URL}/api/agent/tools/execute",
+                json={
+                    "toolName": tool_name,
+                    "parameters": mapped_params,
+                    "confirmed": True
+                },
+                timeout=30
+            )
         
         if response.status_code == 200:
             result = response.json()
@@ -69,6 +73,11 @@ def execute_remote_tool(tool_name: str, parameters: Dict[str, Any]) -> Dict[str,
                 "error": f"Erro HTTP {response.status_code}: {response.text}"
             }
             
+    except ConcurrencyLimitExceeded as e:
+        return {
+            "success": False,
+            "error": f"Servidor de ferramentas sobrecarregado, tente novamente ({e})."
+        }
     except requests.exceptions.ConnectionError:
         return {
             "success": False,
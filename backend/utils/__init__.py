@@ -6,6 +6,7 @@ from .circuit_breaker import CircuitBreaker, CircuitBreakerOpenError, _rag_circu
 from .rate_limiter import RateLimiter, rate_limiter
 from .logger import StructuredLogger, app_logger, rag_logger, tool_logger, model_logger
 from .metrics import MetricsCollector, metrics
+from .adaptive_limiter import AdaptiveLimiter, ConcurrencyLimitExceeded, get_limiter, limited, limiter_stats
 
 __all__ = [
     'TTLCache', 'cached', 'cache_key', '_model_cache', '_response_cache', '_rag_cache',
@@ -13,5 +14,6 @@ __all__ = [
     'RateLimiter', 'rate_limiter',
     'StructuredLogger', 'app_logger', 'rag_logger', 'tool_logger', 'model_logger',
     'MetricsCollector', 'metrics',
+    'AdaptiveLimiter', 'ConcurrencyLimitExceeded', 'get_limiter', 'limited', 'limiter_stats',
 ]
 
@@ -0,0 +1,224 @@
+"""
+Adaptive Concurrency Limiter
+Aprende quantas chamadas simultâneas um recurso aguenta mantendo o p95 da
+latência abaixo do alvo (AIMD, no estilo do controle de congestionamento TCP)
+
+- A cada janela de amostras calcula o p95 da latência (normalizada por custo,
+  ex.: segundos por token gerado)
+- p95 acima do alvo ou chamadas perdidas (timeout/erro de conexão):
+  limite *= backoff (decréscimo multiplicativo)
+- p95 abaixo do alvo e o limite foi realmente usado na janela: limite += 1
+  (acréscimo aditivo; sem demanda não há evidência para crescer)
+- Acima do limite a chamada é recusada na hora (ConcurrencyLimitExceeded) e
+  quem chamou degrada (RAG sem contexto, ferramenta com erro, fila de admissão)
+
+Diferente do CircuitBreaker, reage a lentidão e não só a exceções, e é
+thread-safe. O limite ótimo muda com o tamanho dos prompts; um número fixo
+sempre erra para um lado.
+"""
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Any, Callable, Dict, List, Optional
+
+from utils.metrics import metrics
+
+
+class ConcurrencyLimitExceeded(Exception):
+    """Chamada recusada: o limite adaptativo de concorrência está cheio"""
+    pass
+
+
+class AdaptiveLimiter:
+    """Limite de concorrência AIMD guiado pelo p95 da latência"""
+
+    def __init__(
+        self,
+        name: str,
+        target_p95_s: float,
+        initial_limit: int = 4,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        window: int = 20,
+        backoff: float = 0.9,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.name = name
+        self.target_p95 = target_p95_s
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.window = max(1, window)
+        self.backoff = backoff
+        self._clock = clock
+        self._limit = float(min(max(initial_limit, self.min_limit), self.max_limit))
+        self._in_flight = 0
+        self._samples: List[float] = []
+        self._dropped = 0
+        self._peak = 0  # maior concorrência vista na janela
+        self._last_p95: Optional[float] = None
+        self._stats = {"accepted": 0, "shed": 0, "increases": 0, "decreases": 0}
+        self._lock = threading.Lock()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    # ------------------------------------------------------------------
+    # Chamadas limitadas por este limiter
+    # ------------------------------------------------------------------
+    def try_acquire(self) -> bool:
+        with self._lock:
+            if self._in_flight >= self.limit:
+                self._stats["shed"] += 1
+                return False
+            self._in_flight += 1
+            self._peak = max(self._peak, self._in_flight)
+            self._stats["accepted"] += 1
+            return True
+
+    def release(self, latency: Optional[float], cost: float = 1.0, dropped: bool = False) -> None:
+        """Devolve o lugar e registra a latência (None = não amostrar)"""
+        with self._lock:
+            self._in_flight -= 1
+        if latency is not None or dropped:
+            self.observe(latency, cost, dropped)
+
+    @contextmanager
+    def slot(self):
+        """
+        Ocupa um lugar durante o bloco.
+        Timeouts e erros de I/O (conexão recusada, socket) contam como
+        chamada perdida.
+
+        Raises:
+            ConcurrencyLimitExceeded: limite cheio
+        """
+        if not self.try_acquire():
+            metrics.increment("limiter.shed", tags={"name": self.name})
+            raise ConcurrencyLimitExceeded(f"{self.name}: {self._in_flight}/{self.limit} em andamento")
+        start = self._clock()
+        try:
+            yield
+        except OSError:  # inclui TimeoutError, ConnectionError e as de requests
+            self.release(self._clock() - start, dropped=True)
+            raise
+        except BaseException:
+            self.release(None)
+            raise
+        self.release(self._clock() - start)
+
+    def call(self, func: Callable, *args, **kwargs) -> Any:
+        """Executa func com limite de concorrência"""
+        with self.slot():
+            return func(*args, **kwargs)
+
+    # ------------------------------------------------------------------
+    # Ajuste do limite
+    # ------------------------------------------------------------------
+    def observe(
+        self,
+        latency: Optional[float],
+        cost: float = 1.0,
+        dropped: bool = False,
+        in_flight: Optional[int] = None
+    ) -> None:
+        """
+        Registra uma amostra. `in_flight` é a concorrência medida por quem
+        controla os lugares (ex.: fila de admissão) quando não é este limiter.
+        """
+        with self._lock:
+            if in_flight is not None:
+                self._peak = max(self._peak, in_flight)
+            if dropped:
+                self._dropped += 1
+            elif latency is not None:
+                self._samples.append(latency / max(cost, 1e-9))
+            if len(self._samples) + self._dropped >= self.window:
+                self._adjust()
+
+    def _adjust(self) -> None:
+        """Fecha a janela e aplica AIMD (chamado com o lock)"""
+        ordered = sorted(self._samples)
+        p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] if ordered else None
+        previous = self.limit
+
+        if self._dropped or (p95 is not None and p95 > self.target_p95):
+            # Com limites pequenos o backoff não muda a parte inteira: cai ao menos 1
+            self._limit = max(float(self.min_limit), min(self._limit * self.backoff, previous - 1.0))
+            if self.limit < previous:
+                self._stats["decreases"] += 1
+        elif self._peak >= previous:
+            self._limit = min(float(self.max_limit), self._limit + 1)
+            if self.limit > previous:
+                self._stats["increases"] += 1
+
+        self._last_p95 = p95
+        self._samples.clear()
+        self._dropped = 0
+        self._peak = self._in_flight
+
+        if self.limit != previous:
+            metrics.histogram(f"limiter.{self.name}.limit", self.limit)
+            p95_text = f"{p95 * 1000:.0f}ms" if p95 is not None else "-"
+            print(f"📶 [LIMITER] {self.name}: limite {previous} → {self.limit} "
+                  f"(p95 {p95_text}, alvo {self.target_p95 * 1000:.0f}ms)")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "limit": self.limit,
+                "in_flight": self._in_flight,
+                "min_limit": self.min_limit,
+                "max_limit": self.max_limit,
+                "target_p95_ms": round(self.target_p95 * 1000, 1),
+                "last_p95_ms": round(self._last_p95 * 1000, 1) if self._last_p95 is not None else None,
+                **self._stats,
+            }
+
+
+# ----------------------------------------------------------------------
+# Instâncias globais por recurso (engine, rag, tools)
+# ----------------------------------------------------------------------
+_limiters: Dict[str, AdaptiveLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(name: str, **defaults) -> AdaptiveLimiter:
+    """
+    Limiter do recurso, criado na primeira chamada a partir de
+    settings.adaptive_<name>_* (os kwargs sobrescrevem os valores padrão)
+    """
+    limiter = _limiters.get(name)
+    if limiter is not None:
+        return limiter
+    with _limiters_lock:
+        if name not in _limiters:
+            from infrastructure.config.settings import get_settings
+
+            settings = get_settings()
+            config = {
+                "target_p95_s": getattr(settings, f"adaptive_{name}_target_ms", 1000.0) / 1000.0,
+                "max_limit": getattr(settings, f"adaptive_{name}_max", 64),
+                "window": settings.adaptive_window,
+                **defaults,
+            }
+            _limiters[name] = AdaptiveLimiter(name, **config)
+        return _limiters[name]
+
+
+def limited(name: str):
+    """slot() do limiter do recurso, ou um contexto vazio com os limites desligados"""
+    from infrastructure.config.settings import get_settings
+
+    if not get_settings().adaptive_limits_enabled:
+        return nullcontext()
+    return get_limiter(name).slot()
+
+
+def limiter_stats() -> Dict[str, Dict[str, Any]]:
+    """Estado de todos os limiters criados (exportado em /metrics)"""
+    return {name: limiter.stats() for name, limiter in list(_limiters.items())}
@@ -0,0 +1,290 @@
+"""
+Load test do backend SuperEzio
+
+Reproduz uma mistura de conversas contra /chat e /chat/stream e mede TTFT,
+latência entre tokens (ITL), tokens/s e latência total (p50/p95/p99).
+
+Modelos de chegada:
+  open    requisições chegam por processo de Poisson (--rate req/s), independente
+          de quantas estão em andamento: mostra fila e saturação
+  closed  --concurrency usuários em loop, cada um espera a resposta e pensa
+          --think-time segundos antes da próxima: mostra throughput sustentável
+
+Prompts: arquivos JSONL (padrão data/*.jsonl) nos formatos {"messages": [...]},
+{"text": "<s>[INST] ... [/INST] ..."} ou {"prompt"|"instruction"|"body"|"content": "..."}.
+
+Sem modelo (qualquer CPU): suba o backend com ENGINE_BACKEND=fake e o engine
+simulado (engine/fake_backend.py) responde com latências configuráveis. Use a
+app api.main (tem /chat e /chat/stream e sobe o uvicorn na porta api_port);
+backend/api.py não tem /chat/stream. Suba os limites de RATE_LIMIT_* ou quase
+tudo vira 429 (padrão: 30 /chat e 10 /chat/stream por minuto).
+
+Exemplos:
+  cd backend && ENGINE_BACKEND=fake RATE_LIMIT_CHAT=100000 RATE_LIMIT_STREAM=100000 python -m api.main
+  python scripts/load_test.py --mode closed --concurrency 8 --duration 60
+  python scripts/load_test.py --mode open --rate 4 --requests 200 --stream-ratio 1 --json-out results.json
+"""
+import argparse
+import asyncio
+import glob
+import json
+import random
+import re
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+PROJECT_ROOT = Path(__file__).parent.parent.resolve()
+_INST = re.compile(r"\[INST\](.*?)\[/INST\]", re.S)
+
+
+# ----------------------------------------------------------------------
+# Prompts
+# ----------------------------------------------------------------------
+def _conversation(record: Dict[str, Any]) -> Optional[List[Dict[str, str]]]:
+    """Conversa até a última mensagem do usuário (sem a resposta de referência)"""
+    messages = record.get("messages") or record.get("conversations")
+    if isinstance(messages, list):
+        turns = [
+            {"role": m.get("role") or {"human": "user", "gpt": "assistant"}.get(m.get("from"), "user"),
+             "content": m.get("content") or m.get("value") or ""}
+            for m in messages if isinstance(m, dict)
+        ]
+        turns = [t for t in turns if t["role"] in ("user", "assistant") and t["content"]]
+        while turns and turns[-1]["role"] != "user":
+            turns.pop()
+        return turns or None
+    if isinstance(record.get("text"), str):
+        match = _INST.search(record["text"])
+        if match:
+            return [{"role": "user", "content": match.group(1).strip()}]
+    for key in ("prompt", "instruction", "body", "content", "question"):
+        if isinstance(record.get(key), str) and record[key].strip():
+            return [{"role": "user", "content": record[key].strip()}]
+    return None
+
+
+def load_conversations(patterns: List[str], limit_per_file: int = 500) -> List[List[Dict[str, str]]]:
+    conversations = []
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern)):
+            taken = 0
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        conversation = _conversation(json.loads(line))
+                    except (json.JSONDecodeError, AttributeError):
+                        continue
+                    if conversation:
+                        conversations.append(conversation)
+                        taken += 1
+                        if taken >= limit_per_file:
+                            break
+    return conversations
+
+
+# ----------------------------------------------------------------------
+# Medições
+# ----------------------------------------------------------------------
+@dataclass
+class RequestResult:
+    endpoint: str
+    started: float
+    status: int = 0
+    error: Optional[str] = None
+    ttft: Optional[float] = None
+    latency: Optional[float] = None
+    tokens: int = 0
+    token_gaps: List[float] = field(default_factory=list)
+
+
+def _delta_text(event: Dict[str, Any]) -> str:
+    """Texto de um evento SSE (formato {"content"} do /chat/stream ou chunk OpenAI)"""
+    if "content" in event:
+        return event.get("content") or ""
+    choices = event.get("choices") or [{}]
+    return (choices[0].get("delta") or {}).get("content") or ""
+
+
+async def run_chat(client: httpx.AsyncClient, messages, max_tokens: int) -> RequestResult:
+    result = RequestResult("/chat", time.perf_counter())
+    try:
+        response = await client.post("/chat", json={"messages": messages, "max_tokens": max_tokens, "temperature": 0.7})
+        result.status = response.status_code
+        result.latency = result.ttft = time.perf_counter() - result.started
+        if response.status_code == 200:
+            usage = response.json().get("usage") or {}
+            result.tokens = usage.get("completion_tokens", 0)
+        else:
+            result.error = f"HTTP {response.status_code}"
+    except httpx.HTTPError as exc:
+        result.error = type(exc).__name__
+    return result
+
+
+async def run_stream(client: httpx.AsyncClient, messages, max_tokens: int) -> RequestResult:
+    result = RequestResult("/chat/stream", time.perf_counter())
+    last = None
+    try:
+        payload = {"messages": messages, "max_tokens": max_tokens, "temperature": 0.7}
+        async with client.stream("POST", "/chat/stream", json=payload) as response:
+            result.status = response.status_code
+            if response.status_code != 200:
+                result.error = f"HTTP {response.status_code}"
+                return result
+            async for line in response.aiter_lines():
+                if not line.startswith("data: "):
+                    continue
+                event = json.loads(line[6:])
+                if event.get("error"):
+                    result.error = str(event["error"])[:80]
+                    break
+                if not _delta_text(event):
+                    continue
+                now = time.perf_counter()
+                if last is None:
+                    result.ttft = now - result.started
+                else:
+                    result.token_gaps.append(now - last)
+                last = now
+                result.tokens += 1  # um evento ~ um token (o scheduler emite por token)
+        result.latency = time.perf_counter() - result.started
+    except httpx.HTTPError as exc:
+        result.error = type(exc).__name__
+    return result
+
+
+def percentiles(values: List[float], scale: float = 1000.0) -> Dict[str, Optional[float]]:
+    """p50/p95/p99/média (segundos → ms com o scale padrão)"""
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "mean": None}
+    ordered = sorted(values)
+
+    def pick(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+    return {
+        "p50": round(pick(0.50) * scale, 1),
+        "p95": round(pick(0.95) * scale, 1),
+        "p99": round(pick(0.99) * scale, 1),
+        "mean": round(sum(ordered) / len(ordered) * scale, 1),
+    }
+
+
+def summarize(results: List[RequestResult], elapsed: float) -> Dict[str, Any]:
+    report: Dict[str, Any] = {"elapsed_s": round(elapsed, 2), "endpoints": {}}
+    for endpoint in sorted({r.endpoint for r in results}):
+        group = [r for r in results if r.endpoint == endpoint]
+        ok = [r for r in group if not r.error]
+        tokens = sum(r.tokens for r in ok)
+        report["endpoints"][endpoint] = {
+            "requests": len(group),
+            "errors": len(group) - len(ok),
+            "error_kinds": sorted({r.error for r in group if r.error}),
+            "throughput_rps": round(len(ok) / elapsed, 2) if elapsed else 0,
+            "tokens_per_s": round(tokens / elapsed, 1) if elapsed else 0,
+            "ttft_ms": percentiles([r.ttft for r in ok if r.ttft is not None]),
+            "itl_ms": percentiles([g for r in ok for g in r.token_gaps]),
+            "latency_ms": percentiles([r.latency for r in ok if r.latency is not None]),
+            "per_request_tokens_per_s": percentiles(
+                [r.tokens / r.latency for r in ok if r.latency and r.tokens], scale=1.0
+            ),
+        }
+    return report
+
+
+# ----------------------------------------------------------------------
+# Modelos de chegada
+# ----------------------------------------------------------------------
+class LoadGenerator:
+    def __init__(self, args, conversations):
+        self.args = args
+        self.conversations = conversations
+        self.rng = random.Random(args.seed)
+        self.results: List[RequestResult] = []
+        self.issued = 0
+
+    def _budget_left(self, deadline: float) -> bool:
+        if self.args.requests and self.issued >= self.args.requests:
+            return False
+        return time.perf_counter() < deadline
+
+    async def _one(self, client: httpx.AsyncClient):
+        messages = self.rng.choice(self.conversations)
+        stream = self.rng.random() < self.args.stream_ratio
+        runner = run_stream if stream else run_chat
+        self.results.append(await runner(client, messages, self.args.max_tokens))
+
+    async def open_loop(self, client: httpx.AsyncClient, deadline: float):
+        tasks = []
+        while self._budget_left(deadline):
+            self.issued += 1
+            tasks.append(asyncio.create_task(self._one(client)))
+            await asyncio.sleep(self.rng.expovariate(self.args.rate))
+        await asyncio.gather(*tasks)
+
+    async def closed_loop(self, client: httpx.AsyncClient, deadline: float):
+        async def user():
+            while self._budget_left(deadline):
+                self.issued += 1
+                await self._one(client)
+                if self.args.think_time > 0:
+                    await asyncio.sleep(self.rng.expovariate(1 / self.args.think_time))
+
+        await asyncio.gather(*(user() for _ in range(self.args.concurrency)))
+
+    async def run(self) -> Dict[str, Any]:
+        limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+        timeout = httpx.Timeout(self.args.timeout)
+        async with httpx.AsyncClient(base_url=self.args.url, timeout=timeout, limits=limits) as client:
+            ready = await client.get("/health/ready")
+            if ready.status_code != 200:
+                print(f"⚠️  Backend ainda não está pronto ({ready.status_code}); medindo mesmo assim")
+            start = time.perf_counter()
+            deadline = start + (self.args.duration or float("inf"))
+            if self.args.mode == "open":
+                await self.open_loop(client, deadline)
+            else:
+                await self.closed_loop(client, deadline)
+            return summarize(self.results, time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test de /chat e /chat/stream")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--mode", choices=["open", "closed"], default="closed")
+    parser.add_argument("--rate", type=float, default=2.0, help="open: chegadas por segundo (Poisson)")
+    parser.add_argument("--concurrency", type=int, default=4, help="closed: usuários simultâneos")
+    parser.add_argument("--think-time", type=float, default=0.0, help="closed: pausa média entre requisições (s)")
+    parser.add_argument("--duration", type=float, default=30.0, help="segundos (0 = até --requests)")
+    parser.add_argument("--requests", type=int, default=0, help="total de requisições (0 = até --duration)")
+    parser.add_argument("--stream-ratio", type=float, default=0.5, help="fração das requisições em /chat/stream")
+    parser.add_argument("--max-tokens", type=int, default=256)
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--prompts", nargs="*", default=[str(PROJECT_ROOT / "data" / "*.jsonl")])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json-out", type=Path)
+    args = parser.parse_args()
+
+    if not args.duration and not args.requests:
+        parser.error("use --duration e/ou --requests")
+
+    conversations = load_conversations(args.prompts)
+    if not conversations:
+        sys.exit(f"❌ Nenhuma conversa encontrada em {args.prompts}")
+    print(f"📋 {len(conversations)} conversas | modo {args.mode} | {args.url}")
+
+    report = asyncio.run(LoadGenerator(args, conversations).run())
+    report["config"] = {k: str(v) if isinstance(v, Path) else v for k, v in vars(args).items()}
+    print(json.dumps(report["endpoints"], indent=2, ensure_ascii=False))
+    if args.json_out:
+        args.json_out.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+        print(f"💾 Resultado salvo em {args.json_out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Migra a memória RAG em JSON para o backend SQLite FTS5 (rag_storage = "sqlite")
+
+Fontes:
+  data/rag/*.json          namespaces do PersistentRAG (snapshot + log .wal.jsonl)
+  data/rag_memory.json     memória do RAG Node ({id, content, tags, metadata,
+                           timestamp em ms, domain?}); domain vira o namespace
+
+IDs são preservados e a escrita é upsert: rodar de novo não duplica entradas.
+
+Exemplos:
+  python scripts/migrate_rag_to_sqlite.py
+  python scripts/migrate_rag_to_sqlite.py --db data/rag/rag.sqlite3 --dry-run
+Depois: RAG_STORAGE=sqlite no .env
+"""
+import argparse
+import json
+import sys
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List
+
+PROJECT_ROOT = Path(__file__).parent.parent.resolve()
+sys.path.insert(0, str(PROJECT_ROOT / "backend"))
+
+from infrastructure.config.paths import get_rag_sqlite_path  # noqa: E402
+from rag.sqlite_rag import SQLiteRAG  # noqa: E402
+from rag.wal import NamespaceLog  # noqa: E402
+
+
+def load_namespaces(json_dir: Path) -> Dict[str, List[Dict]]:
+    """Namespaces do PersistentRAG, com o log já aplicado"""
+    names = {p.stem for p in json_dir.glob("*.json")}
+    names.update(p.name[:-len(".wal.jsonl")] for p in json_dir.glob("*.wal.jsonl"))
+    return {name: NamespaceLog(json_dir, name).load() for name in sorted(names)}
+
+
+def load_node_memory(path: Path, default_namespace: str) -> Dict[str, List[Dict]]:
+    """rag_memory.json do serviço Node, agrupado por domain"""
+    grouped: Dict[str, List[Dict]] = defaultdict(list)
+    for item in json.loads(path.read_text(encoding="utf-8")):
+        timestamp = item.get("timestamp")
+        if isinstance(timestamp, (int, float)):
+            timestamp = datetime.fromtimestamp(timestamp / 1000).isoformat()
+        grouped[item.get("domain") or default_namespace].append({
+            "id": item["id"],
+            "text": item.get("content") or item.get("text") or "",
+            "tags": item.get("tags") or [],
+            "metadata": item.get("metadata") or {},
+            "timestamp": timestamp,
+        })
+    return grouped
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migra data/rag/*.json e data/rag_memory.json para SQLite FTS5")
+    parser.add_argument("--json-dir", type=Path, default=PROJECT_ROOT / "data" / "rag")
+    parser.add_argument("--memory-file", type=Path, default=PROJECT_ROOT / "data" / "rag_memory.json")
+    parser.add_argument("--db", type=Path, default=None, help="padrão: settings.rag_sqlite_path")
+    parser.add_argument("--default-namespace", default="memoria", help="namespace de itens sem domain")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    sources: Dict[str, List[Dict]] = defaultdict(list)
+    if args.json_dir.exists():
+        for namespace, entries in load_namespaces(args.json_dir).items():
+            sources[namespace].extend(entries)
+    if args.memory_file.exists():
+        for namespace, entries in load_node_memory(args.memory_file, args.default_namespace).items():
+            sources[namespace].extend(entries)
+
+    total = sum(len(entries) for entries in sources.values())
+    if not total:
+        sys.exit("❌ Nada para migrar")
+    for namespace, entries in sorted(sources.items()):
+        print(f"📦 {namespace}: {len(entries)} entradas")
+
+    if args.dry_run:
+        print(f"🧪 Dry run: {total} entradas seriam migradas")
+        return
+
+    rag = SQLiteRAG(args.db or get_rag_sqlite_path())
+    for namespace, entries in sorted(sources.items()):
+        entries = [e for e in entries if e.get("text")]
+        rag.add_many(namespace, entries)
+    print(f"✅ {total} entradas migradas para {rag.db_path}")
+
+
+if __name__ == "__main__":
+    main()